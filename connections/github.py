@@ -14,7 +14,9 @@
 #
 
 # Standard library imports
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
+import threading
 import time
 
 # Third party imports (anything installed into the local Python environment)
@@ -22,10 +24,23 @@ import github
 
 # Local application imports (anything from EESSI/eessi-bot-software-layer)
 from tools import config, logging
+from tools.metrics import bot_metrics, METRIC_GITHUB_REQUEST_ERRORS, METRIC_GITHUB_REQUEST_SECONDS
 
 _token = None
 _gh = None
 
+# cache for Repository and PullRequest objects obtained via get_repo and
+# get_pull (least recently used entries are evicted when the cache is full,
+# entries expire after GITHUB_OBJECTS_CACHE_TTL seconds)
+GITHUB_OBJECTS_CACHE_SIZE = 256
+GITHUB_OBJECTS_CACHE_TTL = 300
+_gh_objects = OrderedDict()
+_gh_objects_lock = threading.Lock()
+
+# fields of a pull request (dotted names of the attributes of PullRequest)
+# served by LazyPullRequest from the payload of an event
+LAZY_PULL_REQUEST_FIELDS = ("number", "base.ref", "base.repo.full_name", "head.sha")
+
 
 def get_token():
     """
@@ -116,9 +131,107 @@ def get_instance():
 
     if not _gh or (_token and time_now > (_token.expires_at - refresh_time)):
         _gh = connect()
+        # cached objects use the previous access token
+        clear_cache()
     return _gh
 
 
+def clear_cache():
+    """
+    Removes all Repository and PullRequest objects from the cache.
+
+    Args:
+        No arguments
+
+    Returns:
+        None (implicitly)
+    """
+    with _gh_objects_lock:
+        _gh_objects.clear()
+
+
+def _get_cached(key, create):
+    """
+    Returns the object cached for a key or creates (and caches) it if it is not
+    cached or its entry has expired.
+
+    Args:
+        key (tuple): key of the object in the cache
+        create (function): function called without arguments to create the
+            object
+
+    Returns:
+        Cached or newly created object
+    """
+    now = time.monotonic()
+    with _gh_objects_lock:
+        entry = _gh_objects.get(key)
+        if entry and entry[0] > now:
+            _gh_objects.move_to_end(key)
+            return entry[1]
+
+    obj = create()
+
+    with _gh_objects_lock:
+        _gh_objects[key] = (now + GITHUB_OBJECTS_CACHE_TTL, obj)
+        _gh_objects.move_to_end(key)
+        while len(_gh_objects) > GITHUB_OBJECTS_CACHE_SIZE:
+            _gh_objects.popitem(last=False)
+    return obj
+
+
+def timed_request(operation, request, *args, **kwargs):
+    """
+    Sends a request to GitHub and records its duration (and whether it
+    failed) in the metrics of the bot.
+
+    Args:
+        operation (string): name of the operation used as label of the metrics
+        request (function): function sending the request
+        args (list): positional arguments for the function
+        kwargs (dict): keyword arguments for the function
+
+    Returns:
+        Result of the function
+    """
+    with bot_metrics.timer(METRIC_GITHUB_REQUEST_SECONDS, operation=operation):
+        try:
+            return request(*args, **kwargs)
+        except Exception:
+            bot_metrics.inc(METRIC_GITHUB_REQUEST_ERRORS, operation=operation)
+            raise
+
+
+def get_repo(repo_name):
+    """
+    Returns a (cached) instance of Repository for a repository.
+
+    Args:
+        repo_name (string): full name of the repository (OWNER/REPO)
+
+    Returns:
+        Instance of Repository
+    """
+    gh = get_instance()
+    return _get_cached(("repo", repo_name), lambda: timed_request("get_repo", gh.get_repo, repo_name))
+
+
+def get_pull(repo_name, pr_number):
+    """
+    Returns a (cached) instance of PullRequest for a pull request.
+
+    Args:
+        repo_name (string): full name of the repository (OWNER/REPO)
+        pr_number (int): number of the pull request
+
+    Returns:
+        Instance of PullRequest
+    """
+    pr_number = int(pr_number)
+    return _get_cached(("pull", repo_name, pr_number),
+                       lambda: timed_request("get_pull", get_repo(repo_name).get_pull, pr_number))
+
+
 def token():
     """
     Returns the globally defined _token.
@@ -130,3 +243,120 @@ def token():
         Token
     """
     return _token
+
+
+class LazyPullRequest:
+    """
+    Stand-in for a PullRequest that serves the fields contained in the payload
+    of an event (see LAZY_PULL_REQUEST_FIELDS) without sending a request to
+    GitHub. The PullRequest is only obtained (via get_pull) when any other
+    attribute is used, and then all further attributes are taken from it.
+    """
+
+    def __init__(self, repo_name, pr_number, fields=None):
+        """
+        LazyPullRequest constructor.
+
+        Args:
+            repo_name (string): full name of the repository (OWNER/REPO)
+            pr_number (int): number of the pull request
+            fields (dict): values of (dotted) fields of the pull request,
+                e.g., {'head.sha': '...'}
+        """
+        self._repo_name = repo_name
+        # the base repository of a pull request is the repository it belongs to
+        self._fields = {"number": int(pr_number), "base.repo.full_name": repo_name}
+        self._fields.update(fields or {})
+        self._pull = None
+
+    @classmethod
+    def from_event(cls, request_body):
+        """
+        Create a LazyPullRequest for the pull request an event (of type
+        pull_request or issue_comment) belongs to.
+
+        Args:
+            request_body (dict): payload of the event
+
+        Returns:
+            Instance of LazyPullRequest
+        """
+        repo_name = request_body['repository']['full_name']
+        pull_request = request_body.get('pull_request')
+        if pull_request is None:
+            # events of type issue_comment only contain the number of the PR
+            return cls(repo_name, request_body['issue']['number'])
+        fields = {}
+        for field in LAZY_PULL_REQUEST_FIELDS:
+            value = pull_request
+            for name in field.split('.'):
+                value = value.get(name) if isinstance(value, dict) else None
+            if value is not None:
+                fields[field] = value
+        return cls(repo_name, pull_request['number'], fields)
+
+    @property
+    def materialized(self):
+        """
+        Whether the PullRequest was obtained from GitHub.
+        """
+        return self._pull is not None
+
+    def materialize(self):
+        """
+        Obtain the PullRequest (once).
+
+        Args:
+            No arguments
+
+        Returns:
+            Instance of PullRequest
+        """
+        if self._pull is None:
+            self._pull = get_pull(self._repo_name, self._fields["number"])
+        return self._pull
+
+    def _get(self, path):
+        """
+        Returns the value of a (dotted) attribute, from the payload if
+        possible.
+
+        Args:
+            path (string): dotted name of the attribute, e.g., 'base.ref'
+
+        Returns:
+            Value of the attribute, or a _LazyAttributes for attributes (e.g.,
+                'base') containing fields taken from the payload
+        """
+        if path in self._fields:
+            return self._fields[path]
+        if self._pull is None and any(field.startswith(f"{path}.") for field in self._fields):
+            return _LazyAttributes(self, path)
+        value = self.materialize()
+        for name in path.split('.'):
+            value = getattr(value, name)
+        return value
+
+    def __getattr__(self, name):
+        # only called for attributes that are not set in the constructor
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self._get(name)
+
+    def __repr__(self):
+        return f"LazyPullRequest({self._repo_name}#{self._fields['number']}, materialized={self.materialized})"
+
+
+class _LazyAttributes:
+    """
+    Nested attribute (e.g., 'base') of a LazyPullRequest.
+    """
+
+    def __init__(self, lazy_pr, path):
+        self._lazy_pr = lazy_pr
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self._lazy_pr._get(f"{self._path}.{name}")
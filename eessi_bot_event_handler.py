@@ -19,24 +19,33 @@
 #
 
 # Standard library imports
+import os
 import sys
+import traceback
 from datetime import datetime, timezone
+from functools import partial
 
 # Third party imports (anything installed into the local Python environment)
 from pyghee.lib import create_app, get_event_info, PyGHee, read_event_from_json
-from pyghee.utils import log
+from pyghee.utils import log, log_warning
+import flask
 import waitress
 
 # Local application imports (anything from EESSI/eessi-bot-software-layer)
 from connections import github
-from tasks.build import check_build_permission, get_node_types, request_bot_build_issue_comments, \
-    submit_build_jobs
+from tasks.build import check_build_permission, get_build_status_from_job_dirs, get_node_types, \
+    request_bot_build_issue_comments, submit_build_jobs
 from tasks.deploy import deploy_built_artefacts, determine_job_dirs
 from tasks.clean_up import move_to_trash_bin
 from tools import config
 from tools.args import event_handler_parse
 from tools.commands import EESSIBotCommand, EESSIBotCommandError, \
     contains_any_bot_command, get_bot_command
+from tools.delivery_store import DeliveryStore, DELIVERY_DB_DEFAULT, DELIVERY_TTL_DEFAULT, get_payload_hash
+from tools.event_archive import EventArchive
+from tools.event_queue import EventQueue, EVENT_WORKERS_DEFAULT
+from tools.github_poller import GitHubPoller, POLL_STATE_FILE_DEFAULT
+from tools.metrics import bot_metrics, METRIC_EVENTS_DUPLICATE
 from tools.permissions import check_command_permission
 from tools.pr_comments import ChatLevels, create_comment
 
@@ -135,6 +144,21 @@ class EESSIBotSoftwareLayer(PyGHee):
         self.cfg = config.read_config()
         event_handler_cfg = self.cfg[config.SECTION_EVENT_HANDLER]
         self.logfile = event_handler_cfg.get(config.EVENT_HANDLER_SETTING_LOG_PATH)
+        # durable queue of received events handled by worker threads (see
+        # method start_event_queue), if None events are handled right away in
+        # the thread serving the webhook request
+        self.event_queue = None
+        # deliveries of events that were accepted before, so events GitHub
+        # redelivers are not handled again (also after a restart)
+        self.delivery_store = DeliveryStore(
+            event_handler_cfg.get(config.EVENT_HANDLER_SETTING_DELIVERY_DB) or DELIVERY_DB_DEFAULT,
+            ttl=float(event_handler_cfg.get(config.EVENT_HANDLER_SETTING_DELIVERY_TTL) or DELIVERY_TTL_DEFAULT))
+        # archive of all verified events (e.g., to replay them with
+        # scripts/replay_events.py), None if not configured
+        self.event_archive = None
+        event_archive_dir = event_handler_cfg.get(config.EVENT_HANDLER_SETTING_EVENT_ARCHIVE_DIR)
+        if event_archive_dir:
+            self.event_archive = EventArchive(event_archive_dir, self.logfile)
 
     def log(self, msg, *args):
         """
@@ -154,6 +178,173 @@ class EESSIBotSoftwareLayer(PyGHee):
         msg = "[%s]: %s" % (funcname, msg)
         log(msg, log_file=self.logfile)
 
+    def start_event_queue(self, path, workers=EVENT_WORKERS_DEFAULT):
+        """
+        Handle received events asynchronously: webhook requests are answered
+        (with status 202) as soon as the verified event is stored in a durable
+        queue, from which a pool of worker threads takes the events to handle
+        them. Events for the same pull request are handled in order.
+
+        Args:
+            path (string): path to the directory of the queue
+            workers (int): number of worker threads
+
+        Returns:
+            None (implicitly)
+        """
+        self.event_queue = EventQueue(path, self.logfile)
+        self.event_queue.start(partial(self.handle_event, log_file=self.logfile), workers)
+        # answer webhook requests via method receive_event
+        self.view_functions['main'] = self.receive_event
+        self.log(f"handling events with {workers} workers from queue {path} "
+                 f"({len(self.event_queue)} events pending)")
+
+    def receive_event(self):
+        """
+        Answer a webhook request when events are handled asynchronously (see
+        method start_event_queue).
+
+        Args:
+            No arguments
+
+        Returns:
+            tuple of 2 elements containing
+            - (string): empty body
+            - (int): HTTP status, 202 if the event was queued and 200 if it
+              was ignored (e.g., as duplicate)
+        """
+        queued = self.process_event(flask.request, flask.abort, log_file=self.logfile)
+        return '', 202 if queued else 200
+
+    def process_event(self, request, abort_function, events_log_dir=None, log_file=None, raise_error=False,
+                      verify=True):
+        """
+        Process a single event received via a webhook request. Duplicates of
+        events that were accepted before are ignored (see method
+        accept_event). Without a queue, the event is handled right away and
+        errors are logged (as done by PyGHee.process_event). With a queue, the
+        event is stored in the queue. Errors are not caught then, so the
+        request fails (and GitHub can redeliver the event) if the event could
+        not be queued.
+
+        Args:
+            request (flask.Request): the webhook request
+            abort_function (callable): function aborting the request with an
+                HTTP status
+            events_log_dir (string): directory events are logged to
+            log_file (string): path to the log file
+            raise_error (bool): whether errors are raised (only used without
+                a queue)
+            verify (bool): whether the signature of the request is verified
+
+        Returns:
+            (bool): True if the event was queued, False otherwise
+        """
+        if self.event_queue is None:
+            try:
+                event_info = get_event_info(request, self.event_source)
+                if self.accept_event(event_info, abort_function, events_log_dir=events_log_dir,
+                                     log_file=log_file, verify=verify):
+                    self.handle_event(event_info, log_file=log_file)
+            except Exception as err:
+                if raise_error:
+                    raise
+                tb_txt = ''.join(traceback.format_exception(None, err, err.__traceback__))
+                log_warning("A crash occurred!\n" + tb_txt, log_file=log_file)
+            return False
+
+        event_info = get_event_info(request, self.event_source)
+        if not self.accept_event(event_info, abort_function, events_log_dir=events_log_dir, log_file=log_file,
+                                 verify=verify):
+            return False
+        try:
+            self.event_queue.put(event_info)
+        except Exception:
+            # accept the event again if GitHub redelivers it
+            self.delivery_store.forget(event_info['id'])
+            raise
+        return True
+
+    def accept_event(self, event_info, abort_function, events_log_dir=None, log_file=None, verify=True):
+        """
+        Decide if a received event is handled. Events whose delivery id
+        (header X-GitHub-Delivery) or payload was accepted before (e.g., when
+        GitHub or an admin redelivers an event) are ignored right away with a
+        single log line. Other events are logged, verified, registered in
+        the delivery store and (if configured) archived.
+
+        Args:
+            event_info (dict): event received by the event handler
+            abort_function (callable): function aborting the request with an
+                HTTP status
+            events_log_dir (string): directory events are logged to
+            log_file (string): path to the log file
+            verify (bool): whether the signature of the request is verified
+
+        Returns:
+            (bool): True if the event is to be handled, False if it is a
+                duplicate
+        """
+        delivery_id = event_info['id']
+        payload_hash = get_payload_hash(event_info)
+        duplicate = self.delivery_store.check(delivery_id, payload_hash)
+        if duplicate is None:
+            self.log_event(event_info, events_log_dir=events_log_dir, log_file=log_file)
+            if verify:
+                self.verify_request(event_info, abort_function, log_file=log_file)
+            # the same event may have been accepted concurrently
+            if not self.delivery_store.register(delivery_id, payload_hash, event_type=event_info['type']):
+                duplicate = "concurrent"
+        if duplicate is not None:
+            log(f"Duplicate event ignored (same {duplicate}), id: {delivery_id}, type: {event_info['type']}, "
+                f"action: {event_info['action']}", log_file=log_file)
+            bot_metrics.inc(METRIC_EVENTS_DUPLICATE, type=event_info['type'], reason=duplicate)
+            return False
+        if self.event_archive is not None:
+            try:
+                self.event_archive.append(event_info)
+            except OSError as err:
+                # the archive is not needed to handle the event
+                self.log(f"failed to archive event {delivery_id}: {err}")
+        return True
+
+    def poll_github(self):
+        """
+        Poll GitHub for changes to the pull requests of the repositories listed
+        in the setting 'poll_repositories' and handle the synthesized events
+        (see tools.github_poller.GitHubPoller), for sites that cannot receive
+        events via webhook. Events are handled like events received via
+        webhook, except that there is no signature to verify.
+
+        Args:
+            No arguments
+
+        Returns:
+            (int): number of handled events
+        """
+        event_handler_cfg = self.cfg[config.SECTION_EVENT_HANDLER]
+        repos = event_handler_cfg.get(config.EVENT_HANDLER_SETTING_POLL_REPOSITORIES, '').replace(',', ' ').split()
+        if not repos:
+            self.log(f"no repositories to poll, set '{config.EVENT_HANDLER_SETTING_POLL_REPOSITORIES}' in section "
+                     f"'[{config.SECTION_EVENT_HANDLER}]'")
+            return 0
+        state_path = event_handler_cfg.get(config.EVENT_HANDLER_SETTING_POLL_STATE_FILE, POLL_STATE_FILE_DEFAULT)
+        poller = GitHubPoller(state_path, repos, github.get_instance().requester, self.logfile)
+        handled = 0
+        for event_info in poller.poll():
+            if not self.accept_event(event_info, None, log_file=self.logfile, verify=False):
+                continue
+            try:
+                self.handle_event(event_info, log_file=self.logfile)
+            except Exception as err:
+                # like events received via webhook, events whose handling
+                # failed are not handled again
+                tb_txt = ''.join(traceback.format_exception(None, err, err.__traceback__))
+                log_warning("A crash occurred!\n" + tb_txt, log_file=self.logfile)
+            handled += 1
+        self.log(f"polled {len(repos)} repositories, handled {handled} events")
+        return handled
+
     def handle_issue_comment_event(self, event_info, log_file=None):
         """
         Handle events of type issue_comment. Main action is to parse new issue
@@ -449,20 +640,38 @@ class EESSIBotSoftwareLayer(PyGHee):
             None (implicitly)
         """
         action = event_info['action']
-        gh = github.get_instance()
         self.log("repository: '%s'", event_info['raw_request_body']['repository']['full_name'])
-        pr = gh.get_repo(event_info['raw_request_body']['repository']
-                         ['full_name']).get_pull(event_info['raw_request_body']['pull_request']['number'])
-        self.log("PR data: %s", pr)
 
         handler_name = 'handle_pull_request_%s_event' % action
         if hasattr(self, handler_name):
             handler = getattr(self, handler_name)
+            pr = self.get_pull_request(event_info)
+            self.log("PR data: %s", pr)
             self.log("Handling PR action '%s' for PR #%d...", action, pr.number)
             handler(event_info, pr)
         else:
             self.log("No handler for PR action '%s'", action)
 
+    def get_pull_request(self, event_info):
+        """
+        Returns the pull request an event (of type pull_request or
+        issue_comment) belongs to. The pull request is only obtained from
+        GitHub when an attribute not contained in the payload of the event is
+        used (see connections.github.LazyPullRequest), and is shared by all
+        handlers of the event.
+
+        Args:
+            event_info (dict): event received by event_handler
+
+        Returns:
+            (connections.github.LazyPullRequest): the pull request
+        """
+        pr = event_info.get('pull_request')
+        if pr is None:
+            pr = github.LazyPullRequest.from_event(event_info['raw_request_body'])
+            event_info['pull_request'] = pr
+        return pr
+
     def handle_bot_command(self, event_info, bot_command, log_file=None):
         """
         Handle a bot command. Main purpose is to determine a handler for the
@@ -524,11 +733,8 @@ class EESSIBotSoftwareLayer(PyGHee):
             (string): immediate result of command (any jobs or no jobs being
                 submitted) and a link to the issue comment for submitted jobs
         """
-        gh = github.get_instance()
         self.log("repository: '%s'", event_info['raw_request_body']['repository']['full_name'])
-        repo_name = event_info['raw_request_body']['repository']['full_name']
-        pr_number = event_info['raw_request_body']['issue']['number']
-        pr = gh.get_repo(repo_name).get_pull(pr_number)
+        pr = self.get_pull_request(event_info)
         build_msg = ''
         # Require that build_params is defined, it is required. Otherwise, return early
         if bot_command.build_params is None:
@@ -566,18 +772,17 @@ class EESSIBotSoftwareLayer(PyGHee):
                 by the handler for events of type pull_request with the action opened
         """
         self.log("processing bot command 'show_config'")
-        gh = github.get_instance()
-        repo_name = event_info['raw_request_body']['repository']['full_name']
-        pr_number = event_info['raw_request_body']['issue']['number']
-        pr = gh.get_repo(repo_name).get_pull(pr_number)
+        pr = self.get_pull_request(event_info)
         issue_comment = self.handle_pull_request_opened_event(event_info, pr, req_chatlevel=ChatLevels.MINIMAL)
         if issue_comment:
             return f"\n  - added comment {issue_comment.html_url} to show configuration"
 
     def handle_bot_command_status(self, event_info, bot_command):
         """
-        Handles bot command 'status' by querying the github API
-        for the comments in a pr.
+        Handles bot command 'status' by collecting the results of the finished
+        build jobs for a PR from their working directories. If no finished job
+        is found and the setting 'status_comments_fallback' is enabled, the
+        results are obtained from the comments of the PR instead.
 
         Args:
             event_info (dict): event received by event_handler
@@ -590,8 +795,16 @@ class EESSIBotSoftwareLayer(PyGHee):
         self.log("processing bot command 'status'")
         repo_name = event_info['raw_request_body']['repository']['full_name']
         pr_number = event_info['raw_request_body']['issue']['number']
-        status_table = request_bot_build_issue_comments(repo_name, pr_number)
-        self.log(f"Retrieved status table from issue comments: {status_table}")
+        job_dirs = determine_job_dirs(pr_number)
+        status_table = get_build_status_from_job_dirs(job_dirs, repo_name, pr_number, self.cfg)
+        self.log(f"Retrieved status table from job directories: {status_table}")
+        bot_control_cfg = self.cfg[config.SECTION_BOT_CONTROL]
+        comments_fallback = bot_control_cfg.getboolean(config.BOT_CONTROL_SETTING_STATUS_COMMENTS_FALLBACK,
+                                                       fallback=False)
+        if not status_table['date'] and comments_fallback:
+            # e.g., jobs whose directories were moved to the trash bin
+            status_table = request_bot_build_issue_comments(repo_name, pr_number)
+            self.log(f"Retrieved status table from issue comments: {status_table}")
 
         if 'last_build' in bot_command.general_args:
             # If the bot command is something like 'bot:status =last_build', then only retain the last build for each
@@ -623,7 +836,8 @@ class EESSIBotSoftwareLayer(PyGHee):
 
             # Keep only the first entry for each 'for arch', as that is now the newest
             status_table_last = {
-                'on arch': [], 'for arch': [], 'for repo': [], 'date': [], 'status': [], 'url': [], 'result': []
+                'on arch': [], 'for arch': [], 'for repo': [], 'date': [], 'status': [], 'url': [], 'result': [],
+                'test': []
             }
             for x in range(0, len(sorted_table['date'])):
                 # Check if the current 'for arch' AND 'for repo' are already in the status_table_last. If not, add it
@@ -654,13 +868,14 @@ class EESSIBotSoftwareLayer(PyGHee):
 
         comment_status = ''
         comment_status += "\nThis is the status of all the `bot: build` commands:"
-        comment_status += "\n|on|for|repo|result|date|status|url|"
-        comment_status += "\n|----|----|----|------|----|------|---|"
+        comment_status += "\n|on|for|repo|result|test|date|status|url|"
+        comment_status += "\n|----|----|----|------|----|----|------|---|"
         for x in range(0, len(status_table['date'])):
             comment_status += f"\n|{status_table['on arch'][x]}|"
             comment_status += f"{status_table['for arch'][x]}|"
             comment_status += f"{status_table['for repo'][x]}|"
             comment_status += f"{status_table['result'][x]}|"
+            comment_status += f"{status_table['test'][x]}|"
             comment_status += f"{status_table['date'][x]}|"
             comment_status += f"{status_table['status'][x]}|"
             comment_status += f"{status_table['url'][x]}|"
@@ -776,10 +991,24 @@ def main():
         event_info = get_event_info(event)
         app.handle_event(event_info)
     elif opts.cron:
+        # events are not received via webhook in cron mode, so no webhook
+        # secret is needed (PyGHee requires one, so a placeholder is used)
+        os.environ.setdefault("GITHUB_APP_SECRET_TOKEN", "unused-in-cron-mode")
+        app = create_app(klass=EESSIBotSoftwareLayer)
         app.log("Running in cron mode")
+        app.poll_github()
     else:
         # Run as web app
         app = create_app(klass=EESSIBotSoftwareLayer)
+        event_handler_cfg = config.read_config()[config.SECTION_EVENT_HANDLER]
+        event_queue_dir = event_handler_cfg.get(config.EVENT_HANDLER_SETTING_EVENT_QUEUE_DIR)
+        if event_queue_dir:
+            app.start_event_queue(event_queue_dir, int(event_handler_cfg.get(
+                config.EVENT_HANDLER_SETTING_EVENT_WORKERS) or EVENT_WORKERS_DEFAULT))
+        metrics_port = event_handler_cfg.get(config.EVENT_HANDLER_SETTING_METRICS_PORT)
+        if metrics_port:
+            bot_metrics.start_http_server(int(metrics_port))
+            app.log(f"serving metrics on port {metrics_port}")
         app.start(app, port=opts.port)
 
 
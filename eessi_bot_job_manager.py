@@ -32,21 +32,59 @@
 #
 
 # Standard library imports
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import partial
 import os
 import re
 import sys
+import threading
 import time
+import traceback
 
 # Third party imports (anything installed into the local Python environment)
 from pyghee.utils import log
 
 # Local application imports (anything from EESSI/eessi-bot-software-layer)
 from connections import github
-from tools import config, job_metadata, run_cmd
+from tools import config, job_metadata
 from tools.args import job_manager_parse
-from tools.pr_comments import get_submitted_job_comment, update_comment
-
+from tools.batch_backend import (
+    JOB_REASON_HELD_USER, JOB_TERMINAL_STATES, SACCT_COMMAND_DEFAULT, SlurmBackend, SQUEUE_FORMAT_FIXED)
+from tools.circuit_breaker import CIRCUIT_FAILURE_THRESHOLD_DEFAULT, CIRCUIT_RETRY_INTERVAL_DEFAULT
+from tools.comment_templates import get_comment_templates
+from tools.finished_jobs import FINISHED_LAYOUT_FLAT, FinishedJobs, get_finished_jobs_dir
+from tools.metrics import (
+    bot_metrics, METRIC_CLUSTER_UP, METRIC_ITERATION_DURATION, METRIC_ITERATIONS, METRIC_JOBS, METRIC_OUTBOX_ITEMS,
+    METRIC_PHASE_DURATION, METRIC_PHASE_SECONDS, METRIC_POLL_INTERVAL)
+from tools.outbox import get_outbox_dir, Outbox, OUTBOX_DEADLINE_DEFAULT
+from tools.poll_scheduler import PollScheduler, POLL_BACKOFF_FACTOR_DEFAULT
+from tools.spool import get_completion_spool_dir, SpoolWatcher
+from tools.job_registry import (
+    JobRegistry, JOB_STATE_FINISHED, JOB_STATE_NEW, JOB_STATE_RELEASED, JOB_STATE_RUNNING)
+from tools.pr_comments import (COMMENT_UPDATE_WINDOW_DEFAULT, CommentUpdater, get_comment_cache,
+                               get_comment_cache_verify, get_submitted_job_comment)
+
+
+# default number of threads used to process running and finished jobs
+JOB_PROCESSING_WORKERS_DEFAULT = 4
+
+# default number of seconds after which Slurm commands (e.g., squeue) are
+# killed, so an unresponsive slurmctld does not stall the job manager (0 for
+# no limit)
+COMMAND_TIMEOUT_DEFAULT = 120
+
+# symlinks of finished jobs older than the retention period (see setting
+# 'finished_jobs_retention_days') are pruned at most this often (in seconds)
+FINISHED_JOBS_PRUNE_INTERVAL = 24 * 3600
+
+# default maximum number of job ids kept in the cache of non-bot jobs
+NON_BOT_JOBS_CACHE_SIZE_DEFAULT = 10000
+# jobs that were submitted less than this many seconds ago are not added to the
+# cache of non-bot jobs, because the event handler creates the metadata file
+# of a bot job only after the job has been submitted
+NON_BOT_JOBS_GRACE_PERIOD = 300
 
 # settings that are required in 'app.cfg'
 REQUIRED_CONFIG = {
@@ -86,6 +124,10 @@ class EESSIBotSoftwareLayerJobManager:
         configuration to set the path to the logfile.
         """
         cfg = config.read_config()
+        # configuration (e.g., templates of PR comments) used while processing
+        # jobs, read again at the start of each iteration (see method
+        # run_iteration)
+        self.cfg = cfg
         job_manager_cfg = cfg[config.SECTION_JOB_MANAGER]
         self.logfile = job_manager_cfg.get(config.JOB_MANAGER_SETTING_LOG_PATH)
         buildenv_cfg = cfg[config.SECTION_BUILDENV]
@@ -95,6 +137,444 @@ class EESSIBotSoftwareLayerJobManager:
         self.job_handover_protocol = buildenv_cfg.get(config.BUILDENV_SETTING_JOB_HANDOVER_PROTOCOL)
         if self.job_handover_protocol not in config.JOB_HANDOVER_PROTOCOLS_SET:
             raise Exception(f"job handover protocol ({self.job_handover_protocol}) is unknown")
+        # jobs that passed the checks in process_new_job and are waiting to
+        # be released (maps job id to job and the [PR] section of its metadata)
+        self.jobs_to_release = {}
+        # jobs that were held when the job manager stopped are registered
+        # for being released again in the first iteration (see method
+        # restore_jobs_to_release)
+        self.jobs_to_release_restored = False
+        # ids of jobs to be processed (all jobs if empty), set in main
+        self.job_filter = {}
+        # state of bot jobs carried across iterations (maps job id to a dict
+        # with the keys 'repo', 'pr_number', 'comment_id' and 'last_state')
+        self.job_states = {}
+        # batch system (tools.batch_backend.BatchBackend), set in main
+        self.backend = None
+        # optional registry of jobs (see setting 'job_registry_db'), set in main
+        self.registry = None
+        # watcher for completion markers deposited by jobs, set in main
+        self.spool_watcher = None
+        # jobs processed as finished because of their completion marker, but
+        # possibly still listed by squeue (e.g., in state COMPLETING)
+        self.recently_finished_jobs = {}
+        # accounting information about finished jobs (maps job id to what
+        # method accounting of the backend reports), obtained in bulk before
+        # the jobs are processed by method process_finished_job
+        self.job_accounting = {}
+        # running and finished jobs are processed by a pool of threads (created
+        # when needed), jobs belonging to the same PR are processed in order
+        self.job_processing_workers = int(
+            job_manager_cfg.get(config.JOB_MANAGER_SETTING_JOB_PROCESSING_WORKERS) or
+            JOB_PROCESSING_WORKERS_DEFAULT)
+        self.executor = None
+        # optional file the metrics of the job manager are written to after
+        # each iteration (Prometheus text exposition format)
+        self.metrics_file = job_manager_cfg.get(config.JOB_MANAGER_SETTING_METRICS_FILE)
+        # HTTP server serving the metrics (see setting 'metrics_port'), set in main
+        self.metrics_server = None
+        # updates to PR comments are queued and the updates to the same comment
+        # within a short window are applied with a single edit, the bodies of
+        # comments are known from the optional comment cache (the section
+        # [bot_control] is optional for the job manager)
+        comment_update_window = float(
+            cfg.get(config.SECTION_BOT_CONTROL, config.BOT_CONTROL_SETTING_COMMENT_UPDATE_WINDOW, fallback=None) or
+            COMMENT_UPDATE_WINDOW_DEFAULT)
+        self.comment_updater = CommentUpdater(comment_update_window, self.logfile, comment_cache=get_comment_cache(),
+                                              verify=get_comment_cache_verify())
+        # durable queue of updates to PR comments, so updates that could not
+        # be applied (e.g., because GitHub is not reachable) are retried, set
+        # in main
+        self.outbox = None
+        # symlinks of finished jobs (tools.finished_jobs.FinishedJobs), created
+        # on first use (see method get_finished_jobs) in the directory
+        # job_ids_dir/finished, optionally sharded and pruned after the
+        # retention period
+        self.finished_jobs = None
+        self.finished_jobs_lock = threading.Lock()
+        self.finished_jobs_layout = (job_manager_cfg.get(config.JOB_MANAGER_SETTING_FINISHED_JOBS_LAYOUT) or
+                                     FINISHED_LAYOUT_FLAT)
+        retention_days = job_manager_cfg.get(config.JOB_MANAGER_SETTING_FINISHED_JOBS_RETENTION_DAYS)
+        self.finished_jobs_retention_days = float(retention_days) if retention_days else None
+        self.finished_jobs_last_pruned = None
+        # ids of jobs that are known not to be bot jobs (ordered from oldest to
+        # most recently added entry), optionally persisted to a file
+        self.non_bot_jobs = OrderedDict()
+        self.non_bot_jobs_cache_size = int(
+            job_manager_cfg.get(config.JOB_MANAGER_SETTING_NON_BOT_JOBS_CACHE_SIZE) or
+            NON_BOT_JOBS_CACHE_SIZE_DEFAULT)
+        self.non_bot_jobs_cache_file = job_manager_cfg.get(config.JOB_MANAGER_SETTING_NON_BOT_JOBS_CACHE_FILE)
+        if self.non_bot_jobs_cache_file:
+            self.load_non_bot_jobs()
+
+    def load_non_bot_jobs(self):
+        """
+        Read the ids of non-bot jobs from the file set via the setting
+        'non_bot_jobs_cache_file' (one job id per line). A missing or
+        unreadable file results in an empty cache.
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        try:
+            with open(self.non_bot_jobs_cache_file, 'r') as cache_file:
+                for line in cache_file:
+                    job_id = line.strip()
+                    if job_id:
+                        self.non_bot_jobs[job_id] = None
+        except FileNotFoundError:
+            return
+        except OSError as err:
+            log(f"load_non_bot_jobs(): failed to read '{self.non_bot_jobs_cache_file}': {err}", self.logfile)
+            return
+
+        while len(self.non_bot_jobs) > self.non_bot_jobs_cache_size:
+            self.non_bot_jobs.popitem(last=False)
+        log(f"load_non_bot_jobs(): read {len(self.non_bot_jobs)} job ids from '{self.non_bot_jobs_cache_file}'",
+            self.logfile)
+
+    def save_non_bot_jobs(self):
+        """
+        Write the ids of non-bot jobs to the file set via the setting
+        'non_bot_jobs_cache_file' (if any). The file is replaced atomically so
+        a crash of the job manager never leaves a partially written file.
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        if not self.non_bot_jobs_cache_file:
+            return
+
+        tmp_file = f"{self.non_bot_jobs_cache_file}.tmp"
+        try:
+            with open(tmp_file, 'w') as cache_file:
+                cache_file.writelines(f"{job_id}\n" for job_id in self.non_bot_jobs)
+            os.replace(tmp_file, self.non_bot_jobs_cache_file)
+        except OSError as err:
+            log(f"save_non_bot_jobs(): failed to write '{self.non_bot_jobs_cache_file}': {err}", self.logfile)
+
+    def add_non_bot_job(self, job_id, job_info):
+        """
+        Add a job to the cache of non-bot jobs, so it is not classified again
+        in following iterations. Jobs submitted very recently (see
+        NON_BOT_JOBS_GRACE_PERIOD) are not added, because their metadata file
+        may simply not have been written yet. If the cache exceeds its maximum
+        size, the oldest entries are evicted.
+
+        Args:
+            job_id (string): id of the job
+            job_info (dict): key-value pairs reported by scontrol for the job
+
+        Returns:
+            (bool): True if the job was added to the cache, False otherwise
+        """
+        submit_time = job_info.get('SubmitTime')
+        if submit_time:
+            try:
+                submitted = datetime.strptime(submit_time, "%Y-%m-%dT%H:%M:%S")
+            except ValueError:
+                submitted = None
+            if submitted and (datetime.now() - submitted).total_seconds() < NON_BOT_JOBS_GRACE_PERIOD:
+                log(f"add_non_bot_job(): job {job_id} was submitted at {submit_time}, not caching it yet",
+                    self.logfile)
+                return False
+
+        self.non_bot_jobs[job_id] = None
+        while len(self.non_bot_jobs) > self.non_bot_jobs_cache_size:
+            self.non_bot_jobs.popitem(last=False)
+        return True
+
+    def evict_non_bot_jobs(self, current_jobs):
+        """
+        Remove jobs that are no longer registered with the job management
+        system from the cache of non-bot jobs.
+
+        Args:
+            current_jobs (dict): dictionary with information about jobs that are
+                currently registered with the job management system
+
+        Returns:
+            (list): list of ids of evicted jobs
+        """
+        evicted_jobs = [job_id for job_id in self.non_bot_jobs if job_id not in current_jobs]
+        for job_id in evicted_jobs:
+            del self.non_bot_jobs[job_id]
+        return evicted_jobs
+
+    def get_job_state(self, job_id, metadata_pr=None):
+        """
+        Obtain the state record of a bot job. If the job has no record yet, it
+        is created from the section [PR] of the job's metadata file (read from
+        the job's directory if metadata_pr is not provided). The record keeps
+        the id of the job's PR comment and the last status reported to it, so
+        they don't need to be determined via GitHub in every iteration.
+
+        Args:
+            job_id (string): id of the job
+            metadata_pr (dict): contents of the section [PR] of the job's
+                metadata file (optional)
+
+        Returns:
+            (dict): state record of the job or None if there is no metadata
+                file for the job
+        """
+        if job_id in self.job_states:
+            return self.job_states[job_id]
+
+        registered_job = self.registry.get_job(job_id) if self.registry else None
+        if registered_job and registered_job["repo"]:
+            self.job_states[job_id] = self.job_state_from_registry(registered_job)
+            return self.job_states[job_id]
+
+        if metadata_pr is None:
+            job_metadata_path = os.path.join(self.submitted_jobs_dir, job_id, f"_bot_job{job_id}.metadata")
+            metadata_pr = job_metadata.get_section_from_file(job_metadata_path,
+                                                             job_metadata.JOB_PR_SECTION,
+                                                             self.logfile)
+            if metadata_pr is None:
+                return None
+
+        try:
+            comment_id = int(metadata_pr.get(job_metadata.JOB_PR_PR_COMMENT_ID, -1))
+        except ValueError:
+            comment_id = -1
+        self.job_states[job_id] = {
+            "repo": metadata_pr.get(job_metadata.JOB_PR_REPO, ""),
+            "pr_number": metadata_pr.get(job_metadata.JOB_PR_PR_NUMBER, None),
+            "comment_id": comment_id if comment_id != -1 else None,
+            "last_state": None,
+        }
+        return self.job_states[job_id]
+
+    def job_state_from_registry(self, registered_job):
+        """
+        Create the state record of a job (see method get_job_state) from its
+        row in the job registry.
+
+        Args:
+            registered_job (dict): row of the job in the job registry
+
+        Returns:
+            (dict): state record of the job
+        """
+        # a new job has not been reported yet, for all other states the last
+        # reported status corresponds to the state in the registry
+        last_state = None if registered_job["state"] == JOB_STATE_NEW else registered_job["state"]
+        return {
+            "repo": registered_job["repo"],
+            "pr_number": registered_job["pr_number"],
+            "comment_id": registered_job["comment_id"],
+            "last_state": last_state,
+        }
+
+    def update_registry(self, job_id, **fields):
+        """
+        Update the row of a job in the job registry (if a registry is used).
+
+        Args:
+            job_id (string): id of the job
+            fields (dict): new values for the columns of the job's row
+
+        Returns:
+            None (implicitly)
+        """
+        if self.registry:
+            self.registry.update_job(job_id, **fields)
+
+    def get_pr_key(self, job_id):
+        """
+        Determine the PR a job belongs to (used to group jobs whose processing
+        updates the same PR comment).
+
+        Args:
+            job_id (string): id of the job
+
+        Returns:
+            (tuple): repository and PR number, or the job id if the job's
+                state record cannot be determined
+        """
+        job_state = self.get_job_state(job_id)
+        if job_state is None:
+            return (job_id,)
+        return (job_state["repo"], str(job_state["pr_number"]))
+
+    def process_job_group(self, process_job, jobs):
+        """
+        Process jobs one after another. Exceptions raised while processing a
+        job are logged and do not affect the processing of other jobs.
+
+        Args:
+            process_job (function): method processing a single job (e.g.,
+                process_finished_job)
+            jobs (list): list of dictionaries storing key information about jobs
+
+        Returns:
+            (list): ids of jobs whose processing failed
+        """
+        failed = []
+        for job in jobs:
+            try:
+                process_job(job)
+            except Exception:
+                log(f"{process_job.__name__}(): processing job {job['jobid']} failed:\n{traceback.format_exc()}",
+                    self.logfile)
+                failed.append(job["jobid"])
+        return failed
+
+    def process_jobs(self, process_job, jobs):
+        """
+        Process jobs concurrently using a pool of job_processing_workers
+        threads. Jobs belonging to the same PR are processed in order by the
+        same thread, so updates to a PR comment do not race. Returns when all
+        jobs have been processed.
+
+        Args:
+            process_job (function): method processing a single job (e.g.,
+                process_finished_job)
+            jobs (list): list of dictionaries storing key information about jobs
+
+        Returns:
+            (list): ids of jobs whose processing failed
+        """
+        jobs_by_pr = {}
+        for job in jobs:
+            try:
+                pr_key = self.get_pr_key(job["jobid"])
+            except Exception:
+                pr_key = (job["jobid"],)
+            jobs_by_pr.setdefault(pr_key, []).append(job)
+
+        if self.job_processing_workers <= 1 or len(jobs_by_pr) <= 1:
+            return [job_id for pr_jobs in jobs_by_pr.values()
+                    for job_id in self.process_job_group(process_job, pr_jobs)]
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.job_processing_workers,
+                                               thread_name_prefix="job-processing")
+        futures = [self.executor.submit(self.process_job_group, process_job, pr_jobs)
+                   for pr_jobs in jobs_by_pr.values()]
+        return [job_id for future in futures for job_id in future.result()]
+
+    def shutdown(self):
+        """
+        Release resources held by the job manager (thread pool, queued updates
+        to PR comments, spool watcher, job registry, metrics server).
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        self.comment_updater.flush_all()
+        if self.spool_watcher is not None:
+            self.spool_watcher.close()
+        if self.registry is not None:
+            self.registry.close()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+            self.metrics_server = None
+
+    def wait_for_next_poll(self, interval, known_jobs):
+        """
+        Wait until the next poll of the batch system. Jobs that deposit a
+        completion marker in the meantime are processed as finished right away
+        (and removed from known_jobs).
+
+        Args:
+            interval (int): number of seconds to wait
+            known_jobs (dict): dictionary with information about jobs that are
+                known from the last poll
+
+        Returns:
+            (list): ids of jobs processed as finished
+        """
+        if self.spool_watcher is None:
+            time.sleep(interval)
+            return []
+
+        finished_jobs = []
+        deadline = time.monotonic() + interval
+        remaining = interval
+        while remaining > 0:
+            completed_jobs = self.spool_watcher.wait(remaining)
+            if completed_jobs:
+                finished_jobs.extend(self.process_completed_jobs(completed_jobs, known_jobs))
+            remaining = deadline - time.monotonic()
+        return finished_jobs
+
+    def process_completed_jobs(self, completed_jobs, known_jobs):
+        """
+        Process jobs that deposited a completion marker as finished jobs.
+        Markers of jobs that are not known (yet) are left in place; they are
+        removed by method clean_up_spool once the job has left the queue.
+
+        Args:
+            completed_jobs (list): ids of jobs whose completion marker appeared
+            known_jobs (dict): dictionary with information about jobs that are
+                known from the last poll
+
+        Returns:
+            (list): ids of jobs processed as finished
+        """
+        finished_jobs = []
+        for job_id in completed_jobs:
+            if job_id not in known_jobs or (self.job_filter and job_id not in self.job_filter):
+                continue
+            log(f"process_completed_jobs(): found completion marker of job {job_id}", self.logfile)
+            finished_jobs.append(known_jobs.pop(job_id))
+        self.fetch_job_accounting(finished_jobs)
+        self.process_jobs(self.process_finished_job, finished_jobs)
+        for job in finished_jobs:
+            self.recently_finished_jobs[job["jobid"]] = None
+            self.spool_watcher.remove(job["jobid"])
+        return [job["jobid"] for job in finished_jobs]
+
+    def skip_recently_finished_jobs(self, current_jobs):
+        """
+        Remove jobs that were already processed as finished (see method
+        process_completed_jobs) from the current jobs and forget about those
+        that left the queue.
+
+        Args:
+            current_jobs (dict): dictionary with information about jobs that are
+                currently registered with the job management system
+
+        Returns:
+            None (implicitly)
+        """
+        for job_id in list(self.recently_finished_jobs):
+            if job_id in current_jobs:
+                del current_jobs[job_id]
+            else:
+                del self.recently_finished_jobs[job_id]
+
+    def clean_up_spool(self, current_jobs):
+        """
+        Remove completion markers of jobs that are no longer in the queue (they
+        were processed as finished jobs after leaving the queue).
+
+        Args:
+            current_jobs (dict): dictionary with information about jobs that are
+                currently registered with the job management system
+
+        Returns:
+            None (implicitly)
+        """
+        if self.spool_watcher is None:
+            return
+        for job_id in self.spool_watcher.get_markers():
+            if job_id not in current_jobs and job_id not in self.recently_finished_jobs:
+                self.spool_watcher.remove(job_id)
 
     def get_current_jobs(self):
         """
@@ -105,61 +585,58 @@ class EESSIBotSoftwareLayerJobManager:
             No arguments
 
         Returns:
-            (dict): maps a job id to a dictionary containing key information
-                about a job (currently: 'jobid', 'state' and 'reason')
+            (dict): maps a job id to a record (tools.batch_backend.BatchJob)
+                containing key information about a job (currently: 'jobid',
+                'cluster', 'partition', 'state', 'reason' and 'end_time')
 
         Raises:
-            Exception: if the environment variable USER is not set
-        """
-        username = os.getenv('USER', None)
-        if username is None:
-            raise Exception("Unable to find username")
-
-        squeue_cmd = "%s --long --noheader --user=%s" % (self.poll_command, username)
-        if self.job_name:
-            squeue_cmd += " --name='%s'" % self.job_name
-        # Format the output of SLURM
-        squeue_cmd += " --Format JobId:100@,Cluster:100@,Partition:100@,State:100@,Reason:100"
-        squeue_output, squeue_err, squeue_exitcode = run_cmd(
-            squeue_cmd,
-            "get_current_jobs(): squeue command",
-            log_file=self.logfile,
-        )
+            RuntimeError: if the batch system could not be queried
+        """
+        current_jobs = self.backend.list_jobs()
 
-        # create dictionary of jobs from output of 'squeue_cmd'
-        # with the following information per job: jobid, state,
-        # nodelist_reason
-        current_jobs = {}
-        lines = str(squeue_output).rstrip().split("\n")
+        # log any Slurm issues
         bad_state_messages = {
             "F": "Failure",
             "OOM": "Out of Memory",
             "TO": "Time Out",
         }
-
-        # get job info, logging any Slurm issues
-        # Note, all output lines of squeue are processed because we run it with
-        # --noheader.
-        if lines != ['']:
-            for line in lines:
-                job = [x.rstrip() for x in line.rstrip().split('@')]
-                if len(job) == 5:
-                    job_id = job[0]
-                    state = job[3]
-                    current_jobs[job_id] = {
-                        "jobid": job_id,
-                        "cluster": job[1],
-                        "partition": job[2],
-                        "state": state,
-                        "reason": job[4],
-                    }
-                    if state in bad_state_messages:
-                        log("Job {} in state {}: {}".format(job_id, state, bad_state_messages[state]))
-                else:
-                    raise Exception(f"The output of {squeue_cmd} does not have 5 job parameters")
+        for job_id, job in current_jobs.items():
+            if job["state"] in bad_state_messages:
+                log("Job {} in state {}: {}".format(job_id, job["state"], bad_state_messages[job["state"]]))
 
         return current_jobs
 
+    def carry_over_unavailable_jobs(self, known_jobs, current_jobs):
+        """
+        Add known jobs on clusters the batch system could not be queried for
+        (see attribute unavailable_clusters of the backend) to the current
+        jobs, so they are neither reported as finished nor processed as new
+        when their cluster is available again. Also records which clusters
+        were available.
+
+        Args:
+            known_jobs (dict): jobs known from the previous iteration
+            current_jobs (dict): jobs currently listed by the batch system
+                (modified in place)
+
+        Returns:
+            (list): ids of jobs that were carried over
+        """
+        unavailable_clusters = self.backend.unavailable_clusters if self.backend else frozenset()
+        for cluster in getattr(self.backend, "clusters", []):
+            bot_metrics.set(METRIC_CLUSTER_UP, int(cluster not in unavailable_clusters), cluster=cluster)
+        if not unavailable_clusters:
+            return []
+
+        carried_over = [job_id for job_id, job in known_jobs.items()
+                        if job_id not in current_jobs and job.get("cluster") in unavailable_clusters]
+        for job_id in carried_over:
+            current_jobs[job_id] = known_jobs[job_id]
+        if carried_over:
+            log(f"carry_over_unavailable_jobs(): keeping jobs '{','.join(carried_over)}' on unavailable clusters "
+                f"'{','.join(sorted(unavailable_clusters))}'", self.logfile)
+        return carried_over
+
     def determine_running_jobs(self, current_jobs):
         """
         Determine currently running jobs.
@@ -176,6 +653,75 @@ class EESSIBotSoftwareLayerJobManager:
                 running_jobs.append(job["jobid"])
         return running_jobs
 
+    def determine_terminal_jobs(self, current_jobs):
+        """
+        Determine jobs that are still listed by the batch system, but have
+        already ended (e.g., in state COMPLETED, FAILED, TIMEOUT or NODE_FAIL).
+
+        Args:
+            current_jobs (dict): dictionary containing data of current jobs
+
+        Returns:
+            (list): list of ids of jobs in a terminal state
+        """
+        return [job["jobid"] for job in current_jobs.values() if job["state"] in JOB_TERMINAL_STATES]
+
+    def fetch_job_accounting(self, jobs):
+        """
+        Obtain accounting information (final state, exit code, elapsed time,
+        MaxRSS and nodes) for finished jobs with a single query to the batch
+        system (per cluster), store it in the job registry and keep it for method
+        process_finished_job.
+
+        Args:
+            jobs (list): list of finished jobs
+
+        Returns:
+            (dict): maps a job id to its accounting information
+        """
+        if not jobs or self.backend is None:
+            return {}
+
+        with self.timed_phase("accounting"):
+            accounting = self.backend.accounting(jobs)
+        log(f"fetch_job_accounting(): obtained accounting information for {len(accounting)} of "
+            f"{len(jobs)} finished jobs", self.logfile)
+
+        for job_id, job_accounting in accounting.items():
+            self.job_accounting[job_id] = job_accounting
+            self.update_registry(job_id, final_state=job_accounting.get("state"),
+                                 exit_code=job_accounting.get("exitcode"), elapsed=job_accounting.get("elapsed"),
+                                 max_rss=job_accounting.get("maxrss"), node_list=job_accounting.get("nodelist"))
+        return accounting
+
+    def determine_seconds_to_next_end(self, current_jobs):
+        """
+        Determine how many seconds remain until the first of the currently
+        running jobs is expected to end (according to its time limit).
+
+        Args:
+            current_jobs (dict): dictionary containing data of current jobs
+
+        Returns:
+            (float): seconds until the earliest expected end of a running job
+                (may be negative if a job is overdue) or None if no running
+                job has a known end time
+        """
+        now = datetime.now()
+        seconds_to_next_end = None
+        for job in current_jobs.values():
+            if job["state"] != "RUNNING":
+                continue
+            try:
+                end_time = datetime.strptime(job.get("end_time", ""), "%Y-%m-%dT%H:%M:%S")
+            except ValueError:
+                # e.g., 'N/A' or 'Unknown'
+                continue
+            seconds = (end_time - now).total_seconds()
+            if seconds_to_next_end is None or seconds < seconds_to_next_end:
+                seconds_to_next_end = seconds
+        return seconds_to_next_end
+
     def get_known_jobs(self):
         """
         Obtain information about jobs that should be known to the job manager
@@ -185,6 +731,28 @@ class EESSIBotSoftwareLayerJobManager:
         registered with the job management system (see method
         get_current_jobs()), new jobs and finished jobs can be derived.
 
+        Args:
+            No arguments
+
+        Returns:
+            (dict): maps a job id to a dictionary containing key information
+                about a job (currently: 'jobid')
+        """
+        if self.registry:
+            known_jobs = {}
+            for job_id, registered_job in self.registry.get_jobs().items():
+                known_jobs[job_id] = {"jobid": job_id}
+                if registered_job["repo"]:
+                    self.job_states[job_id] = self.job_state_from_registry(registered_job)
+            return known_jobs
+
+        return self.get_known_jobs_from_symlinks()
+
+    def get_known_jobs_from_symlinks(self):
+        """
+        Obtain information about known jobs from the symlinks in the directory
+        storing submitted jobs (see method get_known_jobs).
+
         Args:
             No arguments
 
@@ -227,6 +795,34 @@ class EESSIBotSoftwareLayerJobManager:
 
         return known_jobs
 
+    def import_known_jobs_into_registry(self):
+        """
+        Register all jobs known from the symlinks in the directory storing
+        submitted jobs (e.g., when the job registry is used for the first
+        time). Information about the PR is read from the jobs' metadata files.
+
+        Args:
+            No arguments
+
+        Returns:
+            (int): number of jobs imported
+        """
+        jobs = []
+        for job_id in self.get_known_jobs_from_symlinks():
+            job_state = self.get_job_state(job_id) or {}
+            jobs.append({
+                "job_id": job_id,
+                "work_dir": os.path.realpath(os.path.join(self.submitted_jobs_dir, job_id)),
+                "repo": job_state.get("repo"),
+                "pr_number": job_state.get("pr_number"),
+                "comment_id": job_state.get("comment_id"),
+                "state": JOB_STATE_NEW,
+            })
+        self.registry.add_jobs(jobs)
+        log(f"import_known_jobs_into_registry(): imported {len(jobs)} jobs into '{self.registry.path}'",
+            self.logfile)
+        return len(jobs)
+
     def determine_new_jobs(self, known_jobs, current_jobs):
         """
         Determine which jobs are new.
@@ -267,35 +863,36 @@ class EESSIBotSoftwareLayerJobManager:
 
         return finished_jobs
 
-    def parse_scontrol_show_job_output(self, output):
+    def get_jobs_info(self, jobs):
         """
-        The output of 'scontrol --oneliner show job' is a list of key=value pairs
-        separated by whitespaces.
+        Obtain information about jobs (e.g., their working directory) from the
+        batch system with as few commands as possible (see method
+        describe_jobs of tools.batch_backend.SlurmBackend).
 
         Args:
-            output (string): the output of the scontrol command
+            jobs (list): list of records storing key information about jobs
 
         Returns:
-            (dict): Returns a dictionary of the key-value pairs
+            (dict): maps a job id to a dictionary with the key-value pairs
+                reported by the batch system for that job
         """
-        job_info = {}
-        stripped_output = output.strip()
-        for pair in stripped_output.split():
-            key, value = pair.split('=', 1)
-            job_info[key] = value
-
-        return job_info
+        return self.backend.describe_jobs(jobs)
 
-    def process_new_job(self, new_job):
+    def process_new_job(self, new_job, job_info=None):
         """
         Process a new job by verifying that it is a bot job and if so
         - create symlink in submitted_jobs_dir (destination is the working
             dir of the job derived via scontrol)
-        - release the job (so it may be started by the scheduler)
-        - update the PR comment by adding its new status (released)
+        - register the job for being released (so it may be started by the
+            scheduler) if the job handover protocol is 'hold_release', the
+            actual release is done by method release_held_jobs
+        - update the PR comment by adding its new status (received) if the
+            job handover protocol is 'delayed_begin'
 
         Args:
             new_job (dict): dictionary storing key information about the job
+            job_info (dict): key-value pairs reported by scontrol for the job
+                (if None, they are obtained via method get_jobs_info)
 
         Returns:
             (bool): True if method completed the tasks described, False if job
@@ -303,26 +900,8 @@ class EESSIBotSoftwareLayerJobManager:
         """
         job_id = new_job["jobid"]
 
-        # processing placeholders in scontrol command which is defined in the bot's app.cfg (setting `scontrol_command`)
-        try:
-            templated_scontrol_command = self.scontrol_command % new_job
-        except KeyError:
-            log(f"Failed to process {self.scontrol_command}.")
-            log(f"Information on placeholder is not collected in new_job: {new_job}.")
-            raise
-
-        cmd = "%s --oneliner show jobid %s" % (
-            templated_scontrol_command,
-            job_id,
-        )
-        scontrol_output, scontrol_err, scontrol_exitcode = run_cmd(
-            cmd,
-            "process_new_job(): scontrol command",
-            log_file=self.logfile,
-        )
-
-        # parse output of scontrol command that fetches job info
-        job_info = self.parse_scontrol_show_job_output(str(scontrol_output))
+        if job_info is None:
+            job_info = self.get_jobs_info([new_job]).get(job_id, {})
 
         # check if job_info contains 'WorkDir', if not we cannot process the job
         # further
@@ -349,6 +928,8 @@ class EESSIBotSoftwareLayerJobManager:
                     self.logfile)
                 return False
 
+            self.get_job_state(job_id, metadata_pr)
+
             symlink_source = os.path.join(self.submitted_jobs_dir, job_id)
             log(
                 "process_new_job(): create a symlink: %s -> %s"
@@ -356,82 +937,206 @@ class EESSIBotSoftwareLayerJobManager:
                 self.logfile,
             )
             os.symlink(job_info['WorkDir'], symlink_source)
+            if self.registry:
+                job_state = self.job_states[job_id]
+                self.registry.add_job(job_id, work_dir=job_info['WorkDir'], repo=job_state["repo"],
+                                      pr_number=job_state["pr_number"], comment_id=job_state["comment_id"],
+                                      state=JOB_STATE_NEW)
 
             # handle different job handover protocols
             #   *_HOLD_RELEASE: job was submitted with '--hold' and shall be
-            #                   released with 'scontrol release JOB_ID'
+            #                   released with 'scontrol release JOB_ID'; jobs
+            #                   are collected here and released in bulk by
+            #                   method release_held_jobs (which also updates
+            #                   the PR comment)
             #   *_DELAYED_BEGIN: job was submitted with '--begin=now+SOMEDELAY',
             #                   no extra action is needed
-            job_status = ''
-            extra_info = ''
             if self.job_handover_protocol == config.JOB_HANDOVER_PROTOCOL_HOLD_RELEASE:
-                release_cmd = "%s release %s" % (
-                    templated_scontrol_command,
-                    job_id,
-                )
-
-                release_output, release_err, release_exitcode = run_cmd(
-                    release_cmd,
-                    "process_new_job(): scontrol command",
-                    log_file=self.logfile,
-                )
-                job_status = 'released'
-                extra_info = ''
+                self.jobs_to_release[job_id] = {"job": new_job, "metadata_pr": metadata_pr}
             elif self.job_handover_protocol == config.JOB_HANDOVER_PROTOCOL_DELAYED_BEGIN:
                 job_status = 'received'
-                extra_info = " (eligible to start from {job_info['EligibleTime'})"
+                extra_info = f" (eligible to start from {job_info.get('EligibleTime')})"
+                self.report_new_job(new_job, metadata_pr, job_status, extra_info)
+        else:
+            log(
+                "process_new_job(): did not find work dir for job '%s'"
+                % job_id,
+                self.logfile,
+            )
 
-            # update PR defined by repo and pr_number stored in the job's
-            # metadata file
-            repo_name = metadata_pr.get("repo", "")
-            pr_number = metadata_pr.get("pr_number", None)
+        return True
 
-            gh = github.get_instance()
+    def report_new_job(self, new_job, metadata_pr, job_status, extra_info):
+        """
+        Update the PR comment of a new job by adding its new status.
+
+        Args:
+            new_job (dict): dictionary storing key information about the job
+            metadata_pr (dict): contents of the section [PR] of the job's
+                metadata file
+            job_status (string): new status of the job (e.g., 'released')
+            extra_info (string): additional information added to the comment
+
+        Returns:
+            None (implicitly)
+        """
+        job_id = new_job["jobid"]
 
-            repo = gh.get_repo(repo_name)
-            pr = repo.get_pull(int(pr_number))
+        # update PR defined by repo and pr_number stored in the job's
+        # metadata file
+        job_state = self.get_job_state(job_id, metadata_pr)
 
-            # find & get comment for this job
-            # only get comment if we don't know its id yet
-            if "comment_id" not in new_job:
-                new_job_cmnt = get_submitted_job_comment(pr, new_job['jobid'])
+        pr = github.get_pull(job_state["repo"], job_state["pr_number"])
 
-                if new_job_cmnt:
-                    log(
-                        "process_new_job(): found comment with id %s"
-                        % new_job_cmnt.id,
-                        self.logfile,
-                    )
-                    new_job["comment_id"] = new_job_cmnt.id
+        # find & get comment for this job
+        # only get comment if we don't know its id yet
+        if job_state["comment_id"] is None:
+            new_job_cmnt = get_submitted_job_comment(pr, job_id)
 
-            # update status table if we found a comment
-            if "comment_id" in new_job:
-                new_job_comments_cfg = config.read_config()[config.SECTION_NEW_JOB_COMMENTS]
-                dt = datetime.now(timezone.utc)
-                update = "\n|%s|%s|" % (dt.strftime("%b %d %X %Z %Y"), job_status)
-                description_col_fmt = new_job_comments_cfg[config.NEW_JOB_COMMENTS_SETTING_AWAITS_LAUNCH]
-                update += f"{description_col_fmt.format(extra_info=extra_info)}|"
-                update_comment(new_job["comment_id"], pr, update)
-            else:
+            if new_job_cmnt:
                 log(
-                    "process_new_job(): did not obtain/find a comment"
-                    " for job '%s'" % job_id,
+                    "report_new_job(): found comment with id %s"
+                    % new_job_cmnt.id,
                     self.logfile,
                 )
+                job_state["comment_id"] = new_job_cmnt.id
+
+        # update status table if we found a comment
+        if job_state["comment_id"] is not None:
+            templates = get_comment_templates(self.cfg)
+            dt = datetime.now(timezone.utc)
+            update = "\n|%s|%s|" % (dt.strftime("%b %d %X %Z %Y"), job_status)
+            new_job_section = config.SECTION_NEW_JOB_COMMENTS
+            description_col_fmt = templates[new_job_section, config.NEW_JOB_COMMENTS_SETTING_AWAITS_LAUNCH]
+            update += f"{description_col_fmt.render(extra_info=extra_info)}|"
+            self.update_pr_comment(job_state["repo"], job_state["pr_number"], job_state["comment_id"], update, pr)
+            job_state["last_state"] = job_status
+            self.update_registry(job_id, comment_id=job_state["comment_id"], state=JOB_STATE_RELEASED)
         else:
             log(
-                "process_new_job(): did not find work dir for job '%s'"
-                % job_id,
+                "report_new_job(): did not obtain/find a comment"
+                " for job '%s'" % job_id,
                 self.logfile,
             )
 
-        return True
+    def release_jobs(self, jobs):
+        """
+        Release held jobs with as few commands as possible (see method
+        release_jobs of tools.batch_backend.SlurmBackend).
+
+        Args:
+            jobs (list): list of records storing key information about jobs
+
+        Returns:
+            tuple of 2 elements containing
+            - (list): ids of jobs that were released
+            - (list): ids of jobs that could not be released
+        """
+        return self.backend.release_jobs(jobs)
+
+    def release_held_jobs(self, current_jobs):
+        """
+        Release all jobs registered by method process_new_job and update
+        their PR comments. Jobs whose release failed remain registered and
+        are retried in the next iteration, unless they are no longer known
+        to the batch system.
+
+        Args:
+            current_jobs (dict): dictionary with information about jobs that are
+                currently registered with the job management system
+
+        Returns:
+            (list): ids of jobs that could not be released
+        """
+        for job_id in list(self.jobs_to_release):
+            if job_id not in current_jobs:
+                log(
+                    "release_held_jobs(): job %s vanished before it could be released"
+                    % job_id,
+                    self.logfile,
+                )
+                del self.jobs_to_release[job_id]
+
+        if not self.jobs_to_release:
+            return []
+
+        jobs = [entry["job"] for entry in self.jobs_to_release.values()]
+        released, failed = self.release_jobs(jobs)
+        if failed:
+            log(
+                "release_held_jobs(): failed to release jobs '%s', will retry"
+                % ",".join(failed),
+                self.logfile,
+            )
+
+        for job_id in released:
+            entry = self.jobs_to_release.pop(job_id)
+            # the job is only marked as released once the release succeeded,
+            # so it is released again after a restart otherwise
+            self.update_registry(job_id, state=JOB_STATE_RELEASED)
+            self.report_new_job(entry["job"], entry["metadata_pr"], 'released', '')
+
+        return failed
+
+    def restore_jobs_to_release(self, known_jobs, current_jobs):
+        """
+        Register known jobs that are still held for being released (e.g.,
+        if the job manager stopped before it could release them). Only jobs
+        held by the bot (i.e., listed with reason JOB_REASON_HELD_USER) are
+        registered, and only if the job handover protocol is 'hold_release'.
+        If the job registry is used, only jobs in state JOB_STATE_NEW are
+        considered (jobs marked as released may have been held by someone
+        else).
+
+        Args:
+            known_jobs (dict): jobs known from before the job manager started
+            current_jobs (dict): jobs currently listed by the batch system
+
+        Returns:
+            (list): ids of jobs registered for being released
+        """
+        if self.job_handover_protocol != config.JOB_HANDOVER_PROTOCOL_HOLD_RELEASE:
+            return []
+
+        if self.registry:
+            work_dirs = {job_id: registered_job["work_dir"]
+                         for job_id, registered_job in self.registry.get_jobs().items()
+                         if registered_job["state"] == JOB_STATE_NEW}
+        else:
+            work_dirs = {job_id: os.path.join(self.submitted_jobs_dir, job_id) for job_id in known_jobs}
+
+        restored = []
+        for job_id in known_jobs:
+            job = current_jobs.get(job_id)
+            if job is None or job_id not in work_dirs or job_id in self.jobs_to_release:
+                continue
+            if job.get("reason") != JOB_REASON_HELD_USER or (self.job_filter and job_id not in self.job_filter):
+                continue
+            job_metadata_path = os.path.join(work_dirs[job_id], f"_bot_job{job_id}.metadata")
+            metadata_pr = job_metadata.get_section_from_file(job_metadata_path,
+                                                             job_metadata.JOB_PR_SECTION,
+                                                             self.logfile)
+            if metadata_pr is None:
+                continue
+            self.jobs_to_release[job_id] = {"job": job, "metadata_pr": metadata_pr}
+            restored.append(job_id)
+
+        if restored:
+            log(f"restore_jobs_to_release(): jobs '{','.join(restored)}' are still held and will be released",
+                self.logfile)
+        return restored
 
     def process_running_jobs(self, running_job):
         """
         Process a running job by verifying that it is a bot job and if so
-        - determines the PR comment body and id corresponding to the job,
-        - updates the PR comment (if found)
+        - determines the PR comment id corresponding to the job,
+        - updates the PR comment (if found and not updated before)
+
+        The comment id and the last status reported are kept in the job's
+        state record (see method get_job_state), hence GitHub is only
+        contacted when the job started running since the last iteration. Only
+        if the last reported status is unknown (e.g., after a restart of the
+        job manager), the comment is checked for an existing 'running' row.
 
         Args:
             running_job (dict): dictionary containing data of the running jobs
@@ -442,31 +1147,27 @@ class EESSIBotSoftwareLayerJobManager:
         Raises:
             Exception: if there is no metadata file or reading it failed
         """
+        job_id = running_job["jobid"]
 
-        gh = github.get_instance()
-
-        # set variable for accessing the working directory of the job
-        job_dir = os.path.join(self.submitted_jobs_dir, running_job["jobid"])
-
-        metadata_file = "_bot_job%s.metadata" % running_job["jobid"]
-        job_metadata_path = os.path.join(job_dir, metadata_file)
-
-        # check if metadata file exist
-        metadata_pr = job_metadata.get_section_from_file(job_metadata_path,
-                                                         job_metadata.JOB_PR_SECTION,
-                                                         self.logfile)
-        if metadata_pr is None:
+        job_state = self.get_job_state(job_id)
+        if job_state is None:
             raise Exception("Unable to find metadata file")
 
-        repo_name = metadata_pr.get("repo", "")
-        pr_number = metadata_pr.get("pr_number", None)
+        if job_state["last_state"] == JOB_STATE_RUNNING:
+            log(f"process_running_job(): status 'running' of job {job_id} already reported", self.logfile)
+            return
 
-        repo = gh.get_repo(repo_name)
-        pullrequest = repo.get_pull(int(pr_number))
+        pullrequest = github.get_pull(job_state["repo"], job_state["pr_number"])
+
+        templates = get_comment_templates(self.cfg)
+        running_section = config.SECTION_RUNNING_JOB_COMMENTS
+        running_msg_fmt = templates[running_section, config.RUNNING_JOB_COMMENTS_SETTING_RUNNING_JOB]
+        running_msg = running_msg_fmt.render(job_id=job_id)
 
         # determine comment to be updated
-        if "comment_id" not in running_job:
-            running_job_cmnt = get_submitted_job_comment(pullrequest, running_job['jobid'])
+        comment_body = None
+        if job_state["comment_id"] is None:
+            running_job_cmnt = get_submitted_job_comment(pullrequest, job_id)
 
             if running_job_cmnt:
                 log(
@@ -474,24 +1175,27 @@ class EESSIBotSoftwareLayerJobManager:
                     % running_job_cmnt.id,
                     self.logfile,
                 )
-                running_job["comment_id"] = running_job_cmnt.id
-                running_job["comment_body"] = running_job_cmnt.body
-
-        if "comment_id" in running_job:
-            dt = datetime.now(timezone.utc)
-            running_job_comments_cfg = config.read_config()[config.SECTION_RUNNING_JOB_COMMENTS]
-            running_msg_fmt = running_job_comments_cfg[config.RUNNING_JOB_COMMENTS_SETTING_RUNNING_JOB]
-            running_msg = running_msg_fmt.format(job_id=running_job['jobid'])
-            if "comment_body" in running_job and running_msg in running_job["comment_body"]:
-                log("Not updating comment, '%s' already found" % running_msg)
+                job_state["comment_id"] = running_job_cmnt.id
+                comment_body = running_job_cmnt.body
+        elif job_state["last_state"] is None:
+            issue_comment = self.comment_updater.get_issue_comment(job_state["comment_id"], pullrequest)
+            comment_body = issue_comment.body if issue_comment else None
+
+        if job_state["comment_id"] is not None:
+            if comment_body is not None and running_msg in comment_body:
+                log("Not updating comment, '%s' already found" % running_msg, self.logfile)
             else:
+                dt = datetime.now(timezone.utc)
                 update = f"\n|{dt.strftime('%b %d %X %Z %Y')}|running|"
                 update += f"{running_msg}|"
-                update_comment(running_job["comment_id"], pullrequest, update)
+                self.update_pr_comment(job_state["repo"], job_state["pr_number"], job_state["comment_id"], update,
+                                       pullrequest)
+            job_state["last_state"] = JOB_STATE_RUNNING
+            self.update_registry(job_id, comment_id=job_state["comment_id"], state=JOB_STATE_RUNNING)
         else:
             log(
                 "process_running_job(): did not obtain/find a comment"
-                " for job '%s'" % running_job['jobid'],
+                " for job '%s'" % job_id,
                 self.logfile,
             )
 
@@ -516,15 +1220,15 @@ class EESSIBotSoftwareLayerJobManager:
         job_id = finished_job['jobid']
 
         # move symlink from job_ids_dir/submitted to jobs_ids_dir/finished
+        # (into the shard determined by the setting 'finished_jobs_layout')
         old_symlink = os.path.join(self.submitted_jobs_dir, job_id)
+        new_symlink = self.get_finished_jobs().add(job_id, old_symlink)
+        log(f"{fn}(): moved {old_symlink} to {new_symlink}", self.logfile)
 
-        finished_jobs_dir = os.path.join(self.job_ids_dir, "finished")
-        os.makedirs(finished_jobs_dir, exist_ok=True)
-
-        new_symlink = os.path.join(finished_jobs_dir, job_id)
-
-        log(f"{fn}(): os.rename({old_symlink},{new_symlink})", self.logfile)
-        os.rename(old_symlink, new_symlink)
+        # job is done, its state record is no longer needed
+        self.job_states.pop(job_id, None)
+        self.update_registry(job_id, state=JOB_STATE_FINISHED)
+        job_accounting = self.job_accounting.pop(job_id, None)
 
         # REPORT status (to logfile in any case, to PR comment if accessible)
         #  - rely fully on what bot/check-build.sh and bot/check-test.sh have
@@ -544,7 +1248,8 @@ class EESSIBotSoftwareLayerJobManager:
         #      status = {SUCCESS,FAILURE,UNKNOWN}
 
         # obtain format templates from app.cfg
-        finished_job_comments_cfg = config.read_config()[config.SECTION_FINISHED_JOB_COMMENTS]
+        templates = get_comment_templates(self.cfg)
+        finished_section = config.SECTION_FINISHED_JOB_COMMENTS
 
         # check if _bot_jobJOBID.result exits
         job_result_file = f"_bot_job{job_id}.result"
@@ -553,10 +1258,11 @@ class EESSIBotSoftwareLayerJobManager:
                                                          job_metadata.JOB_RESULT_SECTION,
                                                          self.logfile)
 
-        job_result_unknown_fmt = finished_job_comments_cfg[config.FINISHED_JOB_COMMENTS_SETTING_JOB_RESULT_UNKNOWN_FMT]
+        job_result_unknown_fmt = templates[finished_section,
+                                           config.FINISHED_JOB_COMMENTS_SETTING_JOB_RESULT_UNKNOWN_FMT]
         # set fallback comment_description in case no result file was found
         # (job_metadata.get_section_from_file returned None)
-        comment_description = job_result_unknown_fmt.format(filename=job_result_file)
+        comment_description = job_result_unknown_fmt.render(filename=job_result_file)
         if job_results:
             # get preformatted comment_description or use previously set default for unknown
             comment_description = job_results.get(job_metadata.JOB_RESULT_COMMENT_DESCRIPTION, comment_description)
@@ -569,6 +1275,18 @@ class EESSIBotSoftwareLayerJobManager:
 
         dt = datetime.now(timezone.utc)
 
+        # add accounting information reported by the batch system (if the
+        # setting 'job_accounting_fmt' is defined)
+        job_accounting_fmt = templates.get(finished_section, config.FINISHED_JOB_COMMENTS_SETTING_JOB_ACCOUNTING_FMT)
+        if job_accounting and job_accounting_fmt:
+            comment_description += job_accounting_fmt.render(
+                state=job_accounting.get("state", ""),
+                exit_code=job_accounting.get("exitcode", ""),
+                elapsed=job_accounting.get("elapsed", ""),
+                max_rss=job_accounting.get("maxrss", ""),
+                node_list=job_accounting.get("nodelist", ""),
+            )
+
         comment_update = f"\n|{dt.strftime('%b %d %X %Z %Y')}|finished|"
         comment_update += f"{comment_description}|"
 
@@ -582,10 +1300,10 @@ class EESSIBotSoftwareLayerJobManager:
                                                        job_metadata.JOB_TEST_SECTION,
                                                        self.logfile)
 
-        job_test_unknown_fmt = finished_job_comments_cfg[config.FINISHED_JOB_COMMENTS_SETTING_JOB_TEST_UNKNOWN_FMT]
+        job_test_unknown_fmt = templates[finished_section, config.FINISHED_JOB_COMMENTS_SETTING_JOB_TEST_UNKNOWN_FMT]
         # set fallback comment_description in case no test file was found
         # (job_metadata.get_section_from_file returned None)
-        comment_description = job_test_unknown_fmt.format(filename=job_test_file)
+        comment_description = job_test_unknown_fmt.render(filename=job_test_file)
         if job_tests:
             # get preformatted comment_description or use previously set default for unknown
             comment_description = job_tests.get(job_metadata.JOB_TEST_COMMENT_DESCRIPTION, comment_description)
@@ -612,18 +1330,343 @@ class EESSIBotSoftwareLayerJobManager:
 
         repo_name = metadata_pr.get("repo", None)
         pr_number = metadata_pr.get("pr_number", -1)
-        pr_comment_id = metadata_pr.get("pr_comment_id", -1)
+        pr_comment_id = int(metadata_pr.get("pr_comment_id", -1))
         log(f"{fn}(): pr comment id {pr_comment_id}", self.logfile)
 
-        gh = github.get_instance()
+        # without a comment id in the metadata file, the comment is searched
+        # for (as for new and running jobs), so no update of a comment that
+        # does not exist is kept in the outbox
+        if pr_comment_id == -1:
+            finished_job_cmnt = get_submitted_job_comment(github.get_pull(repo_name, pr_number), job_id)
+            if not finished_job_cmnt:
+                log(f"{fn}(): did not obtain/find a comment for job '{job_id}'", self.logfile)
+                return
+            pr_comment_id = finished_job_cmnt.id
 
-        repo = gh.get_repo(repo_name)
-        pull_request = repo.get_pull(int(pr_number))
-
-        update_comment(int(pr_comment_id), pull_request, comment_update)
+        # the update is kept in the outbox until it was applied, so it is not
+        # lost if GitHub is not reachable (the symlink was moved already)
+        self.update_pr_comment(repo_name, pr_number, pr_comment_id, comment_update)
 
         return
 
+    def get_finished_jobs(self):
+        """
+        Obtain the directory of finished jobs (created on first use).
+
+        Args:
+            No arguments
+
+        Returns:
+            (tools.finished_jobs.FinishedJobs): the directory of finished jobs
+        """
+        with self.finished_jobs_lock:
+            if self.finished_jobs is None:
+                self.finished_jobs = FinishedJobs(get_finished_jobs_dir(self.job_ids_dir),
+                                                  self.finished_jobs_layout, self.logfile)
+            return self.finished_jobs
+
+    def prune_finished_jobs(self, force=False):
+        """
+        Remove the symlinks of jobs that finished before the retention period
+        (see setting 'finished_jobs_retention_days'), at most once every
+        FINISHED_JOBS_PRUNE_INTERVAL seconds unless forced.
+
+        Args:
+            force (bool): prune even if the last pruning was recent
+
+        Returns:
+            (list): ids of the jobs whose symlinks were removed
+        """
+        if not self.finished_jobs_retention_days:
+            return []
+        now = time.time()
+        if (not force and self.finished_jobs_last_pruned is not None and
+                now - self.finished_jobs_last_pruned < FINISHED_JOBS_PRUNE_INTERVAL):
+            return []
+        self.finished_jobs_last_pruned = now
+        return self.get_finished_jobs().prune(self.finished_jobs_retention_days, now=now)
+
+    def update_pr_comment(self, repo, pr_number, comment_id, update, pull_request=None):
+        """
+        Add an update to a PR comment (see tools.pr_comments.CommentUpdater).
+        With an outbox, the update is stored before it is applied and it is
+        retried later if applying it fails. Updates to a comment that has
+        updates waiting to be retried are queued behind them.
+
+        Args:
+            repo (string): name of the repository
+            pr_number (int): number of the pull request
+            comment_id (int): id of the comment
+            update (string): update to be added to the comment
+            pull_request (github.PullRequest.PullRequest): instance representing
+                the pull request (obtained if not given)
+
+        Returns:
+            None (implicitly)
+        """
+        if self.outbox is None:
+            if pull_request is None:
+                pull_request = github.get_pull(repo, pr_number)
+            self.comment_updater.queue_update(comment_id, pull_request, update)
+            return
+
+        if self.outbox.is_waiting(comment_id):
+            self.outbox.add(repo, pr_number, comment_id, update, in_flight=False)
+            log(f"update_pr_comment(): comment {comment_id} has updates waiting, queued update in outbox",
+                self.logfile)
+            return
+        item = self.outbox.add(repo, pr_number, comment_id, update)
+        self.apply_outbox_item(item, pull_request)
+
+    def apply_outbox_item(self, item, pull_request=None):
+        """
+        Queue the update of an item of the outbox for being applied. The item
+        is removed from the outbox once the update was applied and rescheduled
+        if applying it failed.
+
+        Args:
+            item (dict): the item (see tools.outbox.Outbox.add)
+            pull_request (github.PullRequest.PullRequest): instance representing
+                the pull request (obtained if not given)
+
+        Returns:
+            None (implicitly)
+        """
+        try:
+            if pull_request is None:
+                pull_request = github.get_pull(item["repo"], item["pr_number"])
+        except Exception as err:
+            log(f"apply_outbox_item(): failed to obtain PR {item['repo']}#{item['pr_number']}: {err}",
+                self.logfile)
+            self.outbox.reschedule(item)
+            return
+        self.comment_updater.queue_update(item["comment_id"], pull_request, item["update"],
+                                          callback=partial(self.settle_outbox_item, item))
+
+    def settle_outbox_item(self, item, updated):
+        """
+        Remove an item from the outbox if its update was applied, or
+        reschedule it otherwise.
+
+        Args:
+            item (dict): the item (see tools.outbox.Outbox.add)
+            updated (bool): whether the update was applied
+
+        Returns:
+            None (implicitly)
+        """
+        if updated:
+            self.outbox.remove(item)
+        else:
+            self.outbox.reschedule(item)
+
+    def process_outbox(self):
+        """
+        Retry the updates to PR comments in the outbox whose next attempt is
+        due.
+
+        Args:
+            No arguments
+
+        Returns:
+            (int): number of updates retried
+        """
+        if self.outbox is None:
+            return 0
+        due_items = self.outbox.get_due_items()
+        if due_items:
+            log(f"process_outbox(): retrying {len(due_items)} update(s) to PR comments", self.logfile)
+        for item in due_items:
+            self.apply_outbox_item(item)
+        bot_metrics.set(METRIC_OUTBOX_ITEMS, len(self.outbox))
+        return len(due_items)
+
+    def timed_phase(self, phase):
+        """
+        Time a phase of the main loop (see metrics
+        eessi_bot_job_manager_phase_seconds and
+        eessi_bot_job_manager_phase_duration_seconds).
+
+        Args:
+            phase (string): name of the phase
+
+        Returns:
+            context manager timing its body
+        """
+        return bot_metrics.timer(METRIC_PHASE_SECONDS, gauge=METRIC_PHASE_DURATION, phase=phase)
+
+    def write_metrics(self):
+        """
+        Write the metrics of the job manager to the file defined by the
+        setting 'metrics_file' (if set).
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        if not self.metrics_file:
+            return
+        try:
+            bot_metrics.write_file(self.metrics_file)
+        except OSError as err:
+            log(f"write_metrics(): failed to write metrics to '{self.metrics_file}': {err}", self.logfile)
+
+    def run_iteration(self, known_jobs, current_jobs):
+        """
+        Process the jobs of one iteration of the main loop, i.e., new jobs
+        (incl. releasing held jobs), running jobs and finished jobs. Jobs that
+        are not bot jobs are removed from current_jobs.
+
+        Args:
+            known_jobs (dict): jobs known from the previous iteration
+            current_jobs (dict): jobs currently listed by the batch system
+
+        Returns:
+            None (implicitly)
+        """
+        # changes of the configuration (e.g., of templates) take effect with
+        # the next iteration
+        self.cfg = config.read_config()
+
+        # retry updates to PR comments that could not be applied before
+        with self.timed_phase("outbox"):
+            self.process_outbox()
+
+        # jobs on clusters that could not be polled are assumed to be unchanged
+        self.carry_over_unavailable_jobs(known_jobs, current_jobs)
+
+        # ignore jobs already processed as finished via their completion marker
+        self.skip_recently_finished_jobs(current_jobs)
+
+        # forget about non-bot jobs that left the queue and ignore all others
+        non_bot_jobs_changed = bool(self.evict_non_bot_jobs(current_jobs))
+        for job_id in self.non_bot_jobs:
+            current_jobs.pop(job_id, None)
+
+        new_jobs = self.determine_new_jobs(known_jobs, current_jobs)
+        log(
+            "job manager main loop: new_jobs='%s'" % ",".join(new_jobs),
+            self.logfile,
+        )
+        # obtain information about all new jobs (filtered by optional command
+        # line option) with as few scontrol commands as possible
+        with self.timed_phase("scontrol"):
+            new_jobs_info = self.get_jobs_info([
+                current_jobs[nj] for nj in new_jobs
+                if not self.job_filter or nj in self.job_filter
+            ])
+
+        # process new jobs
+        non_bot_jobs = []
+        with self.timed_phase("new_jobs"):
+            for nj in new_jobs:
+                # assume it is not a bot job
+                is_bot_job = False
+                # apply filtering of job ids
+                if not self.job_filter or nj in self.job_filter:
+                    is_bot_job = self.process_new_job(current_jobs[nj], new_jobs_info.get(nj, {}))
+                    # remember classified non-bot jobs, so they are not processed
+                    # again in the next iterations
+                    if not is_bot_job and self.add_non_bot_job(nj, new_jobs_info.get(nj, {})):
+                        non_bot_jobs_changed = True
+                if not is_bot_job:
+                    # add job id to non_bot_jobs list
+                    non_bot_jobs.append(nj)
+            if non_bot_jobs_changed:
+                self.save_non_bot_jobs()
+
+        # remove non bot jobs from current_jobs
+        for job in non_bot_jobs:
+            current_jobs.pop(job)
+
+        # jobs that have ended but are still listed are finished as well (and
+        # ignored as long as they are listed)
+        terminal_jobs = [current_jobs.pop(job_id) for job_id in self.determine_terminal_jobs(current_jobs)]
+        for job in terminal_jobs:
+            self.recently_finished_jobs[job["jobid"]] = None
+
+        # jobs that were not released before the job manager stopped are
+        # released again
+        if not self.jobs_to_release_restored:
+            self.restore_jobs_to_release(known_jobs, current_jobs)
+            self.jobs_to_release_restored = True
+
+        # release held jobs (incl. jobs whose release failed before)
+        with self.timed_phase("release"):
+            self.release_held_jobs(current_jobs)
+
+        running_jobs = self.determine_running_jobs(current_jobs)
+        log(
+            "job manager main loop: running_jobs='%s'" %
+            ",".join(running_jobs),
+            self.logfile,
+        )
+
+        # process running jobs (filtered by optional command line option)
+        with self.timed_phase("running_jobs"):
+            self.process_jobs(self.process_running_jobs, [
+                current_jobs[rj] for rj in running_jobs
+                if not self.job_filter or rj in self.job_filter
+            ])
+
+        finished_jobs = self.determine_finished_jobs(known_jobs, current_jobs)
+        # a job in a terminal state may not be known yet (if it ended before
+        # it was seen in the queue)
+        finished_jobs.extend(job["jobid"] for job in terminal_jobs if job["jobid"] not in known_jobs)
+        terminal_jobs = {job["jobid"]: job for job in terminal_jobs}
+        log(
+            "job manager main loop: finished_jobs='%s'" %
+            ",".join(finished_jobs),
+            self.logfile,
+        )
+        # process finished jobs (filtered by optional command line option)
+        finished_jobs = [
+            known_jobs.get(fj) or terminal_jobs[fj] for fj in finished_jobs
+            if not self.job_filter or fj in self.job_filter
+        ]
+        self.fetch_job_accounting(finished_jobs)
+        with self.timed_phase("finished_jobs"):
+            self.process_jobs(self.process_finished_job, finished_jobs)
+        self.clean_up_spool(current_jobs)
+
+        for category, count in (("current", len(current_jobs)), ("new", len(new_jobs) - len(non_bot_jobs)),
+                                ("running", len(running_jobs)), ("finished", len(finished_jobs)),
+                                ("non_bot", len(self.non_bot_jobs)),
+                                ("pending_release", len(self.jobs_to_release))):
+            bot_metrics.set(METRIC_JOBS, count, category=category)
+
+
+def manage_finished_jobs(opts):
+    """
+    Migrate the directory of finished jobs to the layout defined by the
+    setting 'finished_jobs_layout' and/or prune it according to the setting
+    'finished_jobs_retention_days' (command line options
+    --migrate-finished-jobs and --prune-finished-jobs).
+
+    Args:
+        opts (Namespace): parsed command line arguments
+
+    Returns:
+        (int): exit code
+    """
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.job_ids_dir = config.read_config()[config.SECTION_JOB_MANAGER].get(
+        config.JOB_MANAGER_SETTING_JOB_IDS_DIR)
+    finished_jobs = job_manager.get_finished_jobs()
+    if opts.migrate_finished_jobs:
+        count = finished_jobs.migrate()
+        print(f"migrated {count} finished jobs in '{finished_jobs.path}' to layout '{finished_jobs.layout}'")
+    if opts.prune_finished_jobs:
+        if not job_manager.finished_jobs_retention_days:
+            print(f"setting '{config.JOB_MANAGER_SETTING_FINISHED_JOBS_RETENTION_DAYS}' is not defined, "
+                  "not pruning finished jobs")
+            return 1
+        pruned = job_manager.prune_finished_jobs(force=True)
+        print(f"pruned {len(pruned)} finished jobs in '{finished_jobs.path}'")
+    return 0
+
 
 def main():
     """
@@ -643,6 +1686,11 @@ def main():
     else:
         print("Configuration check: FAILED")
         sys.exit(1)
+
+    # maintenance of the directory of finished jobs (the main loop is not run)
+    if opts.migrate_finished_jobs or opts.prune_finished_jobs:
+        sys.exit(manage_finished_jobs(opts))
+
     github.connect()
 
     job_manager = EESSIBotSoftwareLayerJobManager()
@@ -672,15 +1720,15 @@ def main():
     #  determine finished jobs (comparing known and current jobs)
     #  process finished jobs (filtered by optional command line option)
     #  set known jobs to list of current jobs
-    #  wait configurable period before next iteration begins
+    #  wait before next iteration begins (between min_poll_interval and
+    #    max_poll_interval seconds, depending on what changed)
 
     max_iter = int(opts.max_manager_iterations)
     # retrieve some settings from app.cfg
     job_manager.job_ids_dir = ""
     job_manager.submitted_jobs_dir = ""
-    job_manager.poll_command = "false"
     poll_interval = 0
-    job_manager.scontrol_command = ""
+    poll_scheduler = None
     if max_iter != 0:
         cfg = config.read_config()
         job_mgr = cfg[config.SECTION_JOB_MANAGER]
@@ -688,12 +1736,53 @@ def main():
         job_manager.submitted_jobs_dir = os.path.join(
             job_manager.job_ids_dir, "submitted"
         )
-        job_manager.poll_command = job_mgr.get(config.JOB_MANAGER_SETTING_POLL_COMMAND) or False
         poll_interval = int(job_mgr.get(config.JOB_MANAGER_SETTING_POLL_INTERVAL) or 0)
         if poll_interval <= 0:
             poll_interval = 60
-        job_manager.scontrol_command = job_mgr.get(config.JOB_MANAGER_SETTING_SCONTROL_COMMAND) or False
+        # by default, the job manager polls every poll_interval seconds
+        min_poll_interval = int(job_mgr.get(config.JOB_MANAGER_SETTING_MIN_POLL_INTERVAL) or poll_interval)
+        max_poll_interval = int(job_mgr.get(config.JOB_MANAGER_SETTING_MAX_POLL_INTERVAL) or poll_interval)
+        poll_backoff_factor = float(job_mgr.get(config.JOB_MANAGER_SETTING_POLL_BACKOFF_FACTOR) or
+                                    POLL_BACKOFF_FACTOR_DEFAULT)
+        poll_scheduler = PollScheduler(min_poll_interval, max_poll_interval, poll_backoff_factor)
+        poll_interval = poll_scheduler.interval
+        job_manager.backend = SlurmBackend(
+            job_mgr.get(config.JOB_MANAGER_SETTING_POLL_COMMAND) or False,
+            job_mgr.get(config.JOB_MANAGER_SETTING_SCONTROL_COMMAND) or False,
+            job_name=job_manager.job_name,
+            squeue_format=job_mgr.get(config.JOB_MANAGER_SETTING_SQUEUE_FORMAT) or SQUEUE_FORMAT_FIXED,
+            sacct_command=job_mgr.get(config.JOB_MANAGER_SETTING_SACCT_COMMAND) or SACCT_COMMAND_DEFAULT,
+            logfile=job_manager.logfile,
+            # clusters listed in the setting 'clusters' are polled concurrently
+            clusters=[cluster.strip() for cluster in (job_mgr.get(config.JOB_MANAGER_SETTING_CLUSTERS) or "").split(",")
+                      if cluster.strip()],
+            command_timeout=float(job_mgr.get(config.JOB_MANAGER_SETTING_COMMAND_TIMEOUT) or
+                                  COMMAND_TIMEOUT_DEFAULT) or None,
+            failure_threshold=int(job_mgr.get(config.JOB_MANAGER_SETTING_CLUSTER_FAILURE_THRESHOLD) or
+                                  CIRCUIT_FAILURE_THRESHOLD_DEFAULT),
+            retry_interval=float(job_mgr.get(config.JOB_MANAGER_SETTING_CLUSTER_RETRY_INTERVAL) or
+                                 CIRCUIT_RETRY_INTERVAL_DEFAULT),
+        )
         os.makedirs(job_manager.submitted_jobs_dir, exist_ok=True)
+        job_manager.outbox = Outbox(
+            get_outbox_dir(job_manager.job_ids_dir),
+            deadline=float(job_mgr.get(config.JOB_MANAGER_SETTING_PR_UPDATE_DEADLINE) or OUTBOX_DEADLINE_DEFAULT),
+            logfile=job_manager.logfile)
+        # build jobs deposit a marker in the spool directory when they
+        # complete, so they can be processed without waiting for the next poll
+        job_manager.spool_watcher = SpoolWatcher(get_completion_spool_dir(job_manager.job_ids_dir),
+                                                 job_manager.logfile)
+        job_registry_db = job_mgr.get(config.JOB_MANAGER_SETTING_JOB_REGISTRY_DB)
+        if job_registry_db:
+            job_manager.registry = JobRegistry(job_registry_db)
+            # when the registry is used for the first time, it is populated
+            # with the jobs known from the symlinks
+            if job_manager.registry.is_empty():
+                job_manager.import_known_jobs_into_registry()
+        metrics_port = job_mgr.get(config.JOB_MANAGER_SETTING_METRICS_PORT)
+        if metrics_port:
+            job_manager.metrics_server = bot_metrics.start_http_server(int(metrics_port))
+            log(f"job manager main loop: serving metrics on port {metrics_port}", job_manager.logfile)
 
     # max_iter
     #   < 0: run loop indefinitely
@@ -703,14 +1792,18 @@ def main():
     i = 0
     if max_iter != 0:
         known_jobs = job_manager.get_known_jobs()
+    known_job_states = {}
     while max_iter < 0 or i < max_iter:
-        # sleep poll_interval seconds (not for the first iteration)
+        # wait poll_interval seconds (not for the first iteration), finished
+        # jobs that deposit a completion marker are processed meanwhile
         if i != 0:
             log(
                 "job manager main loop: sleep %d seconds" % poll_interval,
                 job_manager.logfile,
             )
-            time.sleep(poll_interval)
+            with job_manager.timed_phase("wait"):
+                job_manager.wait_for_next_poll(poll_interval, known_jobs)
+        iteration_start = time.perf_counter()
         log("job manager main loop: iteration %d" % i, job_manager.logfile)
         log(
             "job manager main loop: known_jobs='%s'" % ",".join(
@@ -719,7 +1812,8 @@ def main():
         )
 
         try:
-            current_jobs = job_manager.get_current_jobs()
+            with job_manager.timed_phase("squeue"):
+                current_jobs = job_manager.get_current_jobs()
         except RuntimeError:
             i = i + 1
             continue
@@ -730,57 +1824,37 @@ def main():
             job_manager.logfile,
         )
 
-        new_jobs = job_manager.determine_new_jobs(known_jobs, current_jobs)
-        log(
-            "job manager main loop: new_jobs='%s'" % ",".join(new_jobs),
-            job_manager.logfile,
-        )
-        # process new jobs
-        non_bot_jobs = []
-        for nj in new_jobs:
-            # assume it is not a bot job
-            is_bot_job = False
-            # apply filtering of job ids
-            if not job_manager.job_filter or nj in job_manager.job_filter:
-                is_bot_job = job_manager.process_new_job(current_jobs[nj])
-            if not is_bot_job:
-                # add job id to non_bot_jobs list
-                non_bot_jobs.append(nj)
+        job_manager.run_iteration(known_jobs, current_jobs)
 
-        # remove non bot jobs from current_jobs
-        for job in non_bot_jobs:
-            current_jobs.pop(job)
-
-        running_jobs = job_manager.determine_running_jobs(current_jobs)
+        # determine how long to wait before the next iteration
+        current_job_states = {job_id: job["state"] for job_id, job in current_jobs.items()}
+        poll_interval, poll_reason = poll_scheduler.next_interval(
+            current_job_states != known_job_states,
+            bool(job_manager.jobs_to_release),
+            job_manager.determine_seconds_to_next_end(current_jobs),
+        )
         log(
-            "job manager main loop: running_jobs='%s'" %
-            ",".join(running_jobs),
+            "job manager main loop: next poll in %d seconds (%s)" % (poll_interval, poll_reason),
             job_manager.logfile,
         )
 
-        for rj in running_jobs:
-            # apply filtering of job ids
-            if not job_manager.job_filter or rj in job_manager.job_filter:
-                job_manager.process_running_jobs(current_jobs[rj])
+        # remove symlinks of finished jobs after the retention period
+        with job_manager.timed_phase("prune"):
+            job_manager.prune_finished_jobs()
 
-        finished_jobs = job_manager.determine_finished_jobs(
-                        known_jobs, current_jobs)
-        log(
-            "job manager main loop: finished_jobs='%s'" %
-            ",".join(finished_jobs),
-            job_manager.logfile,
-        )
-        # process finished jobs
-        for fj in finished_jobs:
-            # apply filtering of job ids
-            if not job_manager.job_filter or fj in job_manager.job_filter:
-                job_manager.process_finished_job(known_jobs[fj])
+        bot_metrics.inc(METRIC_ITERATIONS)
+        bot_metrics.set(METRIC_ITERATION_DURATION, time.perf_counter() - iteration_start)
+        bot_metrics.set(METRIC_POLL_INTERVAL, poll_interval)
+        job_manager.write_metrics()
 
         known_jobs = current_jobs
+        known_job_states = current_job_states
 
         # add one iteration to the loop
         i = i + 1
 
+    job_manager.shutdown()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+#
+# Benchmark for parsing job comments with the comment templates of the bot.
+# For each requested number of comments, it renders a synthetic set of PR
+# comments (job comments with and without accelerators, mixed with other
+# comments) from the templates in a configuration file, and measures the time
+# needed to extract the status of the finished builds from them (as done for
+# 'bot: status' if the status is obtained from the comments). It compares the
+# registry of precompiled templates with building the templates again for
+# each comment, and checks that every rendered comment is parsed back. Log
+# messages are not written while measuring.
+#
+# Run it from the top-level directory of the repository, e.g.,
+#
+#   PYTHONPATH=$PWD python3 scripts/benchmark_comment_templates.py --comments 100,1000,10000
+#
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from unittest.mock import patch
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+import tasks.build
+from tasks.build import get_build_status_from_comments
+from tools import config
+from tools.comment_templates import CommentTemplates, get_comment_templates
+
+
+ARCHS = ("x86_64/amd/zen2", "x86_64/amd/zen3", "x86_64/intel/icelake", "aarch64/neoverse_v1")
+ACCELERATORS = ("nvidia/cc80", "nvidia/cc90")
+RESULTS = (":grin: SUCCESS", ":cry: FAILURE", ":shrug: UNKNOWN")
+
+
+def make_comments(count, cfg, seed=0):
+    """
+    Render a synthetic set of PR comments.
+
+    Args:
+        count (int): number of comments
+        cfg (ConfigParser): configuration holding the comment templates
+        seed (int): seed of the random number generator
+
+    Returns:
+        tuple of 2 elements containing
+        - (list): comments (dictionaries with the keys 'body' and 'html_url')
+        - (int): number of job comments of finished jobs among them
+    """
+    rng = random.Random(seed)
+    templates = get_comment_templates(cfg)
+    section = config.SECTION_SUBMITTED_JOB_COMMENTS
+    accelerator = templates[section, config.SUBMITTED_JOB_COMMENTS_SETTING_WITH_ACCELERATOR]
+    comments = []
+    finished = 0
+    for index in range(count):
+        html_url = f"https://github.com/org/repo/pull/1#issuecomment-{index}"
+        if rng.random() < 0.25:
+            comments.append({"body": "bot: build for:arch=x86_64/amd/zen2", "html_url": html_url})
+            continue
+        arch = rng.choice(ARCHS)
+        with_accel = rng.random() < 0.3
+        fields = {
+            "app_name": "bot-instance",
+            "repo_id": "eessi.io-2023.06-software",
+            "on_arch": "-".join(arch.split("/")[1:]),
+            "for_arch": arch,
+            "on_accelerator": accelerator.render(accelerator=ACCELERATORS[0]) if with_accel else "",
+            "for_accelerator": accelerator.render(accelerator=rng.choice(ACCELERATORS)) if with_accel else "",
+            "symlink": f"/jobs/2024.01/pr_1/{index}",
+            "job_id": index,
+        }
+        lines = [templates[section, setting].render(**fields) for setting in (
+            config.SUBMITTED_JOB_COMMENTS_SETTING_INSTANCE_REPO, config.SUBMITTED_JOB_COMMENTS_SETTING_BUILD_ON_ARCH,
+            config.SUBMITTED_JOB_COMMENTS_SETTING_BUILD_FOR_ARCH, config.SUBMITTED_JOB_COMMENTS_SETTING_JOBDIR)]
+        release_msg = templates[section, config.SUBMITTED_JOB_COMMENTS_SETTING_AWAITS_RELEASE_HOLD_RELEASE_MSG]
+        lines += ["|date|job status|comment|", "|----------|----------|------------------------|",
+                  f"|Jan 01 10:00:00 UTC 2024|submitted|{release_msg.render(**fields)}|"]
+        if rng.random() < 0.8:
+            lines.append(f"|Jan 01 11:00:00 UTC 2024|finished|{rng.choice(RESULTS)} _(details)_|")
+            finished += 1
+        comments.append({"body": "\n".join(lines), "html_url": html_url})
+    return comments, finished
+
+
+def parse_with_registry(comments, cfg):
+    """
+    Parse all comments with the registry of precompiled templates.
+    """
+    return get_build_status_from_comments(comments, cfg)
+
+
+def parse_per_comment(comments, cfg):
+    """
+    Parse the comments one by one, building the templates again for each
+    comment (as before the registry existed).
+    """
+    status_table = None
+    with patch.object(tasks.build, "get_comment_templates", CommentTemplates):
+        for comment in comments:
+            comment_status = get_build_status_from_comments([comment], cfg)
+            if status_table is None:
+                status_table = comment_status
+            else:
+                for key, values in comment_status.items():
+                    status_table[key].extend(values)
+    return status_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the time needed to parse job comments with the comment "
+                                                 "templates of the bot")
+    parser.add_argument("--comments", default="100,1000,10000",
+                        help="comma-separated list of numbers of comments (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions per measurement (default: %(default)s)")
+    parser.add_argument("--config", default="app.cfg.example",
+                        help="configuration file with the comment templates (default: %(default)s)")
+    parser.add_argument("--json", help="write all measurements to this file")
+    opts = parser.parse_args()
+
+    cfg = config.read_config(opts.config)
+    results = []
+    print(f"{'comments':>9} {'method':>12} {'median s':>9} {'comments/s':>11}")
+    with patch.object(tasks.build, "log", lambda *args, **kwargs: None):
+        for count in [int(count) for count in opts.comments.split(",")]:
+            comments, finished = make_comments(count, cfg)
+            for method, parse in (("registry", parse_with_registry), ("per-comment", parse_per_comment)):
+                seconds = []
+                for _ in range(opts.repeat):
+                    start = time.perf_counter()
+                    status_table = parse(comments, cfg)
+                    seconds.append(time.perf_counter() - start)
+                    if len(status_table["date"]) != finished:
+                        print(f"ERROR: {method} found {len(status_table['date'])} finished jobs, expected {finished}")
+                        sys.exit(1)
+                median = statistics.median(seconds)
+                print(f"{count:>9} {method:>12} {median:>9.4f} {count / median:>11.0f}")
+                results.append({"comments": count, "method": method, "seconds": seconds})
+
+    if opts.json:
+        with open(opts.json, "w") as json_file:
+            json.dump(results, json_file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
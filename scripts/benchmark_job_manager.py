@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+#
+# Benchmark driver for the job manager. For each requested number of jobs, it
+# sets up a simulated Slurm instance (see scripts/slurm_simulator.py) with a
+# synthetic population of bot and non-bot jobs, runs iterations of the job
+# manager's main loop against it while advancing the simulated clock, and
+# reports the latency and memory use per iteration. GitHub is replaced by an
+# in-memory stand-in (with an optional artificial latency per call), so only
+# the work done by the job manager itself is measured.
+#
+# Run it from the top-level directory of the repository, e.g.,
+#
+#   PYTHONPATH=$PWD python3 scripts/benchmark_job_manager.py --jobs 10,100,1000,10000
+#
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import argparse
+import hashlib
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from unittest.mock import patch
+
+# Third party imports (anything installed into the local Python environment)
+from github.IssueComment import IssueComment
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from connections import github
+from eessi_bot_job_manager import EESSIBotSoftwareLayerJobManager
+from tools.batch_backend import SlurmBackend, SQUEUE_FORMATS, SQUEUE_FORMAT_FIXED
+from tools.job_registry import JobRegistry
+from tools.spool import SpoolWatcher, get_completion_spool_dir
+
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "slurm_simulator.py")
+JOB_NAME = "bot_job"
+
+APP_CFG_TEMPLATE = """
+[buildenv]
+job_handover_protocol = hold_release
+job_name = {job_name}
+
+[job_manager]
+log_path = {log_path}
+job_ids_dir = {job_ids_dir}
+poll_command = {simulator} squeue
+poll_interval = 60
+scontrol_command = {simulator} scontrol
+job_processing_workers = {workers}
+
+[new_job_comments]
+awaits_launch = job awaits launch by Slurm scheduler{{extra_info}}
+
+[running_job_comments]
+running_job = job `{{job_id}}` is running
+
+[finished_job_comments]
+job_result_unknown_fmt = job results file `{{filename}}` does not exist
+job_test_unknown_fmt = job test file `{{filename}}` does not exist
+"""
+
+
+class FakeRequester:
+    """
+    In-memory stand-in for github.Requester.Requester serving the comments of
+    all pull requests (comments are created on first access)
+    """
+    is_lazy = False
+    is_not_lazy = True
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.bodies = {}
+        self.lock = threading.Lock()
+
+    def get_comment(self, comment_id):
+        url = f"https://api.github.com/repos/org/repo/issues/comments/{comment_id}"
+        with self.lock:
+            self.bodies.setdefault(url, f"submitted job id `{comment_id}`\n|date|status|comment|\n")
+        return IssueComment(self, *self.response(url), completed=True)
+
+    def response(self, url):
+        with self.lock:
+            body = self.bodies[url]
+        etag = f'W/"{hashlib.sha256(body.encode()).hexdigest()}"'
+        return {"etag": etag}, {"id": int(url.split("/")[-1]), "url": url, "body": body}
+
+    def requestJsonAndCheck(self, verb, url, input=None, **kwargs):
+        time.sleep(self.latency)
+        with self.lock:
+            self.bodies[url] = input["body"]
+        return self.response(url)
+
+    def requestJson(self, verb, url, headers=None, **kwargs):
+        time.sleep(self.latency)
+        response_headers, data = self.response(url)
+        if headers and headers.get("If-None-Match") == response_headers["etag"]:
+            return 304, {}, None
+        return 200, response_headers, json.dumps(data)
+
+    def _Requester__check(self, status, headers, output):
+        return headers, json.loads(output)
+
+
+class FakePullRequest:
+    """
+    In-memory stand-in for github.PullRequest.PullRequest
+    """
+
+    def __init__(self, requester):
+        self.requester = requester
+
+    def get_issue_comment(self, comment_id):
+        time.sleep(self.requester.latency)
+        return self.requester.get_comment(comment_id)
+
+    def get_issue_comments(self):
+        time.sleep(self.requester.latency)
+        return [self.requester.get_comment(int(url.split("/")[-1])) for url in list(self.requester.bodies)]
+
+
+class FakeGitHub:
+    """
+    In-memory stand-in for the pull requests accessed via connections.github
+    (with an optional artificial latency per request)
+    """
+
+    def __init__(self, latency):
+        self.requester = FakeRequester(latency)
+
+    def get_pull(self, repo_name, pr_number):
+        return FakePullRequest(self.requester)
+
+    def count_comments(self):
+        return len(self.requester.bodies)
+
+
+def run_simulator(state_path, *args):
+    """
+    Run a command of the Slurm simulator.
+
+    Args:
+        state_path (string): path to the simulator's state file
+        args (list): command and its arguments
+
+    Returns:
+        None (implicitly)
+    """
+    subprocess.run([sys.executable, SIMULATOR, "--state", state_path] + list(args),
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+def run_benchmark(job_count, opts):
+    """
+    Run the benchmark for a population of jobs.
+
+    Args:
+        job_count (int): number of jobs in the population
+        opts (argparse.Namespace): command line options
+
+    Returns:
+        (list): one dictionary with measurements per iteration
+    """
+    work_dir = tempfile.mkdtemp(prefix="benchmark_job_manager_")
+    cwd = os.getcwd()
+    try:
+        state_path = os.path.join(work_dir, "slurm.json")
+        job_ids_dir = os.path.join(work_dir, "job_ids")
+        simulator_cfg = ["--mean-queue-wait", str(opts.mean_queue_wait), "--mean-run-time", str(opts.mean_run_time),
+                         "--clusters", opts.clusters]
+        if opts.spool:
+            simulator_cfg += ["--completion-spool-dir", get_completion_spool_dir(job_ids_dir)]
+        run_simulator(state_path, "init", *simulator_cfg)
+        run_simulator(state_path, "populate", "--count", str(job_count), "--jobs-dir", os.path.join(work_dir, "jobs"),
+                      "--bot-fraction", str(opts.bot_fraction), "--prs", str(opts.prs), "--job-name", JOB_NAME,
+                      "--hold")
+
+        simulator = f"{sys.executable} {SIMULATOR} --state {state_path}"
+        with open(os.path.join(work_dir, "app.cfg"), "w") as cfg_file:
+            cfg_file.write(APP_CFG_TEMPLATE.format(job_name=JOB_NAME, simulator=simulator,
+                                                   log_path=os.path.join(work_dir, "job_manager.log"),
+                                                   job_ids_dir=job_ids_dir, workers=opts.workers))
+        # the job manager reads 'app.cfg' from the current directory
+        os.chdir(work_dir)
+
+        job_manager = EESSIBotSoftwareLayerJobManager()
+        job_manager.job_ids_dir = job_ids_dir
+        job_manager.submitted_jobs_dir = os.path.join(job_ids_dir, "submitted")
+        os.makedirs(job_manager.submitted_jobs_dir, exist_ok=True)
+        job_manager.backend = SlurmBackend(f"{simulator} squeue", f"{simulator} scontrol", job_name=JOB_NAME,
+                                           squeue_format=opts.squeue_format, logfile=job_manager.logfile)
+        if opts.spool:
+            job_manager.spool_watcher = SpoolWatcher(get_completion_spool_dir(job_ids_dir), job_manager.logfile)
+        if opts.registry:
+            job_manager.registry = JobRegistry(os.path.join(work_dir, "jobs.db"))
+
+        fake_github = FakeGitHub(opts.github_latency)
+        results = []
+        with patch.object(github, "get_pull", fake_github.get_pull):
+            known_jobs = job_manager.get_known_jobs()
+            for iteration in range(opts.iterations):
+                if iteration > 0:
+                    run_simulator(state_path, "advance", str(opts.step))
+                if opts.trace_memory:
+                    tracemalloc.start()
+                start = time.perf_counter()
+
+                if job_manager.spool_watcher is not None:
+                    job_manager.process_completed_jobs(job_manager.spool_watcher.scan(), known_jobs)
+                current_jobs = job_manager.get_current_jobs()
+                listed_jobs = len(current_jobs)
+                job_manager.run_iteration(known_jobs, current_jobs)
+                # include the edits of PR comments queued during the iteration
+                job_manager.comment_updater.flush_all()
+
+                elapsed = time.perf_counter() - start
+                peak_memory = None
+                if opts.trace_memory:
+                    peak_memory = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                results.append({
+                    "jobs": job_count,
+                    "iteration": iteration,
+                    "listed_jobs": listed_jobs,
+                    "bot_jobs": len(current_jobs),
+                    "seconds": elapsed,
+                    "peak_memory_bytes": peak_memory,
+                    "comments": fake_github.count_comments(),
+                })
+                known_jobs = current_jobs
+        job_manager.shutdown()
+        return results
+    finally:
+        os.chdir(cwd)
+        if opts.keep:
+            print(f"kept working directory {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure latency and memory use per iteration of the job manager "
+                                                 "against a simulated Slurm instance")
+    parser.add_argument("--jobs", default="10,100,1000,10000",
+                        help="comma-separated list of job population sizes (default: %(default)s)")
+    parser.add_argument("--iterations", type=int, default=10, help="iterations per population (default: %(default)s)")
+    parser.add_argument("--step", type=float, default=120,
+                        help="simulated seconds between iterations (default: %(default)s)")
+    parser.add_argument("--bot-fraction", type=float, default=0.5,
+                        help="fraction of bot jobs in the population (default: %(default)s)")
+    parser.add_argument("--prs", type=int, default=20, help="number of PRs jobs belong to (default: %(default)s)")
+    parser.add_argument("--clusters", default="cluster", help="comma-separated list of simulated clusters")
+    parser.add_argument("--mean-queue-wait", type=int, default=300,
+                        help="mean simulated queue wait in seconds (default: %(default)s)")
+    parser.add_argument("--mean-run-time", type=int, default=600,
+                        help="mean simulated run time in seconds (default: %(default)s)")
+    parser.add_argument("--squeue-format", choices=SQUEUE_FORMATS, default=SQUEUE_FORMAT_FIXED,
+                        help="output format requested from squeue (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="value of the setting job_processing_workers (default: %(default)s)")
+    parser.add_argument("--github-latency", type=float, default=0.0,
+                        help="artificial latency in seconds of each GitHub call (default: %(default)s)")
+    parser.add_argument("--registry", action="store_true", help="use a job registry (setting job_registry_db)")
+    parser.add_argument("--spool", action="store_true", help="let jobs deposit completion markers")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="report peak memory allocated per iteration (slows down the job manager)")
+    parser.add_argument("--json", help="write all measurements to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the working directories")
+    opts = parser.parse_args()
+
+    # the squeue command of the job manager filters jobs by user
+    os.environ.setdefault("USER", "bot")
+
+    all_results = []
+    print(f"{'jobs':>7} {'iter':>4} {'listed':>7} {'bot':>7} {'seconds':>9} {'peak MiB':>9} {'comments':>9}")
+    for job_count in [int(count) for count in opts.jobs.split(',')]:
+        results = run_benchmark(job_count, opts)
+        for result in results:
+            peak = result["peak_memory_bytes"]
+            print(f"{result['jobs']:>7} {result['iteration']:>4} {result['listed_jobs']:>7} {result['bot_jobs']:>7} "
+                  f"{result['seconds']:>9.3f} {peak / 2 ** 20 if peak is not None else float('nan'):>9.1f} "
+                  f"{result['comments']:>9}")
+        seconds = [result["seconds"] for result in results]
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{job_count:>7} jobs: median {statistics.median(seconds):.3f}s, max {max(seconds):.3f}s per "
+              f"iteration, max RSS {max_rss:.1f} MiB")
+        all_results.extend(results)
+
+    if opts.json:
+        with open(opts.json, "w") as json_file:
+            json.dump(all_results, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
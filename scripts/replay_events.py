@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+#
+# Replay harness for the event handler. It feeds events, either from an event
+# archive (see setting 'event_archive_dir') or from a directory of JSON files
+# (e.g., the directory 'events_log' written by the event handler), through
+# EESSIBotSoftwareLayer.handle_event at a configurable rate and reports
+# percentiles of the handling latency per event type, action and bot command.
+# GitHub is replaced by an in-memory stand-in (with an optional artificial
+# latency per call), pull requests are not downloaded, and jobs are submitted
+# to a simulated Slurm instance (see scripts/slurm_simulator.py).
+#
+# Run it from the top-level directory of the repository, passing the
+# configuration of a bot instance, e.g.,
+#
+#   PYTHONPATH=$PWD python3 scripts/replay_events.py --config app.cfg --workers 4 /path/to/event_archive
+#
+# Settings that would make the replay affect the bot instance (e.g., its job
+# directories, databases and logs) are redirected to a temporary directory.
+#
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import configparser
+import itertools
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Third party imports (anything installed into the local Python environment)
+from pyghee.lib import create_app
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from connections import github
+import eessi_bot_event_handler
+from eessi_bot_event_handler import EESSIBotSoftwareLayer
+import tasks.build
+from tools import config
+from tools.commands import EESSIBotCommand, EESSIBotCommandError, get_bot_command
+from tools.event_archive import EVENT_ARCHIVE_INDEX_FILE_NAME, EventArchive, read_event_files
+from tools.event_queue import get_event_key
+
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "slurm_simulator.py")
+PERCENTILES = (50, 95, 99)
+
+# settings that are removed from the configuration of the bot instance, so
+# the replay does not use its databases, queue or archive
+REMOVED_SETTINGS = {
+    config.SECTION_BOT_CONTROL: (config.BOT_CONTROL_SETTING_COMMENT_CACHE_DB,),
+    config.SECTION_EVENT_HANDLER: (config.EVENT_HANDLER_SETTING_DELIVERY_DB,
+                                   config.EVENT_HANDLER_SETTING_EVENT_ARCHIVE_DIR,
+                                   config.EVENT_HANDLER_SETTING_EVENT_QUEUE_DIR,
+                                   config.EVENT_HANDLER_SETTING_METRICS_PORT),
+}
+
+
+class FakeIssueComment:
+    """
+    In-memory stand-in for github.IssueComment.IssueComment
+    """
+
+    def __init__(self, github_stub, url, comment_id, body):
+        self.github_stub = github_stub
+        self.id = comment_id
+        self.url = f"https://api.github.com/repos/{url}/issues/comments/{comment_id}"
+        self.html_url = f"https://github.com/{url}#issuecomment-{comment_id}"
+        self.body = body
+        self.etag = None
+
+    def edit(self, body):
+        time.sleep(self.github_stub.latency)
+        self.body = body
+
+
+class FakePullRequest:
+    """
+    In-memory stand-in for github.PullRequest.PullRequest
+    """
+
+    def __init__(self, github_stub, repo_name, number, base_ref):
+        self.github_stub = github_stub
+        self.repo_name = repo_name
+        self.number = number
+        self.base = SimpleNamespace(ref=base_ref, repo=SimpleNamespace(full_name=repo_name, ref=base_ref))
+        self.comments = {}
+
+    def create_issue_comment(self, body):
+        time.sleep(self.github_stub.latency)
+        comment = FakeIssueComment(self.github_stub, f"{self.repo_name}/pull/{self.number}",
+                                   self.github_stub.next_comment_id(), body)
+        self.comments[comment.id] = comment
+        return comment
+
+    def get_issue_comment(self, comment_id):
+        time.sleep(self.github_stub.latency)
+        return self.comments[comment_id]
+
+    def get_issue_comments(self):
+        time.sleep(self.github_stub.latency)
+        return list(self.comments.values())
+
+
+class FakeRepository:
+    """
+    In-memory stand-in for github.Repository.Repository
+    """
+
+    def __init__(self, github_stub, repo_name):
+        self.github_stub = github_stub
+        self.full_name = repo_name
+
+    def get_pull(self, number):
+        return self.github_stub.get_pull(self.full_name, number)
+
+
+class FakeGitHub:
+    """
+    In-memory stand-in for the GitHub instance returned by
+    connections.github.get_instance (with an optional artificial latency per
+    request). Pull requests are created on first access; their base branch is
+    taken from the replayed events of type pull_request.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.pulls = {}
+        self.base_refs = {}
+        self.comment_ids = itertools.count(1)
+
+    def next_comment_id(self):
+        with self.lock:
+            return next(self.comment_ids)
+
+    def add_event(self, event_info):
+        pull_request = event_info["raw_request_body"].get("pull_request") or {}
+        repo_name = (event_info["raw_request_body"].get("repository") or {}).get("full_name")
+        if repo_name and pull_request.get("number") and pull_request.get("base"):
+            with self.lock:
+                self.base_refs[(repo_name, pull_request["number"])] = pull_request["base"]["ref"]
+
+    def get_repo(self, repo_name):
+        time.sleep(self.latency)
+        return FakeRepository(self, repo_name)
+
+    def get_pull(self, repo_name, number):
+        time.sleep(self.latency)
+        with self.lock:
+            key = (repo_name, int(number))
+            if key not in self.pulls:
+                self.pulls[key] = FakePullRequest(self, repo_name, int(number), self.base_refs.get(key, "main"))
+            return self.pulls[key]
+
+    def count_comments(self):
+        with self.lock:
+            return sum(len(pull.comments) for pull in self.pulls.values())
+
+
+def fake_download_pr(repo_name, branch_name, pr, arch_job_dir, clone_via=None):
+    """
+    Stand-in for tasks.build.download_pr that does not download anything.
+    """
+    return 'downloading PR skipped', '', 0, tasks.build._ERROR_NONE
+
+
+def fake_request_bot_build_issue_comments(repo_name, pr_number):
+    """
+    Stand-in for tasks.build.request_bot_build_issue_comments that does not
+    query GitHub.
+    """
+    return {'on arch': [], 'for arch': [], 'for repo': [], 'date': [], 'status': [], 'url': [], 'result': [],
+            'test': []}
+
+
+def load_events(source, event_type=None, pr=None):
+    """
+    Load the events to be replayed.
+
+    Args:
+        source (string): path to an event archive or to a directory of JSON
+            files
+        event_type (string): only load events of this type
+        pr (string): only load events of this PR (format 'REPO#NUMBER')
+
+    Returns:
+        (list): events in the order they were received
+    """
+    if os.path.exists(os.path.join(source, EVENT_ARCHIVE_INDEX_FILE_NAME)):
+        archive = EventArchive(source)
+        return [archive.read(entry) for entry in archive.get_entries(event_type=event_type, pr=pr)]
+    events = read_event_files(source)
+    if event_type is not None:
+        events = [event_info for event_info in events if event_info["type"] == event_type]
+    if pr is not None:
+        events = [event_info for event_info in events
+                  if get_event_key(event_info) == pr]
+    return events
+
+
+def get_bot_commands(event_info):
+    """
+    Determine the bot commands contained in an event.
+
+    Args:
+        event_info (dict): the event
+
+    Returns:
+        (string): comma-separated list of the commands ('-' if there are none)
+    """
+    comment = (event_info["raw_request_body"].get("comment") or {}).get("body") or ""
+    commands = []
+    for line in comment.split("\n"):
+        bot_command = get_bot_command(line.strip())
+        if bot_command:
+            try:
+                commands.append(EESSIBotCommand(bot_command).command)
+            except EESSIBotCommandError:
+                commands.append("invalid")
+    return ",".join(commands) or "-"
+
+
+def percentile(values, pct):
+    """
+    Determine a percentile (nearest-rank method).
+
+    Args:
+        values (list): sorted values
+        pct (float): percentile (0 to 100)
+
+    Returns:
+        (float): the percentile or NaN if there are no values
+    """
+    if not values:
+        return float("nan")
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def write_config(cfg_path, work_dir, simulator):
+    """
+    Write the configuration used for the replay: the configuration of the bot
+    instance, with settings that would affect the instance redirected to the
+    working directory and jobs submitted to the simulated Slurm instance.
+
+    Args:
+        cfg_path (string): path to the configuration of the bot instance
+        work_dir (string): working directory of the replay
+        simulator (string): command running the Slurm simulator
+
+    Returns:
+        None (implicitly)
+    """
+    cfg = configparser.ConfigParser()
+    if not cfg.read(cfg_path):
+        sys.exit(f"cannot read configuration file {cfg_path}")
+    for section, settings in REMOVED_SETTINGS.items():
+        for setting in settings:
+            if cfg.has_section(section):
+                cfg.remove_option(section, setting)
+    for section in (config.SECTION_BUILDENV, config.SECTION_EVENT_HANDLER, config.SECTION_CLEAN_UP):
+        if not cfg.has_section(section):
+            cfg.add_section(section)
+    build_job_script = os.path.join(work_dir, "bot-build.slurm")
+    with open(build_job_script, "w") as script_file:
+        script_file.write("#!/bin/bash\n")
+    cfg.set(config.SECTION_BUILDENV, config.BUILDENV_SETTING_BUILD_JOB_SCRIPT, build_job_script)
+    cfg.set(config.SECTION_BUILDENV, config.BUILDENV_SETTING_SUBMIT_COMMAND, f"{simulator} sbatch")
+    cfg.set(config.SECTION_BUILDENV, config.BUILDENV_SETTING_JOBS_BASE_DIR, os.path.join(work_dir, "jobs"))
+    cfg.set(config.SECTION_BUILDENV, config.BUILDENV_SETTING_ALLOW_UPDATE_SUBMIT_OPTS, "false")
+    cfg.set(config.SECTION_EVENT_HANDLER, config.EVENT_HANDLER_SETTING_LOG_PATH,
+            os.path.join(work_dir, "event_handler.log"))
+    cfg.set(config.SECTION_CLEAN_UP, config.CLEAN_UP_SETTING_TRASH_BIN_ROOT_DIR, os.path.join(work_dir, "trash_bin"))
+    # the event handler reads 'app.cfg' from the current directory
+    with open(os.path.join(work_dir, "app.cfg"), "w") as cfg_file:
+        cfg.write(cfg_file)
+
+
+def replay(events, opts):
+    """
+    Replay events through the event handler.
+
+    Args:
+        events (list): events to be replayed
+        opts (argparse.Namespace): command line options
+
+    Returns:
+        tuple of 3 elements containing
+        - (list): one dictionary with measurements per event
+        - (float): seconds taken by the whole replay
+        - (int): number of PR comments created
+    """
+    work_dir = tempfile.mkdtemp(prefix="replay_events_")
+    cwd = os.getcwd()
+    cfg_path = os.path.abspath(opts.config)
+    try:
+        state_path = os.path.join(work_dir, "slurm.json")
+        subprocess.run([sys.executable, SIMULATOR, "--state", state_path, "init"], check=True,
+                       stdout=subprocess.DEVNULL)
+        write_config(cfg_path, work_dir, f"{sys.executable} {SIMULATOR} --state {state_path}")
+        os.chdir(work_dir)
+
+        # PyGHee requires a token and a webhook secret, neither is used
+        os.environ.setdefault("GITHUB_TOKEN", "replay")
+        os.environ.setdefault("GITHUB_APP_SECRET_TOKEN", "replay")
+        app = create_app(klass=EESSIBotSoftwareLayer)
+        fake_github = FakeGitHub(opts.github_latency)
+        for event_info in events:
+            fake_github.add_event(event_info)
+
+        results = []
+        results_lock = threading.Lock()
+
+        def handle(event_info):
+            failed = False
+            start = time.perf_counter()
+            try:
+                app.handle_event(event_info, log_file=app.logfile)
+            except Exception as err:
+                failed = True
+                print(f"handling event {event_info['id']} failed: {err}", file=sys.stderr)
+            elapsed = time.perf_counter() - start
+            with results_lock:
+                results.append({
+                    "delivery_id": event_info["id"],
+                    "type": event_info["type"],
+                    "action": event_info["action"],
+                    "command": get_bot_commands(event_info),
+                    "seconds": elapsed,
+                    "failed": failed,
+                })
+
+        github.clear_cache()
+        with patch.object(github, "get_instance", lambda: fake_github), \
+                patch.object(tasks.build, "download_pr", fake_download_pr), \
+                patch.object(eessi_bot_event_handler, "request_bot_build_issue_comments",
+                             fake_request_bot_build_issue_comments), \
+                ThreadPoolExecutor(max_workers=opts.workers) as executor:
+            start = time.perf_counter()
+            for idx, event_info in enumerate(events):
+                if opts.rate > 0:
+                    # submit events at the requested rate
+                    delay = start + idx / opts.rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                executor.submit(handle, event_info)
+            executor.shutdown(wait=True)
+            total = max(time.perf_counter() - start, 1e-9)
+        github.clear_cache()
+        return results, total, fake_github.count_comments()
+    finally:
+        os.chdir(cwd)
+        if opts.keep:
+            print(f"kept working directory {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay events through the event handler and report the "
+                                                 "handling latency per event type and bot command")
+    parser.add_argument("source", help="event archive (setting event_archive_dir) or directory of JSON files")
+    parser.add_argument("--config", default="app.cfg",
+                        help="configuration of the bot instance (default: %(default)s)")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="events per second fed to the event handler, 0 for as fast as possible "
+                             "(default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of events handled concurrently (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="number of times the events are replayed (default: %(default)s)")
+    parser.add_argument("--type", help="only replay events of this type (e.g., issue_comment)")
+    parser.add_argument("--pr", help="only replay events of this PR (format REPO#NUMBER)")
+    parser.add_argument("--github-latency", type=float, default=0.0,
+                        help="artificial latency in seconds of each GitHub call (default: %(default)s)")
+    parser.add_argument("--json", help="write all measurements to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the working directory")
+    opts = parser.parse_args()
+
+    events = load_events(opts.source, event_type=opts.type, pr=opts.pr)
+    if not events:
+        sys.exit(f"no events found in {opts.source}")
+    results, total, comments = replay(events * max(1, opts.repeat), opts)
+
+    groups = {}
+    for result in results:
+        groups.setdefault((result["type"], result["action"], result["command"]), []).append(result)
+    groups[("all", "", "")] = results
+    print(f"{'type':<20} {'action':<12} {'command':<16} {'events':>6} {'failed':>6} "
+          + " ".join(f"{f'p{pct} ms':>9}" for pct in PERCENTILES) + f" {'max ms':>9}")
+    for (event_type, action, command), group in sorted(groups.items(), key=lambda item: item[0] == ("all", "", "")):
+        seconds = sorted(result["seconds"] for result in group)
+        print(f"{event_type:<20} {action:<12} {command:<16} {len(group):>6} "
+              f"{sum(result['failed'] for result in group):>6} "
+              + " ".join(f"{percentile(seconds, pct) * 1000:>9.1f}" for pct in PERCENTILES)
+              + f" {seconds[-1] * 1000:>9.1f}")
+    print(f"replayed {len(results)} events in {total:.2f}s ({len(results) / total:.1f} events/s) with "
+          f"{opts.workers} workers, {comments} PR comments created")
+
+    if opts.json:
+        with open(opts.json, "w") as json_file:
+            json.dump({"total_seconds": total, "workers": opts.workers, "events": results}, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,769 @@
+#!/usr/bin/env python3
+#
+# Local stand-in for the Slurm commands used by the bot (squeue, scontrol,
+# sbatch, scancel and sacct). Jobs are kept in a JSON state file and move
+# through realistic states (PENDING -> RUNNING -> COMPLETING -> gone) based on
+# a simulated clock, which can be advanced explicitly. The simulator is meant
+# for testing and load-testing the job manager without a real Slurm cluster,
+# for example with the following settings in 'app.cfg':
+#
+#   [buildenv]
+#   submit_command = /path/to/slurm_simulator.py --state /tmp/slurm.json sbatch
+#   [job_manager]
+#   poll_command = /path/to/slurm_simulator.py --state /tmp/slurm.json squeue
+#   scontrol_command = /path/to/slurm_simulator.py --state /tmp/slurm.json scontrol
+#
+# Alternatively, the script may be symlinked as 'squeue', 'scontrol', etc.; the
+# state file is then taken from the environment variable SLURM_SIMULATOR_STATE.
+#
+# Besides the Slurm commands, the following commands are provided
+#   init      (re)initialise the state file and the simulation parameters
+#   configure change simulation parameters (e.g., make clusters unavailable)
+#   populate  submit a synthetic population of (bot and non-bot) jobs
+#   advance   advance the simulated clock
+#   status    print a summary of the simulated queue
+#
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import argparse
+from collections import Counter
+from datetime import datetime
+import fcntl
+import json
+import os
+import random
+import re
+import sys
+import time
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+# (none yet, the simulator is self-contained so it can be run from anywhere)
+
+
+STATE_FILE_ENV_VAR = "SLURM_SIMULATOR_STATE"
+STATE_FILE_DEFAULT = "slurm_simulator.json"
+
+# simulation parameters (stored in the state file, see command 'init')
+DEFAULT_CONFIG = {
+    # seed for drawing the durations of jobs
+    "seed": 42,
+    # mean time (in seconds) an eligible job stays pending
+    "mean_queue_wait": 60,
+    # mean run time (in seconds) of a job
+    "mean_run_time": 600,
+    # time (in seconds) a job spends in state COMPLETING
+    "completing_time": 10,
+    # fraction of jobs that end in state FAILED
+    "failure_rate": 0.1,
+    # time limit (in seconds) of jobs submitted without '--time'
+    "default_time_limit": 3600,
+    # clusters jobs are spread over (round robin) if not given at submission
+    "clusters": ["cluster"],
+    # clusters whose slurmctld cannot be contacted (squeue fails for them)
+    "unavailable_clusters": [],
+    "partition": "batch",
+    # if set, a marker named after the job id is written into this directory
+    # when a job completes (like the bot's job script does)
+    "completion_spool_dir": None,
+    # if true, '_bot_job<ID>.result' and '_bot_job<ID>.test' files are
+    # written into the working directory of bot jobs when they complete
+    "write_results": True,
+}
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# fields supported by 'squeue --Format' (upper case letters are ignored when
+# matching, i.e., 'JobID' and 'jobid' are the same) and 'squeue --format'
+SQUEUE_FIELDS = {
+    "jobid": lambda job: job["job_id"],
+    "cluster": lambda job: job["cluster"],
+    "partition": lambda job: job["partition"],
+    "state": lambda job: job["state"],
+    "reason": lambda job: job["reason"],
+    "endtime": lambda job: format_time(job_end_time(job)),
+    "starttime": lambda job: format_time(job.get("start_time")),
+    "submittime": lambda job: format_time(job["submit_time"]),
+    "name": lambda job: job["name"],
+    "username": lambda job: job["user"],
+}
+SQUEUE_FORMAT_CODES = {
+    "i": "jobid",
+    "P": "partition",
+    "T": "state",
+    "r": "reason",
+    "e": "endtime",
+    "S": "starttime",
+    "V": "submittime",
+    "j": "name",
+    "u": "username",
+}
+SQUEUE_FORMAT_CODE_REGEX = re.compile(r"%\.?\d*([A-Za-z])")
+
+
+def format_time(timestamp):
+    """
+    Format a timestamp like Slurm does.
+
+    Args:
+        timestamp (float): seconds since the epoch (or None)
+
+    Returns:
+        (string): formatted time or 'N/A'
+    """
+    if timestamp is None:
+        return "N/A"
+    return datetime.fromtimestamp(timestamp).strftime(TIME_FORMAT)
+
+
+def format_duration(seconds):
+    """
+    Format a duration like sacct does (HH:MM:SS).
+
+    Args:
+        seconds (float): duration in seconds
+
+    Returns:
+        (string): formatted duration
+    """
+    seconds = int(max(0, seconds))
+    return "%02d:%02d:%02d" % (seconds // 3600, (seconds % 3600) // 60, seconds % 60)
+
+
+def parse_time_limit(value):
+    """
+    Parse the value of the sbatch option '--time' (MM, MM:SS, HH:MM:SS or
+    D-HH:MM:SS).
+
+    Args:
+        value (string): value of the option
+
+    Returns:
+        (int): time limit in seconds
+    """
+    days = 0
+    if '-' in value:
+        days, value = value.split('-', 1)
+        days = int(days)
+    parts = [int(part) for part in value.split(':')]
+    if len(parts) == 1:
+        seconds = parts[0] * 60
+    elif len(parts) == 2:
+        seconds = parts[0] * 60 + parts[1]
+    else:
+        seconds = parts[0] * 3600 + parts[1] * 60 + parts[2]
+    return days * 86400 + seconds
+
+
+def job_end_time(job):
+    """
+    Determine the end time Slurm would report for a job, i.e., its start time
+    plus its time limit (None if the job has not started yet).
+
+    Args:
+        job (dict): the job
+
+    Returns:
+        (float): end time in seconds since the epoch or None
+    """
+    if job.get("start_time") is None:
+        return None
+    return job["start_time"] + job["time_limit"]
+
+
+class SlurmSimulator:
+    """
+    Simulated Slurm instance whose state is kept in a JSON file. Use it as a
+    context manager, which locks the state file, advances the jobs to the
+    current simulated time and saves the state on exit.
+    """
+
+    def __init__(self, path):
+        """
+        SlurmSimulator constructor.
+
+        Args:
+            path (string): path to the state file
+        """
+        self.path = path
+        self.lock_file = None
+        self.state = None
+
+    def __enter__(self):
+        self.lock_file = open(self.path + ".lock", "w")
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            with open(self.path) as state_file:
+                self.state = json.load(state_file)
+        except FileNotFoundError:
+            self.state = self.initial_state()
+        self.advance_jobs()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as state_file:
+                json.dump(self.state, state_file)
+            os.replace(tmp_path, self.path)
+        fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.lock_file.close()
+        return False
+
+    @staticmethod
+    def initial_state(config=None):
+        """
+        Create the state of an empty simulated Slurm instance.
+
+        Args:
+            config (dict): simulation parameters overriding DEFAULT_CONFIG
+
+        Returns:
+            (dict): the state
+        """
+        return {
+            "config": dict(DEFAULT_CONFIG, **(config or {})),
+            "clock_offset": 0,
+            "next_job_id": 1,
+            "jobs": {},
+            "history": {},
+        }
+
+    @property
+    def config(self):
+        return self.state["config"]
+
+    def now(self):
+        """
+        Determine the current simulated time.
+
+        Returns:
+            (float): seconds since the epoch
+        """
+        return time.time() + self.state["clock_offset"]
+
+    def submit(self, work_dir, name="", hold=False, begin=None, time_limit=None, cluster=None,
+               partition=None, user=None):
+        """
+        Submit a job.
+
+        Args:
+            work_dir (string): working directory of the job
+            name (string): name of the job
+            hold (bool): if True, the job is held until it is released
+            begin (float): earliest start time (seconds since the epoch)
+            time_limit (int): time limit in seconds
+            cluster (string): cluster the job is submitted to
+            partition (string): partition the job is submitted to
+            user (string): user submitting the job
+
+        Returns:
+            (string): id of the job
+        """
+        job_id = str(self.state["next_job_id"])
+        self.state["next_job_id"] += 1
+
+        config = self.config
+        rng = random.Random(f"{config['seed']}-{job_id}")
+        if cluster is None:
+            clusters = config["clusters"]
+            cluster = clusters[(int(job_id) - 1) % len(clusters)]
+        now = self.now()
+        time_limit = time_limit or config["default_time_limit"]
+        self.state["jobs"][job_id] = {
+            "job_id": job_id,
+            "name": name,
+            "user": user or os.getenv("USER", "bot"),
+            "cluster": cluster,
+            "partition": partition or config["partition"],
+            "work_dir": work_dir,
+            "state": "PENDING",
+            "reason": "JobHeldUser" if hold else "Priority",
+            "held": hold,
+            "submit_time": now,
+            "eligible_time": max(now, begin or now),
+            "start_time": None,
+            "time_limit": time_limit,
+            "queue_wait": rng.uniform(0, 2 * config["mean_queue_wait"]),
+            "run_time": rng.uniform(0.5, 1.5) * config["mean_run_time"],
+            "fails": rng.random() < config["failure_rate"],
+            "max_rss_kb": rng.randint(100 * 1024, 8 * 1024 * 1024),
+        }
+        self.advance_jobs()
+        return job_id
+
+    def advance_jobs(self):
+        """
+        Move all jobs through their states up to the current simulated time.
+        Jobs that complete are moved to the history (see command sacct).
+
+        Returns:
+            None (implicitly)
+        """
+        now = self.now()
+        completing_time = self.config["completing_time"]
+        for job_id, job in list(self.state["jobs"].items()):
+            if job["state"] == "PENDING" and not job["held"]:
+                start_time = job["eligible_time"] + job["queue_wait"]
+                if start_time <= now:
+                    job["state"] = "RUNNING"
+                    job["reason"] = "None"
+                    job["start_time"] = start_time
+                elif job["eligible_time"] > now:
+                    job["reason"] = "BeginTime"
+                else:
+                    job["reason"] = "Priority"
+            if job["state"] in ("RUNNING", "COMPLETING"):
+                run_time = min(job["run_time"], job["time_limit"])
+                end_time = job["start_time"] + run_time
+                if end_time + completing_time <= now:
+                    self.finish_job(job, end_time)
+                elif end_time <= now:
+                    job["state"] = "COMPLETING"
+
+    def finish_job(self, job, end_time, final_state=None):
+        """
+        Move a job from the queue to the history.
+
+        Args:
+            job (dict): the job
+            end_time (float): time at which the job ended
+            final_state (string): final state (determined from the simulated
+                outcome of the job if None)
+
+        Returns:
+            None (implicitly)
+        """
+        if final_state is None:
+            if job["run_time"] > job["time_limit"]:
+                final_state = "TIMEOUT"
+            elif job["fails"]:
+                final_state = "FAILED"
+            else:
+                final_state = "COMPLETED"
+        job["state"] = final_state
+        job["end_time"] = end_time
+        job["exit_code"] = "0:0" if final_state == "COMPLETED" else "1:0"
+        del self.state["jobs"][job["job_id"]]
+        self.state["history"][job["job_id"]] = job
+
+        if final_state != "CANCELLED":
+            self.write_job_outputs(job)
+
+    def write_job_outputs(self, job):
+        """
+        Write what the bot's job script leaves behind for a bot job (a job
+        whose working directory contains a metadata file): result and test
+        files as well as a completion marker.
+
+        Args:
+            job (dict): the job
+
+        Returns:
+            None (implicitly)
+        """
+        job_id = job["job_id"]
+        work_dir = job["work_dir"]
+        if not os.path.isfile(os.path.join(work_dir, f"_bot_job{job_id}.metadata")):
+            return
+
+        if self.config["write_results"]:
+            status = "SUCCESS" if job["state"] == "COMPLETED" else "FAILURE"
+            with open(os.path.join(work_dir, f"_bot_job{job_id}.result"), "w") as result_file:
+                result_file.write(f"[RESULT]\ncomment_description = simulated job {job['state'].lower()}\n"
+                                  f"status = {status}\nartefacts =\n")
+            with open(os.path.join(work_dir, f"_bot_job{job_id}.test"), "w") as test_file:
+                test_file.write(f"[TEST]\ncomment_description = simulated tests {status.lower()}\n"
+                                f"status = {status}\n")
+
+        spool_dir = self.config["completion_spool_dir"]
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+            tmp_marker = os.path.join(spool_dir, f".{job_id}.tmp")
+            with open(tmp_marker, "w") as marker_file:
+                marker_file.write(f"{job['state']} {job['exit_code']}\n")
+            os.replace(tmp_marker, os.path.join(spool_dir, job_id))
+
+    def get_jobs(self, job_ids):
+        """
+        Look up jobs in the queue.
+
+        Args:
+            job_ids (list): list of job ids
+
+        Returns:
+            tuple of 2 elements containing
+            - (list): jobs found
+            - (list): ids of jobs not found
+        """
+        found = []
+        missing = []
+        for job_id in job_ids:
+            job = self.state["jobs"].get(job_id)
+            if job is None:
+                missing.append(job_id)
+            else:
+                found.append(job)
+        return found, missing
+
+
+def split_job_ids(values):
+    """
+    Split job ids given as (comma-separated lists of) arguments.
+
+    Args:
+        values (list): list of arguments
+
+    Returns:
+        (list): list of job ids
+    """
+    return [job_id for value in values for job_id in value.split(',') if job_id]
+
+
+def cmd_squeue(simulator, args):
+    parser = argparse.ArgumentParser(prog="squeue", add_help=False)
+    parser.add_argument("-h", "--noheader", action="store_true")
+    parser.add_argument("-u", "--user")
+    parser.add_argument("-n", "--name")
+    parser.add_argument("-M", "--clusters")
+    parser.add_argument("-O", "--Format")
+    parser.add_argument("-o", "--format")
+    parser.add_argument("--json", action="store_true")
+    opts = parser.parse_args(args)
+
+    jobs = [job for job in simulator.state["jobs"].values()
+            if (not opts.user or job["user"] == opts.user) and (not opts.name or job["name"] == opts.name)]
+    clusters = None
+    if opts.clusters and opts.clusters != "all":
+        clusters = opts.clusters.split(',')
+        jobs = [job for job in jobs if job["cluster"] in clusters]
+    unavailable = [cluster for cluster in (clusters or simulator.config["clusters"])
+                   if cluster in simulator.config.get("unavailable_clusters", [])]
+    if unavailable:
+        print(f"squeue: error: Problem talking to the database: Unable to contact slurm controller "
+              f"(connect failure) for cluster(s) {','.join(unavailable)}", file=sys.stderr)
+        return 1
+
+    lines = []
+    if opts.json:
+        lines.append(json.dumps({"jobs": [
+            {
+                "job_id": int(job["job_id"]),
+                "name": job["name"],
+                "user_name": job["user"],
+                "cluster": job["cluster"],
+                "partition": job["partition"],
+                "job_state": [job["state"]],
+                "state_reason": job["reason"],
+                "end_time": {"set": job_end_time(job) is not None, "infinite": False,
+                             "number": int(job_end_time(job) or 0)},
+            } for job in jobs
+        ]}))
+    elif opts.Format:
+        fields = []
+        for spec in opts.Format.split(','):
+            name, _, width_suffix = spec.partition(':')
+            width = re.match(r"\.?(\d*)(.*)", width_suffix)
+            fields.append((SQUEUE_FIELDS[name.lower()], int(width.group(1) or 20), width.group(2)))
+        if not opts.noheader:
+            lines.append(" ".join(spec.partition(':')[0].upper() for spec in opts.Format.split(',')))
+        for job in jobs:
+            lines.append("".join(str(value(job)).ljust(width)[:width] + suffix for value, width, suffix in fields))
+    else:
+        output_format = opts.format or "%i|%P|%j|%u|%T|%r"
+        codes = SQUEUE_FORMAT_CODE_REGEX.findall(output_format)
+        if not opts.noheader:
+            lines.append(SQUEUE_FORMAT_CODE_REGEX.sub(lambda m: SQUEUE_FORMAT_CODES[m.group(1)].upper(),
+                                                      output_format))
+        for cluster in (clusters or [None]):
+            if cluster is not None:
+                lines.append(f"CLUSTER: {cluster}")
+            for job in jobs:
+                if cluster is None or job["cluster"] == cluster:
+                    values = iter([str(SQUEUE_FIELDS[SQUEUE_FORMAT_CODES[code]](job)) for code in codes])
+                    lines.append(SQUEUE_FORMAT_CODE_REGEX.sub(lambda m: next(values), output_format))
+
+    print("\n".join(lines))
+    return 0
+
+
+def cmd_scontrol(simulator, args):
+    parser = argparse.ArgumentParser(prog="scontrol")
+    parser.add_argument("-o", "--oneliner", action="store_true")
+    parser.add_argument("-M", "--clusters")
+    parser.add_argument("action", choices=["show", "release", "hold"])
+    parser.add_argument("words", nargs="*")
+    opts = parser.parse_args(args)
+
+    if opts.action == "show":
+        if not opts.words or opts.words[0] != "job":
+            print("scontrol: only 'show job' is supported", file=sys.stderr)
+            return 1
+        job_ids = split_job_ids(opts.words[1:]) or list(simulator.state["jobs"])
+        jobs, missing = simulator.get_jobs(job_ids)
+        separator = " " if opts.oneliner else "\n   "
+        for job in jobs:
+            print(separator.join([
+                f"JobId={job['job_id']} JobName={job['name']}",
+                f"UserId={job['user']}(1000) JobState={job['state']} Reason={job['reason']}",
+                f"SubmitTime={format_time(job['submit_time'])} EligibleTime={format_time(job['eligible_time'])}",
+                f"StartTime={format_time(job['start_time'])} EndTime={format_time(job_end_time(job))}",
+                f"Partition={job['partition']} ClusterName={job['cluster']}",
+                f"TimeLimit={format_duration(job['time_limit'])}",
+                f"WorkDir={job['work_dir']}",
+            ]))
+            if not opts.oneliner:
+                print()
+        if missing:
+            print("slurm_load_jobs error: Invalid job id specified", file=sys.stderr)
+            return 1
+        return 0
+
+    jobs, missing = simulator.get_jobs(split_job_ids(opts.words))
+    for job in jobs:
+        if job["state"] == "PENDING":
+            job["held"] = opts.action == "hold"
+            job["reason"] = "JobHeldUser" if job["held"] else "Priority"
+            # a released job waits in the queue from now on
+            job["eligible_time"] = max(job["eligible_time"], simulator.now())
+    simulator.advance_jobs()
+    if missing:
+        print(f"Invalid job id specified for job {','.join(missing)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_sbatch(simulator, args):
+    parser = argparse.ArgumentParser(prog="sbatch")
+    parser.add_argument("-H", "--hold", action="store_true")
+    parser.add_argument("-b", "--begin")
+    parser.add_argument("-t", "--time")
+    parser.add_argument("-J", "--job-name", default="")
+    parser.add_argument("-D", "--chdir")
+    parser.add_argument("-M", "--clusters")
+    parser.add_argument("-p", "--partition")
+    parser.add_argument("script", nargs="?")
+    opts, _ = parser.parse_known_args(args)
+
+    begin = None
+    if opts.begin:
+        match = re.match(r"now\+(\d+)(seconds)?$", opts.begin)
+        if not match:
+            print(f"sbatch: --begin={opts.begin} is not supported by the simulator", file=sys.stderr)
+            return 1
+        begin = simulator.now() + int(match.group(1))
+
+    job_id = simulator.submit(
+        os.path.abspath(opts.chdir or os.getcwd()),
+        name=opts.job_name or os.path.basename(opts.script or "sbatch"),
+        hold=opts.hold,
+        begin=begin,
+        time_limit=parse_time_limit(opts.time) if opts.time else None,
+        cluster=opts.clusters.split(',')[0] if opts.clusters else None,
+        partition=opts.partition,
+    )
+    print(f"Submitted batch job {job_id}")
+    return 0
+
+
+def cmd_scancel(simulator, args):
+    parser = argparse.ArgumentParser(prog="scancel")
+    parser.add_argument("-M", "--clusters")
+    parser.add_argument("job_ids", nargs="+")
+    opts = parser.parse_args(args)
+
+    jobs, missing = simulator.get_jobs(split_job_ids(opts.job_ids))
+    for job in jobs:
+        simulator.finish_job(job, simulator.now(), final_state="CANCELLED")
+    for job_id in missing:
+        print(f"scancel: error: Kill job error on job id {job_id}: Invalid job id specified", file=sys.stderr)
+    return 1 if missing else 0
+
+
+def cmd_sacct(simulator, args):
+    parser = argparse.ArgumentParser(prog="sacct")
+    parser.add_argument("-p", "--parsable", action="store_true")
+    parser.add_argument("-P", "--parsable2", action="store_true")
+    parser.add_argument("-n", "--noheader", action="store_true")
+    parser.add_argument("-j", "--jobs", required=True)
+    parser.add_argument("-o", "--format", default="JobID,State,ExitCode,Elapsed,MaxRSS,NodeList")
+    parser.add_argument("-M", "--clusters")
+    opts = parser.parse_args(args)
+    clusters = opts.clusters.split(',') if opts.clusters and opts.clusters != "all" else None
+
+    fields = [field.lower() for field in opts.format.split(',')]
+    lines = [] if opts.noheader else ["|".join(opts.format.split(','))]
+    now = simulator.now()
+    for job_id in split_job_ids([opts.jobs]):
+        job = simulator.state["history"].get(job_id) or simulator.state["jobs"].get(job_id)
+        if job is None or (clusters and job["cluster"] not in clusters):
+            continue
+        start_time = job.get("start_time")
+        end_time = job.get("end_time", now)
+        record = {
+            "jobid": job_id,
+            "jobname": job["name"],
+            "state": job["state"],
+            "exitcode": job.get("exit_code", "0:0"),
+            "elapsed": format_duration(end_time - start_time if start_time else 0),
+            "maxrss": "",
+            "nodelist": f"{job['cluster']}-node{int(job_id) % 64:02d}",
+        }
+        lines.append("|".join(record.get(field, "") for field in fields))
+        if start_time:
+            step = dict(record, jobid=f"{job_id}.batch", jobname="batch", maxrss=f"{job['max_rss_kb']}K")
+            lines.append("|".join(step.get(field, "") for field in fields))
+
+    print("\n".join(lines))
+    return 0
+
+
+def config_parser(prog):
+    """
+    Create a parser for options setting simulation parameters (one option per
+    key of DEFAULT_CONFIG, e.g., '--mean-run-time').
+
+    Args:
+        prog (string): name of the command
+
+    Returns:
+        (argparse.ArgumentParser): the parser
+    """
+    parser = argparse.ArgumentParser(prog=prog)
+    for key, value in DEFAULT_CONFIG.items():
+        option = "--" + key.replace('_', '-')
+        if isinstance(value, bool):
+            parser.add_argument(option, type=lambda v: v.lower() in ("1", "true", "yes"))
+        elif isinstance(value, list):
+            parser.add_argument(option, type=lambda v: [item for item in v.split(',') if item])
+        elif isinstance(value, (int, float)):
+            parser.add_argument(option, type=type(value))
+        else:
+            parser.add_argument(option)
+    return parser
+
+
+def cmd_init(path, args):
+    opts = config_parser("init").parse_args(args)
+
+    config = {key: value for key, value in vars(opts).items() if value is not None}
+    with open(path, "w") as state_file:
+        json.dump(SlurmSimulator.initial_state(config), state_file)
+    return 0
+
+
+def cmd_configure(simulator, args):
+    opts = config_parser("configure").parse_args(args)
+
+    simulator.config.update({key: value for key, value in vars(opts).items() if value is not None})
+    return 0
+
+
+def cmd_populate(simulator, args):
+    parser = argparse.ArgumentParser(prog="populate")
+    parser.add_argument("--count", type=int, required=True, help="number of jobs to submit")
+    parser.add_argument("--jobs-dir", required=True, help="directory in which working directories are created")
+    parser.add_argument("--bot-fraction", type=float, default=1.0,
+                        help="fraction of jobs with a bot metadata file (default: %(default)s)")
+    parser.add_argument("--job-name", default="bot_job", help="name of the jobs (default: %(default)s)")
+    parser.add_argument("--repo", default="EESSI/software-layer", help="repository of the pull requests")
+    parser.add_argument("--prs", type=int, default=10, help="number of pull requests jobs belong to")
+    parser.add_argument("--hold", action="store_true", help="submit jobs held (handover protocol hold_release)")
+    parser.add_argument("--time-limit", type=int, help="time limit of the jobs in seconds")
+    opts = parser.parse_args(args)
+
+    bot_jobs = 0
+    for idx in range(opts.count):
+        job_id = str(simulator.state["next_job_id"])
+        work_dir = os.path.abspath(os.path.join(opts.jobs_dir, job_id))
+        os.makedirs(work_dir, exist_ok=True)
+        # spread bot jobs evenly over the population
+        if int((idx + 1) * opts.bot_fraction) > int(idx * opts.bot_fraction):
+            bot_jobs += 1
+            with open(os.path.join(work_dir, f"_bot_job{job_id}.metadata"), "w") as metadata_file:
+                metadata_file.write(f"[PR]\nrepo = {opts.repo}\npr_number = {idx % opts.prs + 1}\n"
+                                    f"pr_comment_id = {job_id}\n")
+        simulator.submit(work_dir, name=opts.job_name, hold=opts.hold, time_limit=opts.time_limit)
+
+    print(f"submitted {opts.count} jobs ({bot_jobs} bot jobs)")
+    return 0
+
+
+def cmd_advance(simulator, args):
+    parser = argparse.ArgumentParser(prog="advance")
+    parser.add_argument("seconds", type=float, help="number of seconds to advance the simulated clock")
+    opts = parser.parse_args(args)
+
+    simulator.state["clock_offset"] += opts.seconds
+    simulator.advance_jobs()
+    return 0
+
+
+def cmd_status(simulator, args):
+    states = Counter(job["state"] for job in simulator.state["jobs"].values())
+    final_states = Counter(job["state"] for job in simulator.state["history"].values())
+    print(f"simulated time: {format_time(simulator.now())}")
+    print("queue: " + ", ".join(f"{state}={count}" for state, count in sorted(states.items())))
+    print("history: " + ", ".join(f"{state}={count}" for state, count in sorted(final_states.items())))
+    return 0
+
+
+SLURM_COMMANDS = {
+    "squeue": cmd_squeue,
+    "scontrol": cmd_scontrol,
+    "sbatch": cmd_sbatch,
+    "scancel": cmd_scancel,
+    "sacct": cmd_sacct,
+    "configure": cmd_configure,
+    "populate": cmd_populate,
+    "advance": cmd_advance,
+    "status": cmd_status,
+}
+
+
+def main(argv=None):
+    """
+    Run a simulated command.
+
+    Args:
+        argv (list): command line arguments (default: sys.argv[1:])
+
+    Returns:
+        (int): exit code
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    state_path = os.getenv(STATE_FILE_ENV_VAR, STATE_FILE_DEFAULT)
+
+    # support being invoked via a symlink named like a Slurm command
+    command = os.path.basename(sys.argv[0])
+    if command in SLURM_COMMANDS:
+        args = argv
+    else:
+        parser = argparse.ArgumentParser(description="Simulated Slurm commands for testing the job manager")
+        parser.add_argument("--state", default=state_path,
+                            help=f"path to the state file (default: ${STATE_FILE_ENV_VAR} or {STATE_FILE_DEFAULT})")
+        parser.add_argument("command", choices=sorted(list(SLURM_COMMANDS) + ["init"]))
+        parser.add_argument("args", nargs=argparse.REMAINDER)
+        opts = parser.parse_args(argv)
+        state_path, command, args = opts.state, opts.command, opts.args
+
+    if command == "init":
+        return cmd_init(state_path, args)
+    with SlurmSimulator(state_path) as simulator:
+        return SLURM_COMMANDS[command](simulator, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,19 +23,19 @@ import configparser
 from datetime import datetime, timezone
 import json
 import os
-import re
 import shutil
-import string
 import sys
 
 # Third party imports (anything installed into the local Python environment)
 from pyghee.utils import error, log
 
 # Local application imports (anything from EESSI/eessi-bot-software-layer)
-from tools import config, cvmfs_repository, job_metadata, pr_comments, run_cmd
+from tools import config, cvmfs_repository, job_index, job_metadata, pr_comments, run_cmd
 import tools.filter as tools_filter
 from tools.pr_comments import ChatLevels, create_comment
+from tools.spool import get_completion_spool_dir
 from tools.build_params import BUILD_PARAM_ARCH, BUILD_PARAM_ACCEL
+from tools.comment_templates import get_comment_templates
 
 # defaults (used if not specified via, eg, 'app.cfg')
 DEFAULT_JOB_TIME_LIMIT = "24:00:00"
@@ -174,6 +174,12 @@ def get_build_env_cfg(cfg):
     log(f"{fn}(): load_modules '{load_modules}'")
     config_data[config.BUILDENV_SETTING_LOAD_MODULES] = load_modules
 
+    # jobs deposit a completion marker in a spool directory under the job
+    # manager's job_ids_dir
+    job_ids_dir = cfg.get(config.SECTION_JOB_MANAGER, config.JOB_MANAGER_SETTING_JOB_IDS_DIR, fallback=None)
+    log(f"{fn}(): job_ids_dir '{job_ids_dir}'")
+    config_data[config.JOB_MANAGER_SETTING_JOB_IDS_DIR] = job_ids_dir
+
     clone_git_repo_via = buildenv.get(config.BUILDENV_SETTING_CLONE_GIT_REPO_VIA, None)
     log(f"{fn}(): clone_git_repo_via '{clone_git_repo_via}'")
     config_data[config.BUILDENV_SETTING_CLONE_GIT_REPO_VIA] = clone_git_repo_via
@@ -727,6 +733,7 @@ def prepare_job_cfg(job_dir, build_env_cfg, repos_cfg, repo_id, software_subdir,
     # site_config_script = config.BUILDENV_SETTING_SITE_CONFIG_SCRIPT
     # shared_fs_path = config.BUILDENV_SETTING_SHARED_FS_PATH
     # build_logs_dir = config.BUILDENV_SETTING_BUILD_LOGS_DIR
+    # completion_spool_dir = config.JOB_MANAGER_SETTING_JOB_IDS_DIR/spool
     #
     # [repository]
     # repos_cfg_dir = job_dir/job_metadata.JOB_CFG_DIRECTORY_NAME
@@ -754,6 +761,11 @@ def prepare_job_cfg(job_dir, build_env_cfg, repos_cfg, repo_id, software_subdir,
     for build_env_key, job_cfg_key in build_env_to_job_cfg_keys.items():
         if build_env_cfg[build_env_key]:
             job_cfg[job_metadata.JOB_CFG_SITE_CONFIG_SECTION][job_cfg_key] = build_env_cfg[build_env_key]
+    job_ids_dir = build_env_cfg.get(config.JOB_MANAGER_SETTING_JOB_IDS_DIR)
+    if job_ids_dir:
+        completion_spool_dir = get_completion_spool_dir(job_ids_dir)
+        job_cfg[job_metadata.JOB_CFG_SITE_CONFIG_SECTION][
+            job_metadata.JOB_CFG_SITE_CONFIG_COMPLETION_SPOOL_DIR] = completion_spool_dir
 
     job_cfg[job_metadata.JOB_CFG_REPOSITORY_SECTION] = {}
     # directory for repos.cfg
@@ -918,6 +930,10 @@ def submit_job(job, cfg):
     log(f"{fn}(): create symlink {symlink} -> {job[0]}")
     os.symlink(job[0], symlink)
 
+    # record the job directory in the index of the pull request (job.pr_id
+    # has the format 'pr_<pr number>'), see tasks.deploy.determine_job_dirs
+    job_index.add_job_dir(build_env_cfg[config.BUILDENV_SETTING_JOBS_BASE_DIR], job.pr_id[len('pr_'):], symlink)
+
     return job_id, symlink
 
 
@@ -945,75 +961,55 @@ def create_pr_comment(job, job_id, app_name, pr, symlink, build_params):
     # Obtain the architecture to build for
     for_arch = build_params[BUILD_PARAM_ARCH]
 
-    submitted_job_comments_cfg = config.read_config()[config.SECTION_SUBMITTED_JOB_COMMENTS]
+    cfg = config.read_config()
+    templates = get_comment_templates(cfg)
+    section = config.SECTION_SUBMITTED_JOB_COMMENTS
 
     # Set string for accelerator to build on
-    accelerator_spec = f"{submitted_job_comments_cfg[config.SUBMITTED_JOB_COMMENTS_SETTING_WITH_ACCELERATOR]}"
+    accelerator_spec = templates[section, config.SUBMITTED_JOB_COMMENTS_SETTING_WITH_ACCELERATOR]
     on_accelerator_str = ''
     if job.accelerator:
-        on_accelerator_str = accelerator_spec.format(accelerator=job.accelerator)
+        on_accelerator_str = accelerator_spec.render(accelerator=job.accelerator)
 
     # Set string for accelerator to build for
     for_accelerator_str = ''
     if BUILD_PARAM_ACCEL in build_params:
-        for_accelerator_str = accelerator_spec.format(accelerator=build_params[BUILD_PARAM_ACCEL])
+        for_accelerator_str = accelerator_spec.render(accelerator=build_params[BUILD_PARAM_ACCEL])
 
     # get current date and time
     dt = datetime.now(timezone.utc)
 
     # construct initial job comment
-    buildenv = config.read_config()[config.SECTION_BUILDENV]
+    buildenv = cfg[config.SECTION_BUILDENV]
     job_handover_protocol = buildenv.get(config.BUILDENV_SETTING_JOB_HANDOVER_PROTOCOL)
-    new_job_instance_repo = submitted_job_comments_cfg[config.SUBMITTED_JOB_COMMENTS_SETTING_INSTANCE_REPO]
-    build_on_arch = submitted_job_comments_cfg[config.SUBMITTED_JOB_COMMENTS_SETTING_BUILD_ON_ARCH]
-    build_for_arch = submitted_job_comments_cfg[config.SUBMITTED_JOB_COMMENTS_SETTING_BUILD_FOR_ARCH]
-    jobdir = submitted_job_comments_cfg[config.SUBMITTED_JOB_COMMENTS_SETTING_JOBDIR]
+    fields = {
+        'app_name': app_name,
+        'on_arch': on_arch,
+        'for_arch': for_arch,
+        'symlink': symlink,
+        'repo_id': job.repo_id,
+        'job_id': job_id,
+        'on_accelerator': on_accelerator_str,
+        'for_accelerator': for_accelerator_str,
+    }
     if job_handover_protocol == config.JOB_HANDOVER_PROTOCOL_DELAYED_BEGIN:
         release_msg_string = config.SUBMITTED_JOB_COMMENTS_SETTING_AWAITS_RELEASE_DELAYED_BEGIN_MSG
-        release_comment_template = submitted_job_comments_cfg[release_msg_string]
         # calculate delay from poll_interval and delay_factor
-        job_manager_cfg = config.read_config()[config.SECTION_JOB_MANAGER]
+        job_manager_cfg = cfg[config.SECTION_JOB_MANAGER]
         poll_interval = int(job_manager_cfg.get(config.JOB_MANAGER_SETTING_POLL_INTERVAL))
         delay_factor = float(buildenv.get(config.BUILDENV_SETTING_JOB_DELAY_BEGIN_FACTOR, 2))
-        eligible_in_seconds = int(poll_interval * delay_factor)
-        job_comment = (f"{new_job_instance_repo}\n"
-                       f"{build_on_arch}\n"
-                       f"{build_for_arch}\n"
-                       f"{jobdir}\n"
-                       f"|date|job status|comment|\n"
-                       f"|----------|----------|------------------------|\n"
-                       f"|{dt.strftime('%b %d %X %Z %Y')}|"
-                       f"submitted|"
-                       f"{release_comment_template}|").format(
-                           app_name=app_name,
-                           on_arch=on_arch,
-                           for_arch=for_arch,
-                           symlink=symlink,
-                           repo_id=job.repo_id,
-                           job_id=job_id,
-                           delay_seconds=eligible_in_seconds,
-                           on_accelerator=on_accelerator_str,
-                           for_accelerator=for_accelerator_str)
+        fields['delay_seconds'] = int(poll_interval * delay_factor)
     else:
         release_msg_string = config.SUBMITTED_JOB_COMMENTS_SETTING_AWAITS_RELEASE_HOLD_RELEASE_MSG
-        release_comment_template = submitted_job_comments_cfg[release_msg_string]
-        job_comment = (f"{new_job_instance_repo}\n"
-                       f"{build_on_arch}\n"
-                       f"{build_for_arch}\n"
-                       f"{jobdir}\n"
-                       f"|date|job status|comment|\n"
-                       f"|----------|----------|------------------------|\n"
-                       f"|{dt.strftime('%b %d %X %Z %Y')}|"
-                       f"submitted|"
-                       f"{release_comment_template}|").format(
-                           app_name=app_name,
-                           on_arch=on_arch,
-                           for_arch=for_arch,
-                           symlink=symlink,
-                           repo_id=job.repo_id,
-                           job_id=job_id,
-                           on_accelerator=on_accelerator_str,
-                           for_accelerator=for_accelerator_str)
+    job_comment = (f"{templates[section, config.SUBMITTED_JOB_COMMENTS_SETTING_INSTANCE_REPO].render(**fields)}\n"
+                   f"{templates[section, config.SUBMITTED_JOB_COMMENTS_SETTING_BUILD_ON_ARCH].render(**fields)}\n"
+                   f"{templates[section, config.SUBMITTED_JOB_COMMENTS_SETTING_BUILD_FOR_ARCH].render(**fields)}\n"
+                   f"{templates[section, config.SUBMITTED_JOB_COMMENTS_SETTING_JOBDIR].render(**fields)}\n"
+                   f"|date|job status|comment|\n"
+                   f"|----------|----------|------------------------|\n"
+                   f"|{dt.strftime('%b %d %X %Z %Y')}|"
+                   f"submitted|"
+                   f"{templates[section, release_msg_string].render(**fields)}|")
 
     # create comment to pull request
     repo_name = pr.base.repo.full_name
@@ -1115,217 +1111,283 @@ def check_build_permission(pr, event_info):
         return True
 
 
-def template_to_regex(format_str, with_eol=True):
+def request_bot_build_issue_comments(repo_name, pr_number):
     """
-    Converts a formatting string into a regex that can extract all the formatted
-    parts of the string. If with_eol is True, it assumes the formatted string is followed by an end-of-line
-    character. This is a requirement if it has to succesfully match a formatting string that ends with a formatting
-    field.
-
-    Example: if one function creates a formatted string
-    value = "my_field_value"
-    format_str = f"This is my string, with a custom field: {my_field}\n"
-    formatted_string = format_str.format(my_field=value)
-    Another function can then grab the original value of my_field by doing:
-    my_re = template_to_regex(format_str)
-    match_object = re.match(my_re, formatted_string)
-    match_object['my_field'] then contains "my_field_value"
-    This is useful when e.g. one function posts a GitHub comment, and another wants to extract information from that
+    Query the github API for the issue_comments in a pr.
 
     Args:
-        format_str (string): a formatting string, with template placeholders.
-        with_eol (bool, optional): a boolean, indicating if the formatting string is expected to be followed by
-                                   an end of line character
+        repo_name (string): name of the repository (format USER_OR_ORGANISATION/REPOSITORY)
+        pr_number (int): number og the pr
+
+    Returns:
+        status_table (dict): dictionary with 'arch', 'date', 'status', 'url', 'result'
+            and 'test' for all the finished builds;
+    """
+    comments = []
+    # for loop because github has max 100 items per request.
+    # if the pr has more than 100 comments we need to use per_page
+    # argument at the moment the for loop is for a max of 400 comments could bump this up
+    for x in range(1, 5):
+        curl_cmd = f'curl -L https://api.github.com/repos/{repo_name}/issues/{pr_number}/comments?per_page=100&page={x}'
+        curl_output, curl_error, curl_exit_code = run_cmd(curl_cmd, "fetch all comments")
+
+        page = json.loads(curl_output)
+        comments.extend(page)
+        if len(page) != 100:
+            break
+    return get_build_status_from_comments(comments, config.read_config())
 
+
+def parse_arch_line(line, arch_template, accelerator_template, field, what):
     """
+    Extract the architecture (and accelerator, if any) from a line of a job
+    comment.
 
-    # string.Formatter returns a 4-tuple of literal text, field name, format spec, and conversion
-    # E.g if format_str = "This is my {app} it is currently {status}"
-    # formatter = [
-    #    ("This is my", "app", "", None),
-    #    ("it is currently", "status", "", None),
-    #    ("", None, None, None),
-    # ]
-    formatter = string.Formatter()
-    regex_parts = []
-
-    for literal_text, field_name, _, _ in formatter.parse(format_str):
-        # We use re.escape to escape any special characters in the literal_text, as we want to match those literally
-        regex_parts.append(re.escape(literal_text))
-        if field_name is not None:
-            # Create a non-greedy, named capture group. Note that the {field_name} itself is a format specifier
-            # So we get the actual field name as the name of the capture group
-            # In other words, if our format_str is "My string with {a_field}" then the named capture group will be
-            # called 'a_field'
-            # We match any character, but in a non-greedy way. Thus, as soon as it can match the next
-            # literal text section, it will - thus assuming that that's the end of the field
-            # We use .* to allow for empty fields (such as the optional accelerator fields)
-            regex_parts.append(f"(?P<{field_name}>.*?)")
-
-    # Finally, make sure we append a $ to the regex. This is necessary because of our non-greedy matching
-    # strategy. Otherwise, a formatting string that ends with a formatting item would only match the first letter
-    # of the field, because it doesn't find anything to match after (and it is non-greedy). With the $, it has
-    # something to match after the field, thus making sure it matches the whole field
-    # This does assume that the format_str in the string to be matched is indeed followed by an end-of-line character
-    # I.e. if a function that creates the formatted string does
-    # my_string = f"{format_str}\n"
-    # (i.e. has an end-of-line after the format specifier) it can be matched by another function that does
-    # my_re = template_to_regex(format_str)
-    # re.match(my_re, my_string)
-    full_pattern = ''.join(regex_parts)
-    if with_eol:
-        full_pattern += "$"
-    return re.compile(full_pattern)
-
-
-class PartialFormatDict(dict):
+    Args:
+        line (string): line of the job comment
+        arch_template (CommentTemplate): template of the line (setting
+            'build_on_arch' or 'build_for_arch')
+        accelerator_template (CommentTemplate): template of the accelerator
+            part (setting 'with_accelerator')
+        field (string): field of the accelerator part in arch_template
+            ('on_accelerator' or 'for_accelerator')
+        what (string): description used in messages ('build on' or 'build
+            for')
+
+    Returns:
+        (dict): values of the fields of the line, including 'accelerator' if
+            the line contains an accelerator
+
+    Raises:
+        ValueError: if the line matches neither template
     """
-    A dictionary class that allows for missing keys - and will just return {key} in that case.
-    This can be used to partially format some, but not all placeholders in a formatting string.
+    # first try to match including accelerator, to see if one was defined
+    arch_template_with_accel = arch_template.partial(**{field: accelerator_template.template})
+    values = arch_template_with_accel.parse(line)
+    if values is None:
+        # pattern with accelerator did not match, retry without accelerator
+        values = arch_template.parse(line)
+    if values is None:
+        # This shouldn't happen: we had an instance_repo_match, but no match for the architecture
+        msg = f"Could not match regular expression for extracting the architecture to {what}.\n"
+        msg += "String to be matched:\n"
+        msg += f"{line}\n"
+        msg += "First regex attempted:\n"
+        msg += f"{arch_template_with_accel.regex.pattern}\n"
+        msg += "Second regex attempted:\n"
+        msg += f"{arch_template.regex.pattern}\n"
+        raise ValueError(msg)
+    return values
+
+
+def get_build_status_from_comments(comments, cfg):
     """
-    def __missing__(self, key):
-        return "{" + key + "}"
+    Determine the status of the finished build jobs from the job comments in a
+    pr.
 
+    Args:
+        comments (list): comments of the pr (dictionaries with at least the keys
+            'body' and 'html_url', as returned by GitHub's API)
+        cfg (ConfigParser): ConfigParser instance holding full configuration
+            (typically read from 'app.cfg')
 
-def request_bot_build_issue_comments(repo_name, pr_number):
+    Returns:
+        status_table (dict): dictionary with 'arch', 'date', 'status', 'url', 'result'
+            and 'test' for all the finished builds;
     """
-    Query the github API for the issue_comments in a pr.
+    fn = sys._getframe().f_code.co_name
+
+    status_table = {'on arch': [], 'for arch': [], 'for repo': [], 'date': [], 'status': [], 'url': [], 'result': [],
+                    'test': []}
+    templates = get_comment_templates(cfg)
+    section = config.SECTION_SUBMITTED_JOB_COMMENTS
+    accelerator_template = templates[section, config.SUBMITTED_JOB_COMMENTS_SETTING_WITH_ACCELERATOR]
+    instance_repo_template = templates[section, config.SUBMITTED_JOB_COMMENTS_SETTING_INSTANCE_REPO]
+    on_arch_template = templates[section, config.SUBMITTED_JOB_COMMENTS_SETTING_BUILD_ON_ARCH]
+    for_arch_template = templates[section, config.SUBMITTED_JOB_COMMENTS_SETTING_BUILD_FOR_ARCH]
+
+    for comment in comments:
+        # iterate through the comments to find the one where the status of the build was in
+        comment_body = comment['body'].split('\n')
+        instance_repo = instance_repo_template.parse(comment_body[0])
+        # Check if this body starts with an initial comment from the bot (first item is always the instance + repo
+        # it is building for)
+        # Then, check that it has at least 4 lines so that we can safely index up to that number
+        if not instance_repo or len(comment_body) < 4:
+            continue
+        log(f"{fn}(): found bot build response in issue, processing...")
+
+        # First, extract the repo_id
+        log(f"{fn}(): found build for repository: {instance_repo['repo_id']}")
+        status_table['for repo'].append(instance_repo['repo_id'])
+
+        # Then, extract the architecture we build on and the architecture we build for (including the accelerator,
+        # if one was defined)
+        on_arch = parse_arch_line(comment_body[1], on_arch_template, accelerator_template, 'on_accelerator',
+                                  'build on')
+        if 'accelerator' in on_arch:
+            log(f"{fn}(): found build on architecture: {on_arch['on_arch']}, "
+                f"with accelerator {on_arch['accelerator']}")
+            status_table['on arch'].append(f"`{on_arch['on_arch']}`, `{on_arch['accelerator']}`")
+        else:
+            log(f"{fn}(): found build on architecture: {on_arch['on_arch']}")
+            status_table['on arch'].append(f"`{on_arch['on_arch']}`")
+        for_arch = parse_arch_line(comment_body[2], for_arch_template, accelerator_template, 'for_accelerator',
+                                   'build for')
+        if 'accelerator' in for_arch:
+            log(f"{fn}(): found build for architecture: {for_arch['for_arch']}, "
+                f"with accelerator {for_arch['accelerator']}")
+            status_table['for arch'].append(f"`{for_arch['for_arch']}`, `{for_arch['accelerator']}`")
+        else:
+            log(f"{fn}(): found build for architecture: {for_arch['for_arch']}")
+            status_table['for arch'].append(f"`{for_arch['for_arch']}`")
+
+        # get date, status, url and result from the markdown table
+        comment_table = comment['body'][comment['body'].find('|'):comment['body'].rfind('|')+1]
+
+        # Convert markdown table to a dictionary
+        lines = comment_table.split('\n')
+        rows = []
+        keys = []
+        for i, row in enumerate(lines):
+            values = {}
+            if i == 0:
+                for key in row.split('|'):
+                    keys.append(key.strip())
+            elif i == 1:
+                continue
+            else:
+                for j, value in enumerate(row.split('|')):
+                    if j > 0 and j < len(keys) - 1:
+                        values[keys[j]] = value.strip()
+                rows.append(values)
+
+        # the job manager adds a row with the result of the test suite after
+        # the row for the finished job
+        test_rows = [row for row in rows if row['job status'] == 'test result']
+
+        # add date, status, url to  status_table if
+        for row in rows:
+            if row['job status'] == 'finished':
+                status_table['date'].append(row['date'])
+                status_table['status'].append(row['job status'])
+                status_table['url'].append(comment['html_url'])
+                status_table['result'].append(get_result_from_comment(row['comment']))
+                status_table['test'].append(get_result_from_comment(test_rows[0]['comment']) if test_rows
+                                            else ':shrug: UNKNOWN')
+    return status_table
+
+
+def get_result_from_comment(comment):
+    """
+    Summarise the result of a job (or of its test suite) given by a cell of
+    the table in a job comment.
 
     Args:
+        comment (string): cell of the column 'comment' of the table
+
+    Returns:
+        (string): ':cry: FAILURE', ':grin: SUCCESS', ':shrug: UNKNOWN' or the
+            cell itself if it contains none of these results
+    """
+    if 'FAILURE' in comment:
+        return ':cry: FAILURE'
+    elif 'SUCCESS' in comment:
+        return ':grin: SUCCESS'
+    elif 'UNKNOWN' in comment:
+        return ':shrug: UNKNOWN'
+    else:
+        return comment
+
+
+def get_build_status_from_job_dirs(job_dirs, repo_name, pr_number, cfg):
+    """
+    Determine the status of the finished build jobs for a pull request from
+    their working directories (that is, without querying GitHub). A job has
+    finished when its directory contains the file '_bot_job<JOBID>.result'.
+    The result of its test suite is read from the file '_bot_job<JOBID>.test'.
+
+    Args:
+        job_dirs (list): working directories of the jobs run for the pull
+            request (see tasks.deploy.determine_job_dirs)
         repo_name (string): name of the repository (format USER_OR_ORGANISATION/REPOSITORY)
-        pr_number (int): number og the pr
+        pr_number (int): number of the pull request
+        cfg (ConfigParser): ConfigParser instance holding full configuration
+            (typically read from 'app.cfg')
 
     Returns:
-        status_table (dict): dictionary with 'arch', 'date', 'status', 'url' and 'result'
-            for all the finished builds;
+        status_table (dict): dictionary with 'on arch', 'for arch', 'for repo',
+            'date', 'status', 'url', 'result' and 'test' for all the finished
+            builds (same format as returned by request_bot_build_issue_comments)
     """
     fn = sys._getframe().f_code.co_name
 
-    status_table = {'on arch': [], 'for arch': [], 'for repo': [], 'date': [], 'status': [], 'url': [], 'result': []}
-    cfg = config.read_config()
+    status_table = {'on arch': [], 'for arch': [], 'for repo': [], 'date': [], 'status': [], 'url': [], 'result': [],
+                    'test': []}
+    node_map = get_node_types(cfg)
+    results = {
+        job_metadata.JOB_RESULT_SUCCESS: ':grin: SUCCESS',
+        job_metadata.JOB_RESULT_FAILURE: ':cry: FAILURE',
+    }
 
-    # for loop because github has max 100 items per request.
-    # if the pr has more than 100 comments we need to use per_page
-    # argument at the moment the for loop is for a max of 400 comments could bump this up
-    for x in range(1, 5):
-        curl_cmd = f'curl -L https://api.github.com/repos/{repo_name}/issues/{pr_number}/comments?per_page=100&page={x}'
-        curl_output, curl_error, curl_exit_code = run_cmd(curl_cmd, "fetch all comments")
+    # job directories are named after the job id, so sorting them numerically
+    # lists the jobs in the order they were submitted
+    job_ids = {job_dir: job_metadata.determine_job_id_from_job_directory(job_dir) for job_dir in job_dirs}
+    for job_dir in sorted(job_dirs, key=lambda job_dir: job_ids[job_dir]):
+        job_id = os.path.basename(job_dir)
+        # jobs of PRs with the same number in other repositories share the
+        # directory pr_<NUMBER>
+        metadata_pr = job_metadata.get_section_from_file(os.path.join(job_dir, f"_bot_job{job_id}.metadata"),
+                                                         job_metadata.JOB_PR_SECTION)
+        if (not metadata_pr or metadata_pr.get(job_metadata.JOB_PR_REPO) != repo_name or
+                str(metadata_pr.get(job_metadata.JOB_PR_PR_NUMBER)) != str(pr_number)):
+            continue
+        job_result_file_path = os.path.join(job_dir, f"_bot_job{job_id}.result")
+        job_results = job_metadata.get_section_from_file(job_result_file_path, job_metadata.JOB_RESULT_SECTION)
+        if job_results is None:
+            log(f"{fn}(): job {job_id} has not finished yet")
+            continue
 
-        comments = json.loads(curl_output)
-
-        for comment in comments:
-            # iterate through the comments to find the one where the status of the build was in
-            submitted_job_comments_section = cfg[config.SECTION_SUBMITTED_JOB_COMMENTS]
-            accelerator_fmt = submitted_job_comments_section[config.SUBMITTED_JOB_COMMENTS_SETTING_WITH_ACCELERATOR]
-            instance_repo_fmt = submitted_job_comments_section[config.SUBMITTED_JOB_COMMENTS_SETTING_INSTANCE_REPO]
-            instance_repo_re = template_to_regex(instance_repo_fmt)
-            comment_body = comment['body'].split('\n')
-            instance_repo_match = re.match(instance_repo_re, comment_body[0])
-            # Check if this body starts with an initial comment from the bot (first item is always the instance + repo
-            # it is building for)
-            # Then, check that it has at least 4 lines so that we can safely index up to that number
-            if instance_repo_match and len(comment_body) >= 4:
-                log(f"{fn}(): found bot build response in issue, processing...")
-
-                # First, extract the repo_id
-                log(f"{fn}(): found build for repository: {instance_repo_match.group('repo_id')}")
-                status_table['for repo'].append(instance_repo_match.group('repo_id'))
-
-                # Then, try to match the architecture we build on.
-                # First try this including accelerator, to see if one was defined
-                on_arch_fmt = submitted_job_comments_section[config.SUBMITTED_JOB_COMMENTS_SETTING_BUILD_ON_ARCH]
-                on_arch_fmt_with_accel = on_arch_fmt.format_map(PartialFormatDict(on_accelerator=accelerator_fmt))
-                on_arch_re_with_accel = template_to_regex(on_arch_fmt_with_accel)
-                on_arch_match = re.match(on_arch_re_with_accel, comment_body[1])
-                if on_arch_match:
-                    # Pattern with accelerator matched, append to status_table
-                    log(f"{fn}(): found build on architecture: {on_arch_match.group('on_arch')}, "
-                        f"with accelerator {on_arch_match.group('accelerator')}")
-                    status_table['on arch'].append(f"`{on_arch_match.group('on_arch')}`, "
-                                                   f"`{on_arch_match.group('accelerator')}`")
-                else:
-                    # Pattern with accelerator did not match, retry without accelerator
-                    on_arch_re = template_to_regex(on_arch_fmt)
-                    on_arch_match = re.match(on_arch_re, comment_body[1])
-                    if on_arch_match:
-                        # Pattern without accelerator matched, append to status_table
-                        log(f"{fn}(): found build on architecture: {on_arch_match.group('on_arch')}")
-                        status_table['on arch'].append(f"`{on_arch_match.group('on_arch')}`")
-                    else:
-                        # This shouldn't happen: we had an instance_repo_match, but no match for the 'on architecture'
-                        msg = "Could not match regular expression for extracting the architecture to build on.\n"
-                        msg += "String to be matched:\n"
-                        msg += f"{comment_body[1]}\n"
-                        msg += "First regex attempted:\n"
-                        msg += f"{on_arch_re_with_accel.pattern}\n"
-                        msg += "Second regex attempted:\n"
-                        msg += f"{on_arch_re.pattern}\n"
-                        raise ValueError(msg)
-
-                # Now, do the same for the architecture we build for. I.e. first, try to match including accelerator
-                for_arch_fmt = submitted_job_comments_section[config.SUBMITTED_JOB_COMMENTS_SETTING_BUILD_FOR_ARCH]
-                for_arch_fmt_with_accel = for_arch_fmt.format_map(PartialFormatDict(for_accelerator=accelerator_fmt))
-                for_arch_re_with_accel = template_to_regex(for_arch_fmt_with_accel)
-                for_arch_match = re.match(for_arch_re_with_accel, comment_body[2])
-                if for_arch_match:
-                    # Pattern with accelerator matched, append to status_table
-                    log(f"{fn}(): found build for architecture: {for_arch_match.group('for_arch')}, "
-                        f"with accelerator {for_arch_match.group('accelerator')}")
-                    status_table['for arch'].append(f"`{for_arch_match.group('for_arch')}`, "
-                                                    f"`{for_arch_match.group('accelerator')}`")
-                else:
-                    # Pattern with accelerator did not match, retry without accelerator
-                    for_arch_re = template_to_regex(for_arch_fmt)
-                    for_arch_match = re.match(for_arch_re, comment_body[2])
-                    if for_arch_match:
-                        # Pattern without accelerator matched, append to status_table
-                        log(f"{fn}(): found build for architecture: {for_arch_match.group('for_arch')}")
-                        status_table['for arch'].append(f"`{for_arch_match.group('for_arch')}`")
-                    else:
-                        # This shouldn't happen: we had an instance_repo_match, but no match for the 'on architecture'
-                        msg = "Could not match regular expression for extracting the architecture to build for.\n"
-                        msg += "String to be matched:\n"
-                        msg += f"{comment_body[2]}\n"
-                        msg += "First regex attempted:\n"
-                        msg += f"{for_arch_re_with_accel.pattern}\n"
-                        msg += "Second regex attempted:\n"
-                        msg += f"{for_arch_re.pattern}\n"
-                        raise ValueError(msg)
-
-                # get date, status, url and result from the markdown table
-                comment_table = comment['body'][comment['body'].find('|'):comment['body'].rfind('|')+1]
-
-                # Convert markdown table to a dictionary
-                lines = comment_table.split('\n')
-                rows = []
-                keys = []
-                for i, row in enumerate(lines):
-                    values = {}
-                    if i == 0:
-                        for key in row.split('|'):
-                            keys.append(key.strip())
-                    elif i == 1:
-                        continue
-                    else:
-                        for j, value in enumerate(row.split('|')):
-                            if j > 0 and j < len(keys) - 1:
-                                values[keys[j]] = value.strip()
-                        rows.append(values)
-
-                # add date, status, url to  status_table if
-                for row in rows:
-                    if row['job status'] == 'finished':
-                        status_table['date'].append(row['date'])
-                        status_table['status'].append(row['job status'])
-                        status_table['url'].append(comment['html_url'])
-                        if 'FAILURE' in row['comment']:
-                            status_table['result'].append(':cry: FAILURE')
-                        elif 'SUCCESS' in row['comment']:
-                            status_table['result'].append(':grin: SUCCESS')
-                        elif 'UNKNOWN' in row['comment']:
-                            status_table['result'].append(':shrug: UNKNOWN')
-                        else:
-                            status_table['result'].append(row['comment'])
-        if len(comments) != 100:
-            break
+        job_cfg_path = os.path.join(job_dir, job_metadata.JOB_CFG_DIRECTORY_NAME, job_metadata.JOB_CFG_FILENAME)
+        job_cfg = job_metadata.read_metadata_file(job_cfg_path) or {}
+        job_arch = job_cfg[job_metadata.JOB_CFG_ARCHITECTURE_SECTION] if job_metadata.JOB_CFG_ARCHITECTURE_SECTION \
+            in job_cfg else {}
+        job_repo = job_cfg[job_metadata.JOB_CFG_REPOSITORY_SECTION] if job_metadata.JOB_CFG_REPOSITORY_SECTION \
+            in job_cfg else {}
+
+        # architecture (and accelerator) of the node type the job ran on, see
+        # create_pr_comment
+        node_type_name = job_arch.get(job_metadata.JOB_CFG_ARCHITECTURE_NODE_TYPE, '')
+        node_type = node_map.get(node_type_name, {})
+        if 'cpu_subdir' in node_type:
+            on_arch = f"`{'-'.join(node_type['cpu_subdir'].split('/')[1:])}`"
+        else:
+            on_arch = f"`{node_type_name}`"
+        if node_type.get('accel'):
+            on_arch += f", `{node_type['accel']}`"
+        for_arch = f"`{job_arch.get(job_metadata.JOB_CFG_ARCHITECTURE_SOFTWARE_SUBDIR, '')}`"
+        if job_arch.get(job_metadata.JOB_CFG_ARCHITECTURE_ACCELERATOR):
+            for_arch += f", `{job_arch.get(job_metadata.JOB_CFG_ARCHITECTURE_ACCELERATOR)}`"
+
+        # the result file is written when the job finishes
+        finished = datetime.fromtimestamp(os.path.getmtime(job_result_file_path), timezone.utc)
+        pr_comment_id = metadata_pr.get(job_metadata.JOB_PR_PR_COMMENT_ID, '-1')
+        url = ''
+        if pr_comment_id.isdigit():
+            url = f"https://github.com/{repo_name}/pull/{pr_number}#issuecomment-{pr_comment_id}"
+
+        status_table['on arch'].append(on_arch)
+        status_table['for arch'].append(for_arch)
+        status_table['for repo'].append(job_repo.get(job_metadata.JOB_CFG_REPOSITORY_REPO_ID, ''))
+        status_table['date'].append(finished.strftime('%b %d %X %Z %Y'))
+        status_table['status'].append('finished')
+        status_table['url'].append(url)
+        status_table['result'].append(results.get(job_results.get(job_metadata.JOB_RESULT_STATUS),
+                                                  ':shrug: UNKNOWN'))
+        # result of the test suite (if the job ran it), see
+        # process_finished_job in eessi_bot_job_manager.py
+        job_tests = job_metadata.get_section_from_file(os.path.join(job_dir, f"_bot_job{job_id}.test"),
+                                                       job_metadata.JOB_TEST_SECTION) or {}
+        status_table['test'].append(results.get(job_tests.get(job_metadata.JOB_TEST_STATUS), ':shrug: UNKNOWN'))
+    log(f"{fn}(): found {len(status_table['date'])} finished jobs for PR {repo_name}#{pr_number}")
     return status_table
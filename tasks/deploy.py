@@ -15,7 +15,6 @@
 
 # Standard library imports
 from datetime import datetime, timezone
-import glob
 import json
 import os
 import re
@@ -27,7 +26,7 @@ from pyghee.utils import log
 # Local application imports (anything from EESSI/eessi-bot-software-layer)
 from connections import github
 from tasks.build import get_build_env_cfg
-from tools import config, job_metadata, pr_comments, run_cmd
+from tools import config, job_index, job_metadata, pr_comments, run_cmd
 from tools.pr_comments import ChatLevels
 
 
@@ -43,26 +42,16 @@ def determine_job_dirs(pr_number):
     """
     funcname = sys._getframe().f_code.co_name
 
-    job_directories = []
-
-    # a job directory's name has the format cfg[config.BUILDENV_SETTING_JOBS_BASE_DIR]/YYYY.MM/pr_<id>/JOBID
-    #  - we may have to scan multiple YYYY.MM directories if the pull request was
-    #    processed over more than one month (that is jobs were run in two or more
-    #    months)
-    #  - we assume that a JOBID is a positive integer
+    # a job directory's name has the format cfg[config.BUILDENV_SETTING_JOBS_BASE_DIR]/YYYY.MM/pr_<id>/JOBID;
+    # the directories of a pull request are listed in an index file (see
+    # tools/job_index.py), so not all YYYY.MM directories have to be scanned
     cfg = config.read_config()
     build_env_cfg = get_build_env_cfg(cfg)
     jobs_base_dir = build_env_cfg[config.BUILDENV_SETTING_JOBS_BASE_DIR]
     log(f"{funcname}(): jobs_base_dir = {jobs_base_dir}")
 
-    date_pr_job_pattern = (f"[0-9][0-9][0-9][0-9].[0-9][0-9]/"
-                           f"pr_{pr_number}/[0-9]*")
-    log(f"{funcname}(): date_pr_job_pattern = {date_pr_job_pattern}")
-
-    glob_str = os.path.join(jobs_base_dir, date_pr_job_pattern)
-    log(f"{funcname}(): glob_str = {glob_str}")
-
-    job_directories = glob.glob(glob_str)
+    job_directories = job_index.get_job_dirs(jobs_base_dir, pr_number)
+    log(f"{funcname}(): found {len(job_directories)} job directories for PR {pr_number}")
 
     return job_directories
 
@@ -203,18 +192,23 @@ def update_pr_comment(artefact, repo_name, pr_number, pr_comment_id, state, msg)
     Returns:
         None (implicitly)
     """
-    gh = github.get_instance()
-    repo = gh.get_repo(repo_name)
-    pull_request = repo.get_pull(pr_number)
-
-    issue_comment = pr_comments.determine_issue_comment(pull_request, pr_comment_id, artefact)
-    if issue_comment:
-        dt = datetime.now(timezone.utc)
-        comment_update = (f"\n|{dt.strftime('%b %d %X %Z %Y')}|{state}|"
-                          f"transfer of `{artefact}` to S3 bucket {msg}|")
-
-        # append update to existing comment
-        issue_comment.edit(issue_comment.body + comment_update)
+    pull_request = github.get_pull(repo_name, pr_number)
+
+    dt = datetime.now(timezone.utc)
+    comment_update = (f"\n|{dt.strftime('%b %d %X %Z %Y')}|{state}|"
+                      f"transfer of `{artefact}` to S3 bucket {msg}|")
+
+    # updates for several artefacts of the same comment are applied together;
+    # a comment with a known id is not obtained here, it is obtained (or taken
+    # from the cache) when the updates are applied
+    comment_updater = pr_comments.get_comment_updater()
+    if pr_comment_id != -1:
+        comment_updater.queue_update(pr_comment_id, pull_request, comment_update)
+    else:
+        issue_comment = pr_comments.determine_issue_comment(pull_request, pr_comment_id, artefact)
+        if issue_comment:
+            # append update to existing comment
+            comment_updater.queue_update(issue_comment.id, pull_request, comment_update)
 
 
 def append_artefact_to_upload_log(artefact, job_dir):
@@ -0,0 +1,99 @@
+# Tests for functions defined in 'connections/github.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+from unittest.mock import MagicMock, patch
+
+# Third party imports (anything installed into the local Python environment)
+import pytest
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from connections import github
+from tools.metrics import bot_metrics, METRIC_GITHUB_REQUEST_ERRORS, METRIC_GITHUB_REQUEST_SECONDS
+
+
+def test_get_repo_and_get_pull_cached():
+    gh = MagicMock()
+    github.clear_cache()
+    with patch('connections.github.get_instance', return_value=gh):
+        pr = github.get_pull("EESSI/software-layer", "42")
+        assert github.get_pull("EESSI/software-layer", 42) is pr
+        assert github.get_repo("EESSI/software-layer") is gh.get_repo.return_value
+        gh.get_repo.assert_called_once_with("EESSI/software-layer")
+        gh.get_repo.return_value.get_pull.assert_called_once_with(42)
+
+        # expired entries are created again
+        with patch('connections.github.GITHUB_OBJECTS_CACHE_TTL', -1):
+            github.clear_cache()
+            github.get_pull("EESSI/software-layer", 42)
+            github.get_pull("EESSI/software-layer", 42)
+        assert gh.get_repo.return_value.get_pull.call_count == 3
+
+        # least recently used entries are evicted
+        github.clear_cache()
+        gh.get_repo.reset_mock()
+        with patch('connections.github.GITHUB_OBJECTS_CACHE_SIZE', 1):
+            github.get_repo("EESSI/software-layer")
+            github.get_repo("EESSI/eessi-bot-software-layer")
+            github.get_repo("EESSI/software-layer")
+        assert gh.get_repo.call_count == 3
+    github.clear_cache()
+
+
+def test_get_instance_clears_cache():
+    github.clear_cache()
+    github._gh_objects[("repo", "EESSI/software-layer")] = (float('inf'), None)
+    with patch('connections.github._gh', None), patch('connections.github.connect') as mock_connect:
+        assert github.get_instance() is mock_connect.return_value
+    assert not github._gh_objects
+
+
+def test_timed_request():
+    _, count = bot_metrics.get(METRIC_GITHUB_REQUEST_SECONDS, operation="test_request") or (0, 0)
+    errors = bot_metrics.get(METRIC_GITHUB_REQUEST_ERRORS, operation="test_request") or 0
+
+    assert github.timed_request("test_request", lambda x: x + 1, 1) == 2
+    with pytest.raises(RuntimeError):
+        github.timed_request("test_request", MagicMock(side_effect=RuntimeError("failed")))
+
+    assert bot_metrics.get(METRIC_GITHUB_REQUEST_SECONDS, operation="test_request")[1] == count + 2
+    assert bot_metrics.get(METRIC_GITHUB_REQUEST_ERRORS, operation="test_request") == errors + 1
+
+
+def test_lazy_pull_request():
+    body = {
+        "repository": {"full_name": "EESSI/software-layer"},
+        "pull_request": {"number": 42, "base": {"ref": "main", "repo": {"full_name": "EESSI/software-layer"}},
+                         "head": {"sha": "abc123"}},
+    }
+    with patch('connections.github.get_pull') as mock_get_pull:
+        pr = github.LazyPullRequest.from_event(body)
+        # fields contained in the payload do not need a request
+        assert (pr.number, pr.base.ref, pr.base.repo.full_name, pr.head.sha) == (
+            42, "main", "EESSI/software-layer", "abc123")
+        assert "materialized=False" in repr(pr)
+        mock_get_pull.assert_not_called()
+
+        # any other attribute is taken from the PullRequest (obtained once)
+        mock_get_pull.return_value.title = "title"
+        assert pr.title == "title"
+        assert pr.base.label is mock_get_pull.return_value.base.label
+        pr.get_issue_comment(1)
+        mock_get_pull.assert_called_once_with("EESSI/software-layer", 42)
+        mock_get_pull.return_value.get_issue_comment.assert_called_once_with(1)
+        assert pr.materialized
+
+        # events of type issue_comment only contain the number of the PR
+        pr = github.LazyPullRequest.from_event({"repository": {"full_name": "EESSI/software-layer"},
+                                                "issue": {"number": "7"}})
+        assert (pr.number, pr.base.repo.full_name) == (7, "EESSI/software-layer")
+        assert pr.base.ref is mock_get_pull.return_value.base.ref
+        mock_get_pull.assert_called_with("EESSI/software-layer", 7)
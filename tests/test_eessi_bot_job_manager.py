@@ -12,9 +12,21 @@
 # license: GPLv2
 #
 
+from datetime import datetime, timedelta
+import os
 import shutil
+import threading
+import time
+from unittest.mock import MagicMock, patch
 
 from eessi_bot_job_manager import EESSIBotSoftwareLayerJobManager
+from tools.batch_backend import BatchJob
+from tools.metrics import bot_metrics, METRIC_CLUSTER_UP
+from tools.job_registry import JobRegistry, JOB_STATE_RUNNING
+from tools.outbox import Outbox, OUTBOX_RETRY_DELAY_MIN
+from tools.pr_comments import CommentUpdater
+from tools.spool import SpoolWatcher
+from tests.test_tools_pr_comments import MockRequester
 
 
 def test_determine_running_jobs():
@@ -135,3 +147,349 @@ def test_determine_finished_jobs():
     assert job_manager.determine_finished_jobs(known_jobs, current_jobs_all_jobs) == []
     assert job_manager.determine_finished_jobs(known_jobs, current_jobs_one_job) == ['1', '2']
     assert job_manager.determine_finished_jobs(known_jobs, {}) == ['0', '1', '2']
+
+
+def test_release_held_jobs():
+    job_manager = EESSIBotSoftwareLayerJobManager()
+
+    current_jobs = {
+        '1': {'jobid': '1'},
+        '2': {'jobid': '2'},
+    }
+    metadata_pr = {'repo': 'test_repo', 'pr_number': '1'}
+    job_manager.jobs_to_release = {
+        '1': {'job': current_jobs['1'], 'metadata_pr': metadata_pr},
+        '2': {'job': current_jobs['2'], 'metadata_pr': metadata_pr},
+        # job 3 is no longer known to the batch system
+        '3': {'job': {'jobid': '3'}, 'metadata_pr': metadata_pr},
+    }
+
+    with patch.object(job_manager, 'release_jobs', return_value=(['1'], ['2'])) as mock_release, \
+            patch.object(job_manager, 'report_new_job') as mock_report:
+        failed = job_manager.release_held_jobs(current_jobs)
+
+    mock_release.assert_called_once_with([current_jobs['1'], current_jobs['2']])
+    mock_report.assert_called_once_with(current_jobs['1'], metadata_pr, 'released', '')
+    assert failed == ['2']
+    # only the job whose release failed is retried
+    assert list(job_manager.jobs_to_release.keys()) == ['2']
+
+
+def test_restore_jobs_to_release(tmpdir):
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.submitted_jobs_dir = str(tmpdir)
+    for job_id in ['123', '124']:
+        os.makedirs(os.path.join(tmpdir, job_id))
+        shutil.copyfile("tests/test_bot_job123.metadata", os.path.join(tmpdir, job_id, f"_bot_job{job_id}.metadata"))
+
+    known_jobs = {'123': {'jobid': '123'}, '124': {'jobid': '124'}, '125': {'jobid': '125'}}
+    current_jobs = {
+        # job 123 was not released before the job manager stopped
+        '123': BatchJob('123', state='PENDING', reason='JobHeldUser'),
+        '124': BatchJob('124', state='PENDING', reason='Priority'),
+        # job 125 has no metadata file
+        '125': BatchJob('125', state='PENDING', reason='JobHeldUser'),
+    }
+    assert job_manager.restore_jobs_to_release(known_jobs, current_jobs) == ['123']
+    assert job_manager.jobs_to_release['123']['job'] is current_jobs['123']
+    assert job_manager.jobs_to_release['123']['metadata_pr']['pr_number'] == '999'
+
+    # the job is only restored in the first iteration
+    job_manager.backend = MagicMock()
+    with patch.object(job_manager, 'restore_jobs_to_release') as mock_restore, \
+            patch.object(job_manager, 'release_held_jobs'), \
+            patch.object(job_manager, 'process_jobs'):
+        job_manager.run_iteration(known_jobs, dict(current_jobs))
+        job_manager.run_iteration(known_jobs, dict(current_jobs))
+    mock_restore.assert_called_once()
+
+
+def test_non_bot_jobs_cache(tmpdir):
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.non_bot_jobs_cache_size = 2
+    job_manager.non_bot_jobs_cache_file = str(tmpdir / "non_bot_jobs")
+
+    old_job_info = {'JobId': '1', 'SubmitTime': '2020-01-01T00:00:00'}
+    assert job_manager.add_non_bot_job('1', old_job_info)
+    assert job_manager.add_non_bot_job('2', {})
+    # recently submitted jobs may still become bot jobs, so they are not cached
+    recent_job_info = {'SubmitTime': datetime.now().strftime("%Y-%m-%dT%H:%M:%S")}
+    assert not job_manager.add_non_bot_job('3', recent_job_info)
+    assert list(job_manager.non_bot_jobs) == ['1', '2']
+
+    # oldest entry is evicted when the cache is full
+    assert job_manager.add_non_bot_job('4', old_job_info)
+    assert list(job_manager.non_bot_jobs) == ['2', '4']
+
+    # jobs that left the queue are evicted
+    assert job_manager.evict_non_bot_jobs({'4': {'jobid': '4'}}) == ['2']
+    assert list(job_manager.non_bot_jobs) == ['4']
+
+    job_manager.save_non_bot_jobs()
+    job_manager.non_bot_jobs.clear()
+    job_manager.load_non_bot_jobs()
+    assert list(job_manager.non_bot_jobs) == ['4']
+
+
+def test_process_running_jobs(tmpdir):
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.submitted_jobs_dir = str(tmpdir)
+    os.makedirs(os.path.join(tmpdir, '123'))
+    shutil.copyfile("tests/test_bot_job123.metadata", os.path.join(tmpdir, '123', '_bot_job123.metadata'))
+
+    running_job = {'jobid': '123', 'state': 'RUNNING'}
+    with patch('eessi_bot_job_manager.github') as mock_github, \
+            patch.object(job_manager.comment_updater, 'get_issue_comment',
+                         return_value=MagicMock(body="|status|")) as mock_get_comment, \
+            patch('eessi_bot_job_manager.get_submitted_job_comment') as mock_search, \
+            patch.object(job_manager.comment_updater, 'queue_update') as mock_update, \
+            patch('eessi_bot_job_manager.config.read_config') as mock_read_config:
+        job_manager.process_running_jobs(running_job)
+        # the configuration read by the constructor is used
+        mock_read_config.assert_not_called()
+        # comment id is taken from the metadata file, no search needed
+        mock_search.assert_not_called()
+        mock_get_comment.assert_called_once()
+        mock_update.assert_called_once()
+        assert mock_update.call_args[0][0] == job_manager.job_states['123']['comment_id']
+        assert job_manager.job_states['123']['last_state'] == 'running'
+
+        # state did not change -> no GitHub calls at all
+        mock_github.reset_mock()
+        job_manager.process_running_jobs(running_job)
+        mock_github.get_pull.assert_not_called()
+        assert mock_update.call_count == 1
+
+
+def test_job_registry(tmpdir):
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.submitted_jobs_dir = os.path.join(tmpdir, 'submitted')
+    job_dir = os.path.join(tmpdir, 'jobs', '123')
+    os.makedirs(job_dir)
+    os.makedirs(job_manager.submitted_jobs_dir)
+    shutil.copyfile("tests/test_bot_job123.metadata", os.path.join(job_dir, '_bot_job123.metadata'))
+    os.symlink(job_dir, os.path.join(job_manager.submitted_jobs_dir, '123'))
+
+    # jobs known from symlinks are imported into an empty registry
+    job_manager.registry = JobRegistry(os.path.join(tmpdir, 'jobs.db'))
+    assert job_manager.import_known_jobs_into_registry() == 1
+    job_manager.update_registry('123', state=JOB_STATE_RUNNING)
+
+    # a restarted job manager recovers the job state from the registry only
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.submitted_jobs_dir = os.path.join(tmpdir, 'does-not-exist')
+    job_manager.registry = JobRegistry(os.path.join(tmpdir, 'jobs.db'))
+    assert job_manager.get_known_jobs() == {'123': {'jobid': '123'}}
+    assert job_manager.job_states['123'] == {
+        'repo': 'test_repo',
+        'pr_number': '999',
+        'comment_id': 77,
+        'last_state': JOB_STATE_RUNNING,
+    }
+
+
+def test_determine_seconds_to_next_end():
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    in_10_minutes = (datetime.now() + timedelta(minutes=10)).strftime("%Y-%m-%dT%H:%M:%S")
+    in_1_hour = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S")
+    current_jobs = {
+        '1': {'jobid': '1', 'state': 'RUNNING', 'end_time': in_1_hour},
+        '2': {'jobid': '2', 'state': 'RUNNING', 'end_time': in_10_minutes},
+        '3': {'jobid': '3', 'state': 'RUNNING', 'end_time': 'Unknown'},
+        '4': {'jobid': '4', 'state': 'PENDING', 'end_time': 'N/A'},
+    }
+    assert 590 < job_manager.determine_seconds_to_next_end(current_jobs) <= 600
+    assert job_manager.determine_seconds_to_next_end({'4': current_jobs['4']}) is None
+
+
+def test_process_completed_jobs(tmpdir):
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.job_filter = {}
+    job_manager.spool_watcher = SpoolWatcher(str(tmpdir))
+    for job_id in ['1', '2']:
+        open(os.path.join(tmpdir, job_id), 'w').close()
+
+    known_jobs = {'1': {'jobid': '1'}, '3': {'jobid': '3'}}
+    with patch.object(job_manager, 'process_finished_job') as mock_finished:
+        assert job_manager.wait_for_next_poll(0.1, known_jobs) == ['1']
+    mock_finished.assert_called_once_with({'jobid': '1'})
+    assert known_jobs == {'3': {'jobid': '3'}}
+
+    # job 1 is still listed by squeue (e.g., COMPLETING) and must not be
+    # treated as a new job
+    current_jobs = {'1': {'jobid': '1'}, '3': {'jobid': '3'}}
+    job_manager.skip_recently_finished_jobs(current_jobs)
+    assert list(current_jobs) == ['3']
+
+    # marker of unknown job 2 is removed once the job left the queue
+    job_manager.clean_up_spool(current_jobs)
+    assert job_manager.spool_watcher.get_markers() == []
+
+    job_manager.skip_recently_finished_jobs(current_jobs)
+    assert job_manager.recently_finished_jobs == {}
+    job_manager.spool_watcher.close()
+
+
+def test_process_jobs():
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.job_processing_workers = 4
+    pr_of_job = {'1': 'A', '2': 'B', '3': 'A', '4': 'B', '5': 'C'}
+    jobs = [{'jobid': job_id} for job_id in pr_of_job]
+
+    processed = {}
+    lock = threading.Lock()
+
+    def process_job(job):
+        with lock:
+            processed.setdefault(pr_of_job[job['jobid']], []).append((job['jobid'], threading.current_thread().name))
+        if job['jobid'] == '2':
+            raise Exception("processing failed")
+
+    with patch.object(job_manager, 'get_pr_key', side_effect=lambda job_id: ('repo', pr_of_job[job_id])):
+        failed = job_manager.process_jobs(process_job, jobs)
+
+    # failure of job 2 does not prevent processing job 4 (of the same PR)
+    assert failed == ['2']
+    # jobs of the same PR are processed in order by the same thread
+    assert [job_id for job_id, _ in processed['A']] == ['1', '3']
+    assert [job_id for job_id, _ in processed['B']] == ['2', '4']
+    for pr_jobs in processed.values():
+        assert len({thread for _, thread in pr_jobs}) == 1
+    job_manager.shutdown()
+
+
+def test_fetch_job_accounting(tmpdir):
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.registry = JobRegistry(os.path.join(tmpdir, 'jobs.db'))
+    job_manager.registry.add_job('1')
+    job_manager.backend = MagicMock()
+    job_manager.backend.accounting.return_value = {
+        '1': {'jobid': '1', 'state': 'TIMEOUT', 'exitcode': '0:15', 'elapsed': '01:00:00', 'maxrss': '2G',
+              'nodelist': 'node1'},
+    }
+
+    assert job_manager.fetch_job_accounting([]) == {}
+    job_manager.backend.accounting.assert_not_called()
+
+    accounting = job_manager.fetch_job_accounting([{'jobid': '1'}, {'jobid': '2'}])
+    # a single query for all jobs
+    job_manager.backend.accounting.assert_called_once_with([{'jobid': '1'}, {'jobid': '2'}])
+    assert accounting['1']['state'] == 'TIMEOUT'
+    assert job_manager.job_accounting == accounting
+    job = job_manager.registry.get_job('1')
+    assert job['final_state'] == 'TIMEOUT'
+    assert job['exit_code'] == '0:15'
+    assert job['node_list'] == 'node1'
+
+
+def test_determine_terminal_jobs():
+    job_manager = EESSIBotSoftwareLayerJobManager()
+
+    current_jobs = {
+        '1': {'jobid': '1', 'state': 'RUNNING'},
+        '2': {'jobid': '2', 'state': 'NODE_FAIL'},
+        '3': {'jobid': '3', 'state': 'COMPLETING'},
+        '4': {'jobid': '4', 'state': 'TIMEOUT'},
+    }
+    assert job_manager.determine_terminal_jobs(current_jobs) == ['2', '4']
+
+
+def test_carry_over_unavailable_jobs():
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.backend = MagicMock()
+    job_manager.backend.clusters = ['a', 'b']
+    job_manager.backend.unavailable_clusters = frozenset(['b'])
+
+    known_jobs = {
+        '1': BatchJob('1', 'a', state='RUNNING'),
+        '2': BatchJob('2', 'b', state='RUNNING'),
+        '3': BatchJob('3', 'b', state='PENDING'),
+    }
+    current_jobs = {'3': BatchJob('3', 'b', state='RUNNING')}
+    # only jobs on the unavailable cluster are kept, job 1 has finished
+    assert job_manager.carry_over_unavailable_jobs(known_jobs, current_jobs) == ['2']
+    assert sorted(current_jobs.keys()) == ['2', '3']
+    assert current_jobs['3'].state == 'RUNNING'
+    assert job_manager.determine_finished_jobs(known_jobs, current_jobs) == ['1']
+    assert bot_metrics.get(METRIC_CLUSTER_UP, cluster='a') == 1
+    assert bot_metrics.get(METRIC_CLUSTER_UP, cluster='b') == 0
+
+    job_manager.backend.unavailable_clusters = frozenset()
+    current_jobs = {}
+    assert job_manager.carry_over_unavailable_jobs(known_jobs, current_jobs) == []
+    assert current_jobs == {}
+    assert bot_metrics.get(METRIC_CLUSTER_UP, cluster='b') == 1
+
+
+def test_prune_finished_jobs(tmpdir):
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.job_ids_dir = str(tmpdir)
+    # without a retention period, nothing is pruned
+    assert job_manager.prune_finished_jobs() == []
+
+    job_manager.finished_jobs_retention_days = 1
+    os.makedirs(os.path.join(tmpdir, "jobs", "1"))
+    os.makedirs(os.path.join(tmpdir, "submitted"))
+    os.symlink(os.path.join(tmpdir, "jobs", "1"), os.path.join(tmpdir, "submitted", "1"))
+    job_manager.get_finished_jobs().add("1", os.path.join(tmpdir, "submitted", "1"), finished=time.time() - 2 * 86400)
+    assert job_manager.prune_finished_jobs() == ['1']
+
+    # pruning happens at most once per day unless forced
+    os.symlink(os.path.join(tmpdir, "jobs", "1"), os.path.join(tmpdir, "submitted", "2"))
+    job_manager.get_finished_jobs().add("2", os.path.join(tmpdir, "submitted", "2"), finished=time.time() - 2 * 86400)
+    assert job_manager.prune_finished_jobs() == []
+    assert job_manager.prune_finished_jobs(force=True) == ['2']
+
+
+def test_update_pr_comment_outbox(tmpdir):
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.outbox = Outbox(os.path.join(tmpdir, 'outbox'))
+    job_manager.comment_updater = CommentUpdater(window=0)
+    requester = MockRequester()
+    pull_request = MagicMock()
+    pull_request.get_issue_comment.side_effect = lambda comment_id: requester.add_comment(comment_id, "job comment")
+
+    # GitHub is not reachable, the updates are kept in the outbox
+    with patch('eessi_bot_job_manager.github.get_pull', side_effect=Exception("GitHub is down")):
+        job_manager.update_pr_comment('repo', 1, 77, '|finished|')
+        job_manager.update_pr_comment('repo', 1, 77, '|test result|')
+    assert [item['update'] for item in job_manager.outbox.get_items()] == ['|finished|', '|test result|']
+    # retries are delayed
+    assert job_manager.process_outbox() == 0
+
+    # retried once due (also after a restart), applied in order
+    job_manager.outbox = Outbox(os.path.join(tmpdir, 'outbox'))
+    with patch('eessi_bot_job_manager.github.get_pull', return_value=pull_request), \
+            patch('tools.outbox.time.time', return_value=time.time() + OUTBOX_RETRY_DELAY_MIN):
+        assert job_manager.process_outbox() == 2
+    assert list(requester.bodies.values()) == ['job comment|finished||test result|']
+    assert len(job_manager.outbox) == 0
+
+
+def test_process_finished_job_without_comment_id(tmpdir):
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.job_ids_dir = str(tmpdir)
+    job_manager.submitted_jobs_dir = os.path.join(tmpdir, 'submitted')
+    job_manager.outbox = Outbox(os.path.join(tmpdir, 'outbox'))
+    os.makedirs(job_manager.submitted_jobs_dir)
+    for job_id in ['123', '124']:
+        job_dir = os.path.join(tmpdir, 'jobs', job_id)
+        os.makedirs(job_dir)
+        with open(os.path.join(job_dir, f'_bot_job{job_id}.metadata'), 'w') as metadata_file:
+            metadata_file.write("[PR]\nrepo = test_repo\npr_number = 999\n")
+        os.symlink(job_dir, os.path.join(job_manager.submitted_jobs_dir, job_id))
+
+    with patch('eessi_bot_job_manager.github'), \
+            patch('eessi_bot_job_manager.get_comment_templates', return_value=MagicMock()), \
+            patch('eessi_bot_job_manager.get_submitted_job_comment',
+                  side_effect=[None, MagicMock(id=77)]) as mock_search, \
+            patch.object(job_manager, 'apply_outbox_item') as mock_apply:
+        # no comment found, nothing is kept in the outbox
+        job_manager.process_finished_job({'jobid': '123'})
+        assert len(job_manager.outbox) == 0
+        mock_apply.assert_not_called()
+
+        # the comment found is updated
+        job_manager.process_finished_job({'jobid': '124'})
+        assert mock_search.call_count == 2
+        assert [item['comment_id'] for item in job_manager.outbox.get_items()] == [77]
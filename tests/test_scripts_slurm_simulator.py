@@ -0,0 +1,241 @@
+# Tests for the Slurm simulator 'scripts/slurm_simulator.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import os
+import shutil
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+
+# Third party imports (anything installed into the local Python environment)
+import pytest
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from eessi_bot_job_manager import EESSIBotSoftwareLayerJobManager
+from tools.batch_backend import SlurmBackend, SQUEUE_FORMATS
+from tools.job_registry import JobRegistry, JOB_STATE_NEW, JOB_STATE_RELEASED
+from tests.test_tools_pr_comments import MockRequester
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "scripts", "slurm_simulator.py")
+
+
+def simulator_cmd(state_path):
+    return f"{sys.executable} {SIMULATOR} --state {state_path}"
+
+
+def run_simulator(state_path, *args):
+    return subprocess.run(simulator_cmd(state_path).split() + list(args), check=True,
+                          capture_output=True, text=True).stdout
+
+
+@pytest.fixture
+def simulated_jobs(tmpdir, monkeypatch):
+    monkeypatch.setenv("USER", "bot")
+    state_path = os.path.join(tmpdir, "slurm.json")
+    run_simulator(state_path, "init", "--clusters", "a,b", "--mean-queue-wait", "0", "--mean-run-time", "100",
+                  "--failure-rate", "0")
+    output = run_simulator(state_path, "populate", "--count", "4", "--jobs-dir", os.path.join(tmpdir, "jobs"),
+                           "--bot-fraction", "0.5", "--prs", "1", "--hold")
+    assert output.strip() == "submitted 4 jobs (2 bot jobs)"
+    return state_path
+
+
+@pytest.mark.parametrize("squeue_format", SQUEUE_FORMATS)
+def test_slurm_backend(simulated_jobs, squeue_format):
+    cmd = simulator_cmd(simulated_jobs)
+    backend = SlurmBackend(f"{cmd} squeue --clusters=a,b", f"{cmd} scontrol --clusters=%(cluster)s",
+                           job_name="bot_job", squeue_format=squeue_format, sacct_command=f"{cmd} sacct")
+
+    jobs = backend.list_jobs()
+    assert sorted(jobs.keys()) == ['1', '2', '3', '4']
+    assert jobs['1'].cluster == 'a'
+    assert jobs['2'].cluster == 'b'
+    assert jobs['1'].state == 'PENDING'
+    assert jobs['1'].reason == 'JobHeldUser'
+
+    jobs_info = backend.describe_jobs(list(jobs.values()))
+    assert jobs_info['3']['WorkDir'].endswith(os.path.join('jobs', '3'))
+
+    released, failed = backend.release_jobs([jobs['1'], jobs['2']])
+    assert sorted(released) == ['1', '2']
+    assert failed == []
+
+    jobs = backend.list_jobs()
+    assert jobs['1'].state == 'RUNNING'
+    assert jobs['1'].end_time != 'N/A'
+    assert jobs['3'].state == 'PENDING'
+
+    # advance beyond the end of the released jobs
+    run_simulator(simulated_jobs, "advance", "1000")
+    assert sorted(backend.list_jobs().keys()) == ['3', '4']
+    accounting = backend.accounting([jobs['1'], jobs['2']])
+    assert accounting['1']['state'] == 'COMPLETED'
+    assert accounting['1']['maxrss'].endswith('K')
+
+
+def test_job_manager_iterations(simulated_jobs, tmpdir):
+    # copy needed app.cfg from tests directory
+    shutil.copyfile("tests/test_app.cfg", "app.cfg")
+
+    cmd = simulator_cmd(simulated_jobs)
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.job_ids_dir = os.path.join(tmpdir, "job_ids")
+    job_manager.submitted_jobs_dir = os.path.join(job_manager.job_ids_dir, "submitted")
+    os.makedirs(job_manager.submitted_jobs_dir)
+    job_manager.backend = SlurmBackend(f"{cmd} squeue", f"{cmd} scontrol", job_name="bot_job",
+                                       sacct_command=f"{cmd} sacct")
+
+    requester = MockRequester()
+    pull_request = MagicMock()
+    pull_request.requester = requester
+    pull_request.get_issue_comment.side_effect = lambda comment_id: requester.add_comment(comment_id, "job comment")
+    with patch('connections.github.get_pull', return_value=pull_request), \
+            patch('eessi_bot_job_manager.config.read_config', return_value=MagicMock()), \
+            patch('eessi_bot_job_manager.get_comment_templates', return_value=MagicMock()), \
+            patch.object(job_manager, 'fetch_job_accounting', wraps=job_manager.fetch_job_accounting) as mock_fetch:
+        # first iteration: the bot jobs (2 and 4) are found and released
+        known_jobs = job_manager.get_known_jobs()
+        current_jobs = job_manager.get_current_jobs()
+        job_manager.run_iteration(known_jobs, current_jobs)
+        assert sorted(current_jobs.keys()) == ['2', '4']
+        assert sorted(os.listdir(job_manager.submitted_jobs_dir)) == ['2', '4']
+        assert job_manager.jobs_to_release == {}
+
+        # second iteration: the bot jobs are running
+        known_jobs = current_jobs
+        current_jobs = job_manager.get_current_jobs()
+        job_manager.run_iteration(known_jobs, current_jobs)
+        assert sorted(current_jobs.keys()) == ['2', '4']
+        assert {job_manager.job_states[job_id]['last_state'] for job_id in ['2', '4']} == {'running'}
+
+        # third iteration: the bot jobs have finished
+        run_simulator(simulated_jobs, "advance", "1000")
+        known_jobs = current_jobs
+        current_jobs = job_manager.get_current_jobs()
+        job_manager.run_iteration(known_jobs, current_jobs)
+        assert current_jobs == {}
+        finished_jobs = job_manager.get_finished_jobs()
+        assert len(finished_jobs) == 2
+        assert all(os.path.islink(finished_jobs.find(job_id)) for job_id in ['2', '4'])
+        assert job_manager.job_states == {}
+        # accounting information was obtained for both jobs at once and used
+        accounting_calls = [args for args in mock_fetch.call_args_list if args[0][0]]
+        assert len(accounting_calls) == 1
+        assert sorted(job['jobid'] for job in accounting_calls[0][0][0]) == ['2', '4']
+        assert job_manager.job_accounting == {}
+
+    job_manager.shutdown()
+    # all updates to the job comments were applied
+    assert requester.bodies
+    assert all("|finished|" in body for body in requester.bodies.values())
+
+
+def test_job_manager_restart_held_jobs(simulated_jobs, tmpdir):
+    # copy needed app.cfg from tests directory
+    shutil.copyfile("tests/test_app.cfg", "app.cfg")
+
+    cmd = simulator_cmd(simulated_jobs)
+
+    def make_job_manager():
+        job_manager = EESSIBotSoftwareLayerJobManager()
+        job_manager.job_ids_dir = os.path.join(tmpdir, "job_ids")
+        job_manager.submitted_jobs_dir = os.path.join(job_manager.job_ids_dir, "submitted")
+        os.makedirs(job_manager.submitted_jobs_dir, exist_ok=True)
+        job_manager.backend = SlurmBackend(f"{cmd} squeue", f"{cmd} scontrol", job_name="bot_job",
+                                           sacct_command=f"{cmd} sacct")
+        return job_manager
+
+    job_manager, restarted_job_manager = make_job_manager(), make_job_manager()
+
+    requester = MockRequester()
+    pull_request = MagicMock()
+    pull_request.requester = requester
+    pull_request.get_issue_comment.side_effect = lambda comment_id: requester.add_comment(comment_id, "job comment")
+    with patch('connections.github.get_pull', return_value=pull_request), \
+            patch('eessi_bot_job_manager.config.read_config', return_value=MagicMock()), \
+            patch('eessi_bot_job_manager.get_comment_templates', return_value=MagicMock()):
+        # the job manager stops before the bot jobs (2 and 4) are released
+        job_manager.registry = JobRegistry(os.path.join(tmpdir, "jobs.db"))
+        with patch.object(job_manager.backend, 'release_jobs', side_effect=lambda jobs: ([], [job["jobid"]
+                                                                                         for job in jobs])):
+            job_manager.run_iteration(job_manager.get_known_jobs(), job_manager.get_current_jobs())
+        assert sorted(job_manager.jobs_to_release.keys()) == ['2', '4']
+        job_manager.shutdown()
+        assert {job["state"] for job in JobRegistry(os.path.join(tmpdir, "jobs.db")).get_jobs().values()} == {
+            JOB_STATE_NEW}
+
+        # after a restart, the jobs that are still held are released
+        job_manager = restarted_job_manager
+        job_manager.registry = JobRegistry(os.path.join(tmpdir, "jobs.db"))
+        known_jobs = job_manager.get_known_jobs()
+        assert sorted(known_jobs.keys()) == ['2', '4']
+        current_jobs = job_manager.get_current_jobs()
+        assert {current_jobs[job_id]["reason"] for job_id in ['2', '4']} == {'JobHeldUser'}
+        job_manager.run_iteration(known_jobs, current_jobs)
+        assert job_manager.jobs_to_release == {}
+        current_jobs = job_manager.get_current_jobs()
+        assert {current_jobs[job_id]["state"] for job_id in ['2', '4']} == {'RUNNING'}
+        assert {job["state"] for job in job_manager.registry.get_jobs().values()} == {JOB_STATE_RELEASED}
+
+    job_manager.shutdown()
+
+
+def test_job_manager_unavailable_cluster(simulated_jobs, tmpdir):
+    # copy needed app.cfg from tests directory
+    shutil.copyfile("tests/test_app.cfg", "app.cfg")
+
+    cmd = simulator_cmd(simulated_jobs)
+    job_manager = EESSIBotSoftwareLayerJobManager()
+    job_manager.job_ids_dir = os.path.join(tmpdir, "job_ids")
+    job_manager.submitted_jobs_dir = os.path.join(job_manager.job_ids_dir, "submitted")
+    os.makedirs(job_manager.submitted_jobs_dir)
+    # the clusters are polled separately, the bot jobs (2 and 4) run on cluster b
+    job_manager.backend = SlurmBackend(f"{cmd} squeue", f"{cmd} scontrol --clusters=%(cluster)s",
+                                       job_name="bot_job", sacct_command=f"{cmd} sacct", clusters=['a', 'b'])
+
+    requester = MockRequester()
+    pull_request = MagicMock()
+    pull_request.requester = requester
+    pull_request.get_issue_comment.side_effect = lambda comment_id: requester.add_comment(comment_id, "job comment")
+    with patch('connections.github.get_pull', return_value=pull_request), \
+            patch('eessi_bot_job_manager.config.read_config', return_value=MagicMock()), \
+            patch('eessi_bot_job_manager.get_comment_templates', return_value=MagicMock()):
+        known_jobs = job_manager.get_known_jobs()
+        current_jobs = job_manager.get_current_jobs()
+        job_manager.run_iteration(known_jobs, current_jobs)
+        assert sorted(current_jobs.keys()) == ['2', '4']
+        assert {job["cluster"] for job in current_jobs.values()} == {'b'}
+
+        # while cluster b is unavailable, its jobs are kept (and not finished)
+        run_simulator(simulated_jobs, "configure", "--unavailable-clusters", "b")
+        run_simulator(simulated_jobs, "advance", "1000")
+        known_jobs = current_jobs
+        current_jobs = job_manager.get_current_jobs()
+        assert sorted(current_jobs.keys()) == ['1', '3']
+        assert job_manager.backend.unavailable_clusters == {'b'}
+        job_manager.run_iteration(known_jobs, current_jobs)
+        assert sorted(current_jobs.keys()) == ['2', '4']
+        assert not os.path.exists(os.path.join(job_manager.job_ids_dir, "finished"))
+
+        # once cluster b is available again, its jobs are noticed as finished
+        run_simulator(simulated_jobs, "configure", "--unavailable-clusters", "")
+        known_jobs = current_jobs
+        current_jobs = job_manager.get_current_jobs()
+        assert job_manager.backend.unavailable_clusters == frozenset()
+        job_manager.run_iteration(known_jobs, current_jobs)
+        assert current_jobs == {}
+        finished_jobs = job_manager.get_finished_jobs()
+        assert len(finished_jobs) == 2
+        assert all(os.path.islink(finished_jobs.find(job_id)) for job_id in ['2', '4'])
+
+    job_manager.shutdown()
@@ -15,10 +15,13 @@
 #
 
 # Standard library imports
+import configparser
 import filecmp
+import json
 import os
 import re
 import shutil
+import time
 from unittest.mock import patch
 
 # Third party imports (anything installed into the local Python environment)
@@ -27,8 +30,8 @@ from datetime import datetime
 import pytest
 
 # Local application imports (anything from EESSI/eessi-bot-software-layer)
-from tasks.build import Job, create_pr_comment
-from tools import run_cmd, run_subprocess
+from tasks.build import Job, create_pr_comment, get_build_status_from_comments, get_build_status_from_job_dirs
+from tools import run_cmd, run_subprocess, TIMEOUT_EXIT_CODE
 from tools.build_params import EESSIBotBuildParams
 from tools.job_metadata import create_metadata_file, read_metadata_file
 from tools.pr_comments import PRComment, get_submitted_job_comment
@@ -113,6 +116,26 @@ def test_run_subprocess(tmpdir):
         assert "test in file" in fp.read()
 
 
+def test_run_subprocess_timeout(tmpdir):
+    """Tests for run_subprocess and run_cmd with a timeout."""
+    log_file = os.path.join(tmpdir, "log.txt")
+    output, err, exit_code = run_subprocess("echo hello", 'test', tmpdir, log_file=log_file, timeout=10)
+    assert exit_code == 0
+    assert output == "hello\n"
+
+    # the command and the processes it started are killed
+    start = time.time()
+    output, err, exit_code = run_subprocess("echo started; sleep 30; echo done", 'timeout test', tmpdir,
+                                            log_file=log_file, timeout=0.5)
+    assert time.time() - start < 10
+    assert exit_code == TIMEOUT_EXIT_CODE
+    assert output == "started\n"
+    assert "timed out" in err
+
+    with pytest.raises(RuntimeError):
+        run_cmd("sleep 30", 'timeout test', tmpdir, log_file=log_file, timeout=0.5)
+
+
 class CreateIssueCommentException(Exception):
     "Raised when pr.create_issue_comment fails in a test."
     pass
@@ -161,6 +184,9 @@ class MockGitHub:
     def get_instance(self):
         return self
 
+    def get_pull(self, repo_name, pr_number):
+        return self.get_repo(repo_name).get_pull(pr_number)
+
 
 MockBase = namedtuple('MockBase', ['repo'])
 
@@ -490,3 +516,79 @@ def test_create_read_metadata_file(mocked_github, tmpdir):
     job_id5 = "555"
     with pytest.raises(TypeError):
         create_metadata_file(job5, job_id5, pr_comment)
+
+
+def test_get_build_status_from_job_dirs(tmpdir):
+    cfg = configparser.ConfigParser()
+    cfg["architecturetargets"] = {"node_type_map": json.dumps({
+        "cpu_zen2": {"os": "linux", "cpu_subdir": "x86_64/amd/zen2"},
+        "gpu_zen3": {"os": "linux", "cpu_subdir": "x86_64/amd/zen3", "accel": "nvidia/cc80"},
+    })}
+
+    def make_job_dir(job_id, repo_name, pr_number, node_type, result=None, test=None):
+        job_dir = os.path.join(tmpdir, str(job_id))
+        os.makedirs(os.path.join(job_dir, "cfg"))
+        with open(os.path.join(job_dir, f"_bot_job{job_id}.metadata"), "w") as metadata_file:
+            metadata_file.write(f"[PR]\nrepo = {repo_name}\npr_number = {pr_number}\npr_comment_id = {job_id}0\n")
+        with open(os.path.join(job_dir, "cfg", "job.cfg"), "w") as job_cfg_file:
+            job_cfg_file.write(f"[repository]\nrepo_id = eessi.io-2023.06-software\n[architecture]\n"
+                               f"node_type = {node_type}\nsoftware_subdir = x86_64/amd/zen2\naccelerator =\n")
+        if result:
+            with open(os.path.join(job_dir, f"_bot_job{job_id}.result"), "w") as result_file:
+                result_file.write(f"[RESULT]\nstatus = {result}\n")
+        if test:
+            with open(os.path.join(job_dir, f"_bot_job{job_id}.test"), "w") as test_file:
+                test_file.write(f"[TEST]\ncomment_description = tests {test.lower()}\nstatus = {test}\n")
+        return job_dir
+
+    job_dirs = [
+        make_job_dir(12, "org/repo", 7, "gpu_zen3", result="FAILURE"),
+        make_job_dir(9, "org/repo", 7, "cpu_zen2", result="SUCCESS", test="FAILURE"),
+        # not finished yet
+        make_job_dir(13, "org/repo", 7, "cpu_zen2"),
+        # PR with the same number in another repository
+        make_job_dir(14, "org/other", 7, "cpu_zen2", result="SUCCESS"),
+    ]
+    status_table = get_build_status_from_job_dirs(job_dirs, "org/repo", 7, cfg)
+    assert status_table["on arch"] == ["`amd-zen2`", "`amd-zen3`, `nvidia/cc80`"]
+    assert status_table["for arch"] == ["`x86_64/amd/zen2`"] * 2
+    assert status_table["for repo"] == ["eessi.io-2023.06-software"] * 2
+    assert status_table["status"] == ["finished"] * 2
+    assert status_table["result"] == [":grin: SUCCESS", ":cry: FAILURE"]
+    # no test file for job 12
+    assert status_table["test"] == [":cry: FAILURE", ":shrug: UNKNOWN"]
+    assert status_table["url"] == ["https://github.com/org/repo/pull/7#issuecomment-90",
+                                   "https://github.com/org/repo/pull/7#issuecomment-120"]
+    # same format as dates in job comments
+    for date in status_table["date"]:
+        datetime.strptime(date, "%b %d %X %Z %Y")
+
+
+def test_get_build_status_from_comments():
+    cfg = configparser.ConfigParser()
+    cfg.read("tests/test_app.cfg")
+    comments = [
+        {"body": "New job on instance `bot` for repository `eessi.io-2023.06-software`\n"
+                 "Building on: `amd-zen3`&nbsp;and accelerator `nvidia/cc80`\n"
+                 "Building for: `x86_64/amd/zen3`\n"
+                 "Job dir: `/jobs/2024.01/pr_7/42`\n"
+                 "|date|job status|comment|\n"
+                 "|----------|----------|------------------------|\n"
+                 "|Jan 01 10:00:00 UTC 2024|submitted|job id `42` awaits release by job manager|\n"
+                 "|Jan 01 11:00:00 UTC 2024|finished|:grin: SUCCESS _(click triangle for details)_|\n"
+                 "|Jan 01 11:00:01 UTC 2024|test result|:cry: FAILURE _(click triangle for details)_|",
+         "html_url": "https://github.com/org/repo/pull/7#issuecomment-1"},
+        {"body": "bot: status", "html_url": "https://github.com/org/repo/pull/7#issuecomment-2"},
+    ]
+    status_table = get_build_status_from_comments(comments, cfg)
+    assert status_table == {
+        "on arch": ["`amd-zen3`, `nvidia/cc80`"], "for arch": ["`x86_64/amd/zen3`"],
+        "for repo": ["eessi.io-2023.06-software"], "date": ["Jan 01 11:00:00 UTC 2024"], "status": ["finished"],
+        "url": ["https://github.com/org/repo/pull/7#issuecomment-1"], "result": [":grin: SUCCESS"],
+        "test": [":cry: FAILURE"],
+    }
+
+    # comments of the bot whose lines do not match the templates
+    comments[0]["body"] = comments[0]["body"].replace("Building for", "Built for")
+    with pytest.raises(ValueError):
+        get_build_status_from_comments(comments, cfg)
@@ -0,0 +1,297 @@
+# Tests for functions defined in 'tools/batch_backend.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import json
+from unittest.mock import patch
+
+# Third party imports (anything installed into the local Python environment)
+import pytest
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.batch_backend import BatchJob, SlurmBackend, SQUEUE_FORMAT_DELIMITED, SQUEUE_FORMAT_JSON
+
+
+def test_batch_job():
+    job = BatchJob('42', 'cluster1', 'part1', 'PENDING', 'JobHeldUser', 'N/A')
+
+    assert job['jobid'] == '42'
+    assert job.state == 'PENDING'
+    assert 'reason' in job
+    assert 'foo' not in job
+    assert job.get('foo', 'bar') == 'bar'
+    with pytest.raises(KeyError):
+        job['foo']
+    assert "scontrol --clusters=%(cluster)s" % job == "scontrol --clusters=cluster1"
+    assert job == {'jobid': '42', 'cluster': 'cluster1', 'partition': 'part1',
+                   'state': 'PENDING', 'reason': 'JobHeldUser', 'end_time': 'N/A'}
+    assert dict(job)['partition'] == 'part1'
+
+
+def test_get_squeue_command(monkeypatch):
+    monkeypatch.setenv('USER', 'bot')
+
+    backend = SlurmBackend("squeue", "scontrol", job_name="bot_job")
+    assert backend.get_squeue_command().startswith("squeue --noheader --user=bot --name='bot_job' --Format ")
+
+    backend = SlurmBackend("squeue", "scontrol", squeue_format=SQUEUE_FORMAT_DELIMITED)
+    assert backend.get_squeue_command() == "squeue --noheader --user=bot --format='%i|%P|%T|%r|%e'"
+
+    backend = SlurmBackend("squeue", "scontrol", squeue_format=SQUEUE_FORMAT_JSON)
+    assert backend.get_squeue_command() == "squeue --user=bot --json"
+
+    with pytest.raises(ValueError):
+        SlurmBackend("squeue", "scontrol", squeue_format="xml")
+
+
+def test_parse_squeue_output():
+    backend = SlurmBackend("squeue", "scontrol")
+
+    output = ("1   @c1  @p1  @PENDING @JobHeldUser @N/A\n"
+              "2   @c2  @p2  @RUNNING @None        @2024-01-01T12:00:00\n")
+    jobs = backend.parse_squeue_fixed_output(output)
+    assert sorted(jobs.keys()) == ['1', '2']
+    assert jobs['1'] == BatchJob('1', 'c1', 'p1', 'PENDING', 'JobHeldUser', 'N/A')
+    assert jobs['2'].end_time == '2024-01-01T12:00:00'
+    with pytest.raises(Exception):
+        backend.parse_squeue_fixed_output("1@c1@p1\n")
+
+    output = ("CLUSTER: c1\n"
+              "1|p1|PENDING|JobHeldUser|N/A\n"
+              "CLUSTER: c2\n"
+              "2|p2|RUNNING|None|2024-01-01T12:00:00\n")
+    jobs = backend.parse_squeue_delimited_output(output)
+    assert jobs['1'] == BatchJob('1', 'c1', 'p1', 'PENDING', 'JobHeldUser', 'N/A')
+    assert jobs['2'] == BatchJob('2', 'c2', 'p2', 'RUNNING', 'None', '2024-01-01T12:00:00')
+
+    output = json.dumps({'jobs': [
+        # format used by older Slurm versions
+        {'job_id': 1, 'cluster': 'c1', 'partition': 'p1', 'job_state': 'PENDING',
+         'state_reason': 'JobHeldUser', 'end_time': 0},
+        # format used by newer Slurm versions
+        {'job_id': 2, 'cluster': 'c2', 'partition': 'p2', 'job_state': ['RUNNING'],
+         'state_reason': 'None', 'end_time': {'set': True, 'infinite': False, 'number': 1704110400}},
+    ]})
+    jobs = backend.parse_squeue_json_output(output)
+    assert jobs['1'] == BatchJob('1', 'c1', 'p1', 'PENDING', 'JobHeldUser', 'N/A')
+    assert jobs['2'].state == 'RUNNING'
+    assert jobs['2'].end_time.startswith('2024-01-01T')
+
+
+def test_parse_scontrol_show_job_output():
+    backend = SlurmBackend("squeue", "scontrol")
+
+    output = ("JobId=42 JobName=bot build UserId=bot(1000) JobState=PENDING Reason=JobHeldUser "
+              "TRES=cpu=1,mem=2G,node=1 CPUs/Task=1 ReqB:S:C:T=0:0:*:* "
+              "WorkDir=/home/bot/jobs/2024.01/pr_1/event 1/run_000/x86_64 Comment=a comment\n")
+    job_info = backend.parse_scontrol_show_job_output(output)
+
+    assert job_info['JobId'] == '42'
+    assert job_info['JobName'] == 'bot build'
+    assert job_info['UserId'] == 'bot(1000)'
+    assert job_info['TRES'] == 'cpu=1,mem=2G,node=1'
+    assert job_info['CPUs/Task'] == '1'
+    assert job_info['ReqB:S:C:T'] == '0:0:*:*'
+    assert job_info['WorkDir'] == '/home/bot/jobs/2024.01/pr_1/event 1/run_000/x86_64'
+    assert job_info['Comment'] == 'a comment'
+
+    assert backend.parse_scontrol_show_job_output('') == {}
+
+
+def test_parse_scontrol_show_jobs_output():
+    backend = SlurmBackend("squeue", "scontrol")
+
+    output = ("JobId=1 JobState=PENDING WorkDir=/tmp/job 1\n"
+              "\n"
+              "JobId=2 JobState=RUNNING WorkDir=/tmp/job2\n")
+    jobs_info = backend.parse_scontrol_show_jobs_output(output)
+
+    assert sorted(jobs_info.keys()) == ['1', '2']
+    assert jobs_info['1']['WorkDir'] == '/tmp/job 1'
+    assert jobs_info['2']['JobState'] == 'RUNNING'
+
+
+def test_describe_jobs():
+    backend = SlurmBackend("squeue", "scontrol --clusters=%(cluster)s")
+
+    jobs = [
+        {'jobid': '1', 'cluster': 'a'},
+        {'jobid': '2', 'cluster': 'b'},
+        {'jobid': '3', 'cluster': 'a'},
+    ]
+
+    commands = []
+
+    def mock_run_cmd(cmd, log_msg='', working_dir=None, log_file=None, raise_on_error=True, env=None,
+                     timeout=None):
+        commands.append(cmd)
+        job_ids = cmd.split()[-1].split(',')
+        output = "\n".join(f"JobId={job_id} WorkDir=/tmp/{job_id}" for job_id in job_ids)
+        return output, '', 0
+
+    with patch('tools.batch_backend.run_cmd', side_effect=mock_run_cmd):
+        jobs_info = backend.describe_jobs(jobs)
+
+    # one scontrol command per cluster
+    assert commands == [
+        "scontrol --clusters=a --oneliner show job 1,3",
+        "scontrol --clusters=b --oneliner show job 2",
+    ]
+    assert sorted(jobs_info.keys()) == ['1', '2', '3']
+    assert jobs_info['3']['WorkDir'] == '/tmp/3'
+
+    # if the bulk query does not provide information for all jobs, missing
+    # jobs are queried one by one
+    commands.clear()
+
+    def mock_run_cmd_no_list(cmd, log_msg='', working_dir=None, log_file=None, raise_on_error=True, env=None,
+                             timeout=None):
+        commands.append(cmd)
+        job_ids = cmd.split()[-1]
+        if ',' in job_ids:
+            return '', 'Invalid job id specified', 1
+        return f"JobId={job_ids} WorkDir=/tmp/{job_ids}", '', 0
+
+    with patch('tools.batch_backend.run_cmd', side_effect=mock_run_cmd_no_list):
+        jobs_info = backend.describe_jobs(jobs)
+
+    assert len(commands) == 4
+    assert sorted(jobs_info.keys()) == ['1', '2', '3']
+
+
+def test_release_jobs():
+    backend = SlurmBackend("squeue", "scontrol --clusters=%(cluster)s")
+
+    jobs = [
+        {'jobid': '1', 'cluster': 'a'},
+        {'jobid': '2', 'cluster': 'a'},
+        {'jobid': '3', 'cluster': 'b'},
+    ]
+
+    commands = []
+
+    def mock_run_cmd(cmd, log_msg='', working_dir=None, log_file=None, raise_on_error=True, env=None,
+                     timeout=None):
+        commands.append(cmd)
+        # releasing job 2 always fails
+        if '2' in cmd.split()[-1].split(','):
+            return '', 'Job has already finished', 1
+        return '', '', 0
+
+    with patch('tools.batch_backend.run_cmd', side_effect=mock_run_cmd):
+        released, failed = backend.release_jobs(jobs)
+
+    assert commands == [
+        "scontrol --clusters=a release 1,2",
+        "scontrol --clusters=a release 1",
+        "scontrol --clusters=a release 2",
+        "scontrol --clusters=b release 3",
+    ]
+    assert sorted(released) == ['1', '3']
+    assert failed == ['2']
+
+
+def test_list_jobs_clusters(monkeypatch):
+    monkeypatch.setenv('USER', 'bot')
+    backend = SlurmBackend("squeue", "scontrol", squeue_format=SQUEUE_FORMAT_DELIMITED, clusters=['a', 'b', 'c'],
+                           command_timeout=10, failure_threshold=2, retry_interval=3600)
+    assert backend.get_squeue_command('a').startswith("squeue --noheader --user=bot --clusters=a ")
+
+    down_clusters = {'b'}
+    timeouts = []
+
+    def mock_run_cmd(cmd, log_msg='', working_dir=None, log_file=None, raise_on_error=True, env=None,
+                     timeout=None):
+        timeouts.append(timeout)
+        cluster = cmd.split('--clusters=')[1].split()[0]
+        if cluster in down_clusters:
+            raise RuntimeError(f"squeue on cluster {cluster} timed out")
+        job_id = {'a': '1', 'b': '2', 'c': '3'}[cluster]
+        return f"CLUSTER: {cluster}\n{job_id}|part|RUNNING|None|N/A\n", '', 0
+
+    with patch('tools.batch_backend.run_cmd', side_effect=mock_run_cmd) as mock_cmd:
+        # the jobs of all clusters that could be polled are merged
+        jobs = backend.list_jobs()
+        assert sorted(jobs.keys()) == ['1', '3']
+        assert jobs['3'].cluster == 'c'
+        assert backend.unavailable_clusters == {'b'}
+        assert timeouts == [10, 10, 10]
+
+        # after failure_threshold failed polls, the cluster is skipped
+        backend.list_jobs()
+        mock_cmd.reset_mock()
+        jobs = backend.list_jobs()
+        assert sorted(jobs.keys()) == ['1', '3']
+        assert backend.unavailable_clusters == {'b'}
+        assert mock_cmd.call_count == 2
+
+        # if no cluster can be polled, list_jobs fails
+        down_clusters = {'a', 'c'}
+        with pytest.raises(RuntimeError):
+            backend.list_jobs()
+        assert backend.unavailable_clusters == {'a', 'b', 'c'}
+
+    # without clusters, a single squeue command is run
+    backend = SlurmBackend("squeue", "scontrol", squeue_format=SQUEUE_FORMAT_DELIMITED)
+    with patch('tools.batch_backend.run_cmd', return_value=("1|part|RUNNING|None|N/A\n", '', 0)) as mock_cmd:
+        assert list(backend.list_jobs().keys()) == ['1']
+    mock_cmd.assert_called_once()
+    assert backend.unavailable_clusters == frozenset()
+
+
+def test_cancel_jobs():
+    backend = SlurmBackend("squeue", "scontrol", scancel_command="scancel --clusters=%(cluster)s")
+
+    jobs = [BatchJob('1', 'a'), BatchJob('2', 'a')]
+    with patch('tools.batch_backend.run_cmd', return_value=('', '', 0)) as mock_run_cmd:
+        cancelled, failed = backend.cancel_jobs(jobs)
+
+    mock_run_cmd.assert_called_once()
+    assert mock_run_cmd.call_args[0][0] == "scancel --clusters=a 1 2"
+    assert cancelled == ['1', '2']
+    assert failed == []
+
+
+def test_parse_sacct_output():
+    output = ("1|COMPLETED|0:0|00:10:00||node1\n"
+              "1.batch|COMPLETED|0:0|00:10:00|512M|node1\n"
+              "1.0|COMPLETED|0:0|00:09:00|2G|node1\n"
+              "2|FAILED|1:0|00:00:05||node2\n"
+              "3.batch|COMPLETED|0:0|00:00:01|1K|node3\n"
+              "garbage\n")
+    accounting = SlurmBackend.parse_sacct_output(output)
+
+    assert sorted(accounting.keys()) == ['1', '2']
+    assert accounting['1']['state'] == 'COMPLETED'
+    assert accounting['1']['maxrss'] == '2G'
+    assert accounting['1']['elapsed'] == '00:10:00'
+    assert accounting['2']['exitcode'] == '1:0'
+    assert accounting['2']['nodelist'] == 'node2'
+
+    backend = SlurmBackend("squeue", "scontrol")
+    jobs = [BatchJob('1', cluster='a'), BatchJob('2', cluster='b')]
+    with patch('tools.batch_backend.run_cmd', return_value=(output, '', 0)) as mock_run_cmd:
+        assert sorted(backend.accounting(jobs).keys()) == ['1', '2']
+    assert mock_run_cmd.call_args[0][0] == ("sacct --parsable2 --noheader --jobs=1,2"
+                                            " --format=JobID,State,ExitCode,Elapsed,MaxRSS,NodeList")
+    assert backend.accounting([]) == {}
+
+    # with clusters, sacct is run once per cluster (jobs whose cluster is not
+    # known are queried on all clusters)
+    backend = SlurmBackend("squeue", "scontrol", clusters=['a', 'b'])
+    with patch('tools.batch_backend.run_cmd', return_value=(output, '', 0)) as mock_run_cmd:
+        assert sorted(backend.accounting(jobs + [{'jobid': '3'}]).keys()) == ['1', '2']
+    sacct_format = "--format=JobID,State,ExitCode,Elapsed,MaxRSS,NodeList"
+    assert [call[0][0] for call in mock_run_cmd.call_args_list] == [
+        f"sacct --parsable2 --noheader --jobs=1 {sacct_format} --clusters=a",
+        f"sacct --parsable2 --noheader --jobs=2 {sacct_format} --clusters=b",
+        f"sacct --parsable2 --noheader --jobs=3 {sacct_format} --clusters=a,b",
+    ]
@@ -0,0 +1,52 @@
+# Tests for functions defined in 'tools/circuit_breaker.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+from unittest.mock import patch
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.circuit_breaker import CircuitBreaker, CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN
+
+
+def test_circuit_breaker():
+    now = [1000.0]
+    with patch('tools.circuit_breaker.time.monotonic', side_effect=lambda: now[0]):
+        breaker = CircuitBreaker(failure_threshold=2, retry_interval=60)
+        assert breaker.state == CIRCUIT_CLOSED
+        assert breaker.allow()
+
+        # the circuit opens after two consecutive failures
+        assert not breaker.record_failure()
+        assert breaker.allow()
+        assert breaker.record_failure()
+        assert breaker.state == CIRCUIT_OPEN
+        assert not breaker.allow()
+
+        # after the retry interval, a single attempt is allowed
+        now[0] += 61
+        assert breaker.state == CIRCUIT_HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()
+
+        # a failed attempt opens the circuit again right away
+        assert breaker.record_failure()
+        assert not breaker.allow()
+
+        # a successful attempt closes the circuit
+        now[0] += 61
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CIRCUIT_CLOSED
+        assert breaker.allow()
+        assert not breaker.record_failure()
@@ -0,0 +1,50 @@
+# Tests for functions defined in 'tools/comment_cache.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import os
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.comment_cache import CommentCache, get_body_hash
+
+
+def test_comment_cache(tmpdir):
+    path = os.path.join(tmpdir, "comments.db")
+    comment_cache = CommentCache(path)
+    assert comment_cache.get(1) is None
+
+    comment_cache.put(1, "https://api.github.com/repos/org/repo/issues/comments/1", "body", 'W/"abc"')
+    entry = comment_cache.get(1)
+    assert entry["body"] == "body"
+    assert entry["body_hash"] == get_body_hash("body")
+    assert entry["etag"] == 'W/"abc"'
+
+    # entries are replaced, the ETag may be unknown
+    comment_cache.put(1, entry["url"], "new body")
+    assert comment_cache.get(1)["body_hash"] == get_body_hash("new body")
+    assert comment_cache.get(1)["etag"] is None
+    comment_cache.close()
+
+    # entries are persistent
+    comment_cache = CommentCache(path)
+    assert comment_cache.get(1)["body"] == "new body"
+    comment_cache.forget(1)
+    assert comment_cache.get(1) is None
+
+    # old entries are removed when the cache is opened
+    comment_cache.put(2, "url", "body")
+    comment_cache.close()
+    comment_cache = CommentCache(path, max_age_days=-1)
+    assert comment_cache.get(2) is None
+    comment_cache.close()
@@ -0,0 +1,70 @@
+# Tests for functions defined in 'tools/comment_templates.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import configparser
+
+# Third party imports (anything installed into the local Python environment)
+import pytest
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools import config
+from tools.comment_templates import CommentTemplate, get_comment_templates
+
+
+def make_cfg(running_job="job `{job_id}` is running"):
+    cfg = configparser.ConfigParser()
+    cfg.read("tests/test_app.cfg")
+    cfg[config.SECTION_RUNNING_JOB_COMMENTS][config.RUNNING_JOB_COMMENTS_SETTING_RUNNING_JOB] = running_job
+    return cfg
+
+
+def test_comment_template():
+    template = CommentTemplate("Building on: `{on_arch}`{on_accelerator}")
+    assert template.fields == ("on_arch", "on_accelerator")
+
+    # round trip (fields not used by the template are ignored)
+    line = template.render(on_arch="zen2", on_accelerator="", job_id=1)
+    assert line == "Building on: `zen2`"
+    assert template.parse(line) == {"on_arch": "zen2", "on_accelerator": ""}
+    assert template.parse("Building for: `zen2`") is None
+
+    # derived templates are cached
+    with_accel = template.partial(on_accelerator=" and accelerator `{accelerator}`")
+    assert with_accel is template.partial(on_accelerator=" and accelerator `{accelerator}`")
+    assert with_accel.template == "Building on: `{on_arch}` and accelerator `{accelerator}`"
+    assert with_accel.parse("Building on: `zen3` and accelerator `nvidia/cc80`") == {
+        "on_arch": "zen3", "accelerator": "nvidia/cc80"}
+    assert with_accel.parse(line) is None
+
+    # special characters in the template are matched literally
+    template = CommentTemplate("job id `{job_id}` (*) awaits release")
+    assert template.parse("job id `42` (*) awaits release") == {"job_id": "42"}
+    assert template.parse("job id `42` () awaits release") is None
+
+
+def test_get_comment_templates():
+    cfg = make_cfg()
+    templates = get_comment_templates(cfg)
+    # the registry is only built again when templates changed
+    assert get_comment_templates(make_cfg()) is templates
+
+    running_job = templates[config.SECTION_RUNNING_JOB_COMMENTS, config.RUNNING_JOB_COMMENTS_SETTING_RUNNING_JOB]
+    assert running_job.render(job_id=42) == "job `42` is running"
+    assert templates.get(config.SECTION_FINISHED_JOB_COMMENTS, "undefined") is None
+    with pytest.raises(KeyError):
+        templates[config.SECTION_FINISHED_JOB_COMMENTS, "undefined"]
+    # only the templates of job comments are in the registry
+    assert templates.get(config.SECTION_BUILDENV, config.BUILDENV_SETTING_JOBS_BASE_DIR) is None
+
+    templates = get_comment_templates(make_cfg(running_job="job {job_id} runs"))
+    running_job = templates[config.SECTION_RUNNING_JOB_COMMENTS, config.RUNNING_JOB_COMMENTS_SETTING_RUNNING_JOB]
+    assert running_job.parse("job 42 runs") == {"job_id": "42"}
@@ -0,0 +1,77 @@
+# Tests for functions defined in 'tools/delivery_store.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import os
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.delivery_store import DeliveryStore, DUPLICATE_DELIVERY, DUPLICATE_PAYLOAD, get_payload_hash
+
+
+def make_event_info(delivery_id, comment_id):
+    return {
+        "id": delivery_id,
+        "type": "issue_comment",
+        "raw_request_body": {"action": "created", "comment": {"id": comment_id, "body": "bot: build"}},
+    }
+
+
+def test_get_payload_hash():
+    # redeliveries with a new delivery id have the same payload
+    assert get_payload_hash(make_event_info("a", 1)) == get_payload_hash(make_event_info("b", 1))
+    assert get_payload_hash(make_event_info("a", 1)) != get_payload_hash(make_event_info("a", 2))
+
+
+def test_delivery_store(tmpdir):
+    path = os.path.join(tmpdir, "deliveries.db")
+    store = DeliveryStore(path)
+    hash1 = get_payload_hash(make_event_info("a", 1))
+    hash2 = get_payload_hash(make_event_info("b", 2))
+    assert store.check("a", hash1) is None
+    assert store.register("a", hash1, event_type="issue_comment")
+    assert not store.register("a", hash1)
+    assert store.check("a", hash1) == DUPLICATE_DELIVERY
+    # same payload with a new delivery id
+    assert store.check("c", hash1) == DUPLICATE_PAYLOAD
+    assert not store.register("c", hash1)
+    assert store.register("b", hash2)
+    assert len(store) == 2
+    store.close()
+
+    # deliveries are remembered across restarts
+    store = DeliveryStore(path)
+    assert store.check("b", hash2) == DUPLICATE_DELIVERY
+    store.forget("b")
+    assert store.check("b", hash2) is None
+    store.close()
+
+    # expired deliveries are ignored and removed
+    store = DeliveryStore(path, ttl=-1)
+    assert store.check("a", hash1) is None
+    assert len(store) == 0
+    assert store.register("a", hash1)
+    assert store.register("a", hash1)
+    store.close()
+
+
+def test_delivery_store_max_entries():
+    store = DeliveryStore(max_entries=3)
+    for idx in range(5):
+        assert store.register(str(idx), f"hash{idx}")
+    with store.lock:
+        store.prune()
+    assert len(store) == 3
+    assert store.check("0", "hash0") is None
+    assert store.check("4", "hash4") == DUPLICATE_DELIVERY
+    store.close()
@@ -0,0 +1,91 @@
+# Tests for functions defined in 'tools/event_archive.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import gzip
+import json
+import os
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.event_archive import EVENT_ARCHIVE_INDEX_FILE_NAME, EventArchive, read_event_files
+
+
+def make_event_info(delivery_id, pr_number=None, event_type="issue_comment"):
+    body = {"action": "created", "repository": {"full_name": "org/repo"}}
+    if pr_number is not None:
+        body["issue"] = {"number": pr_number}
+    return {
+        "id": delivery_id,
+        "type": event_type,
+        "action": "created",
+        "timestamp_raw": 1700000000000,
+        "raw_request_body": body,
+        "raw_request_headers": {"X-GitHub-Delivery": delivery_id},
+        "raw_request_data": b"not archived",
+    }
+
+
+def test_event_archive(tmpdir):
+    path = os.path.join(tmpdir, "archive")
+    archive = EventArchive(path)
+    archive.append(make_event_info("a", pr_number=1), received=1700000000)
+    archive.append(make_event_info("b", pr_number=2), received=1700000001)
+    # the next day goes to a new segment
+    archive.append(make_event_info("c", event_type="installation"), received=1700000000 + 24 * 3600)
+    assert len(archive) == 3
+
+    entries = archive.get_entries()
+    assert [entry["delivery_id"] for entry in entries] == ["a", "b", "c"]
+    assert entries[0]["segment"] == entries[1]["segment"] == "events-2023-11-14.jsonl.gz"
+    assert entries[2]["segment"] == "events-2023-11-15.jsonl.gz"
+    assert [entry["delivery_id"] for entry in archive.get_entries(pr="org/repo#2")] == ["b"]
+    assert [entry["delivery_id"] for entry in archive.get_entries(event_type="installation")] == ["c"]
+
+    event_info = archive.read(archive.get_entries(delivery_id="b")[0])
+    assert event_info["raw_request_body"]["issue"]["number"] == 2
+    assert event_info["timestamp"].year == 2023
+    assert "raw_request_data" not in event_info
+
+    # segments can be read with standard tools
+    with gzip.open(os.path.join(path, entries[0]["segment"]), "rt") as segment_file:
+        assert [json.loads(line)["event_info"]["id"] for line in segment_file] == ["a", "b"]
+
+    # partially written lines of the index are ignored
+    with open(os.path.join(path, EVENT_ARCHIVE_INDEX_FILE_NAME), "a") as index_file:
+        index_file.write("d\tissue_comment")
+    assert len(EventArchive(path)) == 3
+
+
+def test_read_event_files(tmpdir):
+    headers = {"X-Github-Delivery": "a", "X-Github-Event": "issue_comment", "X-Hub-Signature": "sha1=0"}
+    body = {"action": "created", "issue": {"number": 1}}
+    # pair of files as logged by the event handler
+    log_dir = os.path.join(tmpdir, "events_log", "issue_comment", "created", "2024-01-01")
+    os.makedirs(log_dir)
+    with open(os.path.join(log_dir, "2024-01-01T10-00-00_a_headers.json"), "w") as headers_file:
+        json.dump(headers, headers_file)
+    with open(os.path.join(log_dir, "2024-01-01T10-00-00_a_body.json"), "w") as body_file:
+        json.dump(body, body_file)
+    # single file as accepted by the option '--file'
+    with open(os.path.join(tmpdir, "2024-01-01T09-00-00_b.json"), "w") as event_file:
+        json.dump({"headers": dict(headers, **{"X-Github-Delivery": "b"}), "json": body}, event_file)
+    # files that are not events are skipped
+    with open(os.path.join(tmpdir, "other.json"), "w") as other_file:
+        json.dump([], other_file)
+
+    events = read_event_files(str(tmpdir))
+    assert [event_info["id"] for event_info in events] == ["b", "a"]
+    assert events[1]["type"] == "issue_comment"
+    assert events[1]["action"] == "created"
+    assert events[1]["raw_request_body"] == body
@@ -0,0 +1,116 @@
+# Tests for functions defined in 'tools/event_queue.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import os
+import threading
+import time
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.event_queue import EVENT_QUEUE_FAILED, EventQueue, get_event_key
+from tools.metrics import bot_metrics, METRIC_EVENT_QUEUE_DEPTH, METRIC_EVENT_QUEUE_OLDEST, METRIC_EVENTS_HANDLED
+
+
+def make_event(event_id, pr_number=None, event_type="issue_comment"):
+    body = {"repository": {"full_name": "EESSI/software-layer"}}
+    if pr_number is not None:
+        body["issue"] = {"number": pr_number}
+    return {
+        "action": "created",
+        "id": event_id,
+        "type": event_type,
+        "timestamp_raw": 1700000000000,
+        "date": "2023-11-14",
+        "time": "22-13-20",
+        "raw_request_body": body,
+        "raw_request_headers": {"X-Github-Delivery": event_id},
+        # not stored in the queue
+        "raw_request_data": b"{}",
+    }
+
+
+def test_get_event_key():
+    assert get_event_key(make_event("1", pr_number=42)) == "EESSI/software-layer#42"
+    event = make_event("2")
+    event["raw_request_body"]["pull_request"] = {"number": 7}
+    assert get_event_key(event) == "EESSI/software-layer#7"
+    assert get_event_key(make_event("3", event_type="installation")) == "event:3"
+
+
+def test_event_queue_ordering(tmpdir):
+    queue = EventQueue(str(tmpdir))
+    first = queue.put(make_event("a1", pr_number=1))
+    queue.put(make_event("a2", pr_number=1))
+    queue.put(make_event("b1", pr_number=2))
+    assert len(queue) == 3
+    assert bot_metrics.get(METRIC_EVENT_QUEUE_DEPTH) == 3
+    assert bot_metrics.get(METRIC_EVENT_QUEUE_OLDEST) == first["received"]
+
+    # the second event of PR 1 is not handed out while the first is handled
+    item = queue.claim(timeout=0)
+    assert item["event_info"]["id"] == "a1"
+    assert "raw_request_data" not in item["event_info"]
+    assert queue.claim(timeout=0)["event_info"]["id"] == "b1"
+    assert queue.claim(timeout=0) is None
+    queue.done(item)
+    assert queue.claim(timeout=0)["event_info"]["id"] == "a2"
+    assert bot_metrics.get(METRIC_EVENT_QUEUE_DEPTH) == 0
+    assert bot_metrics.get(METRIC_EVENT_QUEUE_OLDEST) == 0
+
+
+def test_event_queue_restart(tmpdir):
+    queue = EventQueue(str(tmpdir))
+    queue.put(make_event("1", pr_number=1))
+    queue.put(make_event("2", pr_number=2))
+    queue.claim(timeout=0)
+
+    # pending events are kept, the interrupted event is not handled again
+    queue = EventQueue(str(tmpdir))
+    assert len(queue) == 1
+    assert queue.claim(timeout=0)["event_info"]["id"] == "2"
+    assert len(os.listdir(os.path.join(tmpdir, EVENT_QUEUE_FAILED))) == 1
+
+
+def test_event_queue_workers(tmpdir):
+    queue = EventQueue(str(tmpdir))
+    handled = []
+    lock = threading.Lock()
+
+    def handler(event_info):
+        if event_info["id"] == "fail":
+            raise Exception("handler failed")
+        # give other workers the chance to handle events of the same PR
+        time.sleep(0.01)
+        with lock:
+            handled.append((event_info["id"], event_info["timestamp"].year))
+
+    failed_before = bot_metrics.get(METRIC_EVENTS_HANDLED, type="issue_comment", result="failed") or 0
+    queue.start(handler, workers=4)
+    for idx in range(10):
+        queue.put(make_event(f"pr1-{idx}", pr_number=1))
+        queue.put(make_event(f"pr2-{idx}", pr_number=2))
+    queue.put(make_event("fail", pr_number=3))
+
+    deadline = time.time() + 10
+    while (len(queue) or queue.active_keys) and time.time() < deadline:
+        time.sleep(0.01)
+    queue.stop()
+
+    # events of the same PR were handled in the order they were received
+    assert [event_id for event_id, _ in handled if event_id.startswith("pr1")] == [f"pr1-{i}" for i in range(10)]
+    assert [event_id for event_id, _ in handled if event_id.startswith("pr2")] == [f"pr2-{i}" for i in range(10)]
+    assert handled[0][1] == 2023
+    # the failed event is kept
+    assert len(os.listdir(os.path.join(tmpdir, EVENT_QUEUE_FAILED))) == 1
+    assert bot_metrics.get(METRIC_EVENTS_HANDLED, type="issue_comment", result="failed") == failed_before + 1
@@ -0,0 +1,86 @@
+# Tests for functions defined in 'tools/finished_jobs.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+from datetime import datetime, timezone
+import os
+
+# Third party imports (anything installed into the local Python environment)
+import pytest
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.finished_jobs import (FINISHED_INDEX_FILE_NAME, FINISHED_LAYOUT_MONTH, FINISHED_LAYOUT_PREFIX,
+                                 FinishedJobs)
+
+MAY_2024 = datetime(2024, 5, 15, tzinfo=timezone.utc).timestamp()
+JUNE_2024 = datetime(2024, 6, 15, tzinfo=timezone.utc).timestamp()
+
+
+def make_symlink(tmpdir, job_id, directory="submitted"):
+    work_dir = os.path.join(tmpdir, "jobs", job_id)
+    os.makedirs(work_dir, exist_ok=True)
+    os.makedirs(os.path.join(tmpdir, directory), exist_ok=True)
+    symlink = os.path.join(tmpdir, directory, job_id)
+    os.symlink(work_dir, symlink)
+    return symlink
+
+
+def test_finished_jobs_layouts(tmpdir):
+    with pytest.raises(ValueError):
+        FinishedJobs(os.path.join(tmpdir, "finished"), layout="yearly")
+
+    finished_jobs = FinishedJobs(os.path.join(tmpdir, "finished"), layout=FINISHED_LAYOUT_MONTH)
+    path = finished_jobs.add('123', make_symlink(tmpdir, '123'), finished=MAY_2024)
+    assert path == os.path.join(tmpdir, "finished", "2024-05", "123")
+    assert os.path.realpath(path) == os.path.join(tmpdir, "jobs", "123")
+    assert finished_jobs.find('123') == path
+    assert finished_jobs.find('456') is None
+
+    # the index is read from the file by a new instance
+    finished_jobs = FinishedJobs(os.path.join(tmpdir, "finished"), layout=FINISHED_LAYOUT_PREFIX)
+    assert finished_jobs.find('123') == path
+    path = finished_jobs.add('1234567', make_symlink(tmpdir, '1234567'))
+    assert path == os.path.join(tmpdir, "finished", "1234xxx", "1234567")
+    assert len(finished_jobs) == 2
+
+    # partially written lines in the index are ignored
+    with open(os.path.join(tmpdir, "finished", FINISHED_INDEX_FILE_NAME), "a") as index_file:
+        index_file.write("999\t")
+    assert len(FinishedJobs(os.path.join(tmpdir, "finished"))) == 2
+
+
+def test_finished_jobs_migrate_and_prune(tmpdir):
+    # symlinks created in the flat layout by older versions of the bot
+    for job_id, mtime in (('1', MAY_2024), ('2', JUNE_2024)):
+        symlink = make_symlink(tmpdir, job_id, directory="finished")
+        os.utime(symlink, (mtime, mtime), follow_symlinks=False)
+
+    finished_jobs = FinishedJobs(os.path.join(tmpdir, "finished"), layout=FINISHED_LAYOUT_MONTH)
+    # jobs not in the index are found in the top-level directory
+    assert finished_jobs.find('1') == os.path.join(tmpdir, "finished", "1")
+
+    assert finished_jobs.migrate() == 2
+    assert finished_jobs.find('1') == os.path.join(tmpdir, "finished", "2024-05", "1")
+    assert finished_jobs.find('2') == os.path.join(tmpdir, "finished", "2024-06", "2")
+    assert os.path.islink(finished_jobs.find('2'))
+    # migrating again does not change anything
+    assert finished_jobs.migrate() == 0
+
+    # only the symlink of job 1 is older than 30 days at the end of June
+    end_of_june = datetime(2024, 6, 30, tzinfo=timezone.utc).timestamp()
+    assert finished_jobs.prune(30, now=end_of_june) == ['1']
+    assert finished_jobs.find('1') is None
+    assert not os.path.exists(os.path.join(tmpdir, "finished", "2024-05"))
+    # the working directory of the job is kept
+    assert os.path.isdir(os.path.join(tmpdir, "jobs", "1"))
+    # the index was rewritten without job 1
+    assert len(FinishedJobs(os.path.join(tmpdir, "finished"))) == 1
+    assert finished_jobs.prune(30, now=end_of_june) == []
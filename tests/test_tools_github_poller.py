@@ -0,0 +1,150 @@
+# Tests for functions defined in 'tools/github_poller.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import hashlib
+import json
+import os
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.github_poller import GitHubPoller
+
+REPO = "org/repo"
+
+
+class FakeRequester:
+    """
+    Stand-in for github.Requester.Requester serving a fixed set of resources
+    with ETags (resources with a list of pages are paginated)
+    """
+
+    def __init__(self):
+        self.resources = {}
+        self.requests = []
+
+    def requestJson(self, verb, url, parameters=None, headers=None, **kwargs):
+        self.requests.append((url, dict(parameters or {}), dict(headers or {})))
+        if url.startswith("https://"):
+            url, page = url[len("https://api.github.com"):].split("?page=")
+            data = self.resources[url][int(page)]
+        else:
+            data = self.resources[url]
+            if url.endswith("/issues/comments"):
+                data = [comment for comment in data if comment["updated_at"] >= parameters["since"]]
+        response_headers = {}
+        if isinstance(data, tuple):
+            # paginated resource
+            response_headers["Link"] = f'<https://api.github.com{url}?page=1>; rel="next"'
+            data = data[0]
+        output = json.dumps(data)
+        etag = f'"{hashlib.sha256(output.encode()).hexdigest()}"'
+        response_headers["ETag"] = etag
+        if headers and headers.get("If-None-Match") == etag:
+            return 304, response_headers, ""
+        return 200, response_headers, output
+
+    def count_requests(self):
+        count = len(self.requests)
+        self.requests = []
+        return count
+
+
+def make_pull(number, labels=()):
+    return {"number": number, "user": {"login": "author"}, "labels": [{"name": label} for label in labels]}
+
+
+def make_comment(comment_id, number, created_at, updated_at=None, body="bot: help"):
+    return {"id": comment_id, "body": body, "user": {"login": "alice"}, "created_at": created_at,
+            "updated_at": updated_at or created_at,
+            "html_url": f"https://github.com/{REPO}/pull/{number}#issuecomment-{comment_id}",
+            "issue_url": f"https://api.github.com/repos/{REPO}/issues/{number}"}
+
+
+def test_github_poller(tmpdir):
+    state_path = os.path.join(tmpdir, "poll_state.json")
+    requester = FakeRequester()
+    requester.resources[f"/repos/{REPO}/pulls"] = [make_pull(1)]
+    requester.resources[f"/repos/{REPO}/issues/comments"] = [make_comment(10, 1, "2000-01-01T00:00:00Z")]
+
+    # the first poll only records the current state
+    poller = GitHubPoller(state_path, [REPO], requester)
+    assert list(poller.poll()) == []
+    since = poller.state[REPO]["comments_since"]
+
+    # changes: PR 2 opened (paginated list) with a label, PR 1 closed, new
+    # comment on PR 2, comment on an issue
+    requester.resources[f"/repos/{REPO}/pulls"] = ([make_pull(3)], [make_pull(2, labels=["bot:deploy"])])
+    requester.resources[f"/repos/{REPO}/pulls/1"] = dict(make_pull(1), merged=True, merged_by={"login": "admin"},
+                                                         closed_at="2100-01-01T00:00:00Z")
+    requester.resources[f"/repos/{REPO}/issues/2/events"] = [
+        {"id": 5, "event": "labeled", "label": {"name": "bot:deploy"}, "actor": {"login": "deployer"},
+         "created_at": "2100-01-01T00:00:00Z"}]
+    issue_comment = make_comment(11, 4, "2100-01-01T00:00:00Z")
+    issue_comment["html_url"] = f"https://github.com/{REPO}/issues/4#issuecomment-11"
+    requester.resources[f"/repos/{REPO}/issues/comments"] = [
+        make_comment(10, 1, "2000-01-01T00:00:00Z"), make_comment(12, 2, "2100-01-01T00:00:00Z"), issue_comment]
+    poller = GitHubPoller(state_path, [REPO], requester)
+    events = list(poller.poll())
+    assert [(event["type"], event["action"]) for event in events] == [
+        ("pull_request", "opened"), ("pull_request", "labeled"), ("pull_request", "opened"),
+        ("pull_request", "closed"), ("issue_comment", "created")]
+    assert events[0]["raw_request_body"]["pull_request"]["number"] == 2
+    assert events[1]["raw_request_body"]["sender"]["login"] == "deployer"
+    assert events[1]["raw_request_body"]["label"]["name"] == "bot:deploy"
+    assert events[3]["raw_request_body"]["sender"]["login"] == "admin"
+    assert events[3]["raw_request_body"]["pull_request"]["merged"]
+    comment_event = events[4]
+    assert comment_event["raw_request_body"]["issue"]["number"] == 2
+    assert comment_event["raw_request_body"]["comment"]["body"] == "bot: help"
+    assert comment_event["raw_request_body"]["sender"]["login"] == "alice"
+    assert len({event["id"] for event in events}) == 5
+    with open(state_path) as state_file:
+        state = json.load(state_file)
+    assert state[REPO]["comments_since"] == "2100-01-01T00:00:00Z" != since
+    assert sorted(state[REPO]["open_pulls"]) == ["2", "3"]
+
+    # nothing changed: no events, and once the new cursor of the comments
+    # was requested, only conditional requests
+    assert list(GitHubPoller(state_path, [REPO], requester).poll()) == []
+    requester.count_requests()
+    assert list(GitHubPoller(state_path, [REPO], requester).poll()) == []
+    assert all(headers.get("If-None-Match") for _, _, headers in requester.requests)
+    assert requester.count_requests() == 2
+
+    # comment 12 edited, comment 13 created and edited since the last poll
+    requester.resources[f"/repos/{REPO}/issues/comments"] = [
+        make_comment(12, 2, "2100-01-01T00:00:00Z", "2100-01-02T00:00:00Z"),
+        make_comment(13, 2, "2100-01-01T12:00:00Z", "2100-01-02T00:00:00Z")]
+    events = list(GitHubPoller(state_path, [REPO], requester).poll())
+    assert [(event["raw_request_body"]["comment"]["id"], event["action"]) for event in events] == [
+        (12, "edited"), (13, "created")]
+
+
+def test_github_poller_interrupted(tmpdir):
+    state_path = os.path.join(tmpdir, "poll_state.json")
+    requester = FakeRequester()
+    requester.resources[f"/repos/{REPO}/pulls"] = []
+    requester.resources[f"/repos/{REPO}/issues/comments"] = []
+    assert list(GitHubPoller(state_path, [REPO], requester).poll()) == []
+
+    requester.resources[f"/repos/{REPO}/pulls"] = [make_pull(1)]
+    # handling of the events is interrupted: the state is not updated, and
+    # the next poll synthesizes the same events
+    first_event = next(GitHubPoller(state_path, [REPO], requester).poll())
+    events = list(GitHubPoller(state_path, [REPO], requester).poll())
+    assert [event["id"] for event in events] == [first_event["id"]]
+    assert list(GitHubPoller(state_path, [REPO], requester).poll()) == []
+
+    # repositories that cannot be polled are skipped
+    assert list(GitHubPoller(state_path, ["org/unknown", REPO], requester).poll()) == []
@@ -0,0 +1,56 @@
+# Tests for functions defined in 'tools/job_index.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import os
+import shutil
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.job_index import add_job_dir, get_job_dirs, get_job_index_file
+
+
+def make_job_dir(jobs_base_dir, year_month, pr_number, job_id):
+    job_dir = os.path.join(jobs_base_dir, year_month, f"pr_{pr_number}", str(job_id))
+    os.makedirs(job_dir)
+    return job_dir
+
+
+def test_job_index(tmpdir):
+    jobs_base_dir = str(tmpdir)
+    # jobs submitted before the index existed
+    job_dir1 = make_job_dir(jobs_base_dir, "2024.01", 7, 1)
+    job_dir2 = make_job_dir(jobs_base_dir, "2024.02", 7, 2)
+    make_job_dir(jobs_base_dir, "2024.02", 8, 3)
+
+    # index is created from the existing job directories
+    index_file = get_job_index_file(jobs_base_dir, 7)
+    assert not os.path.exists(index_file)
+    assert sorted(get_job_dirs(jobs_base_dir, 7)) == [job_dir1, job_dir2]
+    assert os.path.exists(index_file)
+
+    # new jobs are appended to the index and no longer found by scanning
+    job_dir4 = make_job_dir(jobs_base_dir, "2024.03", 7, 4)
+    add_job_dir(jobs_base_dir, 7, job_dir4)
+    make_job_dir(jobs_base_dir, "2024.03", 7, 5)
+    assert sorted(get_job_dirs(jobs_base_dir, 7)) == [job_dir1, job_dir2, job_dir4]
+
+    # job directories that were removed are skipped
+    shutil.rmtree(job_dir1)
+    assert sorted(get_job_dirs(jobs_base_dir, 7)) == [job_dir2, job_dir4]
+
+    # adding the first job of a PR creates its index
+    job_dir6 = make_job_dir(jobs_base_dir, "2024.03", 9, 6)
+    add_job_dir(jobs_base_dir, 9, job_dir6)
+    assert get_job_dirs(jobs_base_dir, 9) == [job_dir6]
+    assert get_job_dirs(jobs_base_dir, 8) == [os.path.join(jobs_base_dir, "2024.02", "pr_8", "3")]
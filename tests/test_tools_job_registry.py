@@ -0,0 +1,73 @@
+# Tests for functions defined in 'tools/job_registry.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import os
+import sqlite3
+
+# Third party imports (anything installed into the local Python environment)
+import pytest
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.job_registry import JobRegistry, JOB_STATE_FINISHED, JOB_STATE_NEW, JOB_STATE_RUNNING
+
+
+def test_job_registry(tmpdir):
+    path = os.path.join(tmpdir, "jobs.db")
+    registry = JobRegistry(path)
+    assert registry.is_empty()
+
+    registry.add_job("1", work_dir="/tmp/1", repo="test_repo", pr_number="999", comment_id=77)
+    registry.add_jobs([{"job_id": "2"}, {"job_id": "3", "state": JOB_STATE_RUNNING}])
+    # adding a registered job again doesn't change it
+    registry.add_job("1", repo="other_repo")
+    assert not registry.is_empty()
+
+    job = registry.get_job("1")
+    assert job["repo"] == "test_repo"
+    assert job["comment_id"] == 77
+    assert job["state"] == JOB_STATE_NEW
+    assert registry.get_job("4") is None
+
+    assert registry.update_job("2", state=JOB_STATE_FINISHED)
+    assert not registry.update_job("4", state=JOB_STATE_FINISHED)
+    with pytest.raises(ValueError):
+        registry.update_job("1", created=0)
+
+    assert sorted(registry.get_jobs()) == ["1", "3"]
+    assert sorted(registry.get_jobs(exclude_state=None)) == ["1", "2", "3"]
+    registry.close()
+
+    # state survives reopening the database
+    registry = JobRegistry(path)
+    assert registry.get_job("3")["state"] == JOB_STATE_RUNNING
+    registry.close()
+
+
+def test_job_registry_accounting_columns(tmpdir):
+    path = os.path.join(tmpdir, "jobs.db")
+
+    # database created before accounting columns were added to the registry
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE jobs (job_id TEXT PRIMARY KEY, work_dir TEXT, repo TEXT, pr_number TEXT,"
+                       " comment_id INTEGER, state TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL)")
+    connection.execute("INSERT INTO jobs VALUES ('1', '/tmp/1', 'test_repo', '999', 77, 'running', 0, 0)")
+    connection.commit()
+    connection.close()
+
+    registry = JobRegistry(path)
+    assert registry.get_job("1")["final_state"] is None
+    assert registry.update_job("1", state=JOB_STATE_FINISHED, final_state="NODE_FAIL", exit_code="0:1",
+                               elapsed="01:02:03", max_rss="2G", node_list="node[1-2]")
+    job = registry.get_job("1")
+    assert job["final_state"] == "NODE_FAIL"
+    assert job["node_list"] == "node[1-2]"
+    registry.close()
@@ -0,0 +1,93 @@
+# Tests for functions defined in 'tools/metrics.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import os
+import urllib.request
+
+# Third party imports (anything installed into the local Python environment)
+import pytest
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools import run_subprocess
+from tools.metrics import (
+    Metrics, bot_metrics, METRIC_ITERATIONS, METRIC_JOBS, METRIC_PHASE_DURATION, METRIC_PHASE_SECONDS,
+    METRIC_SUBPROCESS_SECONDS)
+
+
+def test_metrics_render():
+    metrics = Metrics()
+    metrics.inc(METRIC_ITERATIONS)
+    metrics.inc(METRIC_ITERATIONS, 2)
+    metrics.set(METRIC_JOBS, 5, category="running")
+    metrics.set(METRIC_JOBS, 1, category='new "jobs"')
+    metrics.observe(METRIC_PHASE_SECONDS, 1.5, phase="squeue")
+    metrics.observe(METRIC_PHASE_SECONDS, 0.5, phase="squeue")
+    metrics.set("custom_metric", 7)
+
+    assert metrics.get(METRIC_ITERATIONS) == 3
+    assert metrics.get(METRIC_JOBS, category="running") == 5
+    assert metrics.get(METRIC_PHASE_SECONDS, phase="squeue") == (2.0, 2)
+    assert metrics.get(METRIC_JOBS, category="finished") is None
+
+    lines = metrics.render().splitlines()
+    assert "# TYPE eessi_bot_job_manager_iterations_total counter" in lines
+    assert "eessi_bot_job_manager_iterations_total 3" in lines
+    assert 'eessi_bot_job_manager_jobs{category="running"} 5' in lines
+    assert 'eessi_bot_job_manager_jobs{category="new \\"jobs\\""} 1' in lines
+    assert "# TYPE eessi_bot_job_manager_phase_seconds summary" in lines
+    assert 'eessi_bot_job_manager_phase_seconds_sum{phase="squeue"} 2.000000' in lines
+    assert 'eessi_bot_job_manager_phase_seconds_count{phase="squeue"} 2' in lines
+    assert "# TYPE custom_metric gauge" in lines
+    assert "custom_metric 7" in lines
+
+    metrics.reset()
+    assert metrics.render() == "\n"
+
+
+def test_metrics_timer():
+    metrics = Metrics()
+    with metrics.timer(METRIC_PHASE_SECONDS, gauge=METRIC_PHASE_DURATION, phase="wait"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.timer(METRIC_PHASE_SECONDS, phase="wait"):
+            raise ValueError("failed")
+
+    total, count = metrics.get(METRIC_PHASE_SECONDS, phase="wait")
+    assert count == 2
+    assert 0 <= metrics.get(METRIC_PHASE_DURATION, phase="wait") <= total
+
+
+def test_metrics_write_file_and_serve(tmpdir):
+    metrics = Metrics()
+    metrics.inc(METRIC_ITERATIONS)
+
+    path = os.path.join(tmpdir, "job_manager.prom")
+    metrics.write_file(path)
+    with open(path) as metrics_file:
+        assert metrics_file.read() == metrics.render()
+    assert os.listdir(tmpdir) == ["job_manager.prom"]
+
+    server = metrics.start_http_server(0)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.status == 200
+            assert response.read().decode("utf-8") == metrics.render()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_subprocess_metrics():
+    _, count = bot_metrics.get(METRIC_SUBPROCESS_SECONDS, command="echo") or (0, 0)
+    run_subprocess("echo hello")
+    assert bot_metrics.get(METRIC_SUBPROCESS_SECONDS, command="echo")[1] == count + 1
@@ -0,0 +1,69 @@
+# Tests for functions defined in 'tools/outbox.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import os
+import time
+from unittest.mock import patch
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.outbox import get_outbox_dir, Outbox, OUTBOX_RETRY_DELAY_MAX, OUTBOX_RETRY_DELAY_MIN
+
+
+def test_outbox(tmpdir):
+    path = get_outbox_dir(str(tmpdir))
+    outbox = Outbox(path, deadline=3600)
+    assert len(outbox) == 0
+
+    first = outbox.add("repo", "1", 11, "|running|")
+    second = outbox.add("repo", 1, 22, "|finished|", in_flight=False)
+    assert len(outbox) == 2
+    # items in flight are not due
+    assert [item["id"] for item in outbox.get_due_items()] == [second["id"]]
+    assert outbox.get_due_items() == []
+    outbox.remove(second)
+    assert len(outbox) == 1
+
+    # failed attempts are retried with exponential backoff
+    now = time.time()
+    outbox.reschedule(first)
+    assert first["attempts"] == 1
+    assert outbox.is_waiting(11)
+    assert not outbox.is_waiting(22)
+    assert outbox.get_due_items(now) == []
+    # an update to the same comment is not due before the waiting one
+    third = outbox.add("repo", 1, 11, "|test result|", in_flight=False)
+    assert outbox.get_due_items(now) == []
+    due_items = outbox.get_due_items(now + OUTBOX_RETRY_DELAY_MIN + 1)
+    assert [item["id"] for item in due_items] == [first["id"], third["id"]]
+    # items in flight are not waiting
+    assert not outbox.is_waiting(11)
+    outbox.reschedule(due_items[0])
+    assert outbox.is_waiting(11)
+    assert due_items[0]["next_attempt"] >= now + 2 * OUTBOX_RETRY_DELAY_MIN
+    for _ in range(10):
+        outbox.reschedule(due_items[0])
+    assert due_items[0]["next_attempt"] <= time.time() + OUTBOX_RETRY_DELAY_MAX
+
+    # items are persistent, items whose deadline has passed are given up
+    outbox = Outbox(path, deadline=3600)
+    assert len(outbox) == 2
+    # the items are not read again to check if updates are waiting
+    with patch.object(outbox, 'get_items') as mock_get_items:
+        assert outbox.is_waiting(11)
+    mock_get_items.assert_not_called()
+    assert outbox.get_due_items(now + 3601) == []
+    assert len(outbox) == 0
+    assert not outbox.is_waiting(11)
+    assert os.listdir(path) == []
@@ -0,0 +1,51 @@
+# Tests for functions defined in 'tools/poll_scheduler.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+# (none yet)
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.poll_scheduler import PollScheduler
+
+
+def test_fixed_interval():
+    scheduler = PollScheduler(60, 60)
+    assert scheduler.next_interval(False, False)[0] == 60
+    assert scheduler.next_interval(True, False)[0] == 60
+    assert scheduler.next_interval(False, True)[0] == 60
+
+
+def test_backoff_and_reset():
+    scheduler = PollScheduler(10, 100, 2)
+    assert scheduler.next_interval(False, False) == (20, "no changes since last poll, backing off")
+    assert scheduler.next_interval(False, False)[0] == 40
+    assert scheduler.next_interval(False, False)[0] == 80
+    assert scheduler.next_interval(False, False)[0] == 100
+    assert scheduler.next_interval(False, False) == (100, "no changes since last poll, maximum interval reached")
+    assert scheduler.next_interval(True, False) == (10, "jobs changed since last poll")
+    scheduler.next_interval(False, False)
+    assert scheduler.next_interval(False, True) == (10, "jobs are pending release")
+
+
+def test_expected_end():
+    scheduler = PollScheduler(10, 100, 2)
+    scheduler.next_interval(False, False)
+    scheduler.next_interval(False, False)
+    interval, reason = scheduler.next_interval(False, False, seconds_to_next_end=30.5)
+    assert interval == 31
+    assert reason == "a job is expected to end in 30 seconds"
+    # never poll more often than the minimum interval, even for overdue jobs
+    assert scheduler.next_interval(False, False, seconds_to_next_end=-5)[0] == 10
+    # backing off continues once the job is no longer expected to end soon
+    assert scheduler.next_interval(False, False, seconds_to_next_end=500)[0] == 100
@@ -11,16 +11,20 @@
 #
 
 # Standard library imports
+import json
 import os
 import re
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 # Third party imports (anything installed into the local Python environment)
+from github.IssueComment import IssueComment
 import pytest
 
 # Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.comment_cache import CommentCache, get_body_hash
 from tools.pr_comments import (
-    get_comment, get_submitted_job_comment, update_comment)
+    cache_comment, CommentUpdater, get_comment, get_comment_body, get_submitted_job_comment, update_comment,
+    update_pr_comment)
 
 
 class MockIssueComment:
@@ -634,6 +638,17 @@ def test_get_submitted_job_comment_retry(pr_job_get_comment_retry):
 #  operand is of type MockObject.
 #
 
+def test_get_comment_body(issue_edit_first_call_succeeds):
+    # issue_edit_first_call_succeeds provides one comment with "foo"
+    os.environ['TEST_RAISE_EXCEPTION'] = '0'
+    assert get_comment_body(issue_edit_first_call_succeeds, 0) == "foo"
+
+    with patch('github.PullRequest.PullRequest') as mock_pr:
+        instance = mock_pr.return_value
+        instance.get_issue_comment.return_value = None
+        assert get_comment_body(instance, 0) is None
+
+
 #  - pr.get_issue_comment(cmnt_id): 1st None ==> no edit
 #      (patching pr.get_issue_comment via ContextManager to return None)
 def test_update_comment_none(tmpdir):
@@ -927,3 +942,148 @@ def test_update_comment_second_get_call_all_edits_fail(tmpdir, issue_edit_all_ca
     expected = 5
     actual = issue_edit_all_calls_fail.issue_comments[0].edit_call_count
     assert expected == actual
+
+
+class MockRequester:
+    """
+    Stand-in for github.Requester.Requester that serves comments (by their
+    URL) and records the methods of all requests
+    """
+    is_lazy = False
+    is_not_lazy = True
+
+    def __init__(self):
+        self.bodies = {}
+        self.requests = []
+
+    def add_comment(self, comment_id, body):
+        url = f"https://api.github.com/repos/org/repo/issues/comments/{comment_id}"
+        self.bodies[url] = body
+        return IssueComment(self, *self.response(url), completed=True)
+
+    def response(self, url):
+        etag = f'W/"{get_body_hash(self.bodies[url])}"'
+        return {"etag": etag}, {"id": int(url.split("/")[-1]), "url": url, "body": self.bodies[url]}
+
+    def requestJsonAndCheck(self, verb, url, input=None, **kwargs):
+        self.requests.append(verb)
+        self.bodies[url] = input["body"]
+        return self.response(url)
+
+    def requestJson(self, verb, url, headers=None, **kwargs):
+        self.requests.append(verb)
+        response_headers, data = self.response(url)
+        if headers and headers.get("If-None-Match") == response_headers["etag"]:
+            return 304, {}, None
+        return 200, response_headers, json.dumps(data)
+
+    def _Requester__check(self, status, headers, output):
+        return headers, json.loads(output)
+
+
+def test_comment_updater():
+    requester = MockRequester()
+    issue_comment = requester.add_comment(42, "|date|status|comment|")
+    pr = MagicMock()
+    pr.requester = requester
+    pr.get_issue_comment.return_value = issue_comment
+
+    # updates queued within the window are applied with a single edit
+    updater = CommentUpdater(window=60)
+    updater.queue_update(42, pr, "\n|d1|released|")
+    updater.queue_update(42, pr, "\n|d2|running|")
+    assert requester.requests == []
+    assert updater.flush(42)
+    assert requester.bodies[issue_comment.url] == "|date|status|comment|\n|d1|released|\n|d2|running|"
+    assert requester.requests == ["PATCH"]
+    pr.get_issue_comment.assert_called_once_with(42)
+
+    # the comment is known now, it is only checked for changes before it is
+    # edited again
+    updater.queue_update(42, pr, "\n|d3|finished|")
+    updater.flush_all()
+    assert requester.bodies[issue_comment.url].endswith("\n|d2|running|\n|d3|finished|")
+    assert requester.requests == ["PATCH", "GET", "PATCH"]
+    pr.get_issue_comment.assert_called_once()
+    assert not updater.flush(42)
+
+    # changes made by someone else are kept
+    requester.bodies[issue_comment.url] = "edited"
+    updater.queue_update(42, pr, " update")
+    updater.flush(42)
+    assert requester.bodies[issue_comment.url] == "edited update"
+
+
+def test_comment_updater_no_window():
+    requester = MockRequester()
+    issue_comment = requester.add_comment(7, "body")
+    pr = MagicMock()
+
+    # without a window updates are applied right away, a comment passed by
+    # the caller is used as is
+    updater = CommentUpdater(window=0)
+    updater.queue_update(7, pr, " update", issue_comment)
+    assert requester.bodies[issue_comment.url] == "body update"
+    pr.get_issue_comment.assert_not_called()
+
+
+def test_comment_updater_comment_cache(tmpdir):
+    requester = MockRequester()
+    pr = MagicMock()
+    pr.requester = requester
+    comment_cache = CommentCache(os.path.join(tmpdir, "comments.db"))
+
+    # comment created (and cached) by another process
+    cache_comment(comment_cache, requester.add_comment(5, "job comment"))
+
+    updater = CommentUpdater(window=0, comment_cache=comment_cache)
+    updater.queue_update(5, pr, " released")
+    pr.get_issue_comment.assert_not_called()
+    assert requester.requests == ["GET", "PATCH"]
+    assert comment_cache.get(5)["body"] == "job comment released"
+
+    # without checking for changes, an update is a single request
+    requester.requests.clear()
+    updater = CommentUpdater(window=0, comment_cache=comment_cache, verify=False)
+    updater.queue_update(5, pr, " running")
+    assert requester.requests == ["PATCH"]
+    assert requester.bodies["https://api.github.com/repos/org/repo/issues/comments/5"] == "job comment released running"
+    comment_cache.close()
+
+
+def test_comment_updater_outdated_comment():
+    requester = MockRequester()
+    issue_comment = requester.add_comment(9, "|date|status|comment|")
+    pr = MagicMock()
+    pr.requester = requester
+    pr.get_issue_comment.return_value = issue_comment
+
+    updater = CommentUpdater(window=60)
+    updater.queue_update(9, pr, "\n|d1|artefact 1|")
+    # a caller obtains the comment (e.g., to deploy another artefact) ...
+    outdated_comment = requester.add_comment(9, requester.bodies[issue_comment.url])
+    # ... while the update queued before is applied
+    assert updater.flush(9)
+    updater.queue_update(9, pr, "\n|d2|artefact 2|", outdated_comment)
+    assert updater.flush(9)
+    assert requester.bodies[issue_comment.url] == "|date|status|comment|\n|d1|artefact 1|\n|d2|artefact 2|"
+
+
+def test_update_pr_comment():
+    requester = MockRequester()
+    issue_comment = requester.add_comment(42, "bot: help")
+    pr = MagicMock()
+    pr.requester = requester
+    event_info = {'raw_request_body': {
+        'issue': {'number': 1},
+        'repository': {'full_name': 'org/repo'},
+        'comment': {'id': 42, 'url': issue_comment.url, 'body': "bot: help"},
+    }}
+
+    # the comment is taken from the event, so it is edited with a single request
+    with patch('tools.pr_comments.github.get_pull', return_value=pr), \
+            patch('tools.pr_comments.get_comment_updater', return_value=CommentUpdater(window=0)):
+        update_pr_comment(event_info, "\n- help shown")
+    assert requester.bodies[issue_comment.url] == "bot: help\n- help shown"
+    assert requester.requests == ["PATCH"]
+    pr.get_issue_comment.assert_not_called()
@@ -0,0 +1,58 @@
+# Tests for functions defined in 'tools/spool.py' of the EESSI
+# build-and-deploy bot, see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import os
+import threading
+import time
+from unittest.mock import patch
+
+# Third party imports (anything installed into the local Python environment)
+import pytest
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.spool import get_completion_spool_dir, SpoolWatcher
+
+
+def deposit_marker(spool_dir, job_id):
+    tmp_marker = os.path.join(spool_dir, f".{job_id}.tmp")
+    with open(tmp_marker, "w") as marker:
+        marker.write("0\n")
+    os.rename(tmp_marker, os.path.join(spool_dir, job_id))
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_spool_watcher(tmpdir, use_inotify):
+    spool_dir = get_completion_spool_dir(str(tmpdir))
+    with patch('tools.spool.SPOOL_SCAN_INTERVAL', 0.1):
+        watcher = SpoolWatcher(spool_dir)
+        if not use_inotify:
+            watcher.close()
+        assert os.path.isdir(spool_dir)
+
+        assert watcher.wait(0.1) == []
+
+        # markers deposited while waiting are returned right away
+        timer = threading.Timer(0.2, deposit_marker, args=(spool_dir, "123"))
+        timer.start()
+        start = time.monotonic()
+        assert watcher.wait(10) == ["123"]
+        assert time.monotonic() - start < 5
+        timer.join()
+
+        # markers are only returned once, temporary files are ignored
+        open(os.path.join(spool_dir, ".456.tmp"), "w").close()
+        assert watcher.wait(0.1) == []
+        assert watcher.get_markers() == ["123"]
+
+        watcher.remove("123")
+        assert watcher.get_markers() == []
+        watcher.close()
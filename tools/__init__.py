@@ -15,15 +15,24 @@
 
 # Standard library imports
 import os
+import signal
 import subprocess
 
 # Third party imports (anything installed into the local Python environment)
 from pyghee.utils import log
 
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.metrics import bot_metrics, METRIC_SUBPROCESS_SECONDS
+
 
 # TODO do we really need two functions (run_cmd and run_subprocess) for
 # running a command?
-def run_cmd(cmd, log_msg='', working_dir=None, log_file=None, raise_on_error=True, env=None):
+# exit code reported for commands that were killed because they timed out
+# (the same as used by the 'timeout' command of GNU coreutils)
+TIMEOUT_EXIT_CODE = 124
+
+
+def run_cmd(cmd, log_msg='', working_dir=None, log_file=None, raise_on_error=True, env=None, timeout=None):
     """
     Runs a command in the shell and raises an error if one occurs.
 
@@ -34,6 +43,8 @@ def run_cmd(cmd, log_msg='', working_dir=None, log_file=None, raise_on_error=Tru
         log_file (string): path to log file
         raise_on_error (bool): if True raise an exception in case of error
         env (dict): environment settings for running the command
+        timeout (float): number of seconds after which the command is killed
+            (None for no limit)
 
     Returns:
         tuple of 3 elements containing
@@ -46,7 +57,7 @@ def run_cmd(cmd, log_msg='', working_dir=None, log_file=None, raise_on_error=Tru
             raise_on_error is True
     """
     # TODO use common method for logging function name in log messages
-    stdout, stderr, exit_code = run_subprocess(cmd, log_msg, working_dir, log_file, env)
+    stdout, stderr, exit_code = run_subprocess(cmd, log_msg, working_dir, log_file, env, timeout)
 
     if exit_code != 0:
         error_msg = (
@@ -67,9 +78,11 @@ def run_cmd(cmd, log_msg='', working_dir=None, log_file=None, raise_on_error=Tru
     return stdout, stderr, exit_code
 
 
-def run_subprocess(cmd, log_msg='', working_dir=None, log_file=None, env=None):
+def run_subprocess(cmd, log_msg='', working_dir=None, log_file=None, env=None, timeout=None):
     """
-    Runs a command in the shell. No error is raised if the command fails.
+    Runs a command in the shell. No error is raised if the command fails. If
+    the command does not finish within the timeout, it is killed (including
+    all processes it started) and the exit code TIMEOUT_EXIT_CODE is returned.
 
     Args:
         cmd (string): command to run
@@ -77,6 +90,8 @@ def run_subprocess(cmd, log_msg='', working_dir=None, log_file=None, env=None):
         working_dir (string): location of the job's working directory
         log_file (string): path to log file
         env (dict): environment settings for running the command
+        timeout (float): number of seconds after which the command is killed
+            (None for no limit)
 
     Returns:
         tuple of 3 elements containing
@@ -97,15 +112,30 @@ def run_subprocess(cmd, log_msg='', working_dir=None, log_file=None, env=None):
     if env is not None:
         my_env.update(env)
 
-    result = subprocess.run(cmd,
-                            env=my_env,
-                            cwd=working_dir,
-                            shell=True,
-                            encoding="UTF-8",
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE)
-    stdout = result.stdout
-    stderr = result.stderr
-    exit_code = result.returncode
+    # durations are recorded per command (e.g., 'squeue' or 'scontrol')
+    command = os.path.basename(cmd.split()[0]) if cmd.split() else ""
+    with bot_metrics.timer(METRIC_SUBPROCESS_SECONDS, command=command):
+        # the command runs in a new session, so that all processes started
+        # by the shell can be killed if the command times out
+        process = subprocess.Popen(cmd,
+                                   env=my_env,
+                                   cwd=working_dir,
+                                   shell=True,
+                                   encoding="UTF-8",
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   start_new_session=timeout is not None)
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+            exit_code = process.returncode
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            stdout, stderr = process.communicate()
+            stderr = f"{stderr}command timed out after {timeout} seconds\n"
+            exit_code = TIMEOUT_EXIT_CODE
+            log(f"run_subprocess(): Killed '{cmd}' after {timeout} seconds", log_file=log_file)
 
     return stdout, stderr, exit_code
@@ -76,7 +76,8 @@ def event_handler_parse(args=None):
 
     parser.add_argument(
         "-c", "--cron",
-        help="run in cron mode instead of web app mode",
+        help="run in cron mode instead of web app mode: poll GitHub once for changes to the pull requests of the "
+             "repositories in 'poll_repositories' and handle them",
         action="store_true",
     )
 
@@ -110,4 +111,16 @@ def job_manager_parse(args=None):
         help="limits the processing to a specific job id or list of comma-separated list of job ids",
     )
 
+    parser.add_argument(
+        "--migrate-finished-jobs",
+        help="move the symlinks of finished jobs into the layout set by 'finished_jobs_layout' and exit",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--prune-finished-jobs",
+        help="remove symlinks of jobs finished before 'finished_jobs_retention_days' and exit",
+        action="store_true",
+    )
+
     return parser.parse_args(args=unknown_args, namespace=parsed_args)
@@ -0,0 +1,747 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import os
+import re
+
+# Third party imports (anything installed into the local Python environment)
+from pyghee.utils import log
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools import run_cmd
+from tools.circuit_breaker import CircuitBreaker, CIRCUIT_FAILURE_THRESHOLD_DEFAULT, CIRCUIT_RETRY_INTERVAL_DEFAULT
+
+
+# formats of the output of squeue supported by SlurmBackend
+#  - fixed: '--Format' with fixed-width fields (supported by all Slurm versions)
+#  - delimited: '--format' with '|'-separated fields without padding (the
+#      cluster is taken from the 'CLUSTER: <name>' lines squeue prints when
+#      the option '--clusters' is used)
+#  - json: '--json' (requires Slurm 21.08 or newer)
+SQUEUE_FORMAT_FIXED = "fixed"
+SQUEUE_FORMAT_DELIMITED = "delimited"
+SQUEUE_FORMAT_JSON = "json"
+SQUEUE_FORMATS = (SQUEUE_FORMAT_FIXED, SQUEUE_FORMAT_DELIMITED, SQUEUE_FORMAT_JSON)
+
+SQUEUE_FIXED_FORMAT_OPTION = "--Format JobId:100@,Cluster:100@,Partition:100@,State:100@,Reason:100@,EndTime:100"
+SQUEUE_DELIMITED_FORMAT_OPTION = "--format='%i|%P|%T|%r|%e'"
+
+# keys in the output of 'scontrol --oneliner show job' (e.g., 'JobId',
+# 'WorkDir', 'CPUs/Task' or 'ReqB:S:C:T') preceded by a whitespace
+SCONTROL_KEY_REGEX = re.compile(r"(?:^|(?<=\s))(?P<key>[A-Za-z][A-Za-z0-9_:/.\-]*)=")
+
+# default command for obtaining accounting information (see setting
+# 'sacct_command') and fields reported by it (see SlurmBackend.accounting)
+SACCT_COMMAND_DEFAULT = "sacct"
+SACCT_FIELDS = ("JobID", "State", "ExitCode", "Elapsed", "MaxRSS", "NodeList")
+
+# states of jobs that have ended (squeue lists such jobs for a while, e.g., if
+# the option '--states=all' is used, until they are purged by slurmctld)
+JOB_TERMINAL_STATES = frozenset([
+    "BOOT_FAIL", "CANCELLED", "COMPLETED", "DEADLINE", "FAILED", "NODE_FAIL", "OUT_OF_MEMORY", "PREEMPTED",
+    "TIMEOUT",
+])
+
+# reason squeue reports for jobs submitted with '--hold' that were not yet
+# released
+JOB_REASON_HELD_USER = "JobHeldUser"
+
+
+class BatchJob:
+    """
+    Compact record for a job listed by the batch system. Besides attribute
+    access, it supports read access like a dictionary (e.g., job["state"] or
+    "%(cluster)s" % job), so it can be used wherever a dictionary with job
+    information was used before.
+    """
+
+    __slots__ = ("jobid", "cluster", "partition", "state", "reason", "end_time")
+
+    def __init__(self, jobid, cluster="", partition="", state="", reason="", end_time=""):
+        self.jobid = jobid
+        self.cluster = cluster
+        self.partition = partition
+        self.state = state
+        self.reason = reason
+        self.end_time = end_time
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        if isinstance(other, (BatchJob, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"BatchJob({', '.join(f'{key}={value!r}' for key, value in self.items())})"
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.__slots__]
+
+
+class BatchBackend:
+    """
+    Interface of a batch system as used by the job manager. Jobs are passed as
+    BatchJob records (or dictionaries with the same keys).
+    """
+
+    # clusters that could not be queried by the last call of list_jobs (their
+    # jobs are missing from the result even if they still exist)
+    unavailable_clusters = frozenset()
+
+    def list_jobs(self):
+        """
+        Obtain the jobs currently managed by the batch system.
+
+        Args:
+            No arguments
+
+        Returns:
+            (dict): maps a job id to a BatchJob
+        """
+        raise NotImplementedError
+
+    def describe_jobs(self, jobs):
+        """
+        Obtain detailed information about jobs (e.g., their working directory).
+
+        Args:
+            jobs (list): list of BatchJob records
+
+        Returns:
+            (dict): maps a job id to a dictionary with details about the job
+        """
+        raise NotImplementedError
+
+    def release_jobs(self, jobs):
+        """
+        Release held jobs.
+
+        Args:
+            jobs (list): list of BatchJob records
+
+        Returns:
+            tuple of 2 elements containing
+            - (list): ids of jobs that were released
+            - (list): ids of jobs that could not be released
+        """
+        raise NotImplementedError
+
+    def cancel_jobs(self, jobs):
+        """
+        Cancel jobs.
+
+        Args:
+            jobs (list): list of BatchJob records
+
+        Returns:
+            tuple of 2 elements containing
+            - (list): ids of jobs that were cancelled
+            - (list): ids of jobs that could not be cancelled
+        """
+        raise NotImplementedError
+
+    def accounting(self, job_ids):
+        """
+        Obtain accounting information about (finished) jobs.
+
+        Args:
+            job_ids (list): list of job ids
+
+        Returns:
+            (dict): maps a job id to a dictionary with accounting information
+        """
+        raise NotImplementedError
+
+
+class SlurmBackend(BatchBackend):
+    """
+    Batch backend for Slurm. Jobs are listed with squeue, described and
+    released with scontrol, cancelled with scancel (with one command per
+    templated command, e.g., per cluster) and accounting information is
+    obtained with sacct. If clusters are given, each cluster is polled with
+    its own squeue command, concurrently, and a cluster that fails
+    repeatedly is skipped for a while (see CircuitBreaker), so an unhealthy
+    cluster does not hold up the others.
+    """
+
+    def __init__(self, poll_command, scontrol_command, job_name=None, squeue_format=SQUEUE_FORMAT_FIXED,
+                 scancel_command="scancel", sacct_command=SACCT_COMMAND_DEFAULT, logfile=None, clusters=None,
+                 command_timeout=None, failure_threshold=CIRCUIT_FAILURE_THRESHOLD_DEFAULT,
+                 retry_interval=CIRCUIT_RETRY_INTERVAL_DEFAULT):
+        """
+        SlurmBackend constructor.
+
+        Args:
+            poll_command (string): squeue command
+            scontrol_command (string): scontrol command, may contain
+                placeholders for fields of a BatchJob (e.g., '%(cluster)s')
+            job_name (string): only jobs with this name are listed (optional)
+            squeue_format (string): format of the output of squeue (one of
+                SQUEUE_FORMATS)
+            scancel_command (string): scancel command, may contain
+                placeholders like scontrol_command
+            sacct_command (string): sacct command (None to not obtain
+                accounting information)
+            logfile (string): path to the log file
+            clusters (list): names of the clusters to poll separately (None
+                or empty to poll with a single squeue command)
+            command_timeout (float): number of seconds after which Slurm
+                commands are killed (None for no limit)
+            failure_threshold (int): number of consecutive failed polls after
+                which a cluster is skipped
+            retry_interval (float): number of seconds after which a skipped
+                cluster is polled again
+
+        Raises:
+            ValueError: if the squeue format is not supported
+        """
+        if squeue_format not in SQUEUE_FORMATS:
+            raise ValueError(f"squeue format '{squeue_format}' is unknown (supported: {', '.join(SQUEUE_FORMATS)})")
+        self.poll_command = poll_command
+        self.scontrol_command = scontrol_command
+        self.job_name = job_name
+        self.squeue_format = squeue_format
+        self.scancel_command = scancel_command
+        self.sacct_command = sacct_command
+        self.logfile = logfile
+        self.clusters = list(clusters or [])
+        self.command_timeout = command_timeout
+        self.circuit_breakers = {cluster: CircuitBreaker(failure_threshold, retry_interval)
+                                 for cluster in self.clusters}
+        self.unavailable_clusters = frozenset()
+
+    def get_squeue_command(self, cluster=None):
+        """
+        Assemble the squeue command listing the jobs of the current user.
+
+        Args:
+            cluster (string): name of the cluster to list the jobs of (None to
+                not restrict the command to a cluster)
+
+        Returns:
+            (string): squeue command
+
+        Raises:
+            Exception: if the environment variable USER is not set
+        """
+        username = os.getenv('USER', None)
+        if username is None:
+            raise Exception("Unable to find username")
+
+        squeue_cmd = "%s --noheader --user=%s" % (self.poll_command, username)
+        if cluster:
+            squeue_cmd += " --clusters=%s" % cluster
+        if self.job_name:
+            squeue_cmd += " --name='%s'" % self.job_name
+        if self.squeue_format == SQUEUE_FORMAT_JSON:
+            # --noheader is not compatible with --json
+            squeue_cmd = squeue_cmd.replace(" --noheader", "") + " --json"
+        elif self.squeue_format == SQUEUE_FORMAT_DELIMITED:
+            squeue_cmd += " " + SQUEUE_DELIMITED_FORMAT_OPTION
+        else:
+            squeue_cmd += " " + SQUEUE_FIXED_FORMAT_OPTION
+        return squeue_cmd
+
+    def list_jobs(self):
+        """
+        Obtain the jobs currently managed by Slurm via squeue. If clusters are
+        configured, they are polled concurrently (see method list_cluster_jobs)
+        and their jobs are merged. Clusters that could not be polled (or are
+        skipped because their circuit breaker is open) are recorded in the
+        attribute unavailable_clusters.
+
+        Args:
+            No arguments
+
+        Returns:
+            (dict): maps a job id to a BatchJob
+
+        Raises:
+            RuntimeError: if squeue fails (for all clusters)
+            Exception: if the output of squeue cannot be parsed
+        """
+        if not self.clusters:
+            return self.list_cluster_jobs()
+
+        polled_clusters = [cluster for cluster in self.clusters if self.circuit_breakers[cluster].allow()]
+        unavailable_clusters = set(self.clusters) - set(polled_clusters)
+        if unavailable_clusters:
+            log(f"list_jobs(): skipping clusters '{','.join(sorted(unavailable_clusters))}'"
+                " (too many failed polls)", self.logfile)
+
+        jobs = {}
+        errors = []
+        if polled_clusters:
+            with ThreadPoolExecutor(max_workers=len(polled_clusters), thread_name_prefix="squeue") as executor:
+                futures = {cluster: executor.submit(self.list_cluster_jobs, cluster) for cluster in polled_clusters}
+                # results are merged in the order of the clusters
+                for cluster, future in futures.items():
+                    breaker = self.circuit_breakers[cluster]
+                    try:
+                        cluster_jobs = future.result()
+                    except Exception as err:
+                        errors.append(err)
+                        unavailable_clusters.add(cluster)
+                        if breaker.record_failure():
+                            log(f"list_jobs(): polling cluster '{cluster}' failed, skipping it for "
+                                f"{breaker.retry_interval} seconds: {err}", self.logfile)
+                        else:
+                            log(f"list_jobs(): polling cluster '{cluster}' failed: {err}", self.logfile)
+                        continue
+                    breaker.record_success()
+                    for job_id, job in cluster_jobs.items():
+                        if job_id in jobs and jobs[job_id].cluster != job.cluster:
+                            log(f"list_jobs(): job id {job_id} is used on clusters '{jobs[job_id].cluster}'"
+                                f" and '{job.cluster}'", self.logfile)
+                        jobs[job_id] = job
+
+        self.unavailable_clusters = frozenset(unavailable_clusters)
+        if len(unavailable_clusters) == len(self.clusters):
+            raise RuntimeError(f"list_jobs(): no cluster could be polled: {'; '.join(map(str, errors))}")
+        return jobs
+
+    def list_cluster_jobs(self, cluster=None):
+        """
+        Obtain the jobs of one cluster (or, if no cluster is given, of the
+        clusters the squeue command lists by itself) via a single squeue
+        command.
+
+        Args:
+            cluster (string): name of the cluster (optional)
+
+        Returns:
+            (dict): maps a job id to a BatchJob
+
+        Raises:
+            RuntimeError: if squeue fails or times out
+            Exception: if the output of squeue cannot be parsed
+        """
+        squeue_cmd = self.get_squeue_command(cluster)
+        squeue_output, squeue_err, squeue_exitcode = run_cmd(
+            squeue_cmd,
+            "list_jobs(): squeue command",
+            log_file=self.logfile,
+            timeout=self.command_timeout,
+        )
+        if self.squeue_format == SQUEUE_FORMAT_JSON:
+            jobs = self.parse_squeue_json_output(str(squeue_output))
+        elif self.squeue_format == SQUEUE_FORMAT_DELIMITED:
+            jobs = self.parse_squeue_delimited_output(str(squeue_output))
+        else:
+            jobs = self.parse_squeue_fixed_output(str(squeue_output))
+        if cluster:
+            for job in jobs.values():
+                job.cluster = job.cluster or cluster
+        return jobs
+
+    def parse_squeue_fixed_output(self, output):
+        """
+        Parse the output of squeue run with SQUEUE_FIXED_FORMAT_OPTION.
+
+        Args:
+            output (string): the output of the squeue command
+
+        Returns:
+            (dict): maps a job id to a BatchJob
+
+        Raises:
+            Exception: if a line does not contain all fields
+        """
+        jobs = {}
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            fields = [field.strip() for field in line.split('@')]
+            if len(fields) != 6:
+                raise Exception(f"The output of squeue does not have 6 job parameters: '{line}'")
+            jobs[fields[0]] = BatchJob(*fields)
+        return jobs
+
+    def parse_squeue_delimited_output(self, output):
+        """
+        Parse the output of squeue run with SQUEUE_DELIMITED_FORMAT_OPTION.
+        Lines 'CLUSTER: <name>' (printed by squeue when the option --clusters
+        is used) set the cluster of the jobs listed after them.
+
+        Args:
+            output (string): the output of the squeue command
+
+        Returns:
+            (dict): maps a job id to a BatchJob
+
+        Raises:
+            Exception: if a line does not contain all fields
+        """
+        jobs = {}
+        cluster = ""
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            if line.startswith("CLUSTER: "):
+                cluster = line[len("CLUSTER: "):].strip()
+                continue
+            fields = line.split('|')
+            if len(fields) != 5:
+                raise Exception(f"The output of squeue does not have 5 job parameters: '{line}'")
+            job_id, partition, state, reason, end_time = fields
+            jobs[job_id] = BatchJob(job_id, cluster, partition, state, reason, end_time)
+        return jobs
+
+    def parse_squeue_json_output(self, output):
+        """
+        Parse the output of 'squeue --json'. Different Slurm versions report
+        the state either as string or as list of strings and times either as
+        integers or as dictionaries ({"set": ..., "number": ...}).
+
+        Args:
+            output (string): the output of the squeue command
+
+        Returns:
+            (dict): maps a job id to a BatchJob
+        """
+        def as_string(value):
+            if isinstance(value, list):
+                return value[0] if value else ""
+            return "" if value is None else str(value)
+
+        def as_time(value):
+            if isinstance(value, dict):
+                if not value.get("set", True) or value.get("infinite"):
+                    return "N/A"
+                value = value.get("number")
+            if not value:
+                return "N/A"
+            return datetime.fromtimestamp(int(value)).strftime("%Y-%m-%dT%H:%M:%S")
+
+        jobs = {}
+        for job in json.loads(output).get("jobs", []):
+            job_id = str(job["job_id"])
+            jobs[job_id] = BatchJob(
+                job_id,
+                as_string(job.get("cluster")),
+                as_string(job.get("partition")),
+                as_string(job.get("job_state")),
+                as_string(job.get("state_reason")),
+                as_time(job.get("end_time")),
+            )
+        return jobs
+
+    def group_by_command(self, command, jobs):
+        """
+        Group jobs by their templated command (e.g., the setting
+        'scontrol_command' may contain placeholders such as '%(cluster)s').
+
+        Args:
+            command (string): command possibly containing placeholders
+            jobs (list): list of BatchJob records
+
+        Returns:
+            (dict): maps a templated command to a list of job ids
+
+        Raises:
+            KeyError: if the command contains an unknown placeholder
+        """
+        jobs_by_command = {}
+        for job in jobs:
+            try:
+                templated_command = command % job
+            except KeyError:
+                log(f"Failed to process {command}.", self.logfile)
+                log(f"Information on placeholder is not collected in job: {job}.", self.logfile)
+                raise
+            jobs_by_command.setdefault(templated_command, []).append(job["jobid"])
+        return jobs_by_command
+
+    @staticmethod
+    def parse_scontrol_show_job_output(output):
+        """
+        The output of 'scontrol --oneliner show job' is a list of key=value pairs
+        separated by whitespaces. Values may contain whitespaces themselves (e.g.,
+        the working directory of a job or its comment), hence a new pair is only
+        started when a token looks like a key followed by '='.
+
+        Args:
+            output (string): the output of the scontrol command (for one job)
+
+        Returns:
+            (dict): Returns a dictionary of the key-value pairs
+        """
+        job_info = {}
+        stripped_output = output.strip()
+        keys = list(SCONTROL_KEY_REGEX.finditer(stripped_output))
+        for idx, key in enumerate(keys):
+            value_end = keys[idx + 1].start() if idx + 1 < len(keys) else len(stripped_output)
+            job_info[key.group('key')] = stripped_output[key.end():value_end].strip()
+
+        return job_info
+
+    @staticmethod
+    def parse_scontrol_show_jobs_output(output):
+        """
+        Parse the output of 'scontrol --oneliner show job JOBID[,JOBID]*' which
+        contains one line per job. Lines are processed one by one, so the
+        output for many jobs is never split into a huge list of tokens.
+
+        Args:
+            output (string): the output of the scontrol command
+
+        Returns:
+            (dict): maps a job id to a dictionary of the key-value pairs for
+                that job
+        """
+        jobs_info = {}
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            job_info = SlurmBackend.parse_scontrol_show_job_output(line)
+            if 'JobId' in job_info:
+                jobs_info[job_info['JobId']] = job_info
+
+        return jobs_info
+
+    def describe_jobs(self, jobs):
+        """
+        Obtain information about jobs via 'scontrol show job'. A single scontrol
+        command is run for each templated scontrol command (e.g., per cluster
+        if the setting 'scontrol_command' uses the placeholder '%(cluster)s').
+        If that fails for some jobs, we fall back to obtaining information for
+        each of these jobs separately.
+
+        Args:
+            jobs (list): list of BatchJob records
+
+        Returns:
+            (dict): maps a job id to a dictionary with the key-value pairs
+                reported by scontrol for that job
+        """
+        jobs_info = {}
+        for templated_scontrol_command, job_ids in self.group_by_command(self.scontrol_command, jobs).items():
+            cmd = "%s --oneliner show job %s" % (
+                templated_scontrol_command,
+                ",".join(job_ids),
+            )
+            scontrol_output, scontrol_err, scontrol_exitcode = run_cmd(
+                cmd,
+                "describe_jobs(): scontrol command",
+                log_file=self.logfile,
+                raise_on_error=False,
+                timeout=self.command_timeout,
+            )
+            jobs_info.update(self.parse_scontrol_show_jobs_output(str(scontrol_output)))
+
+            # older Slurm versions do not support a list of job ids, also jobs
+            # may have vanished in the meantime -> query missing jobs one by one
+            missing_job_ids = [job_id for job_id in job_ids if job_id not in jobs_info]
+            if len(job_ids) > 1 and missing_job_ids:
+                log(
+                    "describe_jobs(): no information for jobs '%s' from bulk query,"
+                    " querying them one by one" % ",".join(missing_job_ids),
+                    self.logfile,
+                )
+                for job_id in missing_job_ids:
+                    cmd = "%s --oneliner show job %s" % (templated_scontrol_command, job_id)
+                    scontrol_output, scontrol_err, scontrol_exitcode = run_cmd(
+                        cmd,
+                        "describe_jobs(): scontrol command",
+                        log_file=self.logfile,
+                        raise_on_error=False,
+                        timeout=self.command_timeout,
+                    )
+                    jobs_info.update(self.parse_scontrol_show_jobs_output(str(scontrol_output)))
+
+        return jobs_info
+
+    def run_command_for_jobs(self, command, jobs, separator=","):
+        """
+        Run a command (e.g., 'scontrol release') for a list of job ids
+        (joined with separator) once per templated command. If that fails,
+        the command is run for each job separately to determine for which jobs
+        it failed.
+
+        Args:
+            command (string): command possibly containing placeholders
+            jobs (list): list of BatchJob records
+            separator (string): separator for the list of job ids
+
+        Returns:
+            tuple of 2 elements containing
+            - (list): ids of jobs for which the command succeeded
+            - (list): ids of jobs for which the command failed
+        """
+        succeeded = []
+        failed = []
+        for templated_command, job_ids in self.group_by_command(command, jobs).items():
+            cmd = "%s %s" % (templated_command, separator.join(job_ids))
+            output, err, exitcode = run_cmd(
+                cmd,
+                "run_command_for_jobs(): command",
+                log_file=self.logfile,
+                raise_on_error=False,
+                timeout=self.command_timeout,
+            )
+            if exitcode == 0:
+                succeeded.extend(job_ids)
+            elif len(job_ids) == 1:
+                failed.extend(job_ids)
+            else:
+                # determine for which jobs the command failed
+                for job_id in job_ids:
+                    cmd = "%s %s" % (templated_command, job_id)
+                    output, err, exitcode = run_cmd(
+                        cmd,
+                        "run_command_for_jobs(): command",
+                        log_file=self.logfile,
+                        raise_on_error=False,
+                        timeout=self.command_timeout,
+                    )
+                    if exitcode == 0:
+                        succeeded.append(job_id)
+                    else:
+                        failed.append(job_id)
+
+        return succeeded, failed
+
+    def release_jobs(self, jobs):
+        """
+        Release held jobs via 'scontrol release JOBID[,JOBID]*' (see method
+        run_command_for_jobs).
+
+        Args:
+            jobs (list): list of BatchJob records
+
+        Returns:
+            tuple of 2 elements containing
+            - (list): ids of jobs that were released
+            - (list): ids of jobs that could not be released
+        """
+        return self.run_command_for_jobs(f"{self.scontrol_command} release", jobs)
+
+    def cancel_jobs(self, jobs):
+        """
+        Cancel jobs via 'scancel JOBID [JOBID]*' (see method
+        run_command_for_jobs).
+
+        Args:
+            jobs (list): list of BatchJob records
+
+        Returns:
+            tuple of 2 elements containing
+            - (list): ids of jobs that were cancelled
+            - (list): ids of jobs that could not be cancelled
+        """
+        return self.run_command_for_jobs(self.scancel_command, jobs, separator=" ")
+
+    def accounting(self, jobs):
+        """
+        Obtain accounting information about jobs via sacct, with a single
+        command per cluster if clusters are configured (jobs whose cluster is
+        not known are queried on all clusters). Only the line for the job
+        allocation itself is used (lines for job steps, e.g., '123.batch', are
+        ignored), except for MaxRSS which is only reported for job steps (the
+        maximum over all steps is used).
+
+        Args:
+            jobs (list): list of BatchJob records
+
+        Returns:
+            (dict): maps a job id to a dictionary with the fields listed in
+                SACCT_FIELDS (keys in lower case, e.g., 'exitcode')
+        """
+        if not jobs or not self.sacct_command:
+            return {}
+
+        job_ids_by_clusters = {}
+        for job in jobs:
+            cluster = job.get("cluster") if self.clusters else None
+            clusters = cluster if cluster in self.clusters else ",".join(self.clusters)
+            job_ids_by_clusters.setdefault(clusters, []).append(job["jobid"])
+
+        accounting = {}
+        for clusters, job_ids in job_ids_by_clusters.items():
+            cmd = "%s --parsable2 --noheader --jobs=%s --format=%s" % (
+                self.sacct_command, ",".join(job_ids), ",".join(SACCT_FIELDS))
+            if clusters:
+                cmd += " --clusters=%s" % clusters
+            sacct_output, sacct_err, sacct_exitcode = run_cmd(
+                cmd,
+                "accounting(): sacct command",
+                log_file=self.logfile,
+                raise_on_error=False,
+                timeout=self.command_timeout,
+            )
+            if sacct_exitcode == 0:
+                accounting.update(self.parse_sacct_output(str(sacct_output)))
+        return accounting
+
+    @staticmethod
+    def parse_sacct_output(output):
+        """
+        Parse the output of 'sacct --parsable2 --noheader' run with the fields
+        SACCT_FIELDS.
+
+        Args:
+            output (string): the output of the sacct command
+
+        Returns:
+            (dict): maps a job id to a dictionary with accounting information
+        """
+        def rss_in_bytes(rss):
+            units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+            if not rss:
+                return 0
+            if rss[-1] in units:
+                return int(float(rss[:-1]) * units[rss[-1]])
+            return int(float(rss))
+
+        accounting = {}
+        keys = [field.lower() for field in SACCT_FIELDS]
+        for line in output.splitlines():
+            fields = line.split('|')
+            if len(fields) != len(SACCT_FIELDS):
+                continue
+            record = dict(zip(keys, fields))
+            # e.g., 'CANCELLED by 1000' -> 'CANCELLED'
+            record["state"] = record["state"].split(' ')[0]
+            job_id, _, step = record["jobid"].partition('.')
+            if not step:
+                max_rss = accounting.get(job_id, {}).get("maxrss", "")
+                accounting[job_id] = record
+                if max_rss and not record["maxrss"]:
+                    record["maxrss"] = max_rss
+            else:
+                job_record = accounting.setdefault(job_id, {"jobid": job_id, "maxrss": ""})
+                if rss_in_bytes(record["maxrss"]) > rss_in_bytes(job_record["maxrss"]):
+                    job_record["maxrss"] = record["maxrss"]
+        # drop entries for which only job steps were reported
+        return {job_id: record for job_id, record in accounting.items() if "state" in record}
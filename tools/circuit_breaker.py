@@ -0,0 +1,132 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import threading
+import time
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+# (none yet)
+
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+# default number of consecutive failures after which a circuit is opened
+CIRCUIT_FAILURE_THRESHOLD_DEFAULT = 3
+# default number of seconds an open circuit waits before it lets a single
+# attempt through again
+CIRCUIT_RETRY_INTERVAL_DEFAULT = 300
+
+
+class CircuitBreaker:
+    """
+    Protects callers from repeatedly waiting for an unhealthy service (e.g.,
+    an unresponsive slurmctld). The circuit is closed (attempts are allowed)
+    until failure_threshold consecutive attempts failed. It is then open (no
+    attempts are allowed) for retry_interval seconds, after which it is half
+    open: one attempt is allowed, which closes the circuit if it succeeds or
+    opens it again if it fails. All methods may be called from different
+    threads.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD_DEFAULT,
+                 retry_interval=CIRCUIT_RETRY_INTERVAL_DEFAULT):
+        """
+        CircuitBreaker constructor.
+
+        Args:
+            failure_threshold (int): number of consecutive failures after
+                which the circuit is opened (values smaller than 1 are treated
+                as 1)
+            retry_interval (float): number of seconds after which an open
+                circuit lets an attempt through again
+        """
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.retry_interval = float(retry_interval)
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+
+    @property
+    def state(self):
+        """
+        Current state of the circuit (CIRCUIT_CLOSED, CIRCUIT_OPEN or
+        CIRCUIT_HALF_OPEN).
+        """
+        with self.lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self.opened_at is None:
+            return CIRCUIT_CLOSED
+        if now - self.opened_at < self.retry_interval:
+            return CIRCUIT_OPEN
+        return CIRCUIT_HALF_OPEN
+
+    def allow(self):
+        """
+        Check if an attempt is allowed. In the half open state, only the first
+        caller is allowed an attempt until its outcome was recorded.
+
+        Args:
+            No arguments
+
+        Returns:
+            (bool): True if the caller may make an attempt, False otherwise
+        """
+        with self.lock:
+            state = self._state(time.monotonic())
+            if state == CIRCUIT_CLOSED:
+                return True
+            if state == CIRCUIT_HALF_OPEN and not self.trial_in_progress:
+                self.trial_in_progress = True
+                return True
+            return False
+
+    def record_success(self):
+        """
+        Record a successful attempt, which closes the circuit.
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+    def record_failure(self):
+        """
+        Record a failed attempt, which opens the circuit if the threshold of
+        consecutive failures is reached or if the attempt was made in the half
+        open state.
+
+        Args:
+            No arguments
+
+        Returns:
+            (bool): True if the circuit is open now, False otherwise
+        """
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_progress or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_progress = False
+            return self.opened_at is not None
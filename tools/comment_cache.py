@@ -0,0 +1,145 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import hashlib
+import sqlite3
+import threading
+import time
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+# (none yet)
+
+
+# entries not written for this many days are removed when the cache is opened
+COMMENT_CACHE_MAX_AGE_DAYS_DEFAULT = 90
+
+COMMENT_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS comments (
+    comment_id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    body TEXT NOT NULL,
+    body_hash TEXT NOT NULL,
+    etag TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS comments_updated ON comments (updated);
+"""
+
+
+def get_body_hash(body):
+    """
+    Compute the hash of the body of a comment.
+
+    Args:
+        body (string): body of the comment
+
+    Returns:
+        (string): SHA-256 hash of the body (hex digits)
+    """
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+class CommentCache:
+    """
+    Persistent cache of the bodies of PR comments created or edited by the
+    bot, stored in an SQLite database (in WAL mode, so the event handler and
+    the job manager can share it). Besides the body, each entry holds the hash
+    of the body and the ETag GitHub returned with it, which are used to detect
+    if the comment was changed by someone else. All methods may be called from
+    different threads.
+    """
+
+    def __init__(self, path, max_age_days=COMMENT_CACHE_MAX_AGE_DAYS_DEFAULT):
+        """
+        CommentCache constructor. Opens (and if needed creates) the database
+        and removes entries older than max_age_days.
+
+        Args:
+            path (string): path to the database file
+            max_age_days (float): maximum age of entries in days
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(COMMENT_CACHE_SCHEMA)
+            self.connection.execute("DELETE FROM comments WHERE updated < ?",
+                                    (time.time() - max_age_days * 24 * 3600,))
+
+    def close(self):
+        """
+        Close the database.
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        with self.lock:
+            self.connection.close()
+
+    def get(self, comment_id):
+        """
+        Obtain the entry of a comment.
+
+        Args:
+            comment_id (int): id of the comment
+
+        Returns:
+            (dict): entry with the keys 'comment_id', 'url', 'body',
+                'body_hash', 'etag' and 'updated' or None if the comment is
+                not cached
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM comments WHERE comment_id = ?",
+                                          (int(comment_id),)).fetchone()
+        return dict(row) if row else None
+
+    def put(self, comment_id, url, body, etag=None):
+        """
+        Add or replace the entry of a comment.
+
+        Args:
+            comment_id (int): id of the comment
+            url (string): API URL of the comment
+            body (string): body of the comment
+            etag (string): ETag returned by GitHub together with the body
+                (None if unknown)
+
+        Returns:
+            None (implicitly)
+        """
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO comments (comment_id, url, body, body_hash, etag, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (int(comment_id), url, body, get_body_hash(body), etag, time.time()))
+
+    def forget(self, comment_id):
+        """
+        Remove the entry of a comment (e.g., if it may be outdated).
+
+        Args:
+            comment_id (int): id of the comment
+
+        Returns:
+            None (implicitly)
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM comments WHERE comment_id = ?", (int(comment_id),))
@@ -0,0 +1,271 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import re
+import string
+import threading
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools import config
+
+
+# sections of the configuration holding templates of the comments (and of the
+# rows of their status tables) created by the bot
+COMMENT_TEMPLATE_SECTIONS = (
+    config.SECTION_SUBMITTED_JOB_COMMENTS,
+    config.SECTION_NEW_JOB_COMMENTS,
+    config.SECTION_RUNNING_JOB_COMMENTS,
+    config.SECTION_FINISHED_JOB_COMMENTS,
+)
+
+_comment_templates = None
+_comment_templates_lock = threading.Lock()
+
+
+def template_to_regex(format_str, with_eol=True):
+    """
+    Converts a formatting string into a regex that can extract all the formatted
+    parts of the string. If with_eol is True, it assumes the formatted string is followed by an end-of-line
+    character. This is a requirement if it has to succesfully match a formatting string that ends with a formatting
+    field.
+
+    Example: if one function creates a formatted string
+    value = "my_field_value"
+    format_str = f"This is my string, with a custom field: {my_field}\n"
+    formatted_string = format_str.format(my_field=value)
+    Another function can then grab the original value of my_field by doing:
+    my_re = template_to_regex(format_str)
+    match_object = re.match(my_re, formatted_string)
+    match_object['my_field'] then contains "my_field_value"
+    This is useful when e.g. one function posts a GitHub comment, and another wants to extract information from that
+
+    Args:
+        format_str (string): a formatting string, with template placeholders.
+        with_eol (bool, optional): a boolean, indicating if the formatting string is expected to be followed by
+                                   an end of line character
+
+    """
+
+    # string.Formatter returns a 4-tuple of literal text, field name, format spec, and conversion
+    # E.g if format_str = "This is my {app} it is currently {status}"
+    # formatter = [
+    #    ("This is my", "app", "", None),
+    #    ("it is currently", "status", "", None),
+    #    ("", None, None, None),
+    # ]
+    formatter = string.Formatter()
+    regex_parts = []
+
+    for literal_text, field_name, _, _ in formatter.parse(format_str):
+        # We use re.escape to escape any special characters in the literal_text, as we want to match those literally
+        regex_parts.append(re.escape(literal_text))
+        if field_name is not None:
+            # Create a non-greedy, named capture group. Note that the {field_name} itself is a format specifier
+            # So we get the actual field name as the name of the capture group
+            # In other words, if our format_str is "My string with {a_field}" then the named capture group will be
+            # called 'a_field'
+            # We match any character, but in a non-greedy way. Thus, as soon as it can match the next
+            # literal text section, it will - thus assuming that that's the end of the field
+            # We use .* to allow for empty fields (such as the optional accelerator fields)
+            regex_parts.append(f"(?P<{field_name}>.*?)")
+
+    # Finally, make sure we append a $ to the regex. This is necessary because of our non-greedy matching
+    # strategy. Otherwise, a formatting string that ends with a formatting item would only match the first letter
+    # of the field, because it doesn't find anything to match after (and it is non-greedy). With the $, it has
+    # something to match after the field, thus making sure it matches the whole field
+    # This does assume that the format_str in the string to be matched is indeed followed by an end-of-line character
+    # I.e. if a function that creates the formatted string does
+    # my_string = f"{format_str}\n"
+    # (i.e. has an end-of-line after the format specifier) it can be matched by another function that does
+    # my_re = template_to_regex(format_str)
+    # re.match(my_re, my_string)
+    full_pattern = ''.join(regex_parts)
+    if with_eol:
+        full_pattern += "$"
+    return re.compile(full_pattern)
+
+
+class PartialFormatDict(dict):
+    """
+    A dictionary class that allows for missing keys - and will just return {key} in that case.
+    This can be used to partially format some, but not all placeholders in a formatting string.
+    """
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+class CommentTemplate:
+    """
+    Template (from the configuration) of a line of a comment created by the
+    bot. The regular expression used to parse lines is compiled once (when it
+    is first needed), and so are templates derived by filling in some fields.
+    """
+
+    def __init__(self, template, name=None):
+        """
+        CommentTemplate constructor.
+
+        Args:
+            template (string): formatting string with fields in curly brackets
+            name (string): name of the template (e.g., 'section.setting')
+        """
+        self.template = template
+        self.name = name
+        self.fields = tuple(field for _, field, _, _ in string.Formatter().parse(template) if field is not None)
+        self._regex = None
+        self._partials = {}
+        self._lock = threading.Lock()
+
+    @property
+    def regex(self):
+        """
+        Compiled regular expression matching lines rendered from the template
+        (see template_to_regex).
+        """
+        if self._regex is None:
+            self._regex = template_to_regex(self.template)
+        return self._regex
+
+    def render(self, **fields):
+        """
+        Fill in the fields of the template.
+
+        Args:
+            fields (dict): values of the fields (values of fields that are not
+                used by the template are ignored)
+
+        Returns:
+            (string): the rendered line
+        """
+        return self.template.format(**fields)
+
+    def parse(self, line):
+        """
+        Extract the fields from a line rendered from the template (the
+        reverse of method render).
+
+        Args:
+            line (string): a line of a comment (without the end-of-line
+                character)
+
+        Returns:
+            (dict): values of the fields or None if the line does not match the
+                template
+        """
+        match = self.regex.match(line)
+        return match.groupdict() if match else None
+
+    def partial(self, **fields):
+        """
+        Derive a template by filling in some of the fields (other fields are
+        kept). Derived templates are cached, so the values should not vary
+        (e.g., be taken from the configuration).
+
+        Args:
+            fields (dict): values of the fields to be filled in
+
+        Returns:
+            (CommentTemplate): the derived template
+        """
+        key = tuple(sorted(fields.items()))
+        with self._lock:
+            derived = self._partials.get(key)
+            if derived is None:
+                derived = CommentTemplate(self.template.format_map(PartialFormatDict(fields)), name=self.name)
+                self._partials[key] = derived
+        return derived
+
+    def __repr__(self):
+        return f"CommentTemplate({self.name!r}, {self.template!r})"
+
+
+class CommentTemplates:
+    """
+    Registry of the templates of all comments created by the bot (the
+    settings in the sections listed in COMMENT_TEMPLATE_SECTIONS).
+    """
+
+    def __init__(self, cfg):
+        """
+        CommentTemplates constructor.
+
+        Args:
+            cfg (ConfigParser): ConfigParser instance holding full configuration
+                (typically read from 'app.cfg')
+        """
+        self.settings = get_template_settings(cfg)
+        self.templates = {(section, setting): CommentTemplate(template, name=f"{section}.{setting}")
+                          for section, section_settings in self.settings for setting, template in section_settings}
+
+    def get(self, section, setting):
+        """
+        Returns the template for a setting.
+
+        Args:
+            section (string): name of the section
+            setting (string): name of the setting
+
+        Returns:
+            (CommentTemplate): the template or None if the setting is not
+                defined
+        """
+        return self.templates.get((section, setting))
+
+    def __getitem__(self, key):
+        """
+        Returns the template for a (section, setting) tuple.
+
+        Raises:
+            KeyError: if the setting is not defined
+        """
+        return self.templates[key]
+
+
+def get_template_settings(cfg):
+    """
+    Obtain the settings of all comment templates.
+
+    Args:
+        cfg (ConfigParser): ConfigParser instance holding full configuration
+            (typically read from 'app.cfg')
+
+    Returns:
+        (tuple): tuples of a section name and a tuple of (setting, template)
+            pairs
+    """
+    return tuple((section, tuple(cfg[section].items())) for section in COMMENT_TEMPLATE_SECTIONS if section in cfg)
+
+
+def get_comment_templates(cfg=None):
+    """
+    Returns the registry of comment templates. The registry is only built
+    again if the templates in the configuration changed.
+
+    Args:
+        cfg (ConfigParser): ConfigParser instance holding full configuration
+            (default: read from 'app.cfg')
+
+    Returns:
+        (CommentTemplates): the registry
+    """
+    global _comment_templates
+
+    if cfg is None:
+        cfg = config.read_config()
+    settings = get_template_settings(cfg)
+    with _comment_templates_lock:
+        if _comment_templates is None or _comment_templates.settings != settings:
+            _comment_templates = CommentTemplates(cfg)
+        return _comment_templates
@@ -37,6 +37,10 @@ SECTION_BOT_CONTROL = 'bot_control'
 BOT_CONTROL_SETTING_COMMAND_PERMISSION = 'command_permission'
 BOT_CONTROL_SETTING_COMMAND_RESPONSE_FMT = 'command_response_fmt'
 BOT_CONTROL_SETTING_CHATLEVEL = 'chatlevel'
+BOT_CONTROL_SETTING_COMMENT_CACHE_DB = 'comment_cache_db'
+BOT_CONTROL_SETTING_COMMENT_CACHE_VERIFY = 'comment_cache_verify'
+BOT_CONTROL_SETTING_COMMENT_UPDATE_WINDOW = 'comment_update_window'
+BOT_CONTROL_SETTING_STATUS_COMMENTS_FALLBACK = 'status_comments_fallback'
 
 SECTION_BUILDENV = 'buildenv'
 BUILDENV_SETTING_ALLOWED_EXPORTVARS = 'allowed_exportvars'
@@ -88,9 +92,18 @@ DOWNLOAD_PR_COMMENTS_SETTING_PR_DIFF_FAILURE = 'pr_diff_failure'
 DOWNLOAD_PR_COMMENTS_SETTING_PR_DIFF_TIP = 'pr_diff_tip'
 
 SECTION_EVENT_HANDLER = 'event_handler'
+EVENT_HANDLER_SETTING_DELIVERY_DB = 'delivery_db'
+EVENT_HANDLER_SETTING_DELIVERY_TTL = 'delivery_ttl'
+EVENT_HANDLER_SETTING_EVENT_ARCHIVE_DIR = 'event_archive_dir'
+EVENT_HANDLER_SETTING_EVENT_QUEUE_DIR = 'event_queue_dir'
+EVENT_HANDLER_SETTING_EVENT_WORKERS = 'event_workers'
 EVENT_HANDLER_SETTING_LOG_PATH = 'log_path'
+EVENT_HANDLER_SETTING_METRICS_PORT = 'metrics_port'
+EVENT_HANDLER_SETTING_POLL_REPOSITORIES = 'poll_repositories'
+EVENT_HANDLER_SETTING_POLL_STATE_FILE = 'poll_state_file'
 
 SECTION_FINISHED_JOB_COMMENTS = 'finished_job_comments'
+FINISHED_JOB_COMMENTS_SETTING_JOB_ACCOUNTING_FMT = 'job_accounting_fmt'
 FINISHED_JOB_COMMENTS_SETTING_JOB_RESULT_UNKNOWN_FMT = 'job_result_unknown_fmt'
 FINISHED_JOB_COMMENTS_SETTING_JOB_TEST_UNKNOWN_FMT = 'job_test_unknown_fmt'
 
@@ -101,11 +114,29 @@ GITHUB_SETTING_INSTALLATION_ID = 'installation_id'
 GITHUB_SETTING_PRIVATE_KEY = 'private_key'
 
 SECTION_JOB_MANAGER = 'job_manager'
+JOB_MANAGER_SETTING_CLUSTERS = 'clusters'
+JOB_MANAGER_SETTING_CLUSTER_FAILURE_THRESHOLD = 'cluster_failure_threshold'
+JOB_MANAGER_SETTING_CLUSTER_RETRY_INTERVAL = 'cluster_retry_interval'
+JOB_MANAGER_SETTING_COMMAND_TIMEOUT = 'command_timeout'
+JOB_MANAGER_SETTING_FINISHED_JOBS_LAYOUT = 'finished_jobs_layout'
+JOB_MANAGER_SETTING_FINISHED_JOBS_RETENTION_DAYS = 'finished_jobs_retention_days'
 JOB_MANAGER_SETTING_LOG_PATH = 'log_path'
 JOB_MANAGER_SETTING_JOB_IDS_DIR = 'job_ids_dir'
+JOB_MANAGER_SETTING_JOB_PROCESSING_WORKERS = 'job_processing_workers'
+JOB_MANAGER_SETTING_JOB_REGISTRY_DB = 'job_registry_db'
+JOB_MANAGER_SETTING_MAX_POLL_INTERVAL = 'max_poll_interval'
+JOB_MANAGER_SETTING_METRICS_FILE = 'metrics_file'
+JOB_MANAGER_SETTING_METRICS_PORT = 'metrics_port'
+JOB_MANAGER_SETTING_MIN_POLL_INTERVAL = 'min_poll_interval'
+JOB_MANAGER_SETTING_NON_BOT_JOBS_CACHE_FILE = 'non_bot_jobs_cache_file'
+JOB_MANAGER_SETTING_NON_BOT_JOBS_CACHE_SIZE = 'non_bot_jobs_cache_size'
+JOB_MANAGER_SETTING_POLL_BACKOFF_FACTOR = 'poll_backoff_factor'
 JOB_MANAGER_SETTING_POLL_COMMAND = 'poll_command'
 JOB_MANAGER_SETTING_POLL_INTERVAL = 'poll_interval'
+JOB_MANAGER_SETTING_PR_UPDATE_DEADLINE = 'pr_update_deadline'
+JOB_MANAGER_SETTING_SACCT_COMMAND = 'sacct_command'
 JOB_MANAGER_SETTING_SCONTROL_COMMAND = 'scontrol_command'
+JOB_MANAGER_SETTING_SQUEUE_FORMAT = 'squeue_format'
 
 SECTION_NEW_JOB_COMMENTS = 'new_job_comments'
 NEW_JOB_COMMENTS_SETTING_AWAITS_LAUNCH = 'awaits_launch'
@@ -0,0 +1,204 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+# (none yet)
+
+
+# default path to the database of deliveries (see setting 'delivery_db'),
+# relative to the working directory of the event handler
+DELIVERY_DB_DEFAULT = "deliveries.db"
+# default number of seconds deliveries are remembered (see setting
+# 'delivery_ttl'), GitHub allows redelivering events of the past three days
+DELIVERY_TTL_DEFAULT = 7 * 24 * 3600
+# default maximum number of deliveries remembered (the oldest are forgotten)
+DELIVERY_STORE_MAX_ENTRIES_DEFAULT = 100000
+# expired deliveries are removed every this many registrations
+DELIVERY_STORE_PRUNE_EVERY = 1000
+
+DELIVERY_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    delivery_id TEXT PRIMARY KEY,
+    payload_hash TEXT NOT NULL UNIQUE,
+    event_type TEXT,
+    received REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deliveries_received ON deliveries (received);
+"""
+
+# reasons why an event is a duplicate (see DeliveryStore.check)
+DUPLICATE_DELIVERY = "delivery"
+DUPLICATE_PAYLOAD = "payload"
+
+
+def get_payload_hash(event_info):
+    """
+    Compute the hash identifying the payload of an event. Redeliveries of an
+    event carry the same payload, even if GitHub assigns a new delivery id.
+
+    Args:
+        event_info (dict): event received by the event handler
+
+    Returns:
+        (string): SHA-256 hash (hex digits) of the type of the event and its
+            body
+    """
+    payload = json.dumps([event_info.get("type"), event_info.get("raw_request_body")], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DeliveryStore:
+    """
+    Bounded store of the webhook deliveries handled by the event handler,
+    identified by their delivery id (header X-GitHub-Delivery) and the hash of
+    their payload, stored in an SQLite database (or in memory if no path is
+    given). Deliveries are forgotten after ttl seconds, and only the most
+    recent max_entries deliveries are kept. All methods may be called from
+    different threads.
+    """
+
+    def __init__(self, path=None, ttl=DELIVERY_TTL_DEFAULT, max_entries=DELIVERY_STORE_MAX_ENTRIES_DEFAULT):
+        """
+        DeliveryStore constructor. Opens (and if needed creates) the database
+        and removes expired deliveries.
+
+        Args:
+            path (string): path to the database file (None to keep the
+                deliveries in memory)
+            ttl (float): number of seconds deliveries are remembered
+            max_entries (int): maximum number of deliveries remembered
+        """
+        self.path = path
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        self.lock = threading.Lock()
+        self.registrations = 0
+        self.connection = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None,
+                                          timeout=30)
+        with self.lock:
+            if path:
+                self.connection.execute("PRAGMA journal_mode=WAL")
+                self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(DELIVERY_STORE_SCHEMA)
+            self.prune()
+
+    def close(self):
+        """
+        Close the database.
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        with self.lock:
+            self.connection.close()
+
+    def prune(self):
+        """
+        Remove expired deliveries and the oldest deliveries beyond
+        max_entries. Must be called with the lock held.
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        self.connection.execute("DELETE FROM deliveries WHERE received < ?", (time.time() - self.ttl,))
+        self.connection.execute(
+            "DELETE FROM deliveries WHERE delivery_id IN ("
+            " SELECT delivery_id FROM deliveries ORDER BY received DESC, rowid DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,))
+
+    def check(self, delivery_id, payload_hash):
+        """
+        Check if a delivery (or another delivery with the same payload) was
+        seen before and has not expired yet.
+
+        Args:
+            delivery_id (string): id of the delivery
+            payload_hash (string): hash of the payload (see get_payload_hash)
+
+        Returns:
+            (string): DUPLICATE_DELIVERY or DUPLICATE_PAYLOAD if the delivery
+                is a duplicate, None otherwise
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT delivery_id FROM deliveries WHERE (delivery_id = ? OR payload_hash = ?) AND received >= ?",
+                (delivery_id, payload_hash, time.time() - self.ttl)).fetchall()
+        if not rows:
+            return None
+        return DUPLICATE_DELIVERY if any(row[0] == delivery_id for row in rows) else DUPLICATE_PAYLOAD
+
+    def register(self, delivery_id, payload_hash, event_type=None):
+        """
+        Remember a delivery, unless it (or another delivery with the same
+        payload) was registered before, e.g., concurrently.
+
+        Args:
+            delivery_id (string): id of the delivery
+            payload_hash (string): hash of the payload (see get_payload_hash)
+            event_type (string): type of the event (for information only)
+
+        Returns:
+            (bool): True if the delivery was registered, False if it is a
+                duplicate
+        """
+        with self.lock:
+            self.registrations += 1
+            if self.registrations % DELIVERY_STORE_PRUNE_EVERY == 0:
+                self.prune()
+            else:
+                # expired entries must not prevent the registration
+                self.connection.execute(
+                    "DELETE FROM deliveries WHERE (delivery_id = ? OR payload_hash = ?) AND received < ?",
+                    (delivery_id, payload_hash, time.time() - self.ttl))
+            try:
+                self.connection.execute(
+                    "INSERT INTO deliveries (delivery_id, payload_hash, event_type, received) VALUES (?, ?, ?, ?)",
+                    (delivery_id, payload_hash, event_type, time.time()))
+            except sqlite3.IntegrityError:
+                return False
+        return True
+
+    def forget(self, delivery_id):
+        """
+        Forget a delivery (e.g., if it could not be handled, so it is accepted
+        when GitHub redelivers it).
+
+        Args:
+            delivery_id (string): id of the delivery
+
+        Returns:
+            None (implicitly)
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM deliveries WHERE delivery_id = ?", (delivery_id,))
+
+    def __len__(self):
+        """
+        Number of deliveries remembered.
+        """
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM deliveries").fetchone()[0]
@@ -0,0 +1,200 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+from collections import namedtuple
+from datetime import datetime, timezone
+import gzip
+import json
+import os
+import threading
+import time
+
+# Third party imports (anything installed into the local Python environment)
+from pyghee.lib import get_event_info
+from pyghee.utils import log
+from requests.structures import CaseInsensitiveDict
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.event_queue import get_event_key, restore_event_info, store_event_info
+
+
+# name of the index file (in the archive directory), each line holds the
+# delivery id, type, action and PR (format 'REPO#NUMBER', empty if the event
+# does not belong to a PR) of an event, the segment file and the offset in it
+# at which the event is stored, and the time it was received (seconds since
+# the epoch), separated by tabs
+EVENT_ARCHIVE_INDEX_FILE_NAME = "index.tsv"
+EVENT_ARCHIVE_INDEX_FIELDS = ("delivery_id", "type", "action", "pr", "segment", "offset", "received")
+
+# events are stored in one segment file per day (UTC) they were received
+EVENT_ARCHIVE_SEGMENT_FMT = "events-%Y-%m-%d.jsonl.gz"
+
+# request as expected by pyghee.lib.get_event_info
+EventRequest = namedtuple("EventRequest", ("headers", "json", "data"))
+
+
+class EventArchive:
+    """
+    Append-only archive of the events received by the event handler. Each
+    event is stored as a separate gzip member (holding one line of JSON) in
+    the segment file of the day it was received, so segment files can be
+    read with standard tools (e.g., zcat). An index file maps delivery ids,
+    types and PRs to the position of the events in the segment files; it is
+    written after the event, so events that were only partially written
+    (e.g., when the event handler was killed) are never read. All methods may
+    be called from different threads.
+    """
+
+    def __init__(self, path, logfile=None):
+        """
+        EventArchive constructor. Creates the archive directory if needed.
+
+        Args:
+            path (string): path to the archive directory
+            logfile (string): path to the log file
+        """
+        self.path = path
+        self.logfile = logfile
+        self.index_path = os.path.join(path, EVENT_ARCHIVE_INDEX_FILE_NAME)
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, event_info, received=None):
+        """
+        Append an event to the archive.
+
+        Args:
+            event_info (dict): event received by the event handler
+            received (float): time the event was received (default:
+                time.time())
+
+        Returns:
+            (dict): index entry of the event (see EVENT_ARCHIVE_INDEX_FIELDS)
+        """
+        received = time.time() if received is None else received
+        key = get_event_key(event_info)
+        entry = {
+            "delivery_id": event_info["id"],
+            "type": event_info.get("type", ""),
+            "action": event_info.get("action", ""),
+            "pr": "" if key.startswith("event:") else key,
+            "segment": datetime.fromtimestamp(received, timezone.utc).strftime(EVENT_ARCHIVE_SEGMENT_FMT),
+            "received": received,
+        }
+        record = json.dumps({"received": received, "event_info": store_event_info(event_info)})
+        member = gzip.compress(f"{record}\n".encode("utf-8"))
+        with self.lock:
+            with open(os.path.join(self.path, entry["segment"]), "ab") as segment_file:
+                entry["offset"] = segment_file.tell()
+                segment_file.write(member)
+                segment_file.flush()
+                os.fsync(segment_file.fileno())
+            with open(self.index_path, "a") as index_file:
+                index_file.write("\t".join(f"{entry[field]:.3f}" if field == "received" else str(entry[field])
+                                           for field in EVENT_ARCHIVE_INDEX_FIELDS) + "\n")
+        return entry
+
+    def get_entries(self, event_type=None, pr=None, delivery_id=None):
+        """
+        Read the index, optionally selecting entries by type, PR or delivery
+        id.
+
+        Args:
+            event_type (string): type of the events (e.g., 'issue_comment')
+            pr (string): PR the events belong to (format 'REPO#NUMBER')
+            delivery_id (string): delivery id of the event
+
+        Returns:
+            (list): index entries (see EVENT_ARCHIVE_INDEX_FIELDS) in the
+                order the events were received
+        """
+        entries = []
+        try:
+            with open(self.index_path) as index_file:
+                for line in index_file:
+                    fields = line.rstrip("\n").split("\t")
+                    # skip partially written lines
+                    if len(fields) != len(EVENT_ARCHIVE_INDEX_FIELDS):
+                        continue
+                    entry = dict(zip(EVENT_ARCHIVE_INDEX_FIELDS, fields))
+                    try:
+                        entry["offset"] = int(entry["offset"])
+                        entry["received"] = float(entry["received"])
+                    except ValueError:
+                        continue
+                    if ((event_type is None or entry["type"] == event_type) and (pr is None or entry["pr"] == pr) and
+                            (delivery_id is None or entry["delivery_id"] == delivery_id)):
+                        entries.append(entry)
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def read(self, entry):
+        """
+        Read an event from the archive.
+
+        Args:
+            entry (dict): index entry of the event (see method get_entries)
+
+        Returns:
+            (dict): the event, which can be handled by the event handler
+        """
+        with open(os.path.join(self.path, entry["segment"]), "rb") as segment_file:
+            segment_file.seek(entry["offset"])
+            with gzip.GzipFile(fileobj=segment_file) as member:
+                record = json.loads(member.readline())
+        return restore_event_info(record["event_info"])
+
+    def __len__(self):
+        """
+        Number of events in the archive.
+        """
+        return len(self.get_entries())
+
+
+def read_event_files(path):
+    """
+    Read the events stored in a directory (recursively), either as pairs of
+    files '*_headers.json' and '*_body.json' (as logged by the event handler
+    in the directory 'events_log') or as single JSON files with the keys
+    'headers' and 'json' (as accepted by the option '--file' of the event
+    handler). Files that cannot be read are skipped.
+
+    Args:
+        path (string): path to the directory
+
+    Returns:
+        (list): events ordered by the name of their files (which start with
+            the time the events were received if they were logged by the
+            event handler)
+    """
+    events = []
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            if not file_name.endswith(".json") or file_name.endswith("_body.json"):
+                continue
+            file_path = os.path.join(dir_path, file_name)
+            try:
+                if file_name.endswith("_headers.json"):
+                    with open(file_path) as headers_file:
+                        headers = json.load(headers_file)
+                    with open(file_path[:-len("_headers.json")] + "_body.json") as body_file:
+                        body = json.load(body_file)
+                else:
+                    with open(file_path) as event_file:
+                        event_data = json.load(event_file)
+                    headers, body = event_data["headers"], event_data["json"]
+                request = EventRequest(CaseInsensitiveDict(headers), body, json.dumps(body).encode("utf-8"))
+                events.append((file_name, get_event_info(request)))
+            except (OSError, ValueError, KeyError, TypeError) as err:
+                log(f"read_event_files: skipping '{file_path}': {err}")
+    return [event_info for _, event_info in sorted(events, key=lambda event: event[0])]
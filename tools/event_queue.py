@@ -0,0 +1,354 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+from datetime import datetime, timezone
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+
+# Third party imports (anything installed into the local Python environment)
+from pyghee.utils import log
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from tools.metrics import (bot_metrics, METRIC_EVENT_HANDLING_SECONDS, METRIC_EVENT_QUEUE_DEPTH,
+                           METRIC_EVENT_QUEUE_OLDEST, METRIC_EVENT_WAIT_SECONDS, METRIC_EVENTS_HANDLED)
+
+
+# default number of threads handling queued events (see setting 'event_workers')
+EVENT_WORKERS_DEFAULT = 4
+
+# subdirectories of the queue directory
+#  - pending: events waiting to be handled
+#  - active: events being handled
+#  - failed: events whose handling failed or was interrupted
+EVENT_QUEUE_PENDING = "pending"
+EVENT_QUEUE_ACTIVE = "active"
+EVENT_QUEUE_FAILED = "failed"
+
+# fields of the event information (as created by pyghee.lib.get_event_info)
+# that are stored in the queue; the raw request data is only needed to verify
+# the request, and the timestamp is derived from 'timestamp_raw'
+EVENT_INFO_FIELDS = ("action", "id", "type", "timestamp_raw", "date", "time", "raw_request_body",
+                     "raw_request_headers")
+
+
+def store_event_info(event_info):
+    """
+    Select the fields of an event that are stored (e.g., in the queue).
+
+    Args:
+        event_info (dict): event received by the event handler
+
+    Returns:
+        (dict): fields of the event that can be serialized to JSON
+    """
+    return {field: event_info[field] for field in EVENT_INFO_FIELDS if field in event_info}
+
+
+def restore_event_info(stored_event_info):
+    """
+    Restore an event stored with function store_event_info, so it can be
+    handled by the event handler.
+
+    Args:
+        stored_event_info (dict): stored fields of the event
+
+    Returns:
+        (dict): event information as created by pyghee.lib.get_event_info
+            (without the raw request data)
+    """
+    event_info = dict(stored_event_info)
+    event_info["timestamp"] = datetime.fromtimestamp(int(event_info["timestamp_raw"]) / 1000., tz=timezone.utc)
+    return event_info
+
+
+def get_event_key(event_info):
+    """
+    Determine the key of an event. Events with the same key are handled one
+    after another, in the order they were received. Events that belong to a
+    pull request (or issue) are keyed by repository and number, all other
+    events by their delivery id (i.e., they are not ordered).
+
+    Args:
+        event_info (dict): event received by the event handler
+
+    Returns:
+        (string): key of the event
+    """
+    body = event_info.get("raw_request_body") or {}
+    repo = (body.get("repository") or {}).get("full_name")
+    number = ((body.get("issue") or {}).get("number") or (body.get("pull_request") or {}).get("number") or
+              body.get("number"))
+    if repo and number:
+        return f"{repo}#{number}"
+    return f"event:{event_info['id']}"
+
+
+class EventQueue:
+    """
+    Durable queue of events received by the event handler. Each event is
+    stored in a file (written atomically) before the webhook request is
+    answered, and it is handled by a pool of worker threads (see method
+    start). Events with the same key (see get_event_key) are handled one
+    after another in the order they were received. Events whose handling
+    failed are kept in the subdirectory 'failed'. Events that were being
+    handled when the event handler stopped are not handled again (handling
+    an event, e.g., submitting jobs, is not idempotent), but moved to
+    'failed' as well. All methods may be called from different threads.
+    """
+
+    def __init__(self, path, logfile=None):
+        """
+        EventQueue constructor. Creates the queue directories if needed and
+        loads events left by a previous run.
+
+        Args:
+            path (string): path to the queue directory
+            logfile (string): path to the log file
+        """
+        self.path = path
+        self.logfile = logfile
+        self.condition = threading.Condition()
+        # pending items (ordered by the time they were received) and the
+        # keys of the items being handled
+        self.pending = []
+        self.active_keys = set()
+        self.stopping = False
+        self.workers = []
+        for subdir in (EVENT_QUEUE_PENDING, EVENT_QUEUE_ACTIVE, EVENT_QUEUE_FAILED):
+            os.makedirs(os.path.join(path, subdir), exist_ok=True)
+
+        for file_name in sorted(os.listdir(os.path.join(path, EVENT_QUEUE_ACTIVE))):
+            log(f"EventQueue: handling of event '{file_name}' was interrupted, moving it to "
+                f"'{EVENT_QUEUE_FAILED}'", self.logfile)
+            os.replace(os.path.join(path, EVENT_QUEUE_ACTIVE, file_name),
+                       os.path.join(path, EVENT_QUEUE_FAILED, file_name))
+        for file_name in sorted(os.listdir(os.path.join(path, EVENT_QUEUE_PENDING))):
+            if file_name.startswith(".") or not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(path, EVENT_QUEUE_PENDING, file_name)) as item_file:
+                    self.pending.append(json.load(item_file))
+            except (OSError, ValueError) as err:
+                log(f"EventQueue: failed to read '{file_name}': {err}", self.logfile)
+        if self.pending:
+            log(f"EventQueue: {len(self.pending)} events left by a previous run", self.logfile)
+        self.update_metrics()
+
+    def get_item_path(self, item, subdir):
+        """
+        Determine the path to the file of an item.
+
+        Args:
+            item (dict): the item
+            subdir (string): subdirectory (EVENT_QUEUE_PENDING, ...)
+
+        Returns:
+            (string): path to the file
+        """
+        return os.path.join(self.path, subdir, f"{item['item_id']}.json")
+
+    def put(self, event_info):
+        """
+        Store an event (durably) and wake up a worker to handle it.
+
+        Args:
+            event_info (dict): event received by the event handler
+
+        Returns:
+            (dict): the item with the keys 'item_id', 'key', 'received' and
+                'event_info'
+        """
+        now = time.time()
+        item = {
+            # items are handled in the order they were received
+            "item_id": f"{now:017.6f}-{uuid.uuid4().hex[:8]}",
+            "key": get_event_key(event_info),
+            "received": now,
+            "event_info": store_event_info(event_info),
+        }
+        item_path = self.get_item_path(item, EVENT_QUEUE_PENDING)
+        tmp_path = os.path.join(self.path, EVENT_QUEUE_PENDING, f".{item['item_id']}.tmp")
+        with open(tmp_path, "w") as item_file:
+            json.dump(item, item_file)
+            item_file.flush()
+            os.fsync(item_file.fileno())
+        os.replace(tmp_path, item_path)
+        with self.condition:
+            self.pending.append(item)
+            self.condition.notify()
+        self.update_metrics()
+        return item
+
+    def claim(self, timeout=None):
+        """
+        Take the oldest pending item whose key has no older pending item and
+        no item being handled, waiting until there is one.
+
+        Args:
+            timeout (float): maximum number of seconds to wait (None to wait
+                until an item is available or the queue is stopped)
+
+        Returns:
+            (dict): the item or None if there is none (after the timeout or
+                because the queue is stopped)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                if self.stopping:
+                    return None
+                item = self.find_claimable()
+                if item is not None:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            self.pending.remove(item)
+            self.active_keys.add(item["key"])
+            os.replace(self.get_item_path(item, EVENT_QUEUE_PENDING), self.get_item_path(item, EVENT_QUEUE_ACTIVE))
+        self.update_metrics()
+        return item
+
+    def find_claimable(self):
+        """
+        Find the oldest pending item that can be handled now, i.e., no item
+        with the same key is being handled or pending before it. Must be
+        called with the lock of the condition held.
+
+        Args:
+            No arguments
+
+        Returns:
+            (dict): the item or None if no item can be handled now
+        """
+        blocked_keys = set(self.active_keys)
+        for item in self.pending:
+            if item["key"] not in blocked_keys:
+                return item
+            blocked_keys.add(item["key"])
+        return None
+
+    def done(self, item, failed=False):
+        """
+        Finish handling an item: remove it or (if handling failed) move it
+        to the subdirectory 'failed'. Further items with the same key can be
+        claimed then.
+
+        Args:
+            item (dict): the item
+            failed (bool): whether handling the item failed
+
+        Returns:
+            None (implicitly)
+        """
+        if failed:
+            os.replace(self.get_item_path(item, EVENT_QUEUE_ACTIVE), self.get_item_path(item, EVENT_QUEUE_FAILED))
+        else:
+            os.remove(self.get_item_path(item, EVENT_QUEUE_ACTIVE))
+        with self.condition:
+            self.active_keys.discard(item["key"])
+            self.condition.notify_all()
+        self.update_metrics()
+
+    def update_metrics(self):
+        """
+        Update the metrics about the queue (number of pending events and the
+        time the oldest of them was received).
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        with self.condition:
+            depth = len(self.pending)
+            oldest = self.pending[0]["received"] if self.pending else 0
+        bot_metrics.set(METRIC_EVENT_QUEUE_DEPTH, depth)
+        bot_metrics.set(METRIC_EVENT_QUEUE_OLDEST, oldest)
+
+    def work(self, handler):
+        """
+        Handle items until the queue is stopped (run by each worker thread).
+
+        Args:
+            handler (callable): function handling an event, called with the
+                event information (dict)
+
+        Returns:
+            None (implicitly)
+        """
+        while True:
+            item = self.claim()
+            if item is None:
+                return
+            event_info = restore_event_info(item["event_info"])
+            event_type = event_info.get("type", "")
+            bot_metrics.observe(METRIC_EVENT_WAIT_SECONDS, time.time() - item["received"], type=event_type)
+            failed = False
+            try:
+                with bot_metrics.timer(METRIC_EVENT_HANDLING_SECONDS, type=event_type):
+                    handler(event_info)
+            except Exception as err:
+                failed = True
+                tb_txt = ''.join(traceback.format_exception(None, err, err.__traceback__))
+                log(f"EventQueue: handling event {event_info.get('id')} failed, moving it to "
+                    f"'{EVENT_QUEUE_FAILED}'\n{tb_txt}", self.logfile)
+            bot_metrics.inc(METRIC_EVENTS_HANDLED, type=event_type, result="failed" if failed else "ok")
+            self.done(item, failed=failed)
+
+    def start(self, handler, workers=EVENT_WORKERS_DEFAULT):
+        """
+        Start the worker threads handling the queued events.
+
+        Args:
+            handler (callable): function handling an event, called with the
+                event information (dict)
+            workers (int): number of worker threads
+
+        Returns:
+            None (implicitly)
+        """
+        for idx in range(max(1, int(workers))):
+            worker = threading.Thread(target=self.work, args=(handler,), name=f"event-worker-{idx}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self, timeout=None):
+        """
+        Stop the worker threads after they finished the events they are
+        handling. Pending events stay in the queue.
+
+        Args:
+            timeout (float): maximum number of seconds to wait for each worker
+
+        Returns:
+            None (implicitly)
+        """
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        for worker in self.workers:
+            worker.join(timeout)
+        self.workers = []
+
+    def __len__(self):
+        """
+        Number of pending events.
+        """
+        with self.condition:
+            return len(self.pending)
@@ -0,0 +1,298 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+from datetime import datetime, timezone
+import os
+import threading
+import time
+
+# Third party imports (anything installed into the local Python environment)
+from pyghee.utils import log
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+# (none yet)
+
+
+# name of the directory (under the setting 'job_ids_dir' in section
+# '[job_manager]') holding the symlinks of finished jobs
+FINISHED_DIR_NAME = "finished"
+
+# name of the index file (in the directory of finished jobs), each line holds
+# the job id, the shard (empty for the flat layout) and the time the job
+# finished (seconds since the epoch), separated by tabs; the last line for a
+# job id is the valid one
+FINISHED_INDEX_FILE_NAME = "index.tsv"
+
+# layouts of the directory of finished jobs (see setting 'finished_jobs_layout')
+#  - flat: all symlinks in one directory (layout used by older bot versions)
+#  - month: one subdirectory per month the jobs finished in (e.g., '2024-05')
+#  - prefix: one subdirectory per 1000 job ids (e.g., job 1234567 is stored
+#      in '1234xxx')
+FINISHED_LAYOUT_FLAT = "flat"
+FINISHED_LAYOUT_MONTH = "month"
+FINISHED_LAYOUT_PREFIX = "prefix"
+FINISHED_LAYOUTS = (FINISHED_LAYOUT_FLAT, FINISHED_LAYOUT_MONTH, FINISHED_LAYOUT_PREFIX)
+
+
+def get_finished_jobs_dir(job_ids_dir):
+    """
+    Determine the directory holding the symlinks of finished jobs.
+
+    Args:
+        job_ids_dir (string): value of the setting 'job_ids_dir'
+
+    Returns:
+        (string): path to the directory of finished jobs
+    """
+    return os.path.join(job_ids_dir, FINISHED_DIR_NAME)
+
+
+class FinishedJobs:
+    """
+    Directory of symlinks to the working directories of finished jobs,
+    optionally sharded by month or by job id prefix so no single directory
+    grows without bounds. An append-only index maps job ids to their shard, so
+    a job can be found without listing directories. Symlinks of jobs that are
+    not in the index (e.g., created by older bot versions) are found in the
+    top-level directory. All methods may be called from different threads.
+    """
+
+    def __init__(self, path, layout=FINISHED_LAYOUT_FLAT, logfile=None):
+        """
+        FinishedJobs constructor. Creates the directory if needed.
+
+        Args:
+            path (string): path to the directory of finished jobs
+            layout (string): one of FINISHED_LAYOUTS
+            logfile (string): path to the log file
+
+        Raises:
+            ValueError: if the layout is not supported
+        """
+        if layout not in FINISHED_LAYOUTS:
+            raise ValueError(f"layout '{layout}' of finished jobs is unknown "
+                             f"(supported: {', '.join(FINISHED_LAYOUTS)})")
+        self.path = path
+        self.layout = layout
+        self.logfile = logfile
+        self.index_path = os.path.join(path, FINISHED_INDEX_FILE_NAME)
+        self.lock = threading.Lock()
+        # maps a job id to a tuple (shard, finished), read on first use
+        self.index = None
+        os.makedirs(path, exist_ok=True)
+
+    def get_shard(self, job_id, finished):
+        """
+        Determine the shard (subdirectory) a job is stored in.
+
+        Args:
+            job_id (string): id of the job
+            finished (float): time the job finished (seconds since the epoch)
+
+        Returns:
+            (string): name of the shard (empty for the flat layout)
+        """
+        if self.layout == FINISHED_LAYOUT_MONTH:
+            return datetime.fromtimestamp(finished, timezone.utc).strftime("%Y-%m")
+        if self.layout == FINISHED_LAYOUT_PREFIX:
+            return f"{job_id[:-3] or '0'}xxx"
+        return ""
+
+    def get_entry_path(self, job_id, shard):
+        """
+        Determine the path of the symlink of a job in a shard.
+
+        Args:
+            job_id (string): id of the job
+            shard (string): name of the shard (empty for the top-level
+                directory)
+
+        Returns:
+            (string): path to the symlink
+        """
+        return os.path.join(self.path, shard, job_id) if shard else os.path.join(self.path, job_id)
+
+    def load_index(self):
+        """
+        Read the index file (if it was not read before). Must be called with
+        the lock held.
+
+        Args:
+            No arguments
+
+        Returns:
+            (dict): maps a job id to a tuple (shard, finished)
+        """
+        if self.index is None:
+            self.index = {}
+            try:
+                with open(self.index_path) as index_file:
+                    for line in index_file:
+                        fields = line.rstrip("\n").split("\t")
+                        # skip partially written lines
+                        if len(fields) != 3:
+                            continue
+                        try:
+                            self.index[fields[0]] = (fields[1], float(fields[2]))
+                        except ValueError:
+                            continue
+            except FileNotFoundError:
+                pass
+        return self.index
+
+    def append_to_index(self, entries):
+        """
+        Append entries to the index file and the index. Must be called with
+        the lock held.
+
+        Args:
+            entries (list): list of tuples (job_id, shard, finished)
+
+        Returns:
+            None (implicitly)
+        """
+        index = self.load_index()
+        with open(self.index_path, "a") as index_file:
+            index_file.write("".join(f"{job_id}\t{shard}\t{finished:.0f}\n" for job_id, shard, finished in entries))
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        for job_id, shard, finished in entries:
+            index[job_id] = (shard, finished)
+
+    def add(self, job_id, symlink, finished=None):
+        """
+        Move the symlink of a job (e.g., from the directory of submitted jobs)
+        into the directory of finished jobs and add it to the index.
+
+        Args:
+            job_id (string): id of the job
+            symlink (string): path to the symlink to be moved
+            finished (float): time the job finished (default: time.time())
+
+        Returns:
+            (string): new path of the symlink
+        """
+        finished = time.time() if finished is None else finished
+        shard = self.get_shard(job_id, finished)
+        new_symlink = self.get_entry_path(job_id, shard)
+        if shard:
+            os.makedirs(os.path.join(self.path, shard), exist_ok=True)
+        os.rename(symlink, new_symlink)
+        with self.lock:
+            self.append_to_index([(job_id, shard, finished)])
+        return new_symlink
+
+    def find(self, job_id):
+        """
+        Find the symlink of a finished job.
+
+        Args:
+            job_id (string): id of the job
+
+        Returns:
+            (string): path to the symlink or None if the job is unknown
+        """
+        with self.lock:
+            entry = self.load_index().get(job_id)
+        if entry is not None:
+            return self.get_entry_path(job_id, entry[0])
+        # symlinks of jobs not in the index are in the top-level directory
+        path = self.get_entry_path(job_id, "")
+        return path if os.path.islink(path) else None
+
+    def migrate(self):
+        """
+        Move the symlinks in the top-level directory into the shards of the
+        current layout and add them to the index. Jobs are assumed to have
+        finished when their symlink was last modified. Can be run repeatedly.
+
+        Args:
+            No arguments
+
+        Returns:
+            (int): number of symlinks that were moved or indexed
+        """
+        entries = []
+        with os.scandir(self.path) as dir_entries:
+            for dir_entry in dir_entries:
+                # shards are directories, the symlinks of jobs point to the
+                # working directories of the jobs
+                if not dir_entry.is_symlink():
+                    continue
+                job_id = dir_entry.name
+                finished = dir_entry.stat(follow_symlinks=False).st_mtime
+                shard = self.get_shard(job_id, finished)
+                if shard:
+                    os.makedirs(os.path.join(self.path, shard), exist_ok=True)
+                    os.rename(dir_entry.path, self.get_entry_path(job_id, shard))
+                entries.append((job_id, shard, finished))
+        with self.lock:
+            index = self.load_index()
+            entries = [entry for entry in entries if index.get(entry[0], (None,))[0] != entry[1]]
+            if entries:
+                self.append_to_index(entries)
+        log(f"FinishedJobs: migrated {len(entries)} jobs to layout '{self.layout}'", self.logfile)
+        return len(entries)
+
+    def prune(self, max_age_days, now=None):
+        """
+        Remove the symlinks of jobs that finished more than max_age_days ago
+        (the working directories of the jobs are not touched) and rewrite the
+        index without them. Jobs not in the index are not considered (see
+        method migrate). Shards that become empty are removed.
+
+        Args:
+            max_age_days (float): retention period in days
+            now (float): current time (default: time.time())
+
+        Returns:
+            (list): ids of the jobs whose symlinks were removed
+        """
+        now = time.time() if now is None else now
+        cutoff = now - max_age_days * 24 * 3600
+        with self.lock:
+            index = self.load_index()
+            pruned = [job_id for job_id, (shard, finished) in index.items() if finished < cutoff]
+            shards = set()
+            for job_id in pruned:
+                shard = index.pop(job_id)[0]
+                shards.add(shard)
+                try:
+                    os.remove(self.get_entry_path(job_id, shard))
+                except FileNotFoundError:
+                    pass
+            if pruned:
+                # rewrite the index atomically (compacting it)
+                tmp_path = f"{self.index_path}.tmp"
+                with open(tmp_path, "w") as index_file:
+                    index_file.write("".join(f"{job_id}\t{shard}\t{finished:.0f}\n"
+                                             for job_id, (shard, finished) in index.items()))
+                    index_file.flush()
+                    os.fsync(index_file.fileno())
+                os.replace(tmp_path, self.index_path)
+        for shard in shards - {""}:
+            try:
+                os.rmdir(os.path.join(self.path, shard))
+            except OSError:
+                # shard is not empty
+                pass
+        if pruned:
+            log(f"FinishedJobs: pruned {len(pruned)} jobs that finished more than {max_age_days} days ago",
+                self.logfile)
+        return pruned
+
+    def __len__(self):
+        """
+        Number of jobs in the index.
+        """
+        with self.lock:
+            return len(self.load_index())
@@ -0,0 +1,329 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+from datetime import datetime, timezone
+import json
+import os
+import re
+
+# Third party imports (anything installed into the local Python environment)
+from pyghee.utils import log
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+from connections.github import timed_request
+
+
+# default path to the file storing the state of the poller (see setting
+# 'poll_state_file')
+POLL_STATE_FILE_DEFAULT = "poll_state.json"
+
+# number of items requested per page (maximum supported by GitHub)
+POLL_PER_PAGE = 100
+
+# regular expression extracting the URL of the next page from a Link header
+LINK_NEXT_REGEX = re.compile(r'<([^>]+)>;\s*rel="next"')
+
+
+def make_event_info(event_type, delivery_id, body):
+    """
+    Create the information of an event (as created by
+    pyghee.lib.get_event_info for events received via webhook) for an event
+    synthesized by the poller.
+
+    Args:
+        event_type (string): type of the event (e.g., 'issue_comment')
+        delivery_id (string): id of the event (unique for each change, so
+            events are not handled twice)
+        body (dict): payload of the event (as sent by GitHub via webhook)
+
+    Returns:
+        (dict): event information
+    """
+    timestamp = datetime.now(timezone.utc)
+    iso_timestamp = timestamp.isoformat(timespec="seconds")
+    return {
+        "action": body.get("action", "unknown"),
+        "id": delivery_id,
+        "type": event_type,
+        "timestamp_raw": int(timestamp.timestamp() * 1000),
+        "timestamp": timestamp,
+        "date": iso_timestamp.split("T")[0],
+        "time": iso_timestamp.split("T")[1].split("+")[0].replace(":", "-"),
+        "raw_request_body": body,
+        "raw_request_headers": {},
+    }
+
+
+class GitHubPoller:
+    """
+    Polls GitHub for changes to the pull requests of repositories, for sites
+    that cannot receive events via webhook. Each poll synthesizes the events
+    GitHub would have sent: pull_request (opened, labeled, closed) and
+    issue_comment (created, edited). Requests are conditional (If-None-Match
+    with the ETag of the previous response), so polling resources that did
+    not change does not count against the rate limit of GitHub's API, and new
+    comments are requested with a cursor (parameter since). The cursors and
+    ETags are stored in a JSON file between runs. The first poll of a
+    repository only records its current state.
+    """
+
+    def __init__(self, state_path, repos, requester, logfile=None):
+        """
+        GitHubPoller constructor. Reads the state of previous polls.
+
+        Args:
+            state_path (string): path to the state file
+            repos (list): full names of the repositories to be polled
+            requester (github.Requester.Requester): requester used to send
+                requests to GitHub
+            logfile (string): path to the log file
+        """
+        self.state_path = state_path
+        self.repos = repos
+        self.requester = requester
+        self.logfile = logfile
+        self.state = {}
+        try:
+            with open(state_path) as state_file:
+                self.state = json.load(state_file)
+        except FileNotFoundError:
+            pass
+
+    def save_state(self):
+        """
+        Write the state file atomically.
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as state_file:
+            json.dump(self.state, state_file, indent=1, sort_keys=True)
+            state_file.flush()
+            os.fsync(state_file.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    def request(self, url, parameters=None, etag=None):
+        """
+        Send a (conditional) GET request to GitHub.
+
+        Args:
+            url (string): URL (relative to the API's base URL) or absolute URL
+            parameters (dict): query parameters
+            etag (string): ETag of the previous response (None for an
+                unconditional request)
+
+        Returns:
+            tuple of 3 elements containing
+            - (object): decoded JSON response or None if the resource did not
+              change
+            - (string): ETag of the response
+            - (string): URL of the next page or None
+
+        Raises:
+            RuntimeError: if the request failed
+        """
+        headers = {"If-None-Match": etag} if etag else None
+        status, response_headers, output = timed_request("poll", self.requester.requestJson, "GET", url,
+                                                         parameters=parameters, headers=headers)
+        response_headers = {key.lower(): value for key, value in (response_headers or {}).items()}
+        if status == 304:
+            return None, etag, None
+        if status != 200:
+            raise RuntimeError(f"request {url} failed with status {status}: {output}")
+        match = LINK_NEXT_REGEX.search(response_headers.get("link", ""))
+        return json.loads(output), response_headers.get("etag"), match.group(1) if match else None
+
+    def request_all(self, url, parameters=None, etag=None):
+        """
+        Send a conditional GET request for the first page of a list and, if
+        it changed, obtain all further pages.
+
+        Args:
+            url (string): URL (relative to the API's base URL)
+            parameters (dict): query parameters
+            etag (string): ETag of the previous response for the first page
+
+        Returns:
+            tuple of 2 elements containing
+            - (list): all items or None if the first page did not change
+            - (string): ETag of the first page
+        """
+        items, etag, next_url = self.request(url, parameters=dict(parameters or {}, per_page=POLL_PER_PAGE),
+                                             etag=etag)
+        if items is None:
+            return None, etag
+        while next_url:
+            page, _, next_url = self.request(next_url)
+            items.extend(page)
+        return items, etag
+
+    def poll(self):
+        """
+        Poll all repositories. For each repository, events for pull requests
+        are yielded before events for comments. The state of a repository is saved after
+        all its events were consumed, so events of a repository whose
+        handling was interrupted are synthesized again by the next poll
+        (with the same ids). Repositories that cannot be polled are logged
+        and skipped.
+
+        Args:
+            No arguments
+
+        Yields:
+            (dict): event information (see function make_event_info)
+        """
+        for repo in self.repos:
+            # the state is only updated once all events were consumed
+            repo_state = dict(self.state.get(repo, {}))
+            try:
+                events = self.poll_pulls(repo, repo_state) + self.poll_comments(repo, repo_state)
+            except Exception as err:
+                log(f"GitHubPoller: polling repository {repo} failed: {err}", self.logfile)
+                continue
+            log(f"GitHubPoller: {len(events)} new events in repository {repo}", self.logfile)
+            yield from events
+            self.state[repo] = repo_state
+            self.save_state()
+
+    def poll_pulls(self, repo, repo_state):
+        """
+        Determine which pull requests of a repository were opened, labeled or
+        closed since the last poll. Updates the state of the repository.
+
+        Args:
+            repo (string): full name of the repository
+            repo_state (dict): state of the repository
+
+        Returns:
+            (list): synthesized events
+        """
+        pulls, repo_state["pulls_etag"] = self.request_all(f"/repos/{repo}/pulls", parameters={"state": "open"},
+                                                           etag=repo_state.get("pulls_etag"))
+        if pulls is None:
+            return []
+        known_pulls = repo_state.get("open_pulls")
+        open_pulls = {str(pull["number"]): sorted(label["name"] for label in pull.get("labels", []))
+                      for pull in pulls}
+        repo_state["open_pulls"] = open_pulls
+        if known_pulls is None:
+            # first poll of the repository
+            return []
+
+        events = []
+        repository = {"full_name": repo}
+        for pull in sorted(pulls, key=lambda pull: pull["number"]):
+            number = str(pull["number"])
+            if number not in known_pulls:
+                events.append(make_event_info("pull_request", f"poll:{repo}#{number}:opened", {
+                    "action": "opened", "number": pull["number"], "pull_request": pull,
+                    "repository": repository, "sender": pull["user"]}))
+            added_labels = set(open_pulls[number]) - set(known_pulls.get(number, []))
+            if added_labels:
+                events.extend(self.get_label_events(repo, pull, added_labels))
+        for number in sorted(set(known_pulls) - set(open_pulls), key=int):
+            pull, _, _ = self.request(f"/repos/{repo}/pulls/{number}")
+            sender = pull.get("merged_by") or pull["user"]
+            events.append(make_event_info("pull_request", f"poll:{repo}#{number}:closed:{pull.get('closed_at')}", {
+                "action": "closed", "number": pull["number"], "pull_request": pull,
+                "repository": repository, "sender": sender}))
+        return events
+
+    def get_label_events(self, repo, pull, labels):
+        """
+        Synthesize the events for labels added to a pull request. The issue
+        events of the pull request are obtained to determine who added the
+        labels (which is needed to check permissions, e.g., for 'bot:deploy').
+
+        Args:
+            repo (string): full name of the repository
+            pull (dict): the pull request (as returned by GitHub's API)
+            labels (set): names of the added labels
+
+        Returns:
+            (list): synthesized events
+        """
+        issue_events = self.request_all(f"/repos/{repo}/issues/{pull['number']}/events")[0]
+        # the last time a label was added is the relevant one
+        label_events = {}
+        for issue_event in issue_events:
+            if issue_event.get("event") == "labeled" and issue_event["label"]["name"] in labels:
+                label_events[issue_event["label"]["name"]] = issue_event
+        events = []
+        for name, issue_event in sorted(label_events.items(), key=lambda item: item[1]["created_at"]):
+            events.append(make_event_info("pull_request", f"poll:{repo}#{pull['number']}:labeled:{issue_event['id']}", {
+                "action": "labeled", "number": pull["number"], "pull_request": pull, "label": issue_event["label"],
+                "repository": {"full_name": repo}, "sender": issue_event["actor"]}))
+        return events
+
+    def poll_comments(self, repo, repo_state):
+        """
+        Determine which comments on pull requests of a repository were
+        created or edited since the last poll. Comments created since the
+        last poll are reported as created, even if they were edited since.
+        Updates the state of the repository.
+
+        Args:
+            repo (string): full name of the repository
+            repo_state (dict): state of the repository
+
+        Returns:
+            (list): synthesized events
+        """
+        since = repo_state.get("comments_since")
+        if since is None:
+            # first poll of the repository, only comments created from now on
+            # are of interest
+            repo_state["comments_since"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            repo_state["comments_seen"] = []
+            return []
+        comments, etag = self.request_all(f"/repos/{repo}/issues/comments",
+                                          parameters={"since": since, "sort": "updated", "direction": "asc"},
+                                          etag=repo_state.get("comments_etag"))
+        repo_state["comments_etag"] = etag
+        if comments is None:
+            return []
+
+        # the parameter since is inclusive, so comments updated at the time
+        # of the cursor may have been reported by the previous poll
+        seen = set(repo_state.get("comments_seen", []))
+        events = []
+        for comment in comments:
+            if comment["updated_at"] == since and comment["id"] in seen:
+                continue
+            # comments on issues (rather than pull requests) are not handled
+            if "/pull/" not in comment.get("html_url", ""):
+                continue
+            number = int(comment["issue_url"].rstrip("/").split("/")[-1])
+            if comment["created_at"] > since or (comment["created_at"] == since and comment["id"] not in seen):
+                action = "created"
+                delivery_id = f"poll:{repo}#{number}:comment:{comment['id']}:created"
+            else:
+                action = "edited"
+                delivery_id = f"poll:{repo}#{number}:comment:{comment['id']}:edited:{comment['updated_at']}"
+            events.append(make_event_info("issue_comment", delivery_id, {
+                "action": action, "comment": comment,
+                "issue": {"number": number, "url": comment["issue_url"], "pull_request": {}},
+                "repository": {"full_name": repo}, "sender": comment["user"]}))
+        if comments:
+            new_since = max(comment["updated_at"] for comment in comments)
+            if new_since != since:
+                seen = set()
+                # the URL changes with the cursor, so the ETag is of no use
+                repo_state.pop("comments_etag", None)
+            seen.update(comment["id"] for comment in comments if comment["updated_at"] == new_since)
+            repo_state["comments_since"] = new_since
+            repo_state["comments_seen"] = sorted(seen)
+        return events
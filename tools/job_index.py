@@ -0,0 +1,136 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import glob
+import os
+
+# Third party imports (anything installed into the local Python environment)
+from pyghee.utils import log
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+# (none yet)
+
+
+# name of the directory (under the setting 'jobs_base_dir' in section
+# '[buildenv]') which contains one index file per pull request number; each
+# line of an index file is the path of a job directory
+# (jobs_base_dir/YYYY.MM/pr_<NUMBER>/JOBID)
+JOB_INDEX_DIR_NAME = "pr_index"
+
+
+def get_job_index_file(jobs_base_dir, pr_number):
+    """
+    Determine the index file listing the job directories of a pull request.
+
+    Args:
+        jobs_base_dir (string): value of the setting 'jobs_base_dir'
+        pr_number (int): number of the pull request
+
+    Returns:
+        (string): path to the index file
+    """
+    return os.path.join(jobs_base_dir, JOB_INDEX_DIR_NAME, f"pr_{pr_number}")
+
+
+def glob_job_dirs(jobs_base_dir, pr_number):
+    """
+    Determine the job directories of a pull request by scanning all
+    YYYY.MM directories under jobs_base_dir (used for pull requests whose
+    jobs were submitted before the index existed).
+
+    Args:
+        jobs_base_dir (string): value of the setting 'jobs_base_dir'
+        pr_number (int): number of the pull request
+
+    Returns:
+        (list): paths of the job directories
+    """
+    # a job directory's name has the format jobs_base_dir/YYYY.MM/pr_<id>/JOBID
+    #  - we may have to scan multiple YYYY.MM directories if the pull request was
+    #    processed over more than one month (that is jobs were run in two or more
+    #    months)
+    #  - we assume that a JOBID is a positive integer
+    date_pr_job_pattern = (f"[0-9][0-9][0-9][0-9].[0-9][0-9]/"
+                           f"pr_{pr_number}/[0-9]*")
+    return glob.glob(os.path.join(jobs_base_dir, date_pr_job_pattern))
+
+
+def _create_job_index(jobs_base_dir, pr_number):
+    """
+    Create the index file of a pull request from the job directories that
+    exist already.
+
+    Args:
+        jobs_base_dir (string): value of the setting 'jobs_base_dir'
+        pr_number (int): number of the pull request
+
+    Returns:
+        (list): paths of the job directories written to the index file
+    """
+    index_file = get_job_index_file(jobs_base_dir, pr_number)
+    job_dirs = glob_job_dirs(jobs_base_dir, pr_number)
+    os.makedirs(os.path.dirname(index_file), exist_ok=True)
+    # write to a temporary file first so that a concurrent reader never sees
+    # an incomplete index
+    tmp_index_file = f"{index_file}.{os.getpid()}.tmp"
+    with open(tmp_index_file, "w") as index:
+        index.writelines(f"{job_dir}\n" for job_dir in job_dirs)
+    os.rename(tmp_index_file, index_file)
+    log(f"created job index '{index_file}' with {len(job_dirs)} job directories")
+    return job_dirs
+
+
+def add_job_dir(jobs_base_dir, pr_number, job_dir):
+    """
+    Add a job directory to the index file of a pull request. If the index
+    file does not exist yet, it is created from all job directories of the
+    pull request (including job_dir).
+
+    Args:
+        jobs_base_dir (string): value of the setting 'jobs_base_dir'
+        pr_number (int): number of the pull request
+        job_dir (string): path of the job directory
+            (jobs_base_dir/YYYY.MM/pr_<NUMBER>/JOBID)
+
+    Returns:
+        None (implicitly)
+    """
+    index_file = get_job_index_file(jobs_base_dir, pr_number)
+    if not os.path.exists(index_file):
+        _create_job_index(jobs_base_dir, pr_number)
+        return
+    # lines are short, so appending them is atomic
+    with open(index_file, "a") as index:
+        index.write(f"{job_dir}\n")
+
+
+def get_job_dirs(jobs_base_dir, pr_number):
+    """
+    Determine the job directories of a pull request from its index file
+    (which is created if it does not exist yet). Job directories that no
+    longer exist (e.g., because they were moved to the trash bin) are
+    skipped.
+
+    Args:
+        jobs_base_dir (string): value of the setting 'jobs_base_dir'
+        pr_number (int): number of the pull request
+
+    Returns:
+        (list): paths of the job directories
+    """
+    index_file = get_job_index_file(jobs_base_dir, pr_number)
+    try:
+        with open(index_file) as index:
+            job_dirs = index.read().splitlines()
+    except FileNotFoundError:
+        job_dirs = _create_job_index(jobs_base_dir, pr_number)
+    return [job_dir for job_dir in dict.fromkeys(job_dirs) if job_dir and os.path.isdir(job_dir)]
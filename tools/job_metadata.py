@@ -18,7 +18,7 @@ import sys
 from pyghee.utils import log
 
 # Local application imports (anything from EESSI/eessi-bot-software-layer)
-# (none yet)
+from tools.metrics import bot_metrics, METRIC_METADATA_READ_SECONDS
 
 
 # the job's working directory (JWD) and subdirectories may contain various
@@ -50,6 +50,7 @@ JOB_CFG_REPOSITORY_REPO_VERSION = "repo_version"
 
 JOB_CFG_SITE_CONFIG_SECTION = "site_config"
 JOB_CFG_SITE_CONFIG_BUILD_LOGS_DIR = "build_logs_dir"
+JOB_CFG_SITE_CONFIG_COMPLETION_SPOOL_DIR = "completion_spool_dir"
 JOB_CFG_SITE_CONFIG_CONTAINER_CACHEDIR = "container_cachedir"
 JOB_CFG_SITE_CONFIG_HTTP_PROXY = "http_proxy"
 JOB_CFG_SITE_CONFIG_HTTPS_PROXY = "https_proxy"
@@ -177,7 +178,8 @@ def read_metadata_file(metadata_path, log_file=None):
         log(f"Found metadata file at {metadata_path}", log_file)
         metadata = configparser.ConfigParser()
         try:
-            metadata.read(metadata_path)
+            with bot_metrics.timer(METRIC_METADATA_READ_SECONDS):
+                metadata.read(metadata_path)
         except Exception as err:
             # Using error() would let the process exit. This is too harsh.
             # We just log() a message, return None and let the caller decide
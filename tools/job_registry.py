@@ -0,0 +1,211 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import sqlite3
+import threading
+import time
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+# (none yet)
+
+
+# states of a job as recorded in the registry
+JOB_STATE_NEW = "new"
+JOB_STATE_RELEASED = "released"
+JOB_STATE_RUNNING = "running"
+JOB_STATE_FINISHED = "finished"
+
+# columns with accounting information about finished jobs (as reported by
+# the batch system, e.g., via sacct); they were added after the first version
+# of the registry and are added to existing databases when they are opened
+JOB_REGISTRY_ACCOUNTING_COLUMNS = ("final_state", "exit_code", "elapsed", "max_rss", "node_list")
+
+# columns of the table 'jobs' that may be changed via JobRegistry.update_job
+JOB_REGISTRY_COLUMNS = ("work_dir", "repo", "pr_number", "comment_id", "state") + JOB_REGISTRY_ACCOUNTING_COLUMNS
+
+JOB_REGISTRY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    work_dir TEXT,
+    repo TEXT,
+    pr_number TEXT,
+    comment_id INTEGER,
+    state TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    final_state TEXT,
+    exit_code TEXT,
+    elapsed TEXT,
+    max_rss TEXT,
+    node_list TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+
+class JobRegistry:
+    """
+    Local registry of the jobs handled by the job manager, stored in an SQLite
+    database (in WAL mode). The registry holds one row per job which is
+    updated at each transition of the job (new, released, running, finished).
+    For finished jobs, the row also holds accounting information (final state,
+    exit code, elapsed time, MaxRSS and nodes). All methods may be called from
+    different threads.
+    """
+
+    def __init__(self, path):
+        """
+        JobRegistry constructor. Opens (and if needed creates) the database.
+
+        Args:
+            path (string): path to the database file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(JOB_REGISTRY_SCHEMA)
+            columns = [row["name"] for row in self.connection.execute("PRAGMA table_info(jobs)")]
+            for column in JOB_REGISTRY_ACCOUNTING_COLUMNS:
+                if column not in columns:
+                    self.connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+
+    def close(self):
+        """
+        Close the database.
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        with self.lock:
+            self.connection.close()
+
+    def add_jobs(self, jobs):
+        """
+        Add jobs to the registry (in a single transaction). Jobs that are
+        already registered are left untouched.
+
+        Args:
+            jobs (list): list of dictionaries with the keys 'job_id' and
+                (optionally) 'work_dir', 'repo', 'pr_number', 'comment_id' and
+                'state' (default: 'new')
+
+        Returns:
+            None (implicitly)
+        """
+        now = time.time()
+        rows = [
+            (job["job_id"], job.get("work_dir"), job.get("repo"), job.get("pr_number"),
+             job.get("comment_id"), job.get("state", JOB_STATE_NEW), now, now)
+            for job in jobs
+        ]
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO jobs"
+                " (job_id, work_dir, repo, pr_number, comment_id, state, created, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def add_job(self, job_id, **fields):
+        """
+        Add a single job to the registry (see method add_jobs).
+
+        Args:
+            job_id (string): id of the job
+            fields (dict): values for the columns of the job's row
+
+        Returns:
+            None (implicitly)
+        """
+        self.add_jobs([dict(fields, job_id=job_id)])
+
+    def update_job(self, job_id, **fields):
+        """
+        Update the row of a job, e.g., at a transition of its state.
+
+        Args:
+            job_id (string): id of the job
+            fields (dict): new values for the columns of the job's row (only
+                columns listed in JOB_REGISTRY_COLUMNS)
+
+        Returns:
+            (bool): True if the job is registered, False otherwise
+
+        Raises:
+            ValueError: if an unknown column is given
+        """
+        unknown = set(fields) - set(JOB_REGISTRY_COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown column(s) {', '.join(sorted(unknown))}")
+
+        columns = sorted(fields)
+        assignments = ", ".join(f"{column} = ?" for column in columns + ["updated"])
+        values = [fields[column] for column in columns] + [time.time(), job_id]
+        with self.lock:
+            cursor = self.connection.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", values)
+        return cursor.rowcount > 0
+
+    def get_job(self, job_id):
+        """
+        Obtain the row of a job.
+
+        Args:
+            job_id (string): id of the job
+
+        Returns:
+            (dict): columns of the job's row or None if the job is not registered
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_jobs(self, exclude_state=JOB_STATE_FINISHED):
+        """
+        Obtain the rows of all jobs, by default of all jobs that have not
+        finished yet.
+
+        Args:
+            exclude_state (string): jobs in this state are not returned (None
+                to return all jobs)
+
+        Returns:
+            (dict): maps a job id to the columns of the job's row
+        """
+        with self.lock:
+            if exclude_state is None:
+                rows = self.connection.execute("SELECT * FROM jobs").fetchall()
+            else:
+                rows = self.connection.execute("SELECT * FROM jobs WHERE state != ?", (exclude_state,)).fetchall()
+        return {row["job_id"]: dict(row) for row in rows}
+
+    def is_empty(self):
+        """
+        Check if the registry contains no jobs at all.
+
+        Args:
+            No arguments
+
+        Returns:
+            (bool): True if no job is registered, False otherwise
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT 1 FROM jobs LIMIT 1").fetchone()
+        return row is None
@@ -0,0 +1,309 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+import time
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+# (none yet)
+
+
+METRIC_TYPE_COUNTER = "counter"
+METRIC_TYPE_GAUGE = "gauge"
+METRIC_TYPE_SUMMARY = "summary"
+
+# metrics collected by the bot (name -> (type, help text))
+METRIC_ITERATIONS = "eessi_bot_job_manager_iterations_total"
+METRIC_ITERATION_DURATION = "eessi_bot_job_manager_iteration_duration_seconds"
+METRIC_POLL_INTERVAL = "eessi_bot_job_manager_poll_interval_seconds"
+METRIC_PHASE_DURATION = "eessi_bot_job_manager_phase_duration_seconds"
+METRIC_PHASE_SECONDS = "eessi_bot_job_manager_phase_seconds"
+METRIC_JOBS = "eessi_bot_job_manager_jobs"
+METRIC_SUBPROCESS_SECONDS = "eessi_bot_subprocess_seconds"
+METRIC_GITHUB_REQUEST_SECONDS = "eessi_bot_github_request_seconds"
+METRIC_GITHUB_REQUEST_ERRORS = "eessi_bot_github_request_errors_total"
+METRIC_METADATA_READ_SECONDS = "eessi_bot_metadata_read_seconds"
+METRIC_COMMENT_UPDATES = "eessi_bot_comment_updates_total"
+METRIC_COMMENT_EDITS = "eessi_bot_comment_edits_total"
+METRIC_COMMENT_CACHE = "eessi_bot_comment_cache_lookups_total"
+METRIC_OUTBOX_ITEMS = "eessi_bot_job_manager_outbox_items"
+METRIC_CLUSTER_UP = "eessi_bot_job_manager_cluster_up"
+METRIC_EVENT_QUEUE_DEPTH = "eessi_bot_event_queue_depth"
+METRIC_EVENT_QUEUE_OLDEST = "eessi_bot_event_queue_oldest_event_timestamp_seconds"
+METRIC_EVENT_WAIT_SECONDS = "eessi_bot_event_wait_seconds"
+METRIC_EVENT_HANDLING_SECONDS = "eessi_bot_event_handling_seconds"
+METRIC_EVENTS_HANDLED = "eessi_bot_events_handled_total"
+METRIC_EVENTS_DUPLICATE = "eessi_bot_events_duplicate_total"
+
+METRICS = {
+    METRIC_ITERATIONS: (METRIC_TYPE_COUNTER, "Number of iterations of the job manager's main loop"),
+    METRIC_ITERATION_DURATION: (METRIC_TYPE_GAUGE,
+                                "Duration of the last iteration of the job manager (excluding the wait before it)"),
+    METRIC_POLL_INTERVAL: (METRIC_TYPE_GAUGE, "Current interval between two polls of the batch system"),
+    METRIC_PHASE_DURATION: (METRIC_TYPE_GAUGE, "Duration of each phase in the last iteration of the job manager"),
+    METRIC_PHASE_SECONDS: (METRIC_TYPE_SUMMARY, "Time spent in each phase of the job manager's main loop"),
+    METRIC_JOBS: (METRIC_TYPE_GAUGE, "Number of jobs per category in the last iteration of the job manager"),
+    METRIC_SUBPROCESS_SECONDS: (METRIC_TYPE_SUMMARY, "Time spent running commands (e.g., squeue or scontrol)"),
+    METRIC_GITHUB_REQUEST_SECONDS: (METRIC_TYPE_SUMMARY, "Time spent in requests to GitHub"),
+    METRIC_GITHUB_REQUEST_ERRORS: (METRIC_TYPE_COUNTER, "Number of failed requests to GitHub"),
+    METRIC_METADATA_READ_SECONDS: (METRIC_TYPE_SUMMARY, "Time spent reading job metadata files"),
+    METRIC_COMMENT_UPDATES: (METRIC_TYPE_COUNTER, "Number of updates queued for PR comments"),
+    METRIC_COMMENT_EDITS: (METRIC_TYPE_COUNTER, "Number of edits of PR comments applying queued updates"),
+    METRIC_COMMENT_CACHE: (METRIC_TYPE_COUNTER,
+                           "Number of lookups of PR comments before editing them (by result: hit, changed, miss)"),
+    METRIC_OUTBOX_ITEMS: (METRIC_TYPE_GAUGE, "Number of updates to PR comments waiting in the outbox"),
+    METRIC_CLUSTER_UP: (METRIC_TYPE_GAUGE, "Whether the jobs of a cluster could be listed in the last iteration (1) "
+                        "or not (0)"),
+    METRIC_EVENT_QUEUE_DEPTH: (METRIC_TYPE_GAUGE, "Number of received events waiting to be handled"),
+    METRIC_EVENT_QUEUE_OLDEST: (METRIC_TYPE_GAUGE,
+                                "Time the oldest event waiting to be handled was received (0 if there is none)"),
+    METRIC_EVENT_WAIT_SECONDS: (METRIC_TYPE_SUMMARY, "Time events waited in the queue before they were handled"),
+    METRIC_EVENT_HANDLING_SECONDS: (METRIC_TYPE_SUMMARY, "Time spent handling events"),
+    METRIC_EVENTS_HANDLED: (METRIC_TYPE_COUNTER, "Number of handled events (by type and result: ok, failed)"),
+    METRIC_EVENTS_DUPLICATE: (METRIC_TYPE_COUNTER, "Number of ignored duplicate events (by type and reason: "
+                              "delivery, payload, concurrent)"),
+}
+
+
+def escape_label_value(value):
+    """
+    Escape the value of a label for the Prometheus text exposition format.
+
+    Args:
+        value (string): value of the label
+
+    Returns:
+        (string): escaped value
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels):
+    """
+    Format labels for the Prometheus text exposition format.
+
+    Args:
+        labels (tuple): tuple of (name, value) pairs
+
+    Returns:
+        (string): formatted labels (empty if there are no labels)
+    """
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels) + "}"
+
+
+class Metrics:
+    """
+    Collects counters, gauges and summaries (sum and count of observations)
+    and renders them in the Prometheus text exposition format. All methods may
+    be called from different threads.
+    """
+
+    def __init__(self):
+        """
+        Metrics constructor.
+        """
+        self.lock = threading.Lock()
+        # maps a metric name to a dictionary mapping (sorted) labels to a
+        # value (counters, gauges) or a list [sum, count] (summaries)
+        self.values = {}
+
+    def reset(self):
+        """
+        Forget all collected values.
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        with self.lock:
+            self.values.clear()
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increase a counter.
+
+        Args:
+            name (string): name of the metric
+            value (float): amount to increase the counter by
+            labels (dict): labels of the metric
+
+        Returns:
+            None (implicitly)
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """
+        Set a gauge.
+
+        Args:
+            name (string): name of the metric
+            value (float): new value
+            labels (dict): labels of the metric
+
+        Returns:
+            None (implicitly)
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values.setdefault(name, {})[key] = value
+
+    def observe(self, name, value, **labels):
+        """
+        Record an observation (e.g., a duration) for a summary.
+
+        Args:
+            name (string): name of the metric
+            value (float): observed value
+            labels (dict): labels of the metric
+
+        Returns:
+            None (implicitly)
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values.setdefault(name, {})
+            summary = series.setdefault(key, [0.0, 0])
+            summary[0] += value
+            summary[1] += 1
+
+    @contextmanager
+    def timer(self, name, gauge=None, **labels):
+        """
+        Context manager that records the duration of its body (in seconds)
+        for a summary, also if the body raises an exception.
+
+        Args:
+            name (string): name of the summary
+            gauge (string): name of a gauge that is set to the duration as
+                well (optional)
+            labels (dict): labels of the metrics
+
+        Yields:
+            None
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.observe(name, duration, **labels)
+            if gauge:
+                self.set(gauge, duration, **labels)
+
+    def get(self, name, **labels):
+        """
+        Obtain the value of a metric.
+
+        Args:
+            name (string): name of the metric
+            labels (dict): labels of the metric
+
+        Returns:
+            value of a counter or gauge, tuple (sum, count) for a summary or
+                None if no value was recorded
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            value = self.values.get(name, {}).get(key)
+        return tuple(value) if isinstance(value, list) else value
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Args:
+            No arguments
+
+        Returns:
+            (string): metrics in the text exposition format
+        """
+        lines = []
+        with self.lock:
+            for name in sorted(self.values):
+                metric_type, help_text = METRICS.get(name, (METRIC_TYPE_GAUGE, ""))
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in sorted(self.values[name].items()):
+                    if metric_type == METRIC_TYPE_SUMMARY:
+                        lines.append(f"{name}_sum{format_labels(labels)} {value[0]:.6f}")
+                        lines.append(f"{name}_count{format_labels(labels)} {value[1]}")
+                    else:
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        """
+        Write all metrics to a file (atomically, so a collector never reads a
+        partially written file), e.g., for the textfile collector of the
+        Prometheus node exporter.
+
+        Args:
+            path (string): path to the file
+
+        Returns:
+            None (implicitly)
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_http_server(self, port, address="127.0.0.1"):
+        """
+        Serve all metrics via HTTP (on any path) in a background thread.
+
+        Args:
+            port (int): port to listen on (0 to pick a free port)
+            address (string): address to listen on
+
+        Returns:
+            (ThreadingHTTPServer): the server (call its method shutdown to stop
+                serving)
+        """
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # do not log every scrape to stderr
+                pass
+
+        server = ThreadingHTTPServer((address, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, name="metrics-http-server", daemon=True)
+        thread.start()
+        return server
+
+
+# metrics collected by the current process
+bot_metrics = Metrics()
@@ -0,0 +1,289 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import json
+import os
+import threading
+import time
+import uuid
+
+# Third party imports (anything installed into the local Python environment)
+from pyghee.utils import log
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+# (none yet)
+
+
+# name of the directory (under the setting 'job_ids_dir' in section
+# '[job_manager]') storing updates to PR comments that were not applied yet
+OUTBOX_DIR_NAME = "outbox"
+
+# default number of seconds after which an update that could not be applied
+# is given up (see setting 'pr_update_deadline')
+OUTBOX_DEADLINE_DEFAULT = 24 * 3600
+
+# delays between attempts to apply an update grow exponentially from the
+# minimum to the maximum delay (in seconds)
+OUTBOX_RETRY_DELAY_MIN = 30
+OUTBOX_RETRY_DELAY_MAX = 3600
+
+
+def get_outbox_dir(job_ids_dir):
+    """
+    Determine the directory storing updates to PR comments not applied yet.
+
+    Args:
+        job_ids_dir (string): value of the setting 'job_ids_dir'
+
+    Returns:
+        (string): path to the outbox directory
+    """
+    return os.path.join(job_ids_dir, OUTBOX_DIR_NAME)
+
+
+class Outbox:
+    """
+    Durable queue of updates to PR comments. Each update is stored in a file
+    (written atomically) before it is applied and only removed once it was
+    applied, so updates survive failures of GitHub and restarts of the job
+    manager. Updates that could not be applied are retried with exponential
+    backoff until their deadline has passed. All methods may be called from
+    different threads.
+    """
+
+    def __init__(self, path, deadline=OUTBOX_DEADLINE_DEFAULT, logfile=None):
+        """
+        Outbox constructor. Creates the outbox directory if needed.
+
+        Args:
+            path (string): path to the outbox directory
+            deadline (float): number of seconds after which an update is
+                given up
+            logfile (string): path to the log file
+        """
+        self.path = path
+        self.deadline = deadline
+        self.logfile = logfile
+        self.lock = threading.Lock()
+        # ids of items handed out by method get_due_items that were neither
+        # removed nor rescheduled yet
+        self.in_flight = set()
+        os.makedirs(path, exist_ok=True)
+        # ids of the items waiting to be retried (i.e., not in flight) per
+        # comment id, so method is_waiting does not need to read the items
+        self.waiting = {}
+        for item in self.get_items():
+            self.waiting.setdefault(item["comment_id"], set()).add(item["id"])
+
+    def get_item_path(self, item_id):
+        """
+        Determine the path to the file of an item.
+
+        Args:
+            item_id (string): id of the item
+
+        Returns:
+            (string): path to the file
+        """
+        return os.path.join(self.path, f"{item_id}.json")
+
+    def write_item(self, item):
+        """
+        Write the file of an item atomically.
+
+        Args:
+            item (dict): the item
+
+        Returns:
+            None (implicitly)
+        """
+        item_path = self.get_item_path(item["id"])
+        tmp_path = os.path.join(self.path, f".{item['id']}.tmp")
+        with open(tmp_path, "w") as item_file:
+            json.dump(item, item_file)
+            item_file.flush()
+            os.fsync(item_file.fileno())
+        os.replace(tmp_path, item_path)
+
+    def set_waiting(self, item, waiting):
+        """
+        Record whether an item is waiting to be retried (see attribute
+        waiting). The caller must hold the lock.
+
+        Args:
+            item (dict): the item
+            waiting (bool): whether the item is waiting
+
+        Returns:
+            None (implicitly)
+        """
+        if waiting:
+            self.waiting.setdefault(item["comment_id"], set()).add(item["id"])
+        else:
+            item_ids = self.waiting.get(item["comment_id"], set())
+            item_ids.discard(item["id"])
+            if not item_ids:
+                self.waiting.pop(item["comment_id"], None)
+
+    def add(self, repo, pr_number, comment_id, update, in_flight=True):
+        """
+        Store an update to a PR comment. If the new item is in flight, the
+        caller is expected to try to apply it and then call method remove or
+        reschedule. Otherwise, it is returned by method get_due_items.
+
+        Args:
+            repo (string): name of the repository
+            pr_number (int): number of the pull request
+            comment_id (int): id of the comment
+            update (string): update to be added to the comment
+            in_flight (bool): whether the caller applies the update right away
+
+        Returns:
+            (dict): the item with the keys 'id', 'repo', 'pr_number',
+                'comment_id', 'update', 'created', 'deadline', 'attempts' and
+                'next_attempt'
+        """
+        now = time.time()
+        item = {
+            # items are processed in the order they were created
+            "id": f"{now:017.6f}-{uuid.uuid4().hex[:8]}",
+            "repo": repo,
+            "pr_number": int(pr_number),
+            "comment_id": int(comment_id),
+            "update": update,
+            "created": now,
+            "deadline": now + self.deadline,
+            "attempts": 0,
+            "next_attempt": now,
+        }
+        self.write_item(item)
+        with self.lock:
+            if in_flight:
+                self.in_flight.add(item["id"])
+            else:
+                self.set_waiting(item, True)
+        return item
+
+    def is_waiting(self, comment_id):
+        """
+        Check if updates to a comment are waiting to be retried. Further
+        updates to the comment should then not be applied before them.
+
+        Args:
+            comment_id (int): id of the comment
+
+        Returns:
+            (bool): True if updates to the comment are waiting, False otherwise
+        """
+        with self.lock:
+            return int(comment_id) in self.waiting
+
+    def get_items(self):
+        """
+        Read all items (in the order they were created). Files that cannot be
+        read are logged and skipped.
+
+        Args:
+            No arguments
+
+        Returns:
+            (list): list of items
+        """
+        items = []
+        for file_name in sorted(os.listdir(self.path)):
+            if file_name.startswith(".") or not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.path, file_name)) as item_file:
+                    items.append(json.load(item_file))
+            except (OSError, ValueError) as err:
+                log(f"Outbox: failed to read '{file_name}': {err}", self.logfile)
+        return items
+
+    def get_due_items(self, now=None):
+        """
+        Determine the items whose next attempt is due and mark them as in
+        flight. Items whose deadline has passed are removed (and logged). An
+        item is not due as long as an older item for the same comment is not
+        due, so updates to a comment are applied in order.
+
+        Args:
+            now (float): current time (default: time.time())
+
+        Returns:
+            (list): list of items to be applied
+        """
+        now = time.time() if now is None else now
+        due_items = []
+        waiting_comments = set()
+        for item in self.get_items():
+            with self.lock:
+                if item["id"] in self.in_flight:
+                    continue
+            if item["deadline"] < now:
+                log(f"Outbox: giving up update of comment {item['comment_id']} in PR "
+                    f"{item['repo']}#{item['pr_number']} after {item['attempts']} attempts: "
+                    f"'{item['update']}'", self.logfile)
+                self.remove(item)
+            elif item["next_attempt"] > now or item["comment_id"] in waiting_comments:
+                waiting_comments.add(item["comment_id"])
+            else:
+                with self.lock:
+                    self.in_flight.add(item["id"])
+                    self.set_waiting(item, False)
+                due_items.append(item)
+        return due_items
+
+    def remove(self, item):
+        """
+        Remove an item (e.g., after it was applied).
+
+        Args:
+            item (dict): the item
+
+        Returns:
+            None (implicitly)
+        """
+        try:
+            os.remove(self.get_item_path(item["id"]))
+        except FileNotFoundError:
+            pass
+        with self.lock:
+            self.in_flight.discard(item["id"])
+            self.set_waiting(item, False)
+
+    def reschedule(self, item):
+        """
+        Schedule the next attempt to apply an item after a failed attempt.
+
+        Args:
+            item (dict): the item
+
+        Returns:
+            None (implicitly)
+        """
+        item["attempts"] += 1
+        delay = min(OUTBOX_RETRY_DELAY_MIN * 2 ** (item["attempts"] - 1), OUTBOX_RETRY_DELAY_MAX)
+        item["next_attempt"] = time.time() + delay
+        self.write_item(item)
+        with self.lock:
+            self.in_flight.discard(item["id"])
+            self.set_waiting(item, True)
+        log(f"Outbox: update of comment {item['comment_id']} failed (attempt {item['attempts']}), "
+            f"retrying in {delay} seconds", self.logfile)
+
+    def __len__(self):
+        """
+        Number of items in the outbox.
+        """
+        return sum(1 for file_name in os.listdir(self.path)
+                   if file_name.endswith(".json") and not file_name.startswith("."))
@@ -0,0 +1,88 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+# (none yet)
+
+# Third party imports (anything installed into the local Python environment)
+# (none yet)
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+# (none yet)
+
+
+# default factor by which the poll interval grows when nothing changes
+POLL_BACKOFF_FACTOR_DEFAULT = 2.0
+
+
+class PollScheduler:
+    """
+    Determines how long the job manager waits before it polls the batch system
+    again. The interval is reset to its minimum whenever something happened
+    (jobs appeared, changed state or finished) or jobs wait for being released,
+    and it grows exponentially (up to its maximum) while nothing changes. If a
+    running job is expected to end before the next poll, the interval is
+    shortened so the job is noticed as finished soon after its end.
+    """
+
+    def __init__(self, min_interval, max_interval, backoff_factor=POLL_BACKOFF_FACTOR_DEFAULT):
+        """
+        PollScheduler constructor.
+
+        Args:
+            min_interval (int): minimum interval in seconds
+            max_interval (int): maximum interval in seconds (values smaller
+                than min_interval are raised to min_interval)
+            backoff_factor (float): factor by which the interval grows when
+                nothing changes (values smaller than 1 are treated as 1)
+
+        Returns:
+            None (implicitly)
+        """
+        self.min_interval = max(1, int(min_interval))
+        self.max_interval = max(self.min_interval, int(max_interval))
+        self.backoff_factor = max(1.0, float(backoff_factor))
+        self.interval = self.min_interval
+
+    def next_interval(self, jobs_changed, jobs_pending_release, seconds_to_next_end=None):
+        """
+        Determine the interval until the next poll.
+
+        Args:
+            jobs_changed (bool): True if jobs appeared, changed their state or
+                finished since the last poll
+            jobs_pending_release (bool): True if jobs wait for being released
+            seconds_to_next_end (float): seconds until the earliest expected
+                end of a running job (None if unknown or no job is running)
+
+        Returns:
+            tuple of 2 elements containing
+            - (int): interval in seconds
+            - (string): reason why this interval was chosen
+        """
+        if jobs_pending_release:
+            self.interval = self.min_interval
+            reason = "jobs are pending release"
+        elif jobs_changed:
+            self.interval = self.min_interval
+            reason = "jobs changed since last poll"
+        elif self.interval < self.max_interval:
+            self.interval = min(self.max_interval, int(self.interval * self.backoff_factor))
+            reason = "no changes since last poll, backing off"
+        else:
+            reason = "no changes since last poll, maximum interval reached"
+
+        interval = self.interval
+        if seconds_to_next_end is not None and seconds_to_next_end < interval:
+            interval = max(self.min_interval, int(seconds_to_next_end) + 1)
+            reason = f"a job is expected to end in {int(max(0, seconds_to_next_end))} seconds"
+
+        return interval, reason
@@ -15,21 +15,33 @@
 #
 
 # Standard library imports
-from collections import namedtuple
+import atexit
+from collections import namedtuple, OrderedDict
 from enum import Enum
 import re
 import sys
+import threading
 
 # Third party imports (anything installed into the local Python environment)
+from github.IssueComment import IssueComment
 from pyghee.utils import log
 from retry import retry
 from retry.api import retry_call
 
 # Local application imports (anything from EESSI/eessi-bot-software-layer)
 from connections import github
+from connections.github import timed_request
 from tools import config
+from tools.comment_cache import CommentCache, get_body_hash
+from tools.metrics import bot_metrics, METRIC_COMMENT_CACHE, METRIC_COMMENT_EDITS, METRIC_COMMENT_UPDATES
 
 
+# default number of seconds updates to the same comment are collected before
+# they are applied with a single edit (see setting 'comment_update_window')
+COMMENT_UPDATE_WINDOW_DEFAULT = 2
+# maximum number of comments whose last known body is kept
+COMMENT_UPDATER_CACHE_SIZE = 1000
+
 PRComment = namedtuple('PRComment', ('repo_name', 'pr_number', 'pr_comment_id'))
 
 
@@ -62,11 +74,15 @@ def create_comment(repo_name, pr_number, comment, req_chatlevel):
         config.BOT_CONTROL_SETTING_CHATLEVEL, ChatLevels.BASIC.name).upper()
 
     if ChatLevels[chatlevel].value >= req_chatlevel.value:
-        gh = github.get_instance()
-        repo = gh.get_repo(repo_name)
-        pull_request = repo.get_pull(pr_number)
-        issue_comment = retry_call(pull_request.create_issue_comment, fargs=[comment],
+        pull_request = github.get_pull(repo_name, pr_number)
+        issue_comment = retry_call(timed_request,
+                                   fargs=["create_issue_comment", pull_request.create_issue_comment, comment],
                                    exceptions=Exception, tries=3, delay=1, backoff=2, max_delay=10)
+        # the body of the new comment is known, so adding rows to it later
+        # (e.g., by the job manager) does not need to obtain it first
+        comment_cache = get_comment_cache()
+        if comment_cache is not None:
+            cache_comment(comment_cache, issue_comment)
         return issue_comment
 
     else:
@@ -111,14 +127,17 @@ def get_comment(pr, search_pattern):
         github.IssueComment.IssueComment instance or None (note, github refers to
             PyGithub, not the github from the internal connections module)
     """
-    comments = pr.get_issue_comments()
-    for comment in comments:
-        cms = f".*{search_pattern}.*"
-        comment_match = re.search(cms, comment.body)
-        if comment_match:
-            return comment
+    def search_comments():
+        comments = pr.get_issue_comments()
+        for comment in comments:
+            cms = f".*{search_pattern}.*"
+            comment_match = re.search(cms, comment.body)
+            if comment_match:
+                return comment
+        return None
 
-    return None
+    # comments are obtained page by page while searching
+    return timed_request("get_issue_comments", search_comments)
 
 
 # Note, no @retry decorator used here because it is already used with get_comment.
@@ -143,6 +162,25 @@ def get_submitted_job_comment(pr, job_id):
     return get_comment(pr, job_search_pattern)
 
 
+def get_comment_body(pr, cmnt_id):
+    """
+    Obtain the body of a comment to a pull request
+
+    Args:
+        pr (github.PullRequest.PullRequest): instance representing the pull
+            request the comment belongs to
+        cmnt_id (int): id of the comment
+
+    Returns:
+        (string): body of the comment or None if the comment was not found
+    """
+    issue_comment = retry_call(timed_request, fargs=["get_issue_comment", pr.get_issue_comment, cmnt_id],
+                               exceptions=Exception, tries=5, delay=1, backoff=2, max_delay=30)
+    if issue_comment:
+        return issue_comment.body
+    return None
+
+
 def update_comment(cmnt_id, pr, update, log_file=None):
     """
     Update a comment to a pull request
@@ -157,11 +195,11 @@ def update_comment(cmnt_id, pr, update, log_file=None):
     Returns:
         None (implicitly)
     """
-    issue_comment = retry_call(pr.get_issue_comment, fargs=[cmnt_id], exceptions=Exception,
-                               tries=5, delay=1, backoff=2, max_delay=30)
+    issue_comment = retry_call(timed_request, fargs=["get_issue_comment", pr.get_issue_comment, cmnt_id],
+                               exceptions=Exception, tries=5, delay=1, backoff=2, max_delay=30)
     if issue_comment:
-        retry_call(issue_comment.edit, fargs=[issue_comment.body + update], exceptions=Exception,
-                   tries=5, delay=1, backoff=2, max_delay=30)
+        retry_call(timed_request, fargs=["edit_issue_comment", issue_comment.edit, issue_comment.body + update],
+                   exceptions=Exception, tries=5, delay=1, backoff=2, max_delay=30)
     else:
         log(f"no comment with id {cmnt_id}, skipping update '{update}'",
             log_file=log_file)
@@ -170,6 +208,8 @@ def update_comment(cmnt_id, pr, update, log_file=None):
 def update_pr_comment(event_info, update):
     """
     Updates a comment to a pull request determined from an issue_comment event.
+    The update is queued with the comment updater of the process (see function
+    get_comment_updater).
 
     Args:
         event_info (dict): storing all information of an event
@@ -182,13 +222,380 @@ def update_pr_comment(event_info, update):
     if 'issue' not in request_body:
         log("event is not an issue_comment; cannot update the comment")
         return
-    comment_new = request_body['comment']['body']
     repo_name = request_body['repository']['full_name']
     pr_number = int(request_body['issue']['number'])
     issue_id = int(request_body['comment']['id'])
 
-    gh = github.get_instance()
-    repo = gh.get_repo(repo_name)
-    pull_request = repo.get_pull(pr_number)
-    issue_comment = pull_request.get_issue_comment(issue_id)
-    issue_comment.edit(comment_new + update)
+    pull_request = github.get_pull(repo_name, pr_number)
+    # the comment is created from the event, so it does not need to be obtained
+    # from GitHub before it is edited (unless the comment updater knows a more
+    # recent version of it)
+    issue_comment = IssueComment(pull_request.requester, {}, request_body['comment'], completed=True)
+    get_comment_updater().queue_update(issue_id, pull_request, update, issue_comment=issue_comment)
+
+
+def cache_comment(comment_cache, issue_comment):
+    """
+    Store the body (and the ETag GitHub returned with it) of a comment in a
+    comment cache.
+
+    Args:
+        comment_cache (tools.comment_cache.CommentCache): the cache
+        issue_comment (github.IssueComment.IssueComment): the comment
+
+    Returns:
+        None (implicitly)
+    """
+    comment_cache.put(issue_comment.id, issue_comment.url, issue_comment.body, issue_comment.etag)
+
+
+def get_cached_comment(comment_cache, cmnt_id, pr):
+    """
+    Create a comment from its entry in a comment cache, without contacting
+    GitHub.
+
+    Args:
+        comment_cache (tools.comment_cache.CommentCache): the cache
+        cmnt_id (int): id of the comment
+        pr (github.PullRequest.PullRequest): instance representing the pull
+            request the comment belongs to
+
+    Returns:
+        github.IssueComment.IssueComment instance or None if the comment is
+            not cached
+    """
+    entry = comment_cache.get(cmnt_id)
+    if entry is None:
+        return None
+    headers = {"etag": entry["etag"]} if entry["etag"] else {}
+    attributes = {"id": entry["comment_id"], "url": entry["url"], "body": entry["body"]}
+    return IssueComment(pr.requester, headers, attributes, completed=True)
+
+
+def edit_comment(issue_comment, body, comment_cache=None):
+    """
+    Replace the body of a comment with a single request. Unlike
+    IssueComment.edit, this keeps the ETag of the response, so the comment
+    can be checked for changes later with a conditional request.
+
+    Args:
+        issue_comment (github.IssueComment.IssueComment): the comment
+        body (string): new body of the comment
+        comment_cache (tools.comment_cache.CommentCache): cache the new body
+            is stored in (optional)
+
+    Returns:
+        github.IssueComment.IssueComment instance with the new body
+    """
+    requester = issue_comment.requester
+    headers, data = requester.requestJsonAndCheck("PATCH", issue_comment.url, input={"body": body})
+    edited_comment = IssueComment(requester, headers, data, completed=True)
+    if comment_cache is not None:
+        cache_comment(comment_cache, edited_comment)
+    return edited_comment
+
+
+class CommentUpdater:
+    """
+    Write-behind queue for updates to PR comments (i.e., rows appended to the
+    status table of a comment). All updates queued for the same comment within
+    a short window are merged and applied with a single edit of the comment.
+    The comments edited last (incl. their body) are kept, so appending rows to
+    a comment again does not require to obtain the comment from GitHub first.
+    With a comment cache, the bodies of comments created or edited by the bot
+    are also known across processes and restarts.
+
+    Unless disabled, a known comment is checked with a conditional request
+    (If-None-Match) before it is edited. Such a request does not count against
+    the rate limit of GitHub's API if the comment did not change. If it did
+    change (the hash of its body differs), e.g., because someone else edited
+    it, the rows are appended to the current body.
+    """
+
+    def __init__(self, window=COMMENT_UPDATE_WINDOW_DEFAULT, log_file=None,
+                 cache_size=COMMENT_UPDATER_CACHE_SIZE, comment_cache=None, verify=True):
+        """
+        CommentUpdater constructor.
+
+        Args:
+            window (float): number of seconds updates to a comment are collected
+                before they are applied (0 to apply each update right away)
+            log_file (string): path to log file
+            cache_size (int): maximum number of comments kept
+            comment_cache (tools.comment_cache.CommentCache): persistent cache
+                of comment bodies (optional)
+            verify (bool): whether to check known comments for changes before
+                editing them
+        """
+        self.window = window
+        self.log_file = log_file
+        self.cache_size = cache_size
+        self.comment_cache = comment_cache
+        self.verify = verify
+        self.lock = threading.Lock()
+        # maps comment id to a dict with the keys 'pr', 'updates', 'timer' and
+        # 'issue_comment' (optional, if the caller knows the comment already;
+        # only used if the comment is not among the comments edited last)
+        self.pending = {}
+        # comments edited last (maps comment id to
+        # github.IssueComment.IssueComment, least recently used first)
+        self.comments = OrderedDict()
+        # edits of the same comment are done one after another
+        self.edit_locks = {}
+
+    def queue_update(self, cmnt_id, pr, update, issue_comment=None, callback=None):
+        """
+        Queue an update to a comment. The update is applied when the window
+        of the comment ends, or right away if the window is 0.
+
+        Args:
+            cmnt_id (int): id of the comment to be updated
+            pr (github.PullRequest.PullRequest): instance representing the pull
+                request the comment to be updated belongs to
+            update (string): update to be added to the existing comment
+            issue_comment (github.IssueComment.IssueComment): the comment if
+                known to the caller (optional, ignored if the updater knows a
+                more recent version of the comment)
+            callback (function): function called with True if the update was
+                applied or False if applying it failed (optional)
+
+        Returns:
+            None (implicitly)
+        """
+        cmnt_id = int(cmnt_id)
+        with self.lock:
+            entry = self.pending.get(cmnt_id)
+            if entry is None:
+                entry = {"pr": pr, "updates": [], "callbacks": [], "timer": None, "issue_comment": None}
+                self.pending[cmnt_id] = entry
+                if self.window > 0:
+                    entry["timer"] = threading.Timer(self.window, self.flush, args=[cmnt_id])
+                    entry["timer"].daemon = True
+                    entry["timer"].start()
+            entry["updates"].append(update)
+            if callback is not None:
+                entry["callbacks"].append(callback)
+            if issue_comment is not None:
+                entry["issue_comment"] = issue_comment
+        bot_metrics.inc(METRIC_COMMENT_UPDATES)
+        if self.window <= 0:
+            self.flush(cmnt_id)
+
+    def get_issue_comment(self, cmnt_id, pr):
+        """
+        Obtain a comment from the comments edited last, from the comment cache
+        or, if it is not known, from GitHub.
+
+        Args:
+            cmnt_id (int): id of the comment
+            pr (github.PullRequest.PullRequest): instance representing the pull
+                request the comment belongs to
+
+        Returns:
+            github.IssueComment.IssueComment instance or None
+        """
+        cmnt_id = int(cmnt_id)
+        with self.lock:
+            issue_comment = self.comments.get(cmnt_id)
+        if issue_comment is None and self.comment_cache is not None:
+            issue_comment = get_cached_comment(self.comment_cache, cmnt_id, pr)
+        if issue_comment is not None:
+            if self.verify:
+                self.refresh(issue_comment)
+            else:
+                bot_metrics.inc(METRIC_COMMENT_CACHE, result="hit")
+            return issue_comment
+        bot_metrics.inc(METRIC_COMMENT_CACHE, result="miss")
+        return retry_call(timed_request, fargs=["get_issue_comment", pr.get_issue_comment, cmnt_id],
+                          exceptions=Exception, tries=5, delay=1, backoff=2, max_delay=30)
+
+    def refresh(self, issue_comment):
+        """
+        Check a known comment for changes with a conditional request and
+        update it if it changed.
+
+        Args:
+            issue_comment (github.IssueComment.IssueComment): the comment
+
+        Returns:
+            (bool): True if the body of the comment changed, False otherwise
+        """
+        known_hash = get_body_hash(issue_comment.body)
+        modified = retry_call(timed_request, fargs=["refresh_issue_comment", issue_comment.update],
+                              exceptions=Exception, tries=5, delay=1, backoff=2, max_delay=30)
+        # the ETag also changes if, e.g., a reaction was added to the comment
+        changed = modified and get_body_hash(issue_comment.body) != known_hash
+        bot_metrics.inc(METRIC_COMMENT_CACHE, result="changed" if changed else "hit")
+        if changed:
+            log(f"comment {issue_comment.id} was changed by someone else, using its current body",
+                log_file=self.log_file)
+        if modified and self.comment_cache is not None:
+            cache_comment(self.comment_cache, issue_comment)
+        return changed
+
+    def remember(self, issue_comment):
+        """
+        Keep a comment (and its body) as one of the comments edited last.
+
+        Args:
+            issue_comment (github.IssueComment.IssueComment): the comment
+
+        Returns:
+            None (implicitly)
+        """
+        with self.lock:
+            self.comments[issue_comment.id] = issue_comment
+            self.comments.move_to_end(issue_comment.id)
+            while len(self.comments) > self.cache_size:
+                self.comments.popitem(last=False)
+
+    def flush(self, cmnt_id):
+        """
+        Apply all updates queued for a comment with a single edit and call
+        the callbacks of the updates with the result.
+
+        Args:
+            cmnt_id (int): id of the comment
+
+        Returns:
+            (bool): True if the comment was updated, False otherwise (nothing
+                queued, comment not found or editing it failed)
+        """
+        with self.lock:
+            edit_lock = self.edit_locks.setdefault(cmnt_id, threading.Lock())
+        with edit_lock:
+            with self.lock:
+                entry = self.pending.pop(cmnt_id, None)
+            if entry is None:
+                return False
+            if entry["timer"] is not None:
+                entry["timer"].cancel()
+            updated = self.apply_updates(cmnt_id, entry)
+            for callback in entry["callbacks"]:
+                callback(updated)
+            return updated
+
+    def apply_updates(self, cmnt_id, entry):
+        """
+        Apply the updates queued for a comment with a single edit.
+
+        Args:
+            cmnt_id (int): id of the comment
+            entry (dict): the updates queued for the comment (see method
+                queue_update)
+
+        Returns:
+            (bool): True if the comment was updated, False otherwise
+        """
+        update = "".join(entry["updates"])
+        try:
+            # the body of a comment passed by the caller may be outdated (e.g.,
+            # if the comment was edited by a flush since the caller obtained
+            # it), so it is only used if the comment is not known
+            with self.lock:
+                known = cmnt_id in self.comments
+            if known or entry["issue_comment"] is None:
+                issue_comment = self.get_issue_comment(cmnt_id, entry["pr"])
+            else:
+                issue_comment = entry["issue_comment"]
+            if not issue_comment:
+                log(f"no comment with id {cmnt_id}, skipping update '{update}'", log_file=self.log_file)
+                return False
+            issue_comment = retry_call(
+                timed_request,
+                fargs=["edit_issue_comment", edit_comment, issue_comment, issue_comment.body + update,
+                       self.comment_cache],
+                exceptions=Exception, tries=5, delay=1, backoff=2, max_delay=30)
+        except Exception as err:
+            # the body kept may be outdated now
+            with self.lock:
+                self.comments.pop(cmnt_id, None)
+            if self.comment_cache is not None:
+                self.comment_cache.forget(cmnt_id)
+            log(f"updating comment {cmnt_id} with '{update}' failed: {err}", log_file=self.log_file)
+            return False
+        bot_metrics.inc(METRIC_COMMENT_EDITS)
+        self.remember(issue_comment)
+        return True
+
+    def flush_all(self):
+        """
+        Apply all queued updates (e.g., before the process exits).
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        with self.lock:
+            cmnt_ids = list(self.pending)
+        for cmnt_id in cmnt_ids:
+            self.flush(cmnt_id)
+
+
+# cache of comment bodies of the current process (see setting 'comment_cache_db')
+comment_cache = None
+# updater used by functions running in the event handler (created when needed)
+comment_updater = None
+
+
+def get_comment_cache():
+    """
+    Obtain the comment cache of the current process. It is opened when this
+    function is called first, if the setting 'comment_cache_db' is defined.
+
+    Args:
+        No arguments
+
+    Returns:
+        (tools.comment_cache.CommentCache): the comment cache or None if no
+            comment cache is used
+    """
+    global comment_cache
+    if comment_cache is None:
+        cfg = config.read_config()
+        comment_cache_db = cfg.get(config.SECTION_BOT_CONTROL, config.BOT_CONTROL_SETTING_COMMENT_CACHE_DB,
+                                   fallback=None)
+        if comment_cache_db:
+            comment_cache = CommentCache(comment_cache_db)
+    return comment_cache
+
+
+def get_comment_cache_verify():
+    """
+    Determine whether known comments are checked for changes before they are
+    edited (setting 'comment_cache_verify', enabled by default).
+
+    Args:
+        No arguments
+
+    Returns:
+        (bool): True if known comments are checked, False otherwise
+    """
+    cfg = config.read_config()
+    verify = cfg.get(config.SECTION_BOT_CONTROL, config.BOT_CONTROL_SETTING_COMMENT_CACHE_VERIFY, fallback=None)
+    return (verify or "true").strip().lower() not in ("false", "no", "0", "off")
+
+
+def get_comment_updater():
+    """
+    Obtain the comment updater of the current process. It is created when this
+    function is called first, using the setting 'comment_update_window', and
+    applies all queued updates when the process exits.
+
+    Args:
+        No arguments
+
+    Returns:
+        (CommentUpdater): the comment updater
+    """
+    global comment_updater
+    if comment_updater is None:
+        cfg = config.read_config()
+        window = float(cfg.get(config.SECTION_BOT_CONTROL, config.BOT_CONTROL_SETTING_COMMENT_UPDATE_WINDOW,
+                               fallback=None) or COMMENT_UPDATE_WINDOW_DEFAULT)
+        comment_updater = CommentUpdater(window, comment_cache=get_comment_cache(),
+                                         verify=get_comment_cache_verify())
+        atexit.register(comment_updater.flush_all)
+    return comment_updater
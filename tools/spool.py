@@ -0,0 +1,199 @@
+# This file is part of the EESSI build-and-deploy bot,
+# see https://github.com/EESSI/eessi-bot-software-layer
+#
+# The bot helps with requests to add software installations to the
+# EESSI software layer, see https://github.com/EESSI/software-layer
+#
+# author: Thomas Roeblitz (@trz42)
+#
+# license: GPLv2
+#
+
+# Standard library imports
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import time
+
+# Third party imports (anything installed into the local Python environment)
+from pyghee.utils import log
+
+# Local application imports (anything from EESSI/eessi-bot-software-layer)
+# (none yet)
+
+
+# name of the directory (under the setting 'job_ids_dir' in section
+# '[job_manager]') in which build jobs deposit a marker when they complete
+COMPLETION_SPOOL_DIR_NAME = "spool"
+
+# markers are named after the job id (files whose name starts with '.' are
+# temporary files written by the job script and are ignored)
+COMPLETION_MARKER_REGEX = re.compile(r"^\d+$")
+
+# how often the spool directory is scanned if inotify is not available
+SPOOL_SCAN_INTERVAL = 1
+
+# inotify constants (see 'man inotify')
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+
+
+def get_completion_spool_dir(job_ids_dir):
+    """
+    Determine the spool directory for completion markers of jobs.
+
+    Args:
+        job_ids_dir (string): value of the setting 'job_ids_dir'
+
+    Returns:
+        (string): path to the spool directory
+    """
+    return os.path.join(job_ids_dir, COMPLETION_SPOOL_DIR_NAME)
+
+
+class SpoolWatcher:
+    """
+    Watches the spool directory in which build jobs deposit a marker file
+    (named after the job id) when they complete. Waiting for markers uses
+    inotify if it is available (Linux) and falls back to scanning the
+    directory every SPOOL_SCAN_INTERVAL seconds otherwise.
+    """
+
+    def __init__(self, path, logfile=None):
+        """
+        SpoolWatcher constructor. Creates the spool directory if needed.
+
+        Args:
+            path (string): path to the spool directory
+            logfile (string): path to the log file
+        """
+        self.path = path
+        self.logfile = logfile
+        # markers returned by method wait already
+        self.seen = set()
+        os.makedirs(path, exist_ok=True)
+        self.inotify_fd = self._init_inotify()
+        log(f"SpoolWatcher: watching '{path}' "
+            f"({'inotify' if self.inotify_fd is not None else 'scanning every %ds' % SPOOL_SCAN_INTERVAL})",
+            self.logfile)
+
+    def _init_inotify(self):
+        """
+        Set up an inotify instance for the spool directory.
+
+        Args:
+            No arguments
+
+        Returns:
+            (int): inotify file descriptor or None if inotify is not available
+        """
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            inotify_fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (AttributeError, OSError):
+            return None
+        if inotify_fd < 0:
+            return None
+
+        watch = libc.inotify_add_watch(inotify_fd, os.fsencode(self.path), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if watch < 0:
+            log(f"SpoolWatcher: inotify_add_watch failed (errno {ctypes.get_errno()})", self.logfile)
+            os.close(inotify_fd)
+            return None
+        return inotify_fd
+
+    def close(self):
+        """
+        Release the inotify instance (if any).
+
+        Args:
+            No arguments
+
+        Returns:
+            None (implicitly)
+        """
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+    def get_markers(self):
+        """
+        Determine the ids of all jobs for which a marker exists.
+
+        Args:
+            No arguments
+
+        Returns:
+            (list): list of job ids
+        """
+        try:
+            with os.scandir(self.path) as entries:
+                return [entry.name for entry in entries
+                        if COMPLETION_MARKER_REGEX.match(entry.name) and entry.is_file()]
+        except FileNotFoundError:
+            return []
+
+    def scan(self):
+        """
+        Determine the ids of jobs whose marker appeared since the last scan.
+
+        Args:
+            No arguments
+
+        Returns:
+            (list): list of job ids
+        """
+        new_markers = [job_id for job_id in self.get_markers() if job_id not in self.seen]
+        self.seen.update(new_markers)
+        return new_markers
+
+    def wait(self, timeout):
+        """
+        Wait until new markers appear or the timeout expires.
+
+        Args:
+            timeout (float): maximum number of seconds to wait
+
+        Returns:
+            (list): ids of jobs whose marker appeared (empty if the timeout
+                expired)
+        """
+        deadline = time.monotonic() + timeout
+        new_markers = self.scan()
+        while not new_markers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self.inotify_fd is not None:
+                readable, _, _ = select.select([self.inotify_fd], [], [], remaining)
+                if readable:
+                    # drain the events, the directory is scanned anyway
+                    try:
+                        while os.read(self.inotify_fd, 65536):
+                            pass
+                    except BlockingIOError:
+                        pass
+            else:
+                time.sleep(min(SPOOL_SCAN_INTERVAL, remaining))
+            new_markers = self.scan()
+        return new_markers
+
+    def remove(self, job_id):
+        """
+        Remove the marker of a job.
+
+        Args:
+            job_id (string): id of the job
+
+        Returns:
+            None (implicitly)
+        """
+        self.seen.discard(job_id)
+        try:
+            os.remove(os.path.join(self.path, job_id))
+        except FileNotFoundError:
+            pass